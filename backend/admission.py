@@ -0,0 +1,252 @@
+"""
+Control de admisión: prioridades, límites de concurrencia y rate limits.
+
+- Cada petición cae en una clase de prioridad por ruta:
+    critical     sondas y métricas: nunca se rechazan
+    interactive  búsquedas, fichas, login... (el resto de /api)
+    bulk         /api/sync/* y validaciones SACS (/api/profesionales/*)
+- Cada clase tiene un máximo de peticiones en curso
+  (ADMISSION_MAX_INTERACTIVE, ADMISSION_MAX_BULK). Lo que excede se rechaza
+  con 503 y Retry-After en vez de encolarse detrás del resto.
+- El límite de bulk es adaptativo (AIMD): si la latencia media (EWMA) de las
+  peticiones interactive supera ADMISSION_LATENCY_TARGET_MS, se reduce a la
+  mitad cada ADMISSION_ADJUST_SECONDS (hasta 0: se descarta todo el bulk);
+  mientras se cumpla el objetivo crece de a uno hasta el máximo. Los clientes
+  móviles reintentan la sincronización más tarde; las consultas de pacientes
+  siguen respondiendo rápido.
+- Token buckets por usuario/dispositivo para /api/auth/login y
+  /api/profesionales/* (RATE_LIMIT_LOGIN, RATE_LIMIT_PROFESIONALES con
+  formato "capacidad/segundos"): 429 con Retry-After al agotarse. La
+  identidad es el token, luego X-Device-ID, luego la IP. Los buckets son por
+  proceso: con N workers el límite efectivo es hasta N veces mayor.
+"""
+import os
+import time
+import math
+import json
+import threading
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+
+from metrics import Counter, Gauge, registry
+from read_routing import query_token, request_key
+
+ADMISSION_ENABLED = os.environ.get('ADMISSION_ENABLED', 'true').lower() != 'false'
+ADMISSION_MAX_INTERACTIVE = int(os.environ.get('ADMISSION_MAX_INTERACTIVE', 64))
+ADMISSION_MAX_BULK = int(os.environ.get('ADMISSION_MAX_BULK', 8))
+ADMISSION_LATENCY_TARGET_MS = float(os.environ.get('ADMISSION_LATENCY_TARGET_MS', 500))
+ADMISSION_ADJUST_SECONDS = float(os.environ.get('ADMISSION_ADJUST_SECONDS', 1))
+ADMISSION_RETRY_AFTER = int(os.environ.get('ADMISSION_RETRY_AFTER', 5))
+RATE_LIMIT_LOGIN = os.environ.get('RATE_LIMIT_LOGIN', '10/60')
+RATE_LIMIT_PROFESIONALES = os.environ.get('RATE_LIMIT_PROFESIONALES', '30/60')
+DEVICE_ID_HEADER = "X-Device-ID"
+
+CRITICAL_PATHS = frozenset({"/", "/livez", "/readyz", "/health", "/metrics"})
+BULK_PREFIXES = ("/api/sync/", "/api/profesionales/")
+
+admission_total = registry.register(Counter(
+    "healthshield_admission_total", "Decisiones de admisión por prioridad y resultado", ("priority", "outcome")))
+admission_in_flight = registry.register(Gauge(
+    "healthshield_admission_in_flight", "Peticiones admitidas en curso por prioridad", ("priority",)))
+admission_limit = registry.register(Gauge(
+    "healthshield_admission_limit", "Límite de concurrencia vigente por prioridad", ("priority",)))
+admission_latency_ewma = registry.register(Gauge(
+    "healthshield_admission_latency_ewma_seconds", "Latencia media móvil de las peticiones interactive"))
+rate_limited_total = registry.register(Counter(
+    "healthshield_rate_limited_total", "Peticiones rechazadas por rate limit", ("rule",)))
+
+
+def priority_class(path: str) -> str:
+    if path in CRITICAL_PATHS:
+        return "critical"
+    if path.startswith(BULK_PREFIXES):
+        return "bulk"
+    return "interactive"
+
+
+# ==================== CONCURRENCIA ADAPTATIVA ====================
+
+class AdmissionController:
+    """Peticiones en curso por clase y límite AIMD de bulk según la latencia interactive"""
+
+    EWMA_ALPHA = 0.2
+
+    def __init__(self, max_interactive: int = ADMISSION_MAX_INTERACTIVE, max_bulk: int = ADMISSION_MAX_BULK,
+                 latency_target: float = ADMISSION_LATENCY_TARGET_MS / 1000,
+                 adjust_every: float = ADMISSION_ADJUST_SECONDS):
+        self.max_bulk = max_bulk
+        self.limits = {"interactive": max_interactive, "bulk": max_bulk}
+        self.in_flight = {"interactive": 0, "bulk": 0}
+        self.latency_target = latency_target
+        self.adjust_every = adjust_every
+        self.latency_ewma: Optional[float] = None
+        self._samples_since_adjust = 0
+        self._last_adjust = time.monotonic()
+        self._lock = threading.Lock()
+        for priority, limit in self.limits.items():
+            admission_limit.set(priority, value=limit)
+
+    def try_acquire(self, priority: str) -> bool:
+        if priority == "critical":
+            return True
+        with self._lock:
+            self._maybe_adjust()
+            if self.in_flight[priority] >= self.limits[priority]:
+                return False
+            self.in_flight[priority] += 1
+        admission_in_flight.inc(priority)
+        return True
+
+    def release(self, priority: str, elapsed: float):
+        if priority == "critical":
+            return
+        with self._lock:
+            self.in_flight[priority] -= 1
+            if priority == "interactive":
+                self.latency_ewma = elapsed if self.latency_ewma is None else (
+                    self.EWMA_ALPHA * elapsed + (1 - self.EWMA_ALPHA) * self.latency_ewma)
+                self._samples_since_adjust += 1
+                admission_latency_ewma.set(value=self.latency_ewma)
+        admission_in_flight.dec(priority)
+
+    def overloaded(self) -> bool:
+        return self.latency_ewma is not None and self.latency_ewma > self.latency_target
+
+    def _maybe_adjust(self):
+        now = time.monotonic()
+        if now - self._last_adjust < self.adjust_every:
+            return
+        self._last_adjust = now
+        # Sin tráfico interactive desde el último ajuste no hay nada que proteger
+        if self._samples_since_adjust and self.overloaded():
+            self.limits["bulk"] //= 2
+        else:
+            self.limits["bulk"] = min(self.limits["bulk"] + 1, self.max_bulk)
+            if not self._samples_since_adjust:
+                self.latency_ewma = None
+        self._samples_since_adjust = 0
+        admission_limit.set("bulk", value=self.limits["bulk"])
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {
+                "limits": dict(self.limits),
+                "in_flight": dict(self.in_flight),
+                "latency_ewma_ms": round(self.latency_ewma * 1000, 2) if self.latency_ewma is not None else None,
+                "latency_target_ms": round(self.latency_target * 1000, 2),
+                "overloaded": self.overloaded(),
+            }
+
+
+admission_controller = AdmissionController()
+
+
+# ==================== RATE LIMITS ====================
+
+def parse_rate(spec: str) -> Tuple[float, float]:
+    """"capacidad/segundos" → (capacidad, tokens por segundo)"""
+    capacity, _, seconds = spec.partition("/")
+    capacity = float(capacity)
+    return capacity, capacity / float(seconds or 1)
+
+
+class TokenBucketLimiter:
+    """Un token bucket por identidad; se olvidan los menos usados al pasar max_keys"""
+
+    def __init__(self, spec: str, max_keys: int = 10000):
+        self.capacity, self.refill_rate = parse_rate(spec)
+        self.max_keys = max_keys
+        self._buckets: "OrderedDict[str, Tuple[float, float]]" = OrderedDict()  # clave → (tokens, instante)
+        self._lock = threading.Lock()
+
+    def acquire(self, key: str) -> float:
+        """0 si se admite; si no, segundos hasta que haya un token"""
+        now = time.monotonic()
+        with self._lock:
+            tokens, updated = self._buckets.pop(key, (self.capacity, now))
+            tokens = min(self.capacity, tokens + (now - updated) * self.refill_rate)
+            wait = 0.0
+            if tokens >= 1:
+                tokens -= 1
+            else:
+                wait = (1 - tokens) / self.refill_rate
+            self._buckets[key] = (tokens, now)
+            while len(self._buckets) > self.max_keys:
+                self._buckets.popitem(last=False)
+        return wait
+
+
+RATE_LIMITS: Dict[str, Tuple[str, TokenBucketLimiter]] = {
+    "login": ("/api/auth/login", TokenBucketLimiter(RATE_LIMIT_LOGIN)),
+    "profesionales": ("/api/profesionales/", TokenBucketLimiter(RATE_LIMIT_PROFESIONALES)),
+}
+
+
+def rate_limit_rule(path: str) -> Optional[str]:
+    for rule, (prefix, _) in RATE_LIMITS.items():
+        if path.startswith(prefix):
+            return rule
+    return None
+
+
+def client_identity(scope) -> str:
+    headers = {name.decode("latin-1").lower(): value.decode("latin-1") for name, value in scope.get("headers", ())}
+    key = request_key(headers, query_token(scope))
+    if key is not None:
+        return f"user:{key}"
+    device = headers.get(DEVICE_ID_HEADER.lower())
+    if device:
+        return f"device:{device[:128]}"
+    client = scope.get("client")
+    return f"ip:{client[0] if client else 'unknown'}"
+
+
+# ==================== MIDDLEWARE ====================
+
+async def _reject(send, status_code: int, retry_after: float, error: str):
+    body = json.dumps({"error": error, "status_code": status_code}, ensure_ascii=False).encode("utf-8")
+    await send({
+        "type": "http.response.start",
+        "status": status_code,
+        "headers": [
+            (b"content-type", b"application/json"),
+            (b"content-length", str(len(body)).encode("latin-1")),
+            (b"retry-after", str(max(1, math.ceil(retry_after))).encode("latin-1")),
+        ],
+    })
+    await send({"type": "http.response.body", "body": body})
+
+
+class AdmissionMiddleware:
+    """Rate limits por identidad y admisión por prioridad antes de tocar la aplicación"""
+
+    def __init__(self, app, controller: AdmissionController = admission_controller):
+        self.app = app
+        self.controller = controller
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not ADMISSION_ENABLED or scope.get("method") == "OPTIONS":
+            await self.app(scope, receive, send)
+            return
+
+        path = scope["path"]
+        rule = rate_limit_rule(path)
+        if rule is not None:
+            wait = RATE_LIMITS[rule][1].acquire(f"{rule}:{client_identity(scope)}")
+            if wait > 0:
+                rate_limited_total.inc(rule)
+                await _reject(send, 429, wait, "Demasiadas solicitudes, intente más tarde")
+                return
+
+        priority = priority_class(path)
+        if not self.controller.try_acquire(priority):
+            admission_total.inc(priority, "shed")
+            await _reject(send, 503, ADMISSION_RETRY_AFTER, "Servidor ocupado, intente más tarde")
+            return
+
+        admission_total.inc(priority, "admitted")
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            self.controller.release(priority, time.perf_counter() - start)
@@ -0,0 +1,146 @@
+"""
+CPU por página de /api/pacientes y /api/vacunas: camino anterior vs rápido.
+
+- legacy: query ORM, un PacienteResponse / VacunaResponse por fila con
+  .isoformat() manual, validación contra response_model y json.dumps (lo que
+  hacía FastAPI con el valor devuelto por el handler).
+- fast: select() de Core con las columnas del schema, dicts y orjson
+  (fast_json.py, lo que hacen ahora los endpoints).
+
+Se siembra una base SQLite temporal con datagen.py (o --database-url) y se
+mide el tiempo de CPU (process_time) por página de --page-size filas, con la
+mediana de varias repeticiones. Sale con código 1 si el camino rápido no es
+al menos --min-speedup veces más barato.
+
+Uso:
+    python benchmarks/bench_json_path.py
+    python benchmarks/bench_json_path.py --page-size 1000 --repeat 15
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import tempfile
+import statistics
+from typing import Callable, Dict, List
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, BENCH_DIR)
+sys.path.insert(0, os.path.dirname(BENCH_DIR))
+
+from pydantic import TypeAdapter  # noqa: E402
+
+from datagen import seed_database  # noqa: E402
+
+
+def build_cases(db, page_size: int) -> Dict[str, Dict[str, Callable[[], bytes]]]:
+    from fast_json import encode_rows, fetch_dtos, paciente_select, vacuna_select
+    from models import Paciente, PacienteResponse, Vacuna, VacunaResponse
+
+    paciente_adapter = TypeAdapter(List[PacienteResponse])
+    vacuna_adapter = TypeAdapter(List[VacunaResponse])
+
+    def render_legacy(adapter, objects) -> bytes:
+        # fastapi.routing.serialize_response + JSONResponse.render
+        content = adapter.dump_python(adapter.validate_python(objects, from_attributes=True), mode="json")
+        return json.dumps(content, ensure_ascii=False, allow_nan=False, indent=None,
+                          separators=(",", ":")).encode("utf-8")
+
+    def pacientes_legacy():
+        db.expunge_all()
+        pacientes = db.query(Paciente).offset(0).limit(page_size).all()
+        return render_legacy(paciente_adapter, [
+            PacienteResponse(
+                id=p.id, cedula=p.cedula, nombre=p.nombre, fecha_nacimiento=p.fecha_nacimiento,
+                telefono=p.telefono, direccion=p.direccion, is_synced=bool(p.is_synced),
+                created_at=p.created_at.isoformat() if p.created_at else None,
+                updated_at=p.updated_at.isoformat() if p.updated_at else None,
+            ) for p in pacientes
+        ])
+
+    def vacunas_legacy():
+        db.expunge_all()
+        vacunas = db.query(Vacuna).offset(0).limit(page_size).all()
+        return render_legacy(vacuna_adapter, [
+            VacunaResponse(
+                id=v.id, paciente_id=v.paciente_id, nombre_vacuna=v.nombre_vacuna,
+                fecha_aplicacion=v.fecha_aplicacion, lote=v.lote, proxima_dosis=v.proxima_dosis,
+                usuario_id=v.usuario_id, is_synced=bool(v.is_synced),
+                created_at=v.created_at.isoformat() if v.created_at else None,
+            ) for v in vacunas
+        ])
+
+    return {
+        "pacientes": {
+            "legacy": pacientes_legacy,
+            "fast": lambda: encode_rows(fetch_dtos(db, paciente_select().offset(0).limit(page_size))),
+        },
+        "vacunas": {
+            "legacy": vacunas_legacy,
+            "fast": lambda: encode_rows(fetch_dtos(db, vacuna_select().offset(0).limit(page_size))),
+        },
+    }
+
+
+def measure(func: Callable, repeat: int) -> Dict:
+    func()  # calentamiento (caché de compilación de SQLAlchemy)
+    cpu, wall = [], []
+    for _ in range(repeat):
+        cpu_start, wall_start = time.process_time(), time.perf_counter()
+        body = func()
+        cpu.append(time.process_time() - cpu_start)
+        wall.append(time.perf_counter() - wall_start)
+    return {
+        "cpu_ms": round(statistics.median(cpu) * 1000, 3),
+        "wall_ms": round(statistics.median(wall) * 1000, 3),
+        "bytes": len(body),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--database-url", default=None, help="Por defecto SQLite temporal")
+    parser.add_argument("--rows", type=int, default=2000, help="Pacientes a sembrar")
+    parser.add_argument("--page-size", type=int, default=1000)
+    parser.add_argument("--repeat", type=int, default=11)
+    parser.add_argument("--min-speedup", type=float, default=1.5)
+    parser.add_argument("--output", default=None)
+    args = parser.parse_args()
+
+    database_url = args.database_url or \
+        f"sqlite:///{os.path.join(tempfile.mkdtemp(prefix='healthshield-bench-'), 'bench.db')}"
+    seed_database(database_url, args.rows, usuarios=10)
+
+    import database
+    db = database.SessionLocal()
+    results = {"page_size": args.page_size, "endpoints": {}}
+    failures = []
+    try:
+        for endpoint, paths in build_cases(db, args.page_size).items():
+            legacy, fast = measure(paths["legacy"], args.repeat), measure(paths["fast"], args.repeat)
+            speedup = legacy["cpu_ms"] / fast["cpu_ms"] if fast["cpu_ms"] else float("inf")
+            results["endpoints"][endpoint] = {"legacy": legacy, "fast": fast, "cpu_speedup": round(speedup, 2)}
+            print(f"   {endpoint:<10} legacy {legacy['cpu_ms']:>8.2f} ms CPU   fast {fast['cpu_ms']:>8.2f} ms CPU"
+                  f"   ({speedup:.2f}x)", file=sys.stderr)
+            if speedup < args.min_speedup:
+                failures.append(f"{endpoint}: {speedup:.2f}x < {args.min_speedup}x")
+    finally:
+        db.close()
+
+    output = json.dumps(results, indent=2)
+    print(output)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output)
+
+    if failures:
+        print("\n❌ El camino rápido no alcanza la mejora mínima:", file=sys.stderr)
+        for failure in failures:
+            print(f"   • {failure}", file=sys.stderr)
+        sys.exit(1)
+    print(f"\n✅ CPU por página de {args.page_size} filas al menos {args.min_speedup}x menor", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,144 @@
+"""
+Costo del logging en el camino de sincronización.
+
+Aplica el mismo lote de pacientes (sync_service.apply_pacientes, SQLite en
+memoria, con rollback entre corridas) con distintas configuraciones de log:
+
+- disabled: logging desactivado (referencia)
+- legacy: basicConfig, handler síncrono con un mensaje por paciente
+- async: structured_logging (cola + hilo, JSON) sin muestreo
+- async_sampled: structured_logging con el muestreo por defecto (LOG_SAMPLING)
+
+La salida de log va a un archivo temporal, no a la terminal. Se reporta la
+mediana por lote y el sobrecosto respecto de disabled. Sale con código 1 si
+async_sampled supera --max-overhead.
+
+Uso:
+    python benchmarks/bench_logging.py
+    python benchmarks/bench_logging.py --pacientes 1000 --repeat 9
+"""
+import os
+import sys
+import json
+import time
+import logging
+import argparse
+import tempfile
+import statistics
+from typing import Callable, Dict, List
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, BENCH_DIR)
+sys.path.insert(0, os.path.dirname(BENCH_DIR))
+
+from sqlalchemy import create_engine  # noqa: E402
+from sqlalchemy.orm import sessionmaker  # noqa: E402
+from sqlalchemy.pool import StaticPool  # noqa: E402
+
+import structured_logging  # noqa: E402
+from database import Base  # noqa: E402
+from datagen import generate_pacientes, public_fields  # noqa: E402
+from models import PacienteCreate  # noqa: E402
+from sync_service import SyncResult, apply_pacientes  # noqa: E402
+
+
+def _reset_root():
+    structured_logging.shutdown_logging()
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+        handler.close()
+
+
+def configure_disabled(stream):
+    _reset_root()
+    logging.getLogger().setLevel(logging.WARNING)
+
+
+def configure_legacy(stream):
+    _reset_root()
+    handler = logging.StreamHandler(stream)
+    handler.setFormatter(logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s'))
+    root = logging.getLogger()
+    root.addHandler(handler)
+    root.setLevel(logging.INFO)
+
+
+def configure_async(stream):
+    _reset_root()
+    structured_logging.configure_logging(level="INFO", fmt="json", sampling="", stream=stream)
+
+
+def configure_async_sampled(stream):
+    _reset_root()
+    structured_logging.configure_logging(level="INFO", fmt="json", stream=stream)
+
+
+CONFIGS: Dict[str, Callable] = {
+    "disabled": configure_disabled,
+    "legacy": configure_legacy,
+    "async": configure_async,
+    "async_sampled": configure_async_sampled,
+}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pacientes", type=int, default=500)
+    parser.add_argument("--repeat", type=int, default=7)
+    parser.add_argument("--max-overhead", type=float, default=0.10, help="Fracción sobre disabled")
+    parser.add_argument("--output", default=None)
+    args = parser.parse_args()
+
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    Base.metadata.create_all(bind=engine)
+    Session = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+    pacientes: List[PacienteCreate] = [
+        PacienteCreate(**public_fields(p)) for p in generate_pacientes(args.pacientes, seed=3)
+    ]
+
+    log_path = os.path.join(tempfile.mkdtemp(prefix="healthshield-bench-"), "bench.log")
+    results = {"pacientes": args.pacientes, "configs": {}}
+
+    with open(log_path, "a", encoding="utf-8") as stream:
+        for name, configure in CONFIGS.items():
+            configure(stream)
+            log_start = os.path.getsize(log_path)
+            samples = []
+            for _ in range(args.repeat + 1):
+                db = Session()
+                start = time.perf_counter()
+                apply_pacientes(db, pacientes, SyncResult(track_ids=False))
+                samples.append(time.perf_counter() - start)
+                db.rollback()
+                db.close()
+            # Vaciar la cola antes de medir el archivo
+            _reset_root()
+            stream.flush()
+            results["configs"][name] = {
+                # Sin la primera corrida (calentamiento)
+                "batch_ms": round(statistics.median(samples[1:]) * 1000, 2),
+                "log_bytes": os.path.getsize(log_path) - log_start,
+            }
+
+    reference = results["configs"]["disabled"]["batch_ms"]
+    for name, result in results["configs"].items():
+        result["overhead"] = round(result["batch_ms"] / reference - 1, 4)
+        print(f"   {name:<14} {result['batch_ms']:>9.2f} ms/lote   sobrecosto {result['overhead']:>7.2%}"
+              f"   {result['log_bytes']:>10,} bytes de log", file=sys.stderr)
+
+    output = json.dumps(results, indent=2)
+    print(output)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output)
+
+    overhead = results["configs"]["async_sampled"]["overhead"]
+    if overhead > args.max_overhead:
+        print(f"\n❌ Sobrecosto de logging {overhead:.2%} > {args.max_overhead:.0%}", file=sys.stderr)
+        sys.exit(1)
+    print(f"\n✅ Sobrecosto de logging dentro de {args.max_overhead:.0%}", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
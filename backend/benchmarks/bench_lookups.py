@@ -0,0 +1,162 @@
+"""
+CPU por búsqueda de una fila en repositories.py: Query ORM vs sentencia en caché.
+
+- legacy: db.query(Modelo).filter(...).first(), como antes: se arma un Query
+  y se calcula su clave de caché en cada llamada.
+- cached: los métodos actuales del repositorio (lambda_stmt por sitio de
+  llamada).
+
+Cada corrida vacía la sesión (expunge_all) y busca --lookups claves
+distintas, así ambos caminos van a la base y cargan los objetos. Se reporta
+la mediana de CPU (process_time) por búsqueda. Con --database-url de
+PostgreSQL también se reporta el tiempo de planificación (EXPLAIN ANALYZE)
+de cada búsqueda: el SQL es el mismo en los dos caminos, así que la
+diferencia es solo del lado del cliente.
+
+Sale con código 1 si alguna búsqueda en caché no es al menos --min-speedup
+veces más barata.
+
+Uso:
+    python benchmarks/bench_lookups.py
+    python benchmarks/bench_lookups.py --lookups 1000 --repeat 9
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import tempfile
+import statistics
+from typing import Callable, Dict, List
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, BENCH_DIR)
+sys.path.insert(0, os.path.dirname(BENCH_DIR))
+
+from sqlalchemy import select, text  # noqa: E402
+
+from datagen import seed_database  # noqa: E402
+
+
+def build_cases(db, lookups: int) -> Dict[str, Dict]:
+    from models import Paciente, Usuario
+    from repositories import PacienteRepository, UsuarioRepository
+
+    def sample(column) -> List:
+        return [row[0] for row in db.execute(select(column).order_by(column).limit(lookups))]
+
+    usernames = sample(Usuario.username)
+    usuario_ids = sample(Usuario.id)
+    cedulas = sample(Paciente.cedula)
+    paciente_ids = sample(Paciente.id)
+    server_ids = paciente_ids  # Sin server_id sembrado: mismo costo de consulta (sin filas)
+
+    return {
+        "usuario.get_by_username": {
+            "keys": usernames,
+            "legacy": lambda key: db.query(Usuario).filter(Usuario.username == key).first(),
+            "cached": lambda key: UsuarioRepository.get_by_username(db, key),
+            "statement": lambda key: select(Usuario).where(Usuario.username == key).limit(1),
+        },
+        "usuario.get_by_id": {
+            "keys": usuario_ids,
+            "legacy": lambda key: db.query(Usuario).filter(Usuario.id == key).first(),
+            "cached": lambda key: UsuarioRepository.get_by_id(db, key),
+            "statement": lambda key: select(Usuario).where(Usuario.id == key).limit(1),
+        },
+        "paciente.get_by_cedula": {
+            "keys": cedulas,
+            "legacy": lambda key: db.query(Paciente).filter(Paciente.cedula == key, Paciente.deleted_at.is_(None)).first(),
+            "cached": lambda key: PacienteRepository.get_by_cedula(db, key),
+            "statement": lambda key: select(Paciente).where(Paciente.cedula == key, Paciente.deleted_at.is_(None)).limit(1),
+        },
+        "paciente.get_by_id": {
+            "keys": paciente_ids,
+            "legacy": lambda key: db.query(Paciente).filter(Paciente.id == key, Paciente.deleted_at.is_(None)).first(),
+            "cached": lambda key: PacienteRepository.get_by_id(db, key),
+            "statement": lambda key: select(Paciente).where(Paciente.id == key, Paciente.deleted_at.is_(None)).limit(1),
+        },
+        "paciente.get_by_server_id": {
+            "keys": server_ids,
+            "legacy": lambda key: db.query(Paciente).filter(Paciente.server_id == key, Paciente.deleted_at.is_(None)).first(),
+            "cached": lambda key: PacienteRepository.get_by_server_id(db, key),
+            "statement": lambda key: select(Paciente).where(Paciente.server_id == key, Paciente.deleted_at.is_(None)).limit(1),
+        },
+    }
+
+
+def measure(db, lookup: Callable, keys: List, repeat: int) -> float:
+    """Mediana de ms de CPU por búsqueda"""
+    for key in keys[:5]:
+        lookup(key)  # calentamiento (cachés de compilación)
+    samples = []
+    for _ in range(repeat):
+        db.expunge_all()
+        start = time.process_time()
+        for key in keys:
+            lookup(key)
+        samples.append((time.process_time() - start) / len(keys))
+    return round(statistics.median(samples) * 1000, 4)
+
+
+def planning_ms(db, statement) -> float:
+    """Planning Time de PostgreSQL para la sentencia (EXPLAIN ANALYZE)"""
+    sql = str(statement.compile(dialect=db.get_bind().dialect, compile_kwargs={"literal_binds": True}))
+    plan = db.execute(text(f"EXPLAIN (ANALYZE, FORMAT JSON) {sql}")).scalar()
+    plan = json.loads(plan) if isinstance(plan, str) else plan
+    return plan[0]["Planning Time"]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--database-url", default=None, help="Por defecto SQLite temporal")
+    parser.add_argument("--rows", type=int, default=5000, help="Pacientes a sembrar")
+    parser.add_argument("--lookups", type=int, default=500, help="Claves distintas por corrida")
+    parser.add_argument("--repeat", type=int, default=7)
+    parser.add_argument("--min-speedup", type=float, default=1.2)
+    parser.add_argument("--output", default=None)
+    args = parser.parse_args()
+
+    database_url = args.database_url or \
+        f"sqlite:///{os.path.join(tempfile.mkdtemp(prefix='healthshield-bench-'), 'bench.db')}"
+    seed_database(database_url, args.rows, usuarios=max(args.lookups, 10))
+
+    import database
+    db = database.SessionLocal()
+    is_postgres = db.get_bind().dialect.name == "postgresql"
+    results = {"lookups_per_run": args.lookups, "cases": {}}
+    failures = []
+    try:
+        for name, case in build_cases(db, args.lookups).items():
+            legacy = measure(db, case["legacy"], case["keys"], args.repeat)
+            cached = measure(db, case["cached"], case["keys"], args.repeat)
+            speedup = legacy / cached if cached else float("inf")
+            result = {"legacy_cpu_ms": legacy, "cached_cpu_ms": cached, "cpu_speedup": round(speedup, 2)}
+            if is_postgres:
+                result["planning_ms"] = round(statistics.median(
+                    planning_ms(db, case["statement"](key)) for key in case["keys"][:20]), 4)
+            results["cases"][name] = result
+            planning = f"   plan {result['planning_ms']:.3f} ms" if is_postgres else ""
+            print(f"   {name:<26} legacy {legacy:>7.4f} ms   cached {cached:>7.4f} ms   ({speedup:.2f}x){planning}",
+                  file=sys.stderr)
+            if speedup < args.min_speedup:
+                failures.append(f"{name}: {speedup:.2f}x < {args.min_speedup}x")
+    finally:
+        db.close()
+
+    output = json.dumps(results, indent=2)
+    print(output)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output)
+
+    if failures:
+        print("\n❌ Búsquedas en caché sin la mejora mínima:", file=sys.stderr)
+        for failure in failures:
+            print(f"   • {failure}", file=sys.stderr)
+        sys.exit(1)
+    print(f"\n✅ CPU por búsqueda al menos {args.min_speedup}x menor con sentencias en caché", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
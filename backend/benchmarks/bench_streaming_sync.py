@@ -0,0 +1,134 @@
+"""
+Benchmark de la ingesta en streaming de /api/sync/bulk/stream.
+
+Genera un payload sintético de N filas sin materializarlo (se produce por
+trozos, como llegaría por la red), lo parsea y valida por lotes y mide la
+memoria máxima (RSS del proceso, o heap de Python con --tracemalloc). La
+memoria debe ser la misma para 10k que para 1M de filas.
+
+Uso:
+    python benchmarks/bench_streaming_sync.py --rows 1000000
+    python benchmarks/bench_streaming_sync.py --rows 100000 --tracemalloc
+"""
+import os
+import sys
+import json
+import time
+import asyncio
+import argparse
+import resource
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from streaming_sync import AsyncByteStream, iter_raw_batches, validate_batch  # noqa: E402
+
+CHUNK_BYTES = 64 * 1024
+
+
+def _paciente(i: int) -> dict:
+    return {
+        "local_id": i,
+        "cedula": f"V-{10000000 + i}",
+        "nombre": f"Paciente Sintético {i}",
+        "fecha_nacimiento": f"{1950 + i % 70}-{1 + i % 12:02d}-{1 + i % 28:02d}",
+        "telefono": f"0414-{i % 10000000:07d}",
+        "direccion": "Av. Bolívar, Caracas",
+    }
+
+
+def _vacuna(i: int) -> dict:
+    return {
+        "local_id": i,
+        "paciente_id": i,
+        "nombre_vacuna": "Antiamarílica",
+        "fecha_aplicacion": "2024-03-15",
+        "lote": f"L{i % 999:03d}",
+        "proxima_dosis": "2025-03-15",
+        "es_menor": i % 5 == 0,
+        "cedula_tutor": f"V-{20000000 + i}" if i % 5 == 0 else None,
+    }
+
+
+async def synthetic_body(rows: int):
+    """Cuerpo JSON de `rows` pacientes + `rows` vacunas, producido por trozos"""
+    buffer = ['{"last_sync_client": null, "pacientes": [']
+    size = len(buffer[0])
+
+    for kind, factory in (("pacientes", _paciente), ("vacunas", _vacuna)):
+        if kind == "vacunas":
+            buffer.append('], "vacunas": [')
+        for i in range(rows):
+            item = json.dumps(factory(i))
+            buffer.append(item if i == 0 else "," + item)
+            size += len(item) + 1
+            if size >= CHUNK_BYTES:
+                yield "".join(buffer).encode("utf-8")
+                buffer, size = [], 0
+
+    buffer.append("]}")
+    yield "".join(buffer).encode("utf-8")
+
+
+def _max_rss_mb() -> float:
+    # ru_maxrss está en KB en Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+async def run(rows: int, batch_size: int, use_tracemalloc: bool = False) -> dict:
+    source = AsyncByteStream(synthetic_body(rows))
+    counts = {"pacientes": 0, "vacunas": 0, "invalid": 0, "batches": 0}
+
+    if use_tracemalloc:
+        tracemalloc.start()
+    start = time.perf_counter()
+
+    async for kind, raw_records in iter_raw_batches(source, batch_size):
+        valid, invalid = validate_batch(kind, raw_records)
+        counts[kind] += len(valid)
+        counts["invalid"] += len(invalid)
+        counts["batches"] += 1
+
+    elapsed = time.perf_counter() - start
+    if use_tracemalloc:
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        peak_mb = peak / 1024 / 1024
+    else:
+        # El máximo de RSS es acumulativo: se corre primero el payload pequeño
+        peak_mb = _max_rss_mb()
+
+    return {
+        "rows": rows,
+        "batch_size": batch_size,
+        "bytes": source.bytes_read,
+        "seconds": round(elapsed, 3),
+        "records_per_second": round((counts["pacientes"] + counts["vacunas"]) / elapsed),
+        "peak_memory_mb": round(peak_mb, 2),
+        "memory_source": "tracemalloc" if use_tracemalloc else "max_rss",
+        **counts,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--batch-size", type=int, default=500)
+    parser.add_argument("--compare", type=int, default=10_000,
+                        help="Filas de la corrida de referencia para comparar la memoria máxima")
+    parser.add_argument("--tracemalloc", action="store_true",
+                        help="Medir el heap de Python con tracemalloc (más lento)")
+    args = parser.parse_args()
+
+    results = [asyncio.run(run(n, args.batch_size, args.tracemalloc)) for n in (args.compare, args.rows)]
+    print(json.dumps(results, indent=2))
+
+    small, large = results
+    ratio = large["peak_memory_mb"] / max(small["peak_memory_mb"], 0.01)
+    print(f"\nMemoria máxima {large['rows']} filas / {small['rows']} filas: {ratio:.2f}x")
+    # La memoria no debe crecer con el tamaño del payload
+    sys.exit(0 if ratio < 1.5 else 1)
+
+
+if __name__ == "__main__":
+    main()
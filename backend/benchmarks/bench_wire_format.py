@@ -0,0 +1,100 @@
+"""
+Benchmark del formato de /api/sync/*: JSON vs MessagePack (filas) vs
+MessagePack columnar (wire_format.py).
+
+Compara tiempo de codificación/decodificación y bytes, sin comprimir y con
+gzip, sobre una respuesta de /api/sync/updates con pacientes y vacunas.
+
+Uso:
+    python benchmarks/bench_wire_format.py --rows 10000
+"""
+import os
+import sys
+import gzip
+import json
+import time
+import argparse
+from datetime import datetime, timedelta, timezone
+
+import msgpack
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import wire_format  # noqa: E402
+from bench_streaming_sync import _paciente, _vacuna  # noqa: E402
+
+
+def updates_payload(rows: int) -> dict:
+    """Respuesta de /api/sync/updates con `rows` pacientes y `rows` vacunas"""
+    base = datetime(2024, 1, 1, tzinfo=timezone.utc)
+    updates = []
+    for i in range(rows):
+        created = (base + timedelta(minutes=i)).isoformat()
+        updates.append({"type": "paciente", "id": i + 1, **_paciente(i), "created_at": created, "action": "created"})
+        updates.append({"type": "vacuna", "id": i + 1, **_vacuna(i), "usuario_id": 1,
+                        "created_at": created, "action": "created"})
+    return {
+        "message": "Actualizaciones obtenidas",
+        "updates_count": len(updates),
+        "last_sync": base.isoformat(),
+        "updates": updates,
+    }
+
+
+def _best_of(func, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def run(rows: int, repeat: int) -> list:
+    payload = updates_payload(rows)
+
+    formats = {
+        "json": (
+            lambda: json.dumps(payload, separators=(",", ":")).encode("utf-8"),
+            json.loads,
+        ),
+        "msgpack_rows": (
+            lambda: msgpack.packb(payload, use_bin_type=True),
+            lambda data: msgpack.unpackb(data, raw=False),
+        ),
+        "msgpack_columnar": (
+            lambda: wire_format.packb(payload),
+            wire_format.unpackb,
+        ),
+    }
+
+    results = []
+    for name, (encode, decode) in formats.items():
+        data = encode()
+        results.append({
+            "format": name,
+            "rows": len(payload["updates"]),
+            "bytes": len(data),
+            "gzip_bytes": len(gzip.compress(data, 6)),
+            "encode_ms": round(_best_of(encode, repeat) * 1000, 2),
+            "decode_ms": round(_best_of(lambda: decode(data), repeat) * 1000, 2),
+        })
+
+    reference = results[0]
+    for result in results:
+        result["bytes_vs_json"] = round(result["bytes"] / reference["bytes"], 3)
+        result["encode_vs_json"] = round(result["encode_ms"] / reference["encode_ms"], 3)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=10_000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    print(json.dumps(run(args.rows, args.repeat), indent=2))
+
+
+if __name__ == "__main__":
+    main()
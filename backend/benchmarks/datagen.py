@@ -0,0 +1,263 @@
+"""
+Generador de datos sintéticos para benchmarks y pruebas de carga.
+
+Produce datasets venezolanos realistas y reproducibles (misma semilla →
+mismos datos): pacientes adultos con cédula V-/E-, menores con cédula
+escolar ligada a la cédula de su representante, vacunas del esquema
+nacional (con `es_menor` y `cedula_tutor` para los menores) y usuarios
+profesionales de la salud.
+
+Se genera por lotes, sin materializar el dataset, así que sirve de 10k a
+10M filas contra PostgreSQL o SQLite.
+
+Uso:
+    python benchmarks/datagen.py --database-url sqlite:///bench.db --pacientes 10000
+    python benchmarks/datagen.py --database-url postgresql://... --pacientes 10000000 --batch-size 20000
+"""
+import os
+import sys
+import time
+import random
+import argparse
+from datetime import date, timedelta
+from typing import Dict, Iterator, List
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+BENCH_PASSWORD = "Bench123!"
+
+NOMBRES = [
+    "José", "María", "Luis", "Carmen", "Carlos", "Ana", "Juan", "Rosa", "Pedro", "Yelitza",
+    "Jesús", "Daniela", "Wilmer", "Luisana", "Francisco", "Yusmary", "Miguel", "Gabriela",
+    "Rafael", "Andreína", "Alejandro", "Yorman", "Marisol", "Deivis", "Oriana", "Eduardo",
+]
+APELLIDOS = [
+    "González", "Rodríguez", "Pérez", "Hernández", "García", "Martínez", "López", "Díaz",
+    "Sánchez", "Romero", "Rojas", "Mendoza", "Torres", "Ramírez", "Contreras", "Briceño",
+    "Villegas", "Guerrero", "Medina", "Blanco", "Acosta", "Marcano", "Gutiérrez", "Salazar",
+]
+CIUDADES = [
+    ("Caracas", "Distrito Capital"), ("Maracaibo", "Zulia"), ("Valencia", "Carabobo"),
+    ("Barquisimeto", "Lara"), ("Maracay", "Aragua"), ("Ciudad Guayana", "Bolívar"),
+    ("Barcelona", "Anzoátegui"), ("Maturín", "Monagas"), ("Mérida", "Mérida"),
+    ("San Cristóbal", "Táchira"), ("Cumaná", "Sucre"), ("Coro", "Falcón"),
+]
+SECTORES = ["Centro", "La Candelaria", "El Valle", "Las Acacias", "Los Olivos", "San José", "La Victoria"]
+OPERADORAS = ["0412", "0414", "0416", "0424", "0426"]
+
+# Esquema nacional: (vacuna, edad mínima en años, meses hasta la próxima dosis o None)
+VACUNAS = [
+    ("BCG", 0, None), ("Hepatitis B", 0, 2), ("Pentavalente", 0, 2), ("Polio (VPI)", 0, 2),
+    ("Rotavirus", 0, 2), ("Neumococo conjugada", 0, 2), ("SRP (Trivalente viral)", 1, 48),
+    ("Fiebre Amarilla", 1, None), ("Toxoide tetánico diftérico", 10, 120),
+    ("Influenza", 0, 12), ("COVID-19", 3, 12), ("Antiamarílica", 1, None),
+]
+
+MINOR_RATIO = 0.3
+FOREIGN_RATIO = 0.05
+
+
+def _fecha(d: date) -> str:
+    return d.strftime("%Y-%m-%d")
+
+
+def _nombre(rng: random.Random) -> str:
+    return f"{rng.choice(NOMBRES)} {rng.choice(APELLIDOS)} {rng.choice(APELLIDOS)}"
+
+
+def _telefono(rng: random.Random) -> str:
+    return f"{rng.choice(OPERADORAS)}-{rng.randrange(10**7):07d}"
+
+
+def _direccion(rng: random.Random) -> str:
+    ciudad, estado = rng.choice(CIUDADES)
+    return f"Calle {rng.randint(1, 120)}, Sector {rng.choice(SECTORES)}, {ciudad}, Edo. {estado}"
+
+
+def adult_cedula(index: int) -> str:
+    """Cédula única y estable para el adulto número `index`"""
+    prefix = "E" if index % int(1 / FOREIGN_RATIO) == 0 else "V"
+    return f"{prefix}-{4_000_000 + index * 3}"
+
+
+def generate_pacientes(count: int, seed: int = 42, start: int = 0,
+                       today: date = date(2024, 6, 1)) -> Iterator[Dict]:
+    """
+    Pacientes `start` .. `start + count - 1`. Cada paciente lleva también los
+    campos de apoyo `_es_menor` y `_cedula_tutor` para generar sus vacunas.
+    """
+    for i in range(start, start + count):
+        rng = random.Random(seed * 1_000_003 + i)
+        es_menor = rng.random() < MINOR_RATIO
+        if es_menor:
+            nacimiento = today - timedelta(days=rng.randint(30, 17 * 365))
+            # Cédula escolar: cédula del representante + correlativo único
+            tutor = adult_cedula(rng.randrange(max(i, 1)))
+            cedula = f"{tutor}-{i}"
+        else:
+            nacimiento = today - timedelta(days=rng.randint(18 * 365, 90 * 365))
+            tutor = None
+            cedula = adult_cedula(i)
+
+        yield {
+            "cedula": cedula,
+            "nombre": _nombre(rng),
+            "fecha_nacimiento": _fecha(nacimiento),
+            "telefono": _telefono(rng),
+            "direccion": _direccion(rng),
+            "_es_menor": es_menor,
+            "_cedula_tutor": tutor,
+        }
+
+
+def generate_vacunas(paciente: Dict, paciente_id: int, usuario_id: int, per_paciente: float,
+                     seed: int = 42, today: date = date(2024, 6, 1)) -> List[Dict]:
+    """Vacunas de un paciente (en promedio `per_paciente`)"""
+    rng = random.Random(seed * 7_000_003 + paciente_id)
+    count = int(per_paciente) + (1 if rng.random() < per_paciente % 1 else 0)
+    nacimiento = date.fromisoformat(paciente["fecha_nacimiento"])
+    edad = (today - nacimiento).days // 365
+    candidatas = [v for v in VACUNAS if v[1] <= edad] or VACUNAS[:1]
+
+    vacunas = []
+    for _ in range(count):
+        nombre, edad_minima, meses = rng.choice(candidatas)
+        desde = nacimiento + timedelta(days=edad_minima * 365)
+        aplicada = desde + timedelta(days=rng.randint(0, max((today - desde).days, 0)))
+        es_menor = paciente["_es_menor"]
+        vacunas.append({
+            "paciente_id": paciente_id,
+            "nombre_vacuna": nombre,
+            "fecha_aplicacion": _fecha(aplicada),
+            "lote": f"L{rng.randint(1000, 9999)}-{rng.choice('ABCDEFGH')}",
+            "proxima_dosis": _fecha(aplicada + timedelta(days=30 * meses)) if meses else None,
+            "usuario_id": usuario_id,
+            "es_menor": es_menor,
+            "cedula_tutor": paciente["_cedula_tutor"] if es_menor else None,
+            "cedula_propia": None if es_menor else paciente["cedula"],
+            "nombre_paciente": paciente["nombre"],
+            "cedula_paciente": paciente["cedula"],
+        })
+    return vacunas
+
+
+def public_fields(paciente: Dict) -> Dict:
+    """Paciente sin los campos de apoyo (para enviarlo a la API)"""
+    return {key: value for key, value in paciente.items() if not key.startswith("_")}
+
+
+def bulk_sync_payload(pacientes: int, seed: int, start: int, per_paciente: float = 2.0) -> Dict:
+    """Cuerpo de /api/sync/bulk con pacientes nuevos y sus vacunas (por local_id)"""
+    payload = {"pacientes": [], "vacunas": [], "last_sync_client": None}
+    for offset, paciente in enumerate(generate_pacientes(pacientes, seed=seed, start=start)):
+        local_id = offset + 1
+        payload["pacientes"].append({**public_fields(paciente), "local_id": local_id})
+        for n, vacuna in enumerate(generate_vacunas(paciente, local_id, None, per_paciente, seed=seed)):
+            vacuna.pop("usuario_id")
+            payload["vacunas"].append({**vacuna, "local_id": local_id * 100 + n})
+    return payload
+
+
+def generate_usuarios(count: int, password_hash: str, seed: int = 42) -> Iterator[Dict]:
+    """Profesionales de la salud (todos con la contraseña BENCH_PASSWORD)"""
+    for i in range(count):
+        rng = random.Random(seed * 9_000_011 + i)
+        yield {
+            "username": f"prof{i:06d}",
+            "email": f"prof{i:06d}@healthshield.com.ve",
+            "password": password_hash,
+            "telefono": _telefono(rng),
+            "is_professional": True,
+            "professional_license": f"MPPS-{rng.randint(10000, 99999)}",
+            "is_verified": rng.random() < 0.8,
+            "role": "professional",
+            "is_synced": True,
+        }
+
+
+# ==================== CARGA EN BASE DE DATOS ====================
+
+def seed_database(database_url: str, pacientes: int, vacunas_per_paciente: float = 2.0,
+                  usuarios: int = None, batch_size: int = 5000, seed: int = 42) -> Dict:
+    """Crear las tablas y cargar el dataset. Devuelve conteos y tiempo"""
+    os.environ["DATABASE_URL"] = database_url
+    import database
+    from models import Paciente, Usuario, Vacuna
+
+    engine = database.engine
+    if engine is None:
+        raise SystemExit("❌ No se pudo conectar a la base de datos")
+    database.Base.metadata.create_all(bind=engine)
+
+    usuarios = usuarios if usuarios is not None else max(pacientes // 1000, 10)
+    start = time.perf_counter()
+    counts = {"usuarios": 0, "pacientes": 0, "vacunas": 0}
+
+    with engine.begin() as conn:
+        password_hash = database.hash_password(BENCH_PASSWORD)
+        rows = list(generate_usuarios(usuarios, password_hash, seed))
+        conn.execute(Usuario.__table__.insert(), rows)
+        counts["usuarios"] = len(rows)
+        first_user_id = conn.execute(
+            Usuario.__table__.select().with_only_columns(Usuario.id).where(Usuario.username == rows[0]["username"])
+        ).scalar()
+
+    next_id = None
+    for batch_start in range(0, pacientes, batch_size):
+        batch = list(generate_pacientes(min(batch_size, pacientes - batch_start), seed=seed, start=batch_start))
+        with engine.begin() as conn:
+            if next_id is None:
+                max_id = conn.execute(Paciente.__table__.select().with_only_columns(
+                    Paciente.id).order_by(Paciente.id.desc()).limit(1)).scalar()
+                next_id = (max_id or 0) + 1
+
+            paciente_rows, vacuna_rows = [], []
+            for paciente in batch:
+                paciente_id = next_id
+                next_id += 1
+                paciente_rows.append({**public_fields(paciente), "id": paciente_id, "is_synced": True})
+                usuario_id = first_user_id + (paciente_id % usuarios)
+                vacuna_rows.extend(
+                    {**vacuna, "is_synced": True}
+                    for vacuna in generate_vacunas(paciente, paciente_id, usuario_id, vacunas_per_paciente, seed)
+                )
+
+            conn.execute(Paciente.__table__.insert(), paciente_rows)
+            if vacuna_rows:
+                conn.execute(Vacuna.__table__.insert(), vacuna_rows)
+            counts["pacientes"] += len(paciente_rows)
+            counts["vacunas"] += len(vacuna_rows)
+
+        elapsed = time.perf_counter() - start
+        print(f"   {counts['pacientes']:,} pacientes, {counts['vacunas']:,} vacunas "
+              f"({counts['pacientes'] / elapsed:,.0f} pacientes/s)", flush=True)
+
+    if engine.dialect.name == "postgresql":
+        with engine.begin() as conn:
+            # Ajustar la secuencia tras insertar ids explícitos
+            conn.exec_driver_sql(
+                "SELECT setval(pg_get_serial_sequence('pacientes', 'id'), (SELECT MAX(id) FROM pacientes))"
+            )
+            conn.exec_driver_sql("ANALYZE pacientes; ANALYZE vacunas; ANALYZE usuarios")
+
+    return {**counts, "seconds": round(time.perf_counter() - start, 2)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--database-url", required=True, help="postgresql://... o sqlite:///archivo.db")
+    parser.add_argument("--pacientes", type=int, default=10_000)
+    parser.add_argument("--vacunas-per-paciente", type=float, default=2.0)
+    parser.add_argument("--usuarios", type=int, default=None, help="Por defecto: pacientes / 1000")
+    parser.add_argument("--batch-size", type=int, default=5000)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    print(f"🧪 Generando {args.pacientes:,} pacientes en {args.database_url.split('@')[-1]}")
+    result = seed_database(args.database_url, args.pacientes, args.vacunas_per_paciente,
+                           args.usuarios, args.batch_size, args.seed)
+    print(f"✅ {result}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+"""
+SACS simulado para pruebas de carga.
+
+Responde como https://sistemas.sacs.gob.ve/consultas/prfsnal_salud (llamadas
+xajax_userTable / xajax_tableProfesion) con una latencia configurable, para
+medir /api/profesionales/* sin depender del servicio real. Las cédulas que
+terminan en dígito par existen; las impares devuelven "NO SE ENCONTRÓ REGISTRO".
+
+Uso:
+    python benchmarks/fake_sacs.py --port 8765 --latency-ms 300
+    SACS_BASE_URL=http://127.0.0.1:8765/consultas/prfsnal_salud uvicorn main:app
+"""
+import json
+import time
+import random
+import argparse
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs
+
+
+def sacs_body(cedula: str) -> str:
+    """Cuerpo xajax que devolvería el SACS para la cédula"""
+    if not cedula or int(cedula[-1]) % 2:
+        return '<?xml version="1.0" encoding="utf-8"?><xjx><cmd>NO SE ENCONTRÓ REGISTRO</cmd></xjx>'
+
+    tipo, numero = cedula.split("-", 1)
+    user = {"nombre1": "MARÍA", "apellido1": "GONZÁLEZ", "cedula": numero,
+            "tipo_cedula": tipo, "estatus": "ACTIVO"}
+    profesiones = [{
+        "profesion": "LICENCIADO(A) EN ENFERMERÍA", "licencia": f"ENF-{numero[-5:]}",
+        "fecha_registro": "2015-03-12", "tomo_registro": "12", "folio_registro": "34",
+        "numero_registro": numero[-6:],
+    }]
+    return (
+        '<?xml version="1.0" encoding="utf-8"?><xjx><cmd n="js">'
+        f"xajax_userTable('{json.dumps(user, ensure_ascii=False)}');"
+        f"xajax_tableProfesion('{json.dumps(profesiones, ensure_ascii=False)}');"
+        "</cmd></xjx>"
+    )
+
+
+def make_handler(latency_ms: float, jitter_ms: float):
+    class FakeSacsHandler(BaseHTTPRequestHandler):
+        def do_POST(self):
+            length = int(self.headers.get("Content-Length", 0))
+            form = parse_qs(self.rfile.read(length).decode("utf-8"))
+            cedula = form.get("xajaxargs[]", [""])[0]
+
+            time.sleep(max(latency_ms + random.uniform(-jitter_ms, jitter_ms), 0) / 1000)
+
+            body = sacs_body(cedula).encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "text/xml; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    return FakeSacsHandler
+
+
+def start_fake_sacs(port: int = 0, latency_ms: float = 300, jitter_ms: float = 100) -> ThreadingHTTPServer:
+    """Levantar el SACS simulado en un hilo. Devuelve el servidor (server.server_port)"""
+    server = ThreadingHTTPServer(("127.0.0.1", port), make_handler(latency_ms, jitter_ms))
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="fake-sacs", daemon=True).start()
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency-ms", type=float, default=300)
+    parser.add_argument("--jitter-ms", type=float, default=100)
+    args = parser.parse_args()
+
+    server = ThreadingHTTPServer(("127.0.0.1", args.port), make_handler(args.latency_ms, args.jitter_ms))
+    print(f"🧪 SACS simulado en http://127.0.0.1:{args.port}/consultas/prfsnal_salud")
+    server.serve_forever()
+
+
+if __name__ == "__main__":
+    main()
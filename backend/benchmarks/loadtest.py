@@ -0,0 +1,300 @@
+"""
+Prueba de carga de los endpoints principales.
+
+Escenarios: login, search, pacientes, vacunas, sync_bulk, sync_updates y
+sacs (/api/profesionales/verificar). Cada escenario se ejecuta durante
+--duration segundos con --concurrency clientes simultáneos; se reportan
+p50/p95/p99, throughput y tasa de error, y se comparan con la línea base
+guardada (--save-baseline para actualizarla).
+
+Con --spawn se levanta todo localmente: base de datos sembrada con
+datagen.py (SQLite por defecto o --database-url), SACS simulado y la API
+con uvicorn. Sin --spawn se usa la API en --base-url.
+
+Uso:
+    python benchmarks/loadtest.py --spawn --rows 10000 --concurrency 16 --duration 20
+    python benchmarks/loadtest.py --spawn --save-baseline
+    python benchmarks/loadtest.py --base-url http://127.0.0.1:8000 --username admin --password Admin123!
+"""
+import os
+import sys
+import json
+import time
+import random
+import socket
+import argparse
+import tempfile
+import threading
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List
+
+import requests
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+BACKEND_DIR = os.path.dirname(BENCH_DIR)
+sys.path.insert(0, BENCH_DIR)
+sys.path.insert(0, BACKEND_DIR)
+
+from datagen import APELLIDOS, BENCH_PASSWORD, bulk_sync_payload, seed_database  # noqa: E402
+from fake_sacs import start_fake_sacs  # noqa: E402
+
+DEFAULT_BASELINE = os.path.join(BENCH_DIR, "baselines", "loadtest.json")
+SCENARIOS = ["login", "search", "pacientes", "vacunas", "sync_bulk", "sync_updates", "sacs"]
+
+
+# ==================== ESCENARIOS ====================
+
+class Context:
+    def __init__(self, base_url: str, token: str, usuarios: int, sync_batch: int):
+        self.base_url = base_url.rstrip("/")
+        self.headers = {"Authorization": f"Bearer {token}"}
+        self.usuarios = usuarios
+        self.sync_batch = sync_batch
+        # Cédulas nuevas para sync_bulk, lejos de las del dataset sembrado
+        self._sync_offset = 10**8 + random.randrange(10**6) * 1000
+        self._lock = threading.Lock()
+
+    def next_sync_start(self) -> int:
+        with self._lock:
+            start = self._sync_offset
+            self._sync_offset += self.sync_batch
+        return start
+
+
+def scenario_login(session, ctx: Context, rng: random.Random):
+    username = f"prof{rng.randrange(ctx.usuarios):06d}"
+    return session.post(f"{ctx.base_url}/api/auth/login",
+                        json={"username": username, "password": BENCH_PASSWORD})
+
+
+def scenario_search(session, ctx, rng):
+    return session.get(f"{ctx.base_url}/api/pacientes/buscar",
+                       params={"q": rng.choice(APELLIDOS)[:5]}, headers=ctx.headers)
+
+
+def scenario_pacientes(session, ctx, rng):
+    return session.get(f"{ctx.base_url}/api/pacientes",
+                       params={"skip": rng.randrange(0, 5000), "limit": 100}, headers=ctx.headers)
+
+
+def scenario_vacunas(session, ctx, rng):
+    return session.get(f"{ctx.base_url}/api/vacunas",
+                       params={"skip": rng.randrange(0, 5000), "limit": 100}, headers=ctx.headers)
+
+
+def scenario_sync_bulk(session, ctx, rng):
+    payload = bulk_sync_payload(ctx.sync_batch, seed=7, start=ctx.next_sync_start())
+    return session.post(f"{ctx.base_url}/api/sync/bulk", json=payload, headers=ctx.headers)
+
+
+def scenario_sync_updates(session, ctx, rng):
+    return session.get(f"{ctx.base_url}/api/sync/updates",
+                       params={"last_sync": "2000-01-01T00:00:00Z", "limit": 500}, headers=ctx.headers)
+
+
+def scenario_sacs(session, ctx, rng):
+    return session.get(f"{ctx.base_url}/api/profesionales/verificar",
+                       params={"cedula": f"V-{rng.randint(10_000_000, 30_000_000)}"})
+
+
+SCENARIO_FUNCS: Dict[str, Callable] = {
+    "login": scenario_login,
+    "search": scenario_search,
+    "pacientes": scenario_pacientes,
+    "vacunas": scenario_vacunas,
+    "sync_bulk": scenario_sync_bulk,
+    "sync_updates": scenario_sync_updates,
+    "sacs": scenario_sacs,
+}
+
+
+# ==================== DRIVER ====================
+
+def percentile(sorted_values: List[float], p: float) -> float:
+    if not sorted_values:
+        return 0.0
+    index = min(int(round(p / 100 * (len(sorted_values) - 1))), len(sorted_values) - 1)
+    return sorted_values[index]
+
+
+def run_scenario(name: str, ctx: Context, concurrency: int, duration: float, seed: int) -> Dict:
+    func = SCENARIO_FUNCS[name]
+    deadline = time.perf_counter() + duration
+    latencies: List[float] = []
+    errors: Dict[str, int] = {}
+    lock = threading.Lock()
+
+    def worker(worker_id: int):
+        rng = random.Random(seed * 1000 + worker_id)
+        session = requests.Session()
+        local_latencies, local_errors = [], {}
+        while time.perf_counter() < deadline:
+            start = time.perf_counter()
+            try:
+                response = func(session, ctx, rng)
+                ok = response.status_code < 400
+                key = str(response.status_code)
+            except requests.RequestException as e:
+                ok, key = False, type(e).__name__
+            local_latencies.append(time.perf_counter() - start)
+            if not ok:
+                local_errors[key] = local_errors.get(key, 0) + 1
+        with lock:
+            latencies.extend(local_latencies)
+            for key, count in local_errors.items():
+                errors[key] = errors.get(key, 0) + count
+
+    wall_start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(worker, range(concurrency)))
+    wall = time.perf_counter() - wall_start
+
+    latencies.sort()
+    total = len(latencies)
+    error_count = sum(errors.values())
+    return {
+        "requests": total,
+        "errors": error_count,
+        "error_rate": round(error_count / total, 4) if total else 0.0,
+        "error_codes": errors,
+        "throughput_rps": round(total / wall, 2),
+        "p50_ms": round(percentile(latencies, 50) * 1000, 2),
+        "p95_ms": round(percentile(latencies, 95) * 1000, 2),
+        "p99_ms": round(percentile(latencies, 99) * 1000, 2),
+        "max_ms": round(latencies[-1] * 1000, 2) if latencies else 0.0,
+    }
+
+
+def compare_with_baseline(results: Dict, baseline: Dict, tolerance: float) -> List[str]:
+    """Regresiones: p95 más lento o throughput menor que la línea base más la tolerancia"""
+    regressions = []
+    for name, result in results["scenarios"].items():
+        reference = baseline.get("scenarios", {}).get(name)
+        if not reference:
+            continue
+        if result["p95_ms"] > reference["p95_ms"] * (1 + tolerance):
+            regressions.append(f"{name}: p95 {reference['p95_ms']} → {result['p95_ms']} ms")
+        if result["throughput_rps"] < reference["throughput_rps"] * (1 - tolerance):
+            regressions.append(f"{name}: throughput {reference['throughput_rps']} → {result['throughput_rps']} rps")
+        if result["error_rate"] > reference["error_rate"] + 0.01:
+            regressions.append(f"{name}: error_rate {reference['error_rate']} → {result['error_rate']}")
+    return regressions
+
+
+# ==================== ENTORNO LOCAL (--spawn) ====================
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def spawn_environment(args) -> (subprocess.Popen, str):
+    database_url = args.database_url
+    if not database_url:
+        database_url = f"sqlite:///{os.path.join(tempfile.mkdtemp(prefix='healthshield-bench-'), 'bench.db')}"
+    print(f"🧪 Sembrando {args.rows:,} pacientes en {database_url.split('@')[-1]}")
+    seed_database(database_url, args.rows, usuarios=args.usuarios, seed=args.seed)
+
+    sacs = start_fake_sacs(latency_ms=args.sacs_latency_ms)
+    port = _free_port()
+    env = dict(
+        os.environ,
+        DATABASE_URL=database_url,
+        SACS_BASE_URL=f"http://127.0.0.1:{sacs.server_port}/consultas/prfsnal_salud",
+    )
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--host", "127.0.0.1", "--port", str(port),
+         "--log-level", "warning"],
+        cwd=BACKEND_DIR, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    base_url = f"http://127.0.0.1:{port}"
+    for _ in range(300):
+        try:
+            if requests.get(f"{base_url}/", timeout=1).status_code == 200:
+                return server, base_url
+        except requests.RequestException:
+            pass
+        time.sleep(0.1)
+    server.terminate()
+    raise SystemExit("❌ La API no arrancó")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--base-url", default="http://127.0.0.1:8000")
+    parser.add_argument("--spawn", action="store_true", help="Sembrar DB, levantar SACS simulado y la API")
+    parser.add_argument("--database-url", default=None, help="Con --spawn: PostgreSQL o SQLite (por defecto SQLite temporal)")
+    parser.add_argument("--rows", type=int, default=10_000, help="Con --spawn: pacientes a sembrar")
+    parser.add_argument("--usuarios", type=int, default=10)
+    parser.add_argument("--sacs-latency-ms", type=float, default=300)
+    parser.add_argument("--username", default="prof000000")
+    parser.add_argument("--password", default=BENCH_PASSWORD)
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS))
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--duration", type=float, default=10, help="Segundos por escenario")
+    parser.add_argument("--sync-batch", type=int, default=50, help="Pacientes por petición de sync_bulk")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE)
+    parser.add_argument("--save-baseline", action="store_true")
+    parser.add_argument("--tolerance", type=float, default=0.2)
+    parser.add_argument("--output", default=None, help="Guardar resultados en JSON")
+    args = parser.parse_args()
+
+    server = None
+    base_url = args.base_url
+    if args.spawn:
+        server, base_url = spawn_environment(args)
+
+    try:
+        login = requests.post(f"{base_url}/api/auth/login",
+                              json={"username": args.username, "password": args.password})
+        login.raise_for_status()
+        ctx = Context(base_url, login.json()["token"], args.usuarios, args.sync_batch)
+
+        results = {
+            "config": {
+                "rows": args.rows if args.spawn else None,
+                "concurrency": args.concurrency,
+                "duration": args.duration,
+                "sync_batch": args.sync_batch,
+            },
+            "scenarios": {},
+        }
+        for name in [s.strip() for s in args.scenarios.split(",") if s.strip()]:
+            print(f"▶️  {name} ({args.concurrency} clientes, {args.duration}s)", flush=True)
+            results["scenarios"][name] = run_scenario(name, ctx, args.concurrency, args.duration, args.seed)
+            r = results["scenarios"][name]
+            print(f"   {r['throughput_rps']} rps  p50 {r['p50_ms']} ms  p95 {r['p95_ms']} ms  "
+                  f"p99 {r['p99_ms']} ms  errores {r['error_rate']:.2%}", flush=True)
+    finally:
+        if server:
+            server.terminate()
+            server.wait()
+
+    print(json.dumps(results, indent=2))
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+
+    if args.save_baseline:
+        os.makedirs(os.path.dirname(args.baseline), exist_ok=True)
+        with open(args.baseline, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"💾 Línea base guardada en {args.baseline}")
+        return
+
+    if os.path.exists(args.baseline):
+        with open(args.baseline) as f:
+            regressions = compare_with_baseline(results, json.load(f), args.tolerance)
+        if regressions:
+            print("\n❌ Regresiones respecto a la línea base:")
+            for regression in regressions:
+                print(f"   • {regression}")
+            sys.exit(1)
+        print("\n✅ Sin regresiones respecto a la línea base")
+
+
+if __name__ == "__main__":
+    main()
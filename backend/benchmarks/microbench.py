@@ -0,0 +1,197 @@
+"""
+Micro-benchmarks de los caminos calientes que son solo CPU.
+
+- Construcción de listas PacienteResponse / VacunaResponse (como en los handlers)
+- Validación Pydantic de BulkSyncData (dict y JSON crudo)
+- Codificación y verificación de JWT
+- Extracción de datos de la respuesta del SACS (ProfesionalValidator)
+
+Los datasets son fijos (datagen.py con semilla fija, respuesta del SACS
+simulado), así que los resultados son comparables entre corridas. Se
+reporta el tiempo por operación (mediana y mínimo de varias repeticiones)
+en JSON, y se marcan como regresión los casos cuya mediana supera la línea
+base en más de --tolerance.
+
+Uso:
+    python benchmarks/microbench.py
+    python benchmarks/microbench.py --only jwt --output resultados.json
+    python benchmarks/microbench.py --save-baseline
+"""
+import os
+import sys
+import json
+import time
+import platform
+import argparse
+import statistics
+from datetime import datetime
+from types import SimpleNamespace
+from typing import Callable, Dict, List, Tuple
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, BENCH_DIR)
+sys.path.insert(0, os.path.dirname(BENCH_DIR))
+
+from jose import jwt  # noqa: E402
+
+from datagen import bulk_sync_payload, generate_pacientes, generate_vacunas, public_fields  # noqa: E402
+from fake_sacs import sacs_body  # noqa: E402
+from models import BulkSyncData, PacienteResponse, VacunaResponse  # noqa: E402
+from profesional_validator import ProfesionalValidator  # noqa: E402
+
+DEFAULT_BASELINE = os.path.join(BENCH_DIR, "baselines", "microbench.json")
+
+# Mismos parámetros que main.py
+JWT_SECRET = "dev_secret_key_32_chars_minimum_here"
+JWT_ALGORITHM = "HS256"
+
+LIST_SIZE = 100
+SYNC_PACIENTES = 200
+
+
+# ==================== FIXTURES ====================
+
+def _orm_rows() -> Tuple[List[SimpleNamespace], List[SimpleNamespace]]:
+    """Objetos con los atributos de las filas ORM que leen los handlers"""
+    created = datetime(2024, 6, 1, 12, 0, 0)
+    pacientes, vacunas = [], []
+    for i, paciente in enumerate(generate_pacientes(LIST_SIZE, seed=1), start=1):
+        pacientes.append(SimpleNamespace(id=i, server_id=None, is_synced=True, created_at=created,
+                                         updated_at=None, **public_fields(paciente)))
+        for vacuna in generate_vacunas(paciente, i, 1, 1.0, seed=1):
+            vacunas.append(SimpleNamespace(id=len(vacunas) + 1, server_id=None, paciente_server_id=None,
+                                           is_synced=True, created_at=created, updated_at=None, **vacuna))
+    return pacientes, vacunas
+
+
+def build_cases() -> Dict[str, Callable[[], object]]:
+    pacientes, vacunas = _orm_rows()
+    sync_payload = bulk_sync_payload(SYNC_PACIENTES, seed=1, start=0)
+    sync_json = json.dumps(sync_payload).encode("utf-8")
+    token = jwt.encode({"sub": "admin", "user_id": 1}, JWT_SECRET, algorithm=JWT_ALGORITHM)
+    sacs_html = sacs_body("V-12345678")
+
+    def pacientes_response_list():
+        return [
+            PacienteResponse(
+                id=p.id, cedula=p.cedula, nombre=p.nombre, fecha_nacimiento=p.fecha_nacimiento,
+                telefono=p.telefono, direccion=p.direccion, is_synced=bool(p.is_synced),
+                created_at=p.created_at.isoformat() if p.created_at else None,
+                updated_at=p.updated_at.isoformat() if p.updated_at else None,
+            ).model_dump()
+            for p in pacientes
+        ]
+
+    def vacunas_response_list():
+        return [
+            VacunaResponse(
+                id=v.id, paciente_id=v.paciente_id, nombre_vacuna=v.nombre_vacuna,
+                fecha_aplicacion=v.fecha_aplicacion, lote=v.lote, proxima_dosis=v.proxima_dosis,
+                usuario_id=v.usuario_id, is_synced=bool(v.is_synced),
+                created_at=v.created_at.isoformat() if v.created_at else None,
+            ).model_dump()
+            for v in vacunas
+        ]
+
+    return {
+        f"pacientes_response_list[{len(pacientes)}]": pacientes_response_list,
+        f"vacunas_response_list[{len(vacunas)}]": vacunas_response_list,
+        f"bulk_sync_validate_python[{SYNC_PACIENTES}]": lambda: BulkSyncData.model_validate(sync_payload),
+        f"bulk_sync_validate_json[{SYNC_PACIENTES}]": lambda: BulkSyncData.model_validate_json(sync_json),
+        "jwt_encode": lambda: jwt.encode({"sub": "admin", "user_id": 1}, JWT_SECRET, algorithm=JWT_ALGORITHM),
+        "jwt_decode": lambda: jwt.decode(token, JWT_SECRET, algorithms=[JWT_ALGORITHM]),
+        "sacs_extract_user_data": lambda: ProfesionalValidator._extract_user_data(sacs_html),
+        "sacs_extract_professional_data": lambda: ProfesionalValidator._extract_professional_data(sacs_html),
+    }
+
+
+# ==================== MEDICIÓN ====================
+
+def measure(func: Callable, repeat: int, target_seconds: float) -> Dict:
+    """Tiempo por operación: calibra el número de iteraciones y toma `repeat` muestras"""
+    number = 1
+    while True:
+        start = time.perf_counter()
+        for _ in range(number):
+            func()
+        elapsed = time.perf_counter() - start
+        if elapsed >= target_seconds / 10 or number >= 1_000_000:
+            break
+        number *= 10
+
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for _ in range(number):
+            func()
+        samples.append((time.perf_counter() - start) / number)
+
+    return {
+        "median_us": round(statistics.median(samples) * 1e6, 3),
+        "min_us": round(min(samples) * 1e6, 3),
+        "iterations": number,
+        "repeat": repeat,
+    }
+
+
+def compare_with_baseline(results: Dict, baseline: Dict, tolerance: float) -> List[str]:
+    regressions = []
+    for name, result in results["cases"].items():
+        reference = baseline.get("cases", {}).get(name)
+        if reference and result["median_us"] > reference["median_us"] * (1 + tolerance):
+            ratio = result["median_us"] / reference["median_us"]
+            regressions.append(f"{name}: {reference['median_us']} → {result['median_us']} µs ({ratio:.2f}x)")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--only", default=None, help="Solo los casos que contengan este texto")
+    parser.add_argument("--repeat", type=int, default=7)
+    parser.add_argument("--target-seconds", type=float, default=0.5, help="Duración aproximada de cada muestra")
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE)
+    parser.add_argument("--save-baseline", action="store_true")
+    parser.add_argument("--tolerance", type=float, default=0.25)
+    parser.add_argument("--output", default=None)
+    args = parser.parse_args()
+
+    results = {
+        "environment": {
+            "python": platform.python_version(),
+            "machine": platform.machine(),
+            "processor": platform.processor() or platform.machine(),
+        },
+        "cases": {},
+    }
+    for name, func in build_cases().items():
+        if args.only and args.only not in name:
+            continue
+        results["cases"][name] = measure(func, args.repeat, args.target_seconds)
+        print(f"   {name:<40} {results['cases'][name]['median_us']:>12.3f} µs", file=sys.stderr, flush=True)
+
+    output = json.dumps(results, indent=2)
+    print(output)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output)
+
+    if args.save_baseline:
+        os.makedirs(os.path.dirname(args.baseline), exist_ok=True)
+        with open(args.baseline, "w") as f:
+            f.write(output + "\n")
+        print(f"💾 Línea base guardada en {args.baseline}", file=sys.stderr)
+        return
+
+    if os.path.exists(args.baseline):
+        with open(args.baseline) as f:
+            regressions = compare_with_baseline(results, json.load(f), args.tolerance)
+        if regressions:
+            print("\n❌ Regresiones respecto a la línea base:", file=sys.stderr)
+            for regression in regressions:
+                print(f"   • {regression}", file=sys.stderr)
+            sys.exit(1)
+        print("\n✅ Sin regresiones respecto a la línea base", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,112 @@
+"""
+Presupuesto de arranque en frío.
+
+Importa main en un proceso limpio (sin variables de base de datos) con
+`python -X importtime`, y comprueba que:
+
+- importar main + crear la app cabe en --budget-ms (STARTUP_BUDGET_MS)
+- importar main no crea el engine ni abre conexiones (el engine es perezoso
+  y el esquema/admin se crean con `python bootstrap.py`)
+
+Muestra los módulos con mayor tiempo acumulado de importación para saber
+qué diferir si el presupuesto se supera. Sale con código 1 si falla algo.
+
+Uso:
+    python benchmarks/startup_budget.py
+    python benchmarks/startup_budget.py --budget-ms 1000 --top 15
+"""
+import os
+import sys
+import json
+import argparse
+import subprocess
+from typing import Dict, List
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+BACKEND_DIR = os.path.dirname(BENCH_DIR)
+
+DB_ENV_VARS = ("DATABASE_URL", "NEON_DATABASE_URL", "POSTGRES_URL", "PGHOST", "PGUSER", "PGPASSWORD")
+
+PROBE = """
+import json, time
+start = time.perf_counter()
+import main
+app = main.app
+elapsed = time.perf_counter() - start
+import database
+print(json.dumps({"import_ms": elapsed * 1000, "engine_created": database._engine_initialized}))
+"""
+
+
+def parse_importtime(stderr: str) -> List[Dict]:
+    """Líneas `import time: self [us] | cumulative | imported package`"""
+    modules = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "imported package" in line:
+            continue
+        try:
+            self_us, cumulative_us, name = line[len("import time:"):].split("|", 2)
+            modules.append({
+                "module": name.rstrip(),
+                "depth": (len(name) - len(name.lstrip())) // 2,
+                "self_ms": int(self_us) / 1000,
+                "cumulative_ms": int(cumulative_us) / 1000,
+            })
+        except ValueError:
+            continue
+    return modules
+
+
+def measure(runs: int) -> Dict:
+    env = {k: v for k, v in os.environ.items() if k not in DB_ENV_VARS}
+    env["LOOP_MONITOR_ENABLED"] = "false"
+    samples, modules = [], []
+    for _ in range(runs):
+        proc = subprocess.run([sys.executable, "-X", "importtime", "-c", PROBE], cwd=BACKEND_DIR,
+                              env=env, capture_output=True, text=True)
+        if proc.returncode != 0:
+            print(proc.stderr[-2000:], file=sys.stderr)
+            raise SystemExit("❌ No se pudo importar main")
+        result = json.loads(proc.stdout.strip().splitlines()[-1])
+        samples.append(result)
+        modules = parse_importtime(proc.stderr)
+    return {
+        "import_ms": min(s["import_ms"] for s in samples),
+        "engine_created": any(s["engine_created"] for s in samples),
+        "modules": modules,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--budget-ms", type=float, default=float(os.environ.get("STARTUP_BUDGET_MS", 1500)))
+    parser.add_argument("--runs", type=int, default=3, help="Se toma el mejor de N procesos")
+    parser.add_argument("--top", type=int, default=10)
+    args = parser.parse_args()
+
+    result = measure(args.runs)
+
+    # Importaciones directas de main: el acumulado ya incluye a sus hijos
+    top_level = sorted((m for m in result["modules"] if m["depth"] == 1),
+                       key=lambda m: m["cumulative_ms"], reverse=True)
+    print(f"⏱️  Importar main + crear app: {result['import_ms']:.1f} ms (presupuesto {args.budget_ms:.0f} ms)")
+    print("   Importaciones más costosas (acumulado):")
+    for module in top_level[:args.top]:
+        print(f"   {module['module'].strip():<40} {module['cumulative_ms']:>9.1f} ms")
+
+    failures = []
+    if result["import_ms"] > args.budget_ms:
+        failures.append(f"arranque {result['import_ms']:.1f} ms > {args.budget_ms:.0f} ms")
+    if result["engine_created"]:
+        failures.append("importar main creó el engine de base de datos")
+
+    if failures:
+        print("\n❌ Presupuesto de arranque superado:")
+        for failure in failures:
+            print(f"   • {failure}")
+        sys.exit(1)
+    print("\n✅ Dentro del presupuesto de arranque")
+
+
+if __name__ == "__main__":
+    main()
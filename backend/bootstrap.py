@@ -0,0 +1,100 @@
+"""
+Bootstrap de la base de datos: tarea única, fuera del arranque de la API.
+
+Crea las tablas, el paciente por defecto y el usuario admin. Se ejecuta en
+cada despliegue (o a mano), no en cada arranque en frío:
+
+    python bootstrap.py
+    python bootstrap.py --skip-admin
+"""
+import os
+import sys
+import logging
+import argparse
+
+from sqlalchemy.orm import Session
+
+from database import check_connection, get_db, get_engine, init_db
+from change_log import backfill
+from models import UsuarioCreate
+from repositories import UsuarioRepository
+
+logger = logging.getLogger(__name__)
+
+
+def create_default_admin(db: Session):
+    """Crear usuario administrador por defecto si no existe"""
+    try:
+        existing_admin = UsuarioRepository.get_by_username(db, "admin")
+        if existing_admin:
+            logger.info("✅ Usuario admin ya existe")
+            return existing_admin
+        
+        admin_password = os.environ.get('ADMIN_PASSWORD', 'Admin123!')
+        
+        admin_data = UsuarioCreate(
+            username="admin",
+            email="admin@healthshield.com",
+            password=admin_password,
+            telefono="0000000000",
+            is_professional=True,
+            professional_license="ADMIN-001"
+        )
+        
+        db_admin = UsuarioRepository.create(db, admin_data)
+        if db_admin:
+            db_admin.is_verified = True
+            db.commit()
+            db.refresh(db_admin)
+            logger.info(f"✅ Usuario admin creado: {db_admin.username}")
+            return db_admin
+        else:
+            logger.error("❌ No se pudo crear usuario admin")
+            return None
+            
+    except Exception as e:
+        logger.error(f"❌ Error creando usuario admin: {e}")
+        db.rollback()
+        return None
+
+def run_bootstrap(create_admin: bool = True) -> bool:
+    """Probar la conexión, crear el esquema y el admin. True si todo salió bien"""
+    engine = get_engine()
+    if engine is None or not check_connection(engine):
+        return False
+    
+    if not init_db():
+        return False
+    logger.info("✅ Base de datos inicializada correctamente")
+    
+    with engine.begin() as conn:
+        registered = backfill(conn)
+    if registered:
+        logger.info(f"📜 change_log inicializado con {registered} registros existentes")
+    
+    if create_admin:
+        db_gen = get_db()
+        try:
+            admin = create_default_admin(next(db_gen))
+        finally:
+            db_gen.close()
+        if not admin:
+            logger.warning("⚠️  No se pudo crear usuario admin")
+            return False
+        logger.info(f"✅ Usuario admin: {admin.username} ({admin.email})")
+    
+    return True
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Inicializar la base de datos de HealthShield")
+    parser.add_argument("--skip-admin", action="store_true", help="No crear el usuario admin")
+    args = parser.parse_args()
+    
+    if os.path.exists('.env'):
+        from dotenv import load_dotenv
+        load_dotenv()
+    
+    from structured_logging import configure_logging
+    configure_logging()
+    
+    sys.exit(0 if run_bootstrap(create_admin=not args.skip_admin) else 1)
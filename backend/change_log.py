@@ -0,0 +1,376 @@
+"""
+Registro append-only de cambios (change_log) para la sincronización incremental.
+
+- Cada alta, modificación o borrado de Paciente/Vacuna hecho con la sesión ORM
+  (repositorios, bulk_sync, sync por partes y streaming) agrega una fila en
+  change_log dentro de la misma transacción (listener after_flush). Si un
+  SAVEPOINT o la transacción se deshacen, sus filas también.
+- seq se asigna a filas ya confirmadas: en PostgreSQL, justo después del
+  COMMIT (after_commit) y en una transacción corta aparte, un numerador toma
+  el advisory lock, ve todo lo confirmado hasta ese momento y le da nextval.
+  Las filas de transacciones todavía en curso no son visibles y reciben un
+  seq mayor cuando confirman, así un lector con "seq > cursor" nunca se
+  salta una transacción más lenta. El lock solo cubre ese UPDATE: las
+  transacciones que escriben no lo esperan. En SQLite las escrituras ya son
+  serializadas: seq = id al confirmar (before_commit).
+- GET /api/sync/updates?cursor=N lee "WHERE seq > N ORDER BY seq": el costo es
+  O(cambios), no un recorrido de pacientes y vacunas completas. Cada entidad
+  se envía una vez por página con su estado actual; si tiene borrado lógico
+  (deleted_at) o ya no existe, como lápida (action 'deleted').
+- Compactación (compact): borra las entradas reemplazadas por una más nueva
+  de la misma entidad y las de más de CHANGE_LOG_RETENTION_DAYS días. Esto
+  último sube la marca de agua: un cursor menor recibe resync_required y el
+  dispositivo descarga todo de nuevo.
+- Lápidas: las filas con deleted_at de más de SOFT_DELETE_RETENTION_DAYS días
+  se borran físicamente (purge_tombstones). Un cursor anterior al borrado
+  sigue recibiendo la lápida desde el change_log; el modo por fecha
+  (sin cursor) solo la ve mientras no se haya purgado.
+
+La compactación y la purga corren en segundo plano cada
+CHANGE_LOG_COMPACT_INTERVAL_SECONDS (ChangeLogMaintenance, iniciada en el
+lifespan; también numera filas que quedaron sin seq si un proceso murió
+entre el COMMIT y el numerador), o a mano / por cron:
+
+    python change_log.py
+    python change_log.py --retention-days 7
+"""
+import os
+import sys
+import asyncio
+import logging
+import argparse
+from datetime import datetime, timedelta, timezone
+from typing import Any, Callable, Dict, List, NamedTuple, Optional
+
+from fastapi.concurrency import run_in_threadpool
+
+from sqlalchemy import delete, event, exists, func, insert, literal, select, text, update
+from sqlalchemy.orm import Session
+
+from models import CHANGE_LOG_SEQUENCE, ChangeLog, ChangeLogCompaction, Paciente, Vacuna
+
+logger = logging.getLogger(__name__)
+
+CHANGE_LOG_RETENTION_DAYS = int(os.environ.get('CHANGE_LOG_RETENTION_DAYS', 30))
+SOFT_DELETE_RETENTION_DAYS = int(os.environ.get('SOFT_DELETE_RETENTION_DAYS', CHANGE_LOG_RETENTION_DAYS))
+CHANGE_LOG_COMPACT_INTERVAL_SECONDS = float(os.environ.get('CHANGE_LOG_COMPACT_INTERVAL_SECONDS', 3600))
+CHANGE_LOG_LOCK_KEY = 0x6873636C  # pg_advisory_xact_lock: un numerador a la vez
+CHANGE_LOG_MAINTENANCE_LOCK_KEY = 0x6873636D  # Una compactación a la vez entre workers
+
+ENTITIES = {"paciente": Paciente, "vacuna": Vacuna}
+_TRACKED = {model: entity for entity, model in ENTITIES.items()}
+_PENDING = "change_log_pending"
+
+
+# ==================== REGISTRO ====================
+
+@event.listens_for(Session, "after_flush")
+def _record_changes(session, flush_context):
+    rows = []
+    for action, instances in (("created", session.new), ("updated", session.dirty), ("deleted", session.deleted)):
+        for instance in instances:
+            entity = _TRACKED.get(type(instance))
+            if entity is None or instance.id is None:
+                continue
+            row_action = action
+            if action == "updated":
+                if not session.is_modified(instance, include_collections=False):
+                    continue
+                if instance.deleted_at is not None:
+                    row_action = "deleted"  # Borrado lógico
+            rows.append({"entity": entity, "entity_id": instance.id, "action": row_action})
+    if rows:
+        session.connection().execute(insert(ChangeLog.__table__), rows)
+        session.info[_PENDING] = True
+
+
+@event.listens_for(Session, "before_commit")
+def _sequence_changes(session):
+    if session.in_nested_transaction():
+        return  # RELEASE SAVEPOINT: se numera al confirmar la transacción
+    if session.new or session.dirty or session.deleted:
+        session.flush()  # El flush de commit() corre después de este evento
+    if session.info.get(_PENDING):
+        connection = session.connection()
+        if connection.dialect.name != "postgresql":
+            session.info.pop(_PENDING)
+            assign_sequence(connection)
+
+
+@event.listens_for(Session, "after_commit")
+def _sequence_committed_changes(session):
+    if not session.info.pop(_PENDING, False):
+        return
+    bind = session.get_bind()
+    try:
+        with getattr(bind, "engine", bind).begin() as connection:
+            assign_sequence(connection)
+    except Exception as e:
+        # El commit ya ocurrió: ChangeLogMaintenance las numera en su próxima pasada
+        logger.warning(f"⚠️  change_log sin numerar tras el commit: {e}")
+
+
+def assign_sequence(connection) -> int:
+    """Numerar las filas sin seq visibles para esta transacción"""
+    table = ChangeLog.__table__
+    unsequenced = update(table).where(table.c.seq.is_(None))
+    if connection.dialect.name == "postgresql":
+        # Tomado el lock, el UPDATE ve todo lo confirmado antes: nadie numera
+        # en paralelo, así que un seq nuevo siempre es mayor que los ya leídos
+        connection.execute(text("SELECT pg_advisory_xact_lock(:key)"), {"key": CHANGE_LOG_LOCK_KEY})
+        return connection.execute(unsequenced.values(seq=CHANGE_LOG_SEQUENCE.next_value())).rowcount
+    return connection.execute(unsequenced.values(seq=table.c.id)).rowcount
+
+
+def backfill(connection) -> int:
+    """
+    Registrar las filas sin entrada en change_log: todas en el primer despliegue,
+    o las escritas sin la sesión ORM. Tras una compactación, una fila sin
+    entrada es normal (venció) y no se vuelve a registrar.
+    """
+    table = ChangeLog.__table__
+    if connection.execute(select(ChangeLogCompaction.id).limit(1)).first() is not None:
+        return 0
+    total = 0
+    for entity, model in ENTITIES.items():
+        logged = exists().where(table.c.entity == entity, table.c.entity_id == model.id)
+        total += connection.execute(insert(table).from_select(
+            ["entity", "entity_id", "action"],
+            select(literal(entity), model.id, literal("created")).where(~logged).order_by(model.id),
+        )).rowcount
+    if total:
+        assign_sequence(connection)
+    return total
+
+
+# ==================== LECTURA ====================
+
+def paciente_update(paciente: Paciente, action: str = 'created') -> Dict[str, Any]:
+    return {
+        'type': 'paciente',
+        'id': paciente.id,
+        'cedula': paciente.cedula,
+        'nombre': paciente.nombre,
+        'fecha_nacimiento': paciente.fecha_nacimiento,
+        'telefono': paciente.telefono,
+        'direccion': paciente.direccion,
+        'created_at': paciente.created_at.isoformat() if paciente.created_at else None,
+        'action': action
+    }
+
+
+def vacuna_update(vacuna: Vacuna, action: str = 'created') -> Dict[str, Any]:
+    return {
+        'type': 'vacuna',
+        'id': vacuna.id,
+        'paciente_id': vacuna.paciente_id,
+        'nombre_vacuna': vacuna.nombre_vacuna,
+        'fecha_aplicacion': vacuna.fecha_aplicacion,
+        'lote': vacuna.lote,
+        'proxima_dosis': vacuna.proxima_dosis,
+        'usuario_id': vacuna.usuario_id,
+        'created_at': vacuna.created_at.isoformat() if vacuna.created_at else None,
+        'action': action
+    }
+
+
+def tombstone(entity: str, entity_id: int, deleted_at=None) -> Dict[str, Any]:
+    return {
+        'type': entity,
+        'id': entity_id,
+        'deleted_at': deleted_at.isoformat() if deleted_at else None,
+        'action': 'deleted'
+    }
+
+
+_BUILDERS = {"paciente": paciente_update, "vacuna": vacuna_update}
+
+
+class ChangesPage(NamedTuple):
+    updates: List[Dict[str, Any]]
+    cursor: int
+    has_more: bool
+    resync_required: bool
+
+
+def compacted_through(db: Session) -> int:
+    return db.execute(select(func.max(ChangeLogCompaction.compacted_through))).scalar() or 0
+
+
+def latest_seq(db: Session) -> int:
+    # Con el change_log vacío tras compactar, el último seq es la marca de agua
+    return max(db.execute(select(func.max(ChangeLog.seq))).scalar() or 0, compacted_through(db))
+
+
+def fetch_changes(db: Session, cursor: int, limit: int) -> ChangesPage:
+    """Cambios confirmados con seq > cursor, una entrada por entidad con su estado actual"""
+    if cursor < compacted_through(db):
+        # Cursor anterior a la compactación: descargar todo y seguir desde aquí
+        return ChangesPage([], latest_seq(db), False, True)
+
+    table = ChangeLog.__table__
+    entries = db.execute(
+        select(table.c.seq, table.c.entity, table.c.entity_id, table.c.action)
+        .where(table.c.seq > cursor).order_by(table.c.seq).limit(limit)
+    ).all()
+
+    latest = {}
+    for entry in entries:
+        latest.pop((entry.entity, entry.entity_id), None)
+        latest[(entry.entity, entry.entity_id)] = entry  # Queda en la posición de su último cambio
+
+    current = {}
+    for entity, model in ENTITIES.items():
+        ids = [entity_id for kind, entity_id in latest if kind == entity]
+        if ids:
+            current.update(((entity, row.id), row) for row in db.query(model).filter(model.id.in_(ids)))
+
+    updates = []
+    for key, entry in latest.items():
+        row = current.get(key)
+        if row is None or row.deleted_at is not None:
+            update_item = tombstone(entry.entity, entry.entity_id, row.deleted_at if row is not None else None)
+        else:
+            update_item = _BUILDERS[entry.entity](row, entry.action)
+        update_item['seq'] = entry.seq
+        updates.append(update_item)
+
+    next_cursor = entries[-1].seq if entries else cursor
+    return ChangesPage(updates, next_cursor, len(entries) == limit, False)
+
+
+# ==================== COMPACTACIÓN ====================
+
+def _maintenance_lock(db: Session) -> bool:
+    """En PostgreSQL, False si otro worker ya está compactando (se libera con el commit)"""
+    if db.get_bind().dialect.name != "postgresql":
+        return True
+    return db.execute(text("SELECT pg_try_advisory_xact_lock(:key)"),
+                      {"key": CHANGE_LOG_MAINTENANCE_LOCK_KEY}).scalar()
+
+
+def compact(db: Session, retention_days: int = CHANGE_LOG_RETENTION_DAYS) -> Dict[str, int]:
+    """Borrar entradas reemplazadas y las más viejas que la retención (sube la marca de agua)"""
+    if not _maintenance_lock(db):
+        db.rollback()
+        return {"superseded": 0, "expired": 0, "compacted_through": compacted_through(db)}
+    table = ChangeLog.__table__
+    newer = table.alias("newer")
+    superseded = db.execute(delete(table).where(
+        table.c.seq.isnot(None),
+        exists().where(
+            newer.c.entity == table.c.entity,
+            newer.c.entity_id == table.c.entity_id,
+            newer.c.seq > table.c.seq,
+        ),
+    )).rowcount
+
+    cutoff = datetime.now(timezone.utc) - timedelta(days=retention_days)
+    through = db.execute(select(func.max(table.c.seq)).where(table.c.changed_at < cutoff)).scalar()
+    expired = 0
+    watermark = compacted_through(db)
+    if through is not None and through > watermark:
+        expired = db.execute(delete(table).where(table.c.seq <= through)).rowcount
+        db.add(ChangeLogCompaction(compacted_through=through, removed=superseded + expired))
+        watermark = through
+    db.commit()
+
+    if superseded or expired:
+        logger.info(f"🧹 change_log compactado: {superseded} entradas reemplazadas, "
+                    f"{expired} vencidas (marca de agua seq {watermark})")
+    return {"superseded": superseded, "expired": expired, "compacted_through": watermark}
+
+
+def purge_tombstones(db: Session, retention_days: int = SOFT_DELETE_RETENTION_DAYS) -> int:
+    """Borrar físicamente las filas con borrado lógico más viejo que la retención"""
+    if not _maintenance_lock(db):
+        db.rollback()
+        return 0
+    cutoff = datetime.now(timezone.utc) - timedelta(days=retention_days)
+    purged = 0
+    for model in ENTITIES.values():
+        # Core: el change_log ya tiene la entrada 'deleted' de cada una
+        purged += db.execute(delete(model.__table__).where(model.deleted_at < cutoff)).rowcount
+    db.commit()
+
+    if purged:
+        logger.info(f"🪦 {purged} lápidas de más de {retention_days} días eliminadas")
+    return purged
+
+
+class ChangeLogMaintenance:
+    """Compactación y purga de lápidas en segundo plano, fuera del camino de las peticiones"""
+
+    def __init__(self, interval_seconds: float = CHANGE_LOG_COMPACT_INTERVAL_SECONDS):
+        self.interval_seconds = interval_seconds
+        self.last_result: Optional[Dict[str, int]] = None
+        self._task: Optional[asyncio.Task] = None
+
+    def run_once(self, SessionLocal) -> Dict[str, int]:
+        db = SessionLocal()
+        try:
+            with db.begin():
+                # Filas de un proceso que murió entre el COMMIT y el numerador
+                sequenced = assign_sequence(db.connection())
+            result = compact(db)
+            result["tombstones_purged"] = purge_tombstones(db)
+            result["sequenced"] = sequenced
+            self.last_result = result
+            return result
+        finally:
+            db.close()
+
+    async def _maintenance_loop(self, get_session_factory: Callable):
+        while True:
+            await asyncio.sleep(self.interval_seconds)
+            SessionLocal = get_session_factory()
+            if SessionLocal is None:
+                continue
+            try:
+                await run_in_threadpool(self.run_once, SessionLocal)
+            except Exception as e:
+                logger.warning(f"⚠️  Mantenimiento del change_log falló: {e}")
+
+    def start(self, get_session_factory: Callable):
+        if self._task is None and self.interval_seconds > 0:
+            self._task = asyncio.get_running_loop().create_task(self._maintenance_loop(get_session_factory))
+
+    async def stop(self):
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+
+change_log_maintenance = ChangeLogMaintenance()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compactar el change_log y purgar lápidas vencidas")
+    parser.add_argument("--retention-days", type=int, default=CHANGE_LOG_RETENTION_DAYS)
+    parser.add_argument("--tombstone-retention-days", type=int, default=SOFT_DELETE_RETENTION_DAYS)
+    args = parser.parse_args()
+
+    if os.path.exists('.env'):
+        from dotenv import load_dotenv
+        load_dotenv()
+
+    from structured_logging import configure_logging
+    configure_logging()
+
+    from database import get_session_factory
+    SessionLocal = get_session_factory()
+    if SessionLocal is None:
+        logger.error("❌ Base de datos no disponible")
+        sys.exit(1)
+    db = SessionLocal()
+    try:
+        result = compact(db, args.retention_days)
+        result["tombstones_purged"] = purge_tombstones(db, args.tombstone_retention_days)
+        print(result)
+    finally:
+        db.close()
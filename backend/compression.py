@@ -0,0 +1,423 @@
+"""
+Compresión de cuerpos HTTP para la sincronización móvil.
+
+- Respuestas: gzip o zstd (si está instalado `zstandard`) según Accept-Encoding,
+  solo para tipos comprimibles y por encima de un tamaño mínimo.
+- Peticiones: acepta Content-Encoding gzip/zstd en /api/sync/*; el cuerpo se
+  descomprime de forma incremental, así que funciona también con la ingesta
+  en streaming.
+- Métricas de bytes ahorrados por endpoint.
+"""
+import os
+import zlib
+import logging
+import threading
+from typing import Dict, List, Optional, Tuple
+
+from fastapi import status
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.responses import JSONResponse, PlainTextResponse
+
+try:
+    import zstandard
+except ImportError:  # zstd es opcional: sin el paquete solo se ofrece gzip
+    zstandard = None
+
+_DECOMPRESS_ERRORS = (zlib.error,) if zstandard is None else (zlib.error, zstandard.ZstdError)
+
+logger = logging.getLogger(__name__)
+
+COMPRESSION_MIN_SIZE = int(os.environ.get('COMPRESSION_MIN_SIZE', 1024))
+GZIP_LEVEL = int(os.environ.get('COMPRESSION_GZIP_LEVEL', 6))
+ZSTD_LEVEL = int(os.environ.get('COMPRESSION_ZSTD_LEVEL', 3))
+# Límite del cuerpo descomprimido (protección contra "zip bombs")
+MAX_DECOMPRESSED_SIZE = int(os.environ.get('MAX_DECOMPRESSED_SIZE', 512 * 1024 * 1024))
+# Bytes descomprimidos por mensaje entregado a la app
+DECOMPRESS_CHUNK_SIZE = int(os.environ.get('DECOMPRESS_CHUNK_SIZE', 256 * 1024))
+# Un bloque zstd de pocos bytes se expande hasta 128 KB: porciones pequeñas
+# acotan lo que puede pasarse del límite en una llamada
+ZSTD_INPUT_SLICE = 256
+
+COMPRESSED_UPLOAD_PREFIXES = ("/api/sync/",)
+COMPRESSIBLE_TYPES = (
+    "application/json",
+    "application/x-msgpack",
+    "application/javascript",
+    "application/xml",
+    "text/",
+)
+
+
+# ==================== MÉTRICAS ====================
+
+class CompressionStats:
+    """Bytes antes/después de comprimir, por endpoint"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.responses: Dict[str, Dict[str, int]] = {}
+        self.requests: Dict[str, Dict[str, int]] = {}
+
+    @staticmethod
+    def _bump(table: Dict[str, Dict[str, int]], endpoint: str, original: int, compressed: int):
+        entry = table.setdefault(endpoint, {"count": 0, "original_bytes": 0, "compressed_bytes": 0})
+        entry["count"] += 1
+        entry["original_bytes"] += original
+        entry["compressed_bytes"] += compressed
+
+    def record_response(self, endpoint: str, original: int, compressed: int):
+        with self._lock:
+            self._bump(self.responses, endpoint, original, compressed)
+
+    def record_request(self, endpoint: str, original: int, compressed: int):
+        with self._lock:
+            self._bump(self.requests, endpoint, original, compressed)
+
+    def snapshot(self) -> dict:
+        def with_savings(table):
+            return {
+                endpoint: {
+                    **entry,
+                    "bytes_saved": entry["original_bytes"] - entry["compressed_bytes"],
+                }
+                for endpoint, entry in table.items()
+            }
+
+        with self._lock:
+            return {
+                "responses": with_savings(self.responses),
+                "requests": with_savings(self.requests),
+            }
+
+
+compression_stats = CompressionStats()
+
+
+def _endpoint_name(scope) -> str:
+    """Ruta plantilla (/api/pacientes/{paciente_id}) para no explotar la cardinalidad"""
+    route = scope.get("route")
+    path = getattr(route, "path", None) or scope.get("path", "")
+    return f"{scope.get('method', 'GET')} {path}"
+
+
+# ==================== CODIFICADORES ====================
+
+def _parse_accept_encoding(value: str) -> Dict[str, float]:
+    encodings = {}
+    for part in value.split(","):
+        token, _, params = part.strip().partition(";")
+        if not token:
+            continue
+        q = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        encodings[token.strip().lower()] = q
+    return encodings
+
+
+def negotiate_encoding(accept_encoding: str) -> Optional[str]:
+    """Elegir zstd o gzip según Accept-Encoding"""
+    if not accept_encoding:
+        return None
+    accepted = _parse_accept_encoding(accept_encoding)
+    wildcard = accepted.get("*", 0.0)
+
+    candidates = []
+    if zstandard is not None:
+        candidates.append("zstd")
+    candidates.append("gzip")
+
+    best, best_q = None, 0.0
+    for encoding in candidates:
+        q = accepted.get(encoding, wildcard)
+        if q > best_q:
+            best, best_q = encoding, q
+    return best
+
+
+def _compressor(encoding: str):
+    if encoding == "zstd":
+        return zstandard.ZstdCompressor(level=ZSTD_LEVEL).compressobj()
+    return zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+
+
+def _decompressor(encoding: str):
+    if encoding == "zstd":
+        return zstandard.ZstdDecompressor().decompressobj()
+    return zlib.decompressobj(16 + zlib.MAX_WBITS)
+
+
+def _supported_upload_encodings() -> Tuple[str, ...]:
+    return ("gzip", "zstd") if zstandard is not None else ("gzip",)
+
+
+def _is_compressible(headers: Headers) -> bool:
+    content_type = headers.get("content-type", "")
+    return any(content_type.startswith(t) for t in COMPRESSIBLE_TYPES)
+
+
+# ==================== MIDDLEWARE ====================
+
+class CompressionMiddleware:
+    """Middleware ASGI de compresión de respuestas y descompresión de peticiones"""
+
+    def __init__(self, app, minimum_size: int = COMPRESSION_MIN_SIZE):
+        self.app = app
+        self.minimum_size = minimum_size
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        headers = Headers(scope=scope)
+
+        content_encoding = headers.get("content-encoding", "identity").lower().strip()
+        if content_encoding != "identity":
+            if (not scope["path"].startswith(COMPRESSED_UPLOAD_PREFIXES)
+                    or content_encoding not in _supported_upload_encodings()):
+                response = PlainTextResponse(
+                    f"Content-Encoding no soportado: {content_encoding}",
+                    status_code=status.HTTP_415_UNSUPPORTED_MEDIA_TYPE,
+                )
+                await response(scope, receive, send)
+                return
+            await self._handle_compressed_request(scope, receive, send, headers, content_encoding)
+            return
+
+        await self._respond(scope, receive, send, headers)
+
+    async def _respond(self, scope, receive, send, headers: Headers):
+        encoding = negotiate_encoding(headers.get("accept-encoding", ""))
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+
+        responder = _CompressingResponder(self.app, encoding, self.minimum_size)
+        await responder(scope, receive, send)
+
+    async def _handle_compressed_request(self, scope, receive, send, headers: Headers, content_encoding: str):
+        """Si el cuerpo se rechaza, la respuesta de la app se descarta y se envía el 400/413"""
+        failure: dict = {}
+        app_scope, app_receive = self._decompressing_request(scope, receive, content_encoding, failure)
+        started = False
+
+        async def send_unless_failed(message):
+            nonlocal started
+            if "response" in failure:
+                return
+            started = True
+            await send(message)
+
+        try:
+            await self._respond(app_scope, app_receive, send_unless_failed, headers)
+        except Exception:
+            if "response" not in failure:
+                raise
+
+        if "response" in failure and not started:
+            await failure["response"](scope, receive, send)
+
+    @staticmethod
+    def _decompressing_request(scope, receive, encoding: str, failure: dict):
+        """
+        Reemplazar receive por uno que descomprime al vuelo. Cada mensaje
+        entregado a la app trae como mucho DECOMPRESS_CHUNK_SIZE bytes; el
+        límite total se comprueba a medida que crece. Si el cuerpo es inválido
+        o demasiado grande se guarda la respuesta de error en `failure` y la
+        app ve una desconexión.
+        """
+        # Se modifica el scope original (no una copia): Starlette escribe en él
+        # scope["route"], que leen MetricsMiddleware y SyncMemoryMiddleware
+        scope["headers"] = [
+            (name, value) for name, value in scope["headers"]
+            if name not in (b"content-encoding", b"content-length")
+        ]
+
+        decompressor = _BoundedDecompressor(encoding)
+        totals = {"compressed": 0, "original": 0}
+        upstream = {"more_body": True}
+
+        def fail(status_code: int, error: str):
+            logger.warning(f"⚠️  Cuerpo {encoding} rechazado en {scope['path']}: {error}")
+            failure["response"] = JSONResponse(
+                {"error": error, "status_code": status_code}, status_code=status_code
+            )
+            return {"type": "http.disconnect"}
+
+        async def receive_decompressed():
+            if "response" in failure:
+                return {"type": "http.disconnect"}
+
+            while True:
+                body = b""
+                if not decompressor.has_pending:
+                    message = await receive()
+                    if message["type"] != "http.request":
+                        return message
+                    body = message.get("body", b"")
+                    upstream["more_body"] = message.get("more_body", False)
+                    totals["compressed"] += len(body)
+
+                try:
+                    data = decompressor.decompress(body, DECOMPRESS_CHUNK_SIZE)
+                    finished = not upstream["more_body"] and not decompressor.has_pending
+                    if finished:
+                        data += decompressor.flush()
+                except _DECOMPRESS_ERRORS as e:
+                    return fail(status.HTTP_400_BAD_REQUEST, f"Cuerpo {encoding} inválido: {str(e)[:100]}")
+                if finished and not decompressor.complete:
+                    return fail(status.HTTP_400_BAD_REQUEST, f"Cuerpo {encoding} truncado")
+
+                totals["original"] += len(data)
+                if totals["original"] > MAX_DECOMPRESSED_SIZE:
+                    return fail(
+                        status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+                        "El cuerpo descomprimido supera el tamaño máximo permitido"
+                    )
+
+                if finished:
+                    compression_stats.record_request(
+                        _endpoint_name(scope), totals["original"], totals["compressed"]
+                    )
+                if data or finished:
+                    return {"type": "http.request", "body": data, "more_body": not finished}
+                # Sin salida todavía (p. ej. cabecera gzip incompleta): seguir leyendo
+
+        return scope, receive_decompressed
+
+
+class _BoundedDecompressor:
+    """Descompresión incremental con salida acotada por llamada"""
+
+    def __init__(self, encoding: str):
+        self.encoding = encoding
+        self._decompressor = _decompressor(encoding)
+        self._pending = b""
+
+    @property
+    def has_pending(self) -> bool:
+        """Queda entrada ya recibida sin descomprimir"""
+        return bool(self._pending)
+
+    def decompress(self, data: bytes, max_length: int) -> bytes:
+        if self._pending:
+            data = self._pending + data
+        if self.encoding == "gzip":
+            out = self._decompressor.decompress(data, max_length)
+            self._pending = self._decompressor.unconsumed_tail
+            return out
+
+        # zstandard no admite max_length: se le da la entrada por porciones
+        # pequeñas y se para al llegar al límite
+        parts, size, offset = [], 0, 0
+        while offset < len(data) and size < max_length:
+            piece = self._decompressor.decompress(data[offset:offset + ZSTD_INPUT_SLICE])
+            offset += ZSTD_INPUT_SLICE
+            parts.append(piece)
+            size += len(piece)
+        self._pending = data[offset:]
+        return b"".join(parts)
+
+    def flush(self) -> bytes:
+        return self._decompressor.flush() if self.encoding == "gzip" else b""
+
+    @property
+    def complete(self) -> bool:
+        """Se llegó al final del stream (flush() no avisa si el cuerpo está truncado)"""
+        return self._decompressor.eof
+
+
+class _CompressingResponder:
+    """Comprime el cuerpo de una respuesta (completa o en streaming)"""
+
+    def __init__(self, app, encoding: str, minimum_size: int):
+        self.app = app
+        self.encoding = encoding
+        self.minimum_size = minimum_size
+        self.send = None
+        self.scope = None
+        self.start_message = None
+        self.compressor = None
+        self.passthrough = False
+        self.original_bytes = 0
+        self.compressed_bytes = 0
+
+    async def __call__(self, scope, receive, send):
+        self.scope = scope
+        self.send = send
+        await self.app(scope, receive, self.send_compressed)
+
+    async def send_compressed(self, message):
+        message_type = message["type"]
+
+        if message_type == "http.response.start":
+            # Esperar al primer trozo del cuerpo para decidir
+            self.start_message = message
+            headers = Headers(raw=message["headers"])
+            if "content-encoding" in headers or not _is_compressible(headers):
+                self.passthrough = True
+            return
+
+        if message_type != "http.response.body":
+            await self.send(message)
+            return
+
+        if self.passthrough:
+            if self.start_message is not None:
+                await self.send(self.start_message)
+                self.start_message = None
+            await self.send(message)
+            return
+
+        body = message.get("body", b"")
+        more_body = message.get("more_body", False)
+
+        if self.start_message is not None:
+            start, self.start_message = self.start_message, None
+
+            if not more_body and len(body) < self.minimum_size:
+                # Respuesta pequeña: no vale la pena comprimir
+                self.passthrough = True
+                await self.send(start)
+                await self.send(message)
+                return
+
+            headers = MutableHeaders(raw=start["headers"])
+            headers["Content-Encoding"] = self.encoding
+            headers.add_vary_header("Accept-Encoding")
+            if "content-length" in headers:
+                del headers["content-length"]
+            self.compressor = _compressor(self.encoding)
+
+            if not more_body:
+                compressed = self.compressor.compress(body) + self.compressor.flush()
+                headers["Content-Length"] = str(len(compressed))
+                await self.send(start)
+                await self.send({"type": "http.response.body", "body": compressed})
+                self._record(len(body), len(compressed))
+                return
+
+            await self.send(start)
+
+        # Respuesta en streaming
+        self.original_bytes += len(body)
+        data = self.compressor.compress(body)
+        if not more_body:
+            data += self.compressor.flush()
+        elif self.encoding == "gzip":
+            data += self.compressor.flush(zlib.Z_SYNC_FLUSH)
+        else:
+            data += self.compressor.flush(zstandard.COMPRESSOBJ_FLUSH_BLOCK)
+        self.compressed_bytes += len(data)
+        await self.send({"type": "http.response.body", "body": data, "more_body": more_body})
+
+        if not more_body:
+            self._record(self.original_bytes, self.compressed_bytes)
+
+    def _record(self, original: int, compressed: int):
+        compression_stats.record_response(_endpoint_name(self.scope), original, compressed)
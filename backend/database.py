@@ -1,17 +1,22 @@
 import os
-from sqlalchemy import create_engine, text
+import re
+import random
+import threading
+from collections import deque
+from datetime import datetime
+from sqlalchemy import create_engine, text, inspect
 from sqlalchemy.orm import sessionmaker, declarative_base
 from sqlalchemy.pool import NullPool
 from sqlalchemy.exc import OperationalError
 import logging
-import time
 import bcrypt
+from starlette.requests import Request
+
+from read_routing import LAST_WRITE_HEADER, read_routing_total, read_target, request_key
+from neon_connection import NEON_CONNECT_TIMEOUT, ConnectionManager, primary_connections, replica_connections
+from metrics import add_query_observer
 
 # Configurar logging
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
-)
 logger = logging.getLogger(__name__)
 
 Base = declarative_base()
@@ -75,15 +80,33 @@ def get_neon_database_url():
     
     return None
 
-def create_neon_engine():
+def get_replica_database_url():
+    """URL de la réplica de lectura (opcional): DATABASE_REPLICA_URL o NEON_REPLICA_URL"""
+    database_url = os.environ.get('DATABASE_REPLICA_URL') or os.environ.get('NEON_REPLICA_URL')
+    if database_url and database_url.startswith('postgres://'):
+        database_url = database_url.replace('postgres://', 'postgresql://', 1)
+    return database_url
+
+def create_neon_engine(database_url: str = None, application_name: str = "healthshield-api",
+                       connections: ConnectionManager = primary_connections):
     """Crear engine SQLAlchemy para Neon PostgreSQL - CORREGIDO"""
     try:
-        database_url = get_neon_database_url()
+        database_url = database_url or get_neon_database_url()
         
         if not database_url:
             logger.error("❌ No se pudo obtener URL de base de datos")
             return None
         
+        if database_url.startswith('sqlite'):
+            # SQLite local: solo para benchmarks y pruebas de carga
+            engine = create_engine(
+                database_url,
+                echo=False,
+                connect_args={"check_same_thread": False}
+            )
+            logger.info(f"🧪 Usando SQLite local: {database_url}")
+            return engine
+        
         logger.info("🔗 Conectando a Neon PostgreSQL...")
         
         # Asegurar parámetros de conexión SSL
@@ -101,18 +124,35 @@ def create_neon_engine():
             pool_pre_ping=True,
             pool_recycle=300,
             connect_args={
-                "connect_timeout": 15,
+                "connect_timeout": NEON_CONNECT_TIMEOUT,
                 "keepalives": 1,
                 "keepalives_idle": 30,
                 "keepalives_interval": 10,
                 "keepalives_count": 5,
-                "application_name": "healthshield-api",
+                "application_name": application_name,
             }
         )
         
-        # Test de conexión
-        logger.info("🔄 Probando conexión a PostgreSQL...")
+        # No se conecta aquí: la primera consulta abre la conexión (pool_pre_ping).
+        # Cada conexión nueva reintenta mientras Neon despierta (neon_connection.py)
+        return connections.instrument(engine)
+        
+    except Exception as e:
+        logger.error(f"❌ Error inesperado: {e}")
+        import traceback
+        logger.error(traceback.format_exc())
+        return None
+
+def check_connection(engine) -> bool:
+    """Probar la conexión y mostrar información del servidor (diagnóstico y bootstrap)"""
+    try:
+        logger.info("🔄 Probando conexión a la base de datos...")
         with engine.connect() as conn:
+            if engine.dialect.name != "postgresql":
+                version = conn.execute(text("SELECT sqlite_version()")).scalar()
+                logger.info(f"✅ CONEXIÓN EXITOSA: SQLite {version}")
+                return True
+            
             result = conn.execute(text("""
                 SELECT 
                     version() as version,
@@ -129,8 +169,7 @@ def create_neon_engine():
                Versión: {db_info.version.split(',')[0]}
                Hora Servidor: {db_info.server_time}
             """)
-        
-        return engine
+        return True
         
     except OperationalError as e:
         error_msg = str(e)
@@ -146,68 +185,253 @@ def create_neon_engine():
         elif "SSL" in error_msg:
             logger.error("🔐 ERROR: Problema con SSL")
         
-        return None
+        return False
         
     except Exception as e:
         logger.error(f"❌ Error inesperado: {e}")
-        import traceback
-        logger.error(traceback.format_exc())
-        return None
+        return False
+
+# ==================== REGISTRO DE CONSULTAS LENTAS ====================
+
+SLOW_QUERY_THRESHOLD_MS = float(os.environ.get('SLOW_QUERY_THRESHOLD_MS', 200))
+# Fracción de consultas lentas a las que se les captura el plan (EXPLAIN, sin ANALYZE)
+SLOW_QUERY_EXPLAIN_RATE = float(os.environ.get('SLOW_QUERY_EXPLAIN_RATE', 0.1))
+SLOW_QUERY_LOG_SIZE = int(os.environ.get('SLOW_QUERY_LOG_SIZE', 100))
+
+_SQL_STRING = re.compile(r"'(?:[^']|'')*'")
+_SQL_NUMBER = re.compile(r"\b\d+(?:\.\d+)?\b")
+_SQL_BIND = re.compile(r"%\(\w+\)s|%s|:\w+|\?")
+_SQL_IN_LIST = re.compile(r"\(\s*\?(?:\s*,\s*\?)+\s*\)")
+_SQL_SPACES = re.compile(r"\s+")
+
+
+def normalize_sql(statement: str) -> str:
+    """SQL sin literales ni valores: agrupa consultas iguales con distintos parámetros"""
+    sql = _SQL_STRING.sub("?", statement)
+    sql = _SQL_BIND.sub("?", sql)
+    sql = _SQL_NUMBER.sub("?", sql)
+    sql = _SQL_IN_LIST.sub("(?, ...)", sql)
+    return _SQL_SPACES.sub(" ", sql).strip()
+
+
+def parameter_shape(parameters, executemany: bool = False):
+    """Tipos de los parámetros, nunca sus valores (pueden ser datos de pacientes)"""
+    if executemany:
+        rows = list(parameters or [])
+        return {"rows": len(rows), "row": parameter_shape(rows[0]) if rows else None}
+    if isinstance(parameters, dict):
+        return {key: type(value).__name__ for key, value in parameters.items()}
+    if isinstance(parameters, (list, tuple)):
+        return [type(value).__name__ for value in parameters]
+    return None
+
+
+class SlowQueryLog:
+    """Últimas consultas lentas en un buffer circular"""
+
+    def __init__(self, maxlen: int):
+        self._entries = deque(maxlen=maxlen)
+        self._lock = threading.Lock()
+        self.total = 0
+
+    def add(self, entry: dict):
+        with self._lock:
+            self._entries.append(entry)
+            self.total += 1
+
+    def entries(self, limit: int = None) -> list:
+        with self._lock:
+            entries = list(self._entries)
+        entries.reverse()  # Más recientes primero
+        return entries[:limit] if limit else entries
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+slow_query_log = SlowQueryLog(SLOW_QUERY_LOG_SIZE)
+
+
+def _explain(cursor, statement, parameters) -> str:
+    """
+    Plan de la consulta con EXPLAIN simple: solo planifica, no la vuelve a
+    ejecutar (ANALYZE duplicaría la latencia de una petición ya lenta). En un
+    cursor aparte y dentro de un SAVEPOINT para que un error no invalide la
+    transacción de la petición.
+    """
+    explain_cursor = cursor.connection.cursor()
+    try:
+        explain_cursor.execute("SAVEPOINT slow_query_explain")
+        try:
+            explain_cursor.execute("EXPLAIN " + statement, parameters)
+            plan = "\n".join(row[0] for row in explain_cursor.fetchall())
+            explain_cursor.execute("RELEASE SAVEPOINT slow_query_explain")
+            return plan
+        except Exception as e:
+            explain_cursor.execute("ROLLBACK TO SAVEPOINT slow_query_explain")
+            return f"EXPLAIN falló: {str(e)[:200]}"
+    finally:
+        explain_cursor.close()
+
+
+def _record_slow_query(conn, cursor, statement, parameters, executemany, elapsed):
+    elapsed_ms = elapsed * 1000
+    if elapsed_ms < SLOW_QUERY_THRESHOLD_MS:
+        return
+
+    entry = {
+        "timestamp": datetime.now().isoformat(),
+        "duration_ms": round(elapsed_ms, 2),
+        "sql": normalize_sql(statement),
+        "parameters": parameter_shape(parameters, executemany),
+        "explain": None,
+    }
+
+    if (conn.dialect.name == "postgresql" and not executemany
+            and statement.lstrip()[:6].upper() == "SELECT"
+            and random.random() < SLOW_QUERY_EXPLAIN_RATE):
+        entry["explain"] = _explain(cursor, statement, parameters)
+
+    slow_query_log.add(entry)
+    logger.warning(f"🐢 Consulta lenta ({entry['duration_ms']} ms): {entry['sql'][:200]}")
+
+
+# La duración la mide el hook de metrics.py: una sola medición por consulta
+add_query_observer(_record_slow_query)
 
-# ==================== INICIALIZACIÓN GLOBAL ====================
-
-# Mensaje de inicio
-logger.info("="*70)
-logger.info("🚀 HEALTHSHIELD API")
-logger.info("="*70)
-
-# Información del entorno
-env_info = {
-    'Entorno': os.environ.get('ENVIRONMENT', 'development'),
-    'Vercel': os.environ.get('VERCEL', 'No'),
-    'Región': os.environ.get('VERCEL_REGION', 'local'),
-}
-
-for key, value in env_info.items():
-    logger.info(f"📊 {key}: {value}")
-
-# Verificar variables de base de datos
-db_vars_to_check = ['DATABASE_URL', 'NEON_DATABASE_URL', 'POSTGRES_URL', 'PGHOST']
-found_db_vars = []
-
-for var in db_vars_to_check:
-    value = os.environ.get(var)
-    if value:
-        found_db_vars.append(var)
-        # Mostrar de forma segura
-        if var.endswith('_URL') and '@' in value:
-            parts = value.split('@')
-            if len(parts) == 2:
-                user_part = parts[0]
-                if '://' in user_part:
-                    protocol = user_part.split('://')[0]
-                    credentials = user_part.split('://')[1]
-                    if ':' in credentials:
-                        user = credentials.split(':')[0]
-                        logger.info(f"🔗 {var}: {protocol}://{user}:***@{parts[1].split('?')[0][:40]}...")
-
-if found_db_vars:
-    logger.info(f"✅ Variables DB encontradas: {', '.join(found_db_vars)}")
-else:
-    logger.warning("⚠️  No se encontraron variables de base de datos")
-
-logger.info("="*70)
-
-# Crear engine global
-engine = create_neon_engine()
-
-if engine:
-    SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
-    logger.info("✅ SQLAlchemy configurado exitosamente")
-else:
-    SessionLocal = None
-    logger.warning("⚠️  La aplicación iniciará SIN base de datos")
-    logger.info("💡 Los endpoints que requieran DB mostrarán un error apropiado")
+# ==================== INICIALIZACIÓN PEREZOSA ====================
+# El engine se crea en la primera petición que lo necesita, no al importar
+# el módulo: así el arranque en frío (serverless) no espera a la base de datos.
+
+_engine = None
+_SessionLocal = None
+_engine_initialized = False
+_engine_lock = threading.Lock()
+
+# Si alguna está definida, un engine que no se pudo crear se vuelve a intentar
+DATABASE_URL_VARS = ('DATABASE_URL', 'NEON_DATABASE_URL', 'POSTGRES_URL', 'PGHOST')
+
+def _log_environment():
+    """Resumen del entorno y de las variables de base de datos (sin credenciales)"""
+    # Mensaje de inicio
+    logger.info("="*70)
+    logger.info("🚀 HEALTHSHIELD API")
+    logger.info("="*70)
+
+    # Información del entorno
+    env_info = {
+        'Entorno': os.environ.get('ENVIRONMENT', 'development'),
+        'Vercel': os.environ.get('VERCEL', 'No'),
+        'Región': os.environ.get('VERCEL_REGION', 'local'),
+    }
+
+    for key, value in env_info.items():
+        logger.info(f"📊 {key}: {value}")
+
+    # Verificar variables de base de datos
+    found_db_vars = []
+
+    for var in DATABASE_URL_VARS:
+        value = os.environ.get(var)
+        if value:
+            found_db_vars.append(var)
+            # Mostrar de forma segura
+            if var.endswith('_URL') and '@' in value:
+                parts = value.split('@')
+                if len(parts) == 2:
+                    user_part = parts[0]
+                    if '://' in user_part:
+                        protocol = user_part.split('://')[0]
+                        credentials = user_part.split('://')[1]
+                        if ':' in credentials:
+                            user = credentials.split(':')[0]
+                            logger.info(f"🔗 {var}: {protocol}://{user}:***@{parts[1].split('?')[0][:40]}...")
+
+    if found_db_vars:
+        logger.info(f"✅ Variables DB encontradas: {', '.join(found_db_vars)}")
+    else:
+        logger.warning("⚠️  No se encontraron variables de base de datos")
+
+    logger.info("="*70)
+
+def _build_engine():
+    global _engine, _SessionLocal
+    _engine = create_neon_engine()
+    if _engine:
+        _SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=_engine)
+        logger.info("✅ SQLAlchemy configurado exitosamente")
+    else:
+        _SessionLocal = None
+        logger.warning("⚠️  La aplicación funcionará SIN base de datos")
+        logger.info("💡 Los endpoints que requieran DB mostrarán un error apropiado")
+    primary_connections.engine_created(_engine, retryable=any(os.environ.get(v) for v in DATABASE_URL_VARS))
+
+def get_engine():
+    """
+    Engine global, creado en el primer uso (None si no hay configuración).
+    
+    Se recrea sin reiniciar el proceso si crearlo falló o si las conexiones
+    fallan repetidamente (ver neon_connection.py).
+    """
+    global _engine_initialized
+    if _engine_initialized and not primary_connections.should_rebuild(_engine):
+        return _engine
+    
+    with _engine_lock:
+        if not _engine_initialized:
+            _log_environment()
+            _build_engine()
+            _engine_initialized = True
+        elif primary_connections.should_rebuild(_engine):
+            old_engine = _engine
+            _build_engine()
+            primary_connections.engine_rebuilt("connect_failures" if old_engine is not None else "create_failed")
+            if old_engine is not None:
+                old_engine.dispose()
+    return _engine
+
+def get_session_factory():
+    """sessionmaker ligado al engine global (None si no hay base de datos)"""
+    get_engine()
+    return _SessionLocal
+
+# Réplica de lectura: también perezosa; sin DATABASE_REPLICA_URL todo va al primario
+_replica_engine = None
+_ReplicaSessionLocal = None
+_replica_initialized = False
+
+def get_replica_engine():
+    """Engine de la réplica de lectura (None si no está configurada)"""
+    global _replica_engine, _ReplicaSessionLocal, _replica_initialized
+    if _replica_initialized:
+        return _replica_engine
+    
+    with _engine_lock:
+        if not _replica_initialized:
+            replica_url = get_replica_database_url()
+            if replica_url:
+                _replica_engine = create_neon_engine(replica_url, application_name="healthshield-api-replica",
+                                                     connections=replica_connections)
+                if _replica_engine:
+                    _ReplicaSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=_replica_engine)
+                    logger.info("📖 Réplica de lectura configurada")
+            _replica_initialized = True
+    return _replica_engine
+
+def dispose_engines():
+    """Cerrar las conexiones del engine primario y de la réplica (apagado)"""
+    for engine in (_engine, _replica_engine):
+        if engine is not None:
+            engine.dispose()
+
+def __getattr__(name):
+    # Compatibilidad: database.engine / database.SessionLocal
+    if name == "engine":
+        return get_engine()
+    if name == "SessionLocal":
+        return get_session_factory()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 # ==================== FUNCIONES PÚBLICAS ====================
 
@@ -215,6 +439,7 @@ def get_db():
     """
     Dependencia FastAPI para obtener sesión de base de datos.
     """
+    SessionLocal = get_session_factory()
     if SessionLocal is None:
         raise RuntimeError(
             "🚫 Base de datos no disponible\n\n"
@@ -238,6 +463,42 @@ def get_db():
     finally:
         db.close()
 
+def _read_only_session(SessionLocal):
+    db = SessionLocal()
+    try:
+        if db.get_bind().dialect.name == "postgresql":
+            db.execute(text("SET TRANSACTION READ ONLY"))
+        yield db
+    except Exception as e:
+        logger.error(f"❌ Error en sesión DB de solo lectura: {e}")
+        db.rollback()
+        raise
+    finally:
+        db.close()
+
+def get_read_db(request: Request):
+    """
+    Dependencia FastAPI para endpoints de solo lectura.
+    
+    Usa la réplica en una transacción READ ONLY, salvo que el autor haya
+    escrito hace poco (read-your-writes, ver read_routing.py) o que la réplica
+    esté atrasada o caída: entonces lee del primario. Sin réplica configurada
+    equivale a get_db().
+    """
+    if get_replica_engine() is None:
+        yield from get_db()
+        return
+    
+    key = request_key(request.headers, request.query_params.get("token"))
+    target, reason = read_target(key, request.headers.get(LAST_WRITE_HEADER))
+    read_routing_total.inc(target, reason)
+    
+    SessionLocal = _ReplicaSessionLocal if target == "replica" else get_session_factory()
+    if SessionLocal is None:
+        yield from get_db()
+        return
+    yield from _read_only_session(SessionLocal)
+
 def hash_password(password: str) -> str:
     """Hashear contraseña usando bcrypt"""
     try:
@@ -267,8 +528,38 @@ def verify_password(plain_password: str, hashed_password: str) -> bool:
         logger.warning("⚠️  Error verificando contraseña")
         return False
 
+# Índices que versiones anteriores crearon y los modelos ya no declaran
+OBSOLETE_INDEXES = (
+    "ix_pacientes_cedula_activos",  # Duplicaba el índice único de pacientes.cedula
+)
+
+def upgrade_schema(engine):
+    """
+    Agregar a las tablas existentes las columnas e índices nuevos de los modelos
+    y quitar los obsoletos. create_all solo crea tablas que faltan; sin
+    migraciones, las columnas nuevas deben admitir NULL.
+    """
+    inspector = inspect(engine)
+    with engine.begin() as conn:
+        for name in OBSOLETE_INDEXES:
+            conn.execute(text(f"DROP INDEX IF EXISTS {name}"))
+        for table in Base.metadata.sorted_tables:
+            existing = {column["name"] for column in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name in existing:
+                    continue
+                if not column.nullable:
+                    logger.warning(f"⚠️  Columna {table.name}.{column.name} NOT NULL: agregar a mano")
+                    continue
+                column_type = column.type.compile(dialect=engine.dialect)
+                conn.execute(text(f"ALTER TABLE {table.name} ADD COLUMN {column.name} {column_type}"))
+                logger.info(f"🔧 Columna {table.name}.{column.name} agregada")
+            for index in table.indexes:
+                index.create(conn, checkfirst=True)
+
 def init_db():
     """Inicializar todas las tablas en la base de datos"""
+    engine = get_engine()
     if engine is None:
         logger.error("❌ No se puede inicializar DB: engine no disponible")
         return False
@@ -281,42 +572,33 @@ def init_db():
         
         # Crear todas las tablas definidas en los modelos
         Base.metadata.create_all(bind=engine)
+        upgrade_schema(engine)
         
         logger.info("✅ Tablas creadas exitosamente")
         
         try:
-            with engine.connect() as conn:
+            # Con la sesión ORM, no SQL crudo: así el alta queda en change_log
+            import change_log  # noqa: F401
+            with get_session_factory()() as db:
                 # Verificar si ya existe un paciente por defecto
-                result = conn.execute(text("SELECT COUNT(*) FROM pacientes WHERE cedula = '00000000'"))
-                count = result.scalar()
-                
-                if count == 0:
+                if db.query(Paciente.id).filter(Paciente.cedula == '00000000').first() is None:
                     # Crear paciente por defecto
-                    conn.execute(text("""
-                        INSERT INTO pacientes (cedula, nombre, fecha_nacimiento, telefono, direccion, is_synced)
-                        VALUES ('00000000', 'Paciente Por Defecto', '2000-01-01', '0000000000', 'Dirección por defecto', true)
-                    """))
-                    conn.commit()
+                    db.add(Paciente(cedula='00000000', nombre='Paciente Por Defecto', fecha_nacimiento='2000-01-01',
+                                    telefono='0000000000', direccion='Dirección por defecto', is_synced=True))
+                    db.commit()
                     logger.info("✅ Paciente por defecto creado")
         except Exception as e:
             logger.warning(f"⚠️ No se pudo crear paciente por defecto: {e}")
 
         # Verificar tablas creadas
-        with engine.connect() as conn:
-            result = conn.execute(text("""
-                SELECT table_name, table_type
-                FROM information_schema.tables 
-                WHERE table_schema = 'public'
-                ORDER BY table_name
-            """))
-            tables = result.fetchall()
-            
-            if tables:
-                logger.info("📊 Tablas en la base de datos:")
-                for table_name, table_type in tables:
-                    logger.info(f"   • {table_name} ({table_type})")
-            else:
-                logger.warning("⚠️  No se encontraron tablas")
+        tables = inspect(engine).get_table_names()
+        
+        if tables:
+            logger.info("📊 Tablas en la base de datos:")
+            for table_name in tables:
+                logger.info(f"   • {table_name}")
+        else:
+            logger.warning("⚠️  No se encontraron tablas")
         
         return True
         
@@ -330,6 +612,9 @@ def init_db():
 # ==================== EJECUCIÓN DIRECTA ====================
 
 if __name__ == "__main__":
+    from structured_logging import configure_logging
+    configure_logging(fmt="text")
+    
     print("\n" + "="*70)
     print("🔍 DIAGNÓSTICO BASE DE DATOS")
     print("="*70)
@@ -346,6 +631,7 @@ if __name__ == "__main__":
         print(f"{key}: {value}")
     
     # Probar conexión si hay engine
+    engine = get_engine()
     if engine:
         try:
             with engine.connect() as conn:
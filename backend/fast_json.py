@@ -0,0 +1,74 @@
+"""
+Camino rápido para respuestas de listas.
+
+Los endpoints de listas construían un PacienteResponse / VacunaResponse por
+fila (con .isoformat() manual), FastAPI los volvía a validar contra
+response_model y luego los codificaba con el json de la biblioteca estándar.
+
+Aquí la consulta es un select() de Core con exactamente las columnas del
+schema de respuesta, cada fila se convierte en un dict (el DTO) y la lista
+entera se codifica una sola vez con orjson, que serializa datetime de forma
+nativa. Las filas vienen de columnas tipadas de la base de datos, así que no
+se vuelven a validar; response_model sigue declarado en el endpoint para la
+documentación OpenAPI.
+"""
+from typing import List, Sequence, Type
+
+import orjson
+from fastapi.responses import Response
+from pydantic import BaseModel
+from sqlalchemy import false, func, select
+from sqlalchemy.orm import Session
+
+from models import Paciente, PacienteResponse, Vacuna, VacunaResponse
+
+
+class ORJSONListResponse(Response):
+    media_type = "application/json"
+
+    def render(self, content) -> bytes:
+        return orjson.dumps(content)
+
+
+def response_columns(model, schema: Type[BaseModel]) -> List:
+    """Columnas de `model` en el orden de los campos de `schema`"""
+    table = model.__table__
+    columns = []
+    for name in schema.model_fields:
+        if name not in table.c:
+            continue
+        column = table.c[name]
+        if name == "is_synced":
+            # Los schemas exigen bool; la columna admite NULL
+            column = func.coalesce(column, false()).label(name)
+        columns.append(column)
+    return columns
+
+
+PACIENTE_COLUMNS = response_columns(Paciente, PacienteResponse)
+VACUNA_COLUMNS = response_columns(Vacuna, VacunaResponse)
+
+
+def paciente_select():
+    """Pacientes vigentes (sin borrado lógico)"""
+    return select(*PACIENTE_COLUMNS).where(Paciente.deleted_at.is_(None))
+
+
+def vacuna_select():
+    """Vacunas vigentes (sin borrado lógico)"""
+    return select(*VACUNA_COLUMNS).where(Vacuna.deleted_at.is_(None))
+
+
+def fetch_dtos(db: Session, statement) -> List[dict]:
+    """Ejecutar el select y devolver una lista de dicts (sin objetos ORM)"""
+    result = db.execute(statement)
+    keys = tuple(result.keys())
+    return [dict(zip(keys, row)) for row in result]
+
+
+def encode_rows(rows: Sequence[dict]) -> bytes:
+    return orjson.dumps(rows)
+
+
+def list_response(db: Session, statement) -> ORJSONListResponse:
+    return ORJSONListResponse(content=fetch_dtos(db, statement))
@@ -0,0 +1,170 @@
+"""
+Sondas de salud baratas.
+
+- /livez: el proceso responde; no toca la base de datos.
+- /readyz: devuelve el último estado de las dependencias, que una tarea en
+  segundo plano refresca cada READINESS_REFRESH_SECONDS. Las sondas del
+  balanceador nunca esperan a la base de datos; si el estado está vencido
+  (p. ej. en serverless, donde la tarea no corre entre invocaciones) se
+  refresca una sola vez aunque lleguen varias sondas a la vez.
+- Con réplica de lectura, la misma tarea mide su retraso (read_routing.py).
+- Conteos de filas de /health: estimaciones de pg_class.reltuples (que
+  mantienen VACUUM/ANALYZE) en lugar de COUNT(*) sobre tablas completas.
+"""
+import os
+import time
+import asyncio
+import logging
+from datetime import datetime
+from typing import Dict, Optional
+
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import text
+
+from database import get_engine, get_replica_engine
+from metrics import Gauge, registry
+from read_routing import replica_state
+
+logger = logging.getLogger(__name__)
+
+READINESS_REFRESH_SECONDS = float(os.environ.get('READINESS_REFRESH_SECONDS', 5))
+# Pasado este tiempo sin refrescar, el estado se considera vencido
+READINESS_MAX_AGE_SECONDS = float(os.environ.get('READINESS_MAX_AGE_SECONDS', 15))
+READINESS_DB_TIMEOUT_MS = int(os.environ.get('READINESS_DB_TIMEOUT_MS', 2000))
+
+COUNTED_TABLES = ("pacientes", "vacunas", "usuarios")
+CRITICAL_CHECKS = ("database",)
+
+readiness_gauge = registry.register(Gauge(
+    "healthshield_ready", "1 si la última comprobación de dependencias fue exitosa"))
+dependency_check_duration = registry.register(Gauge(
+    "healthshield_dependency_check_seconds", "Duración de la última comprobación por dependencia",
+    ("dependency",)))
+
+
+def table_row_estimates(conn) -> Dict[str, Optional[int]]:
+    """Filas aproximadas por tabla sin recorrerlas (None si no hay estadísticas)"""
+    if conn.dialect.name == "postgresql":
+        rows = conn.execute(text("""
+            SELECT c.relname, c.reltuples::bigint
+            FROM pg_class c
+            JOIN pg_namespace n ON n.oid = c.relnamespace
+            WHERE c.relkind = 'r'
+              AND n.nspname = current_schema()
+              AND c.relname IN ('pacientes', 'vacunas', 'usuarios')
+        """)).fetchall()
+        # reltuples = -1: la tabla nunca se analizó (PostgreSQL 14+)
+        estimates = {name: (count if count >= 0 else None) for name, count in rows}
+    else:
+        # SQLite (desarrollo/benchmarks): MAX(rowid) usa el índice de la tabla
+        estimates = {
+            name: conn.execute(text(f"SELECT MAX(rowid) FROM {name}")).scalar() or 0
+            for name in COUNTED_TABLES
+        }
+    return {f"{name}_count": estimates.get(name) for name in COUNTED_TABLES}
+
+
+class ReadinessState:
+    """Último resultado de las comprobaciones de dependencias"""
+
+    def __init__(self, refresh_seconds: float = READINESS_REFRESH_SECONDS,
+                 max_age_seconds: float = READINESS_MAX_AGE_SECONDS):
+        self.refresh_seconds = refresh_seconds
+        self.max_age_seconds = max_age_seconds
+        self.ready = False
+        self.draining = False  # Apagado en curso (lifecycle.py): no enviar tráfico nuevo
+        self.checks: Dict[str, dict] = {}
+        self.checked_at: Optional[float] = None
+        self.checked_at_iso: Optional[str] = None
+        self._refresh_lock: Optional[asyncio.Lock] = None
+        self._task: Optional[asyncio.Task] = None
+
+    # ---------- comprobaciones (en el threadpool) ----------
+
+    @staticmethod
+    def _check_database() -> dict:
+        engine = get_engine()
+        if engine is None:
+            return {"ok": False, "error": "engine no disponible"}
+        start = time.perf_counter()
+        try:
+            with engine.connect() as conn:
+                if conn.dialect.name == "postgresql":
+                    conn.execute(text(f"SET LOCAL statement_timeout = {READINESS_DB_TIMEOUT_MS}"))
+                conn.execute(text("SELECT 1"))
+            return {"ok": True, "latency_ms": round((time.perf_counter() - start) * 1000, 2)}
+        except Exception as e:
+            return {"ok": False, "latency_ms": round((time.perf_counter() - start) * 1000, 2),
+                    "error": str(e)[:200]}
+
+    def _run_checks(self):
+        checks = {"database": self._check_database()}
+        replica_engine = get_replica_engine()
+        if replica_engine is not None:
+            # No crítica: si la réplica falla, las lecturas van al primario
+            checks["replica"] = replica_state.check(replica_engine)
+        for name, result in checks.items():
+            dependency_check_duration.set(name, value=result.get("latency_ms", 0) / 1000)
+
+        ready = all(checks[name]["ok"] for name in CRITICAL_CHECKS)
+        if ready != self.ready and self.checked_at is not None:
+            if ready:
+                logger.info("✅ Dependencias disponibles: listo para recibir tráfico")
+            else:
+                logger.warning(f"⚠️  Dependencias no disponibles: {checks}")
+        self.ready = ready
+        self.checks = checks
+        self.checked_at = time.monotonic()
+        self.checked_at_iso = datetime.now().isoformat()
+        readiness_gauge.set(value=1 if ready else 0)
+
+    # ---------- API asíncrona ----------
+
+    def is_stale(self) -> bool:
+        return self.checked_at is None or time.monotonic() - self.checked_at > self.max_age_seconds
+
+    async def refresh(self):
+        if self._refresh_lock is None:
+            self._refresh_lock = asyncio.Lock()
+        checked_before = self.checked_at
+        async with self._refresh_lock:
+            # Otra sonda ya refrescó mientras esperábamos el lock
+            if self.checked_at != checked_before and not self.is_stale():
+                return
+            await run_in_threadpool(self._run_checks)
+
+    async def snapshot(self) -> dict:
+        if self.is_stale():
+            await self.refresh()
+        return {
+            "ready": self.ready and not self.draining,
+            "draining": self.draining,
+            "checked_at": self.checked_at_iso,
+            "age_seconds": round(time.monotonic() - self.checked_at, 3),
+            "checks": self.checks,
+        }
+
+    async def _refresh_loop(self):
+        while True:
+            try:
+                await self.refresh()
+            except Exception as e:
+                logger.error(f"❌ Error refrescando el estado de readiness: {e}")
+            await asyncio.sleep(self.refresh_seconds)
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.get_running_loop().create_task(self._refresh_loop())
+
+    async def stop(self):
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+
+readiness = ReadinessState()
@@ -0,0 +1,204 @@
+"""
+Soporte de claves de idempotencia (cabecera Idempotency-Key).
+
+El cliente Flutter reintenta las escrituras cuando la red móvil falla. Si el
+reintento trae la misma Idempotency-Key, se devuelve la respuesta guardada sin
+volver a ejecutar los repositorios.
+
+Las claves viven en la base de datos (tabla idempotency_keys, única por
+ámbito + clave): un reintento que llega a otro worker de serve.py o a otra
+instancia serverless encuentra la misma clave. Se reclaman con un INSERT
+(otro proceso que llegue a la vez choca con la restricción única y ve la
+clave en proceso) y vencen a los IDEMPOTENCY_TTL_SECONDS. Una clave que
+quedó en proceso más de IDEMPOTENCY_IN_PROGRESS_SECONDS (el proceso murió
+antes de completarla) puede volver a reclamarse.
+"""
+import os
+import json
+import time
+import hashlib
+import logging
+import threading
+from datetime import datetime, timedelta, timezone
+from typing import Any, Optional, Tuple
+
+from fastapi import HTTPException, status
+from sqlalchemy import delete, select, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from models import IdempotencyKey
+from wire_format import WireFormatResponse
+
+logger = logging.getLogger(__name__)
+
+IDEMPOTENCY_HEADER = "Idempotency-Key"
+MAX_KEY_LENGTH = 255
+
+# Estados posibles al consultar una clave
+NEW = "new"
+REPLAY = "replay"
+MISMATCH = "mismatch"
+IN_PROGRESS = "in_progress"
+
+
+def _aware(value: datetime) -> datetime:
+    # SQLite devuelve datetimes sin zona horaria
+    return value if value.tzinfo is not None else value.replace(tzinfo=timezone.utc)
+
+
+class IdempotencyStore:
+    """
+    Almacén clave → respuesta en la base de datos con TTL.
+    Las claves se guardan por ámbito (usuario + endpoint) para que dos
+    usuarios no colisionen aunque usen la misma clave.
+    """
+
+    def __init__(self, ttl_seconds: int = 86400, in_progress_seconds: int = 600,
+                 purge_every_seconds: float = 3600):
+        self.ttl_seconds = ttl_seconds
+        self.in_progress_seconds = in_progress_seconds
+        self.purge_every_seconds = purge_every_seconds
+        self._last_purge: Optional[float] = None
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def fingerprint(payload: Any) -> str:
+        """Huella SHA-256 del cuerpo de la petición"""
+        raw = json.dumps(payload, sort_keys=True, separators=(",", ":"), default=str)
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    def _maybe_purge(self, db: Session, now: datetime):
+        monotonic = time.monotonic()
+        with self._lock:
+            if self._last_purge is not None and monotonic - self._last_purge < self.purge_every_seconds:
+                return
+            self._last_purge = monotonic
+        purged = db.execute(delete(IdempotencyKey).where(IdempotencyKey.expires_at < now)).rowcount
+        db.commit()
+        if purged:
+            logger.info(f"🧹 {purged} claves de idempotencia vencidas eliminadas")
+
+    def _abandoned(self, entry: IdempotencyKey, now: datetime) -> bool:
+        if _aware(entry.expires_at) <= now:
+            return True
+        return entry.status_code is None and \
+            _aware(entry.created_at) <= now - timedelta(seconds=self.in_progress_seconds)
+
+    def begin(self, db: Session, scope: str, key: str, fingerprint: str) -> Tuple[str, Optional[IdempotencyKey]]:
+        """Reclamar la clave al inicio de una petición (queda confirmada en la base)"""
+        now = datetime.now(timezone.utc)
+        self._maybe_purge(db, now)
+        lookup = select(IdempotencyKey).where(IdempotencyKey.scope == scope, IdempotencyKey.key == key)
+
+        for _ in range(3):
+            entry = db.execute(lookup).scalars().first()
+            if entry is None:
+                try:
+                    with db.begin_nested():
+                        db.add(IdempotencyKey(
+                            scope=scope, key=key, fingerprint=fingerprint, created_at=now,
+                            expires_at=now + timedelta(seconds=self.ttl_seconds),
+                        ))
+                    db.commit()
+                except IntegrityError:
+                    continue  # Otro worker la reclamó a la vez: volver a leer
+                self.misses += 1
+                return NEW, None
+
+            if self._abandoned(entry, now):
+                db.delete(entry)
+                db.commit()
+                continue
+
+            if entry.fingerprint != fingerprint:
+                return MISMATCH, entry
+            if entry.status_code is None:
+                return IN_PROGRESS, entry
+            self.hits += 1
+            return REPLAY, entry
+
+        return IN_PROGRESS, None
+
+    def complete(self, db: Session, scope: str, key: str, status_code: int, content: Any):
+        """Guardar la respuesta exitosa asociada a la clave"""
+        body = json.dumps(content, separators=(",", ":"), default=str)
+        db.execute(update(IdempotencyKey).where(
+            IdempotencyKey.scope == scope, IdempotencyKey.key == key, IdempotencyKey.status_code.is_(None)
+        ).values(status_code=status_code, response=body))
+        db.commit()
+
+    def release(self, db: Session, scope: str, key: str):
+        """Liberar la clave si la petición falló, para permitir reintentos"""
+        db.rollback()  # La transacción de la petición pudo quedar abortada
+        db.execute(delete(IdempotencyKey).where(
+            IdempotencyKey.scope == scope, IdempotencyKey.key == key, IdempotencyKey.status_code.is_(None)
+        ))
+        db.commit()
+
+    def stats(self) -> dict:
+        return {"hits": self.hits, "misses": self.misses}
+
+
+idempotency_store = IdempotencyStore(
+    ttl_seconds=int(os.environ.get("IDEMPOTENCY_TTL_SECONDS", 60 * 60 * 24)),
+    in_progress_seconds=int(os.environ.get("IDEMPOTENCY_IN_PROGRESS_SECONDS", 600)),
+)
+
+
+def idempotency_begin(db: Session, key: Optional[str], scope: str, payload: Any) -> Optional[WireFormatResponse]:
+    """
+    Consultar la clave antes de ejecutar el endpoint.
+    Devuelve la respuesta guardada si es un reintento, o None si hay que procesar.
+    """
+    if not key:
+        return None
+
+    if len(key) > MAX_KEY_LENGTH:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"{IDEMPOTENCY_HEADER} no puede tener más de {MAX_KEY_LENGTH} caracteres"
+        )
+
+    state, entry = idempotency_store.begin(db, scope, key, IdempotencyStore.fingerprint(payload))
+
+    if state == REPLAY:
+        logger.info(f"♻️  Respuesta idempotente reutilizada ({scope})")
+        # Se decodifica para poder responder en el formato negociado (JSON o MessagePack)
+        return WireFormatResponse(
+            content=json.loads(entry.response),
+            status_code=entry.status_code,
+            headers={"Idempotent-Replayed": "true"},
+        )
+
+    if state == MISMATCH:
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail=f"{IDEMPOTENCY_HEADER} ya fue usada con un cuerpo distinto"
+        )
+
+    if state == IN_PROGRESS:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail=f"Ya hay una petición en proceso con la misma {IDEMPOTENCY_HEADER}"
+        )
+
+    return None
+
+
+def idempotency_complete(db: Session, key: Optional[str], scope: str, status_code: int, content: Any):
+    """Guardar la respuesta de una petición exitosa"""
+    if key:
+        idempotency_store.complete(db, scope, key, status_code, content)
+
+
+def idempotency_release(db: Session, key: Optional[str], scope: str):
+    """Liberar la clave tras un error (nunca lanza: el error original es el que importa)"""
+    if not key:
+        return
+    try:
+        idempotency_store.release(db, scope, key)
+    except Exception as e:
+        logger.warning(f"⚠️  No se pudo liberar la clave de idempotencia ({scope}): {e}")
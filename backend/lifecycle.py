@@ -0,0 +1,263 @@
+"""
+Calentamiento al arrancar y drenaje ordenado al apagar (lifespan de main.py).
+
+Arranque, antes de que el worker acepte peticiones:
+- Abre conexiones (WARMUP_CONNECTIONS con pool; con el NullPool de Neon una
+  sola, que despierta el compute si estaba suspendido).
+- Ejecuta la consulta representativa de cada endpoint caliente: SQLAlchemy
+  guarda la sentencia compilada en la caché del engine y la primera petición
+  real no paga la compilación. Corre en una transacción de solo lectura con
+  WARMUP_STATEMENT_TIMEOUT_MS y, en total, hasta WARMUP_TIMEOUT_SECONDS: si
+  la base no responde, el worker arranca igual y /readyz lo reporta.
+
+Apagado:
+- Al llegar SIGTERM (drain_on_exit envuelve Server.handle_exit de uvicorn),
+  /readyz pasa a 503 y las peticiones nuevas reciben 503 con Retry-After y
+  Connection: close. uvicorn sigue escuchando SHUTDOWN_PRESTOP_SECONDS para
+  que el balanceador vea el 503 y deje de enviar tráfico; después cierra el
+  socket y espera las peticiones en curso. SIGINT empieza el apagado sin
+  esa espera.
+- En el lifespan, drain_state.drain() espera lo que quede en curso
+  (sincronizaciones incluidas) hasta SHUTDOWN_DRAIN_SECONDS; luego main.py
+  detiene las tareas de fondo, escribe el último volcado de métricas, cierra
+  los engines y vacía la cola de logs.
+"""
+import os
+import time
+import signal
+import asyncio
+import logging
+from datetime import datetime, timezone
+from typing import Callable, Dict, Tuple
+
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import or_, text
+from sqlalchemy.pool import NullPool
+
+from change_log import fetch_changes
+from database import get_engine, get_session_factory
+from fast_json import encode_rows, fetch_dtos, paciente_select, vacuna_select
+from health import readiness
+from metrics import Gauge, registry
+from models import Paciente, Vacuna
+from repositories import PacienteRepository, UsuarioRepository
+
+logger = logging.getLogger(__name__)
+
+WARMUP_ENABLED = os.environ.get('WARMUP_ENABLED', 'true').lower() != 'false'
+WARMUP_CONNECTIONS = int(os.environ.get('WARMUP_CONNECTIONS', 2))
+WARMUP_TIMEOUT_SECONDS = float(os.environ.get('WARMUP_TIMEOUT_SECONDS', 20))
+WARMUP_STATEMENT_TIMEOUT_MS = int(os.environ.get('WARMUP_STATEMENT_TIMEOUT_MS', 2000))
+SHUTDOWN_DRAIN_SECONDS = float(os.environ.get('SHUTDOWN_DRAIN_SECONDS', 25))
+# Tras SIGTERM, tiempo que se sigue escuchando (respondiendo 503) antes de cerrar el socket
+SHUTDOWN_PRESTOP_SECONDS = float(os.environ.get('SHUTDOWN_PRESTOP_SECONDS', 5))
+DRAIN_RETRY_AFTER = 5
+
+# Sondas que siguen respondiendo durante el drenaje
+PROBE_PATHS = frozenset({"/livez", "/readyz", "/health", "/metrics"})
+
+warmup_step_duration = registry.register(Gauge(
+    "healthshield_warmup_seconds", "Duración de cada paso del calentamiento al arrancar", ("step",)))
+
+_WARMUP_EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+
+
+# ==================== CALENTAMIENTO ====================
+
+def _search(db):
+    # Misma forma que /api/pacientes/buscar: misma entrada en la caché de compilación
+    q = "%__warmup__%"
+    return fetch_dtos(db, paciente_select().where(or_(Paciente.nombre.ilike(q), Paciente.cedula.ilike(q))))
+
+
+# Consulta representativa por endpoint caliente
+HOT_QUERIES: Tuple[Tuple[str, Callable], ...] = (
+    ("login", lambda db: UsuarioRepository.get_by_username(db, "__warmup__")),
+    ("pacientes", lambda db: encode_rows(fetch_dtos(db, paciente_select().order_by(Paciente.id).offset(0).limit(1)))),
+    ("pacientes_buscar", _search),
+    ("paciente_cedula", lambda db: PacienteRepository.get_by_cedula(db, "__warmup__")),
+    ("vacunas", lambda db: encode_rows(fetch_dtos(db, vacuna_select().offset(0).limit(1)))),
+    ("vacunas_paciente", lambda db: fetch_dtos(db, vacuna_select().where(Vacuna.paciente_id == 0))),
+    ("sync_updates", lambda db: (
+        db.query(Paciente).filter(Paciente.created_at > _WARMUP_EPOCH).limit(1).all(),
+        db.query(Vacuna).filter(Vacuna.created_at > _WARMUP_EPOCH).limit(1).all(),
+    )),
+    ("sync_changes", lambda db: fetch_changes(db, 0, 1)),
+)
+
+
+def _timed(timings: Dict[str, float], step: str, fn: Callable):
+    start = time.perf_counter()
+    try:
+        return fn()
+    except Exception as e:
+        logger.warning(f"⚠️  Calentamiento '{step}' falló: {str(e).strip()[:200]}")
+    finally:
+        timings[step] = time.perf_counter() - start
+        warmup_step_duration.set(step, value=timings[step])
+
+
+def _open_connections(engine):
+    count = 1 if isinstance(engine.pool, NullPool) else max(WARMUP_CONNECTIONS, 1)
+    connections = [engine.connect() for _ in range(count)]
+    for conn in connections:
+        conn.close()  # Vuelven al pool ya abiertas
+
+
+def _run_hot_queries(SessionLocal, timings: Dict[str, float]):
+    db = SessionLocal()
+    try:
+        if db.get_bind().dialect.name == "postgresql":
+            db.execute(text("SET TRANSACTION READ ONLY"))
+            db.execute(text(f"SET LOCAL statement_timeout = {WARMUP_STATEMENT_TIMEOUT_MS}"))
+        for step, query in HOT_QUERIES:
+            # Un fallo aborta la transacción en PostgreSQL: SAVEPOINT por paso
+            _timed(timings, step, lambda: _in_savepoint(db, query))
+    finally:
+        db.rollback()
+        db.close()
+
+
+def _in_savepoint(db, query: Callable):
+    with db.begin_nested():
+        query(db)
+
+
+def _warmup_sync() -> Dict[str, float]:
+    timings: Dict[str, float] = {}
+    engine = _timed(timings, "engine", get_engine)
+    if engine is None:
+        logger.warning("⚠️  Calentamiento omitido: base de datos no disponible")
+        return timings
+    _timed(timings, "connections", lambda: _open_connections(engine))
+    _run_hot_queries(get_session_factory(), timings)
+    return timings
+
+
+async def warmup():
+    """Calentar conexiones y sentencias antes de aceptar tráfico (nunca lanza)"""
+    if not WARMUP_ENABLED:
+        return
+    start = time.perf_counter()
+    try:
+        timings = await asyncio.wait_for(run_in_threadpool(_warmup_sync), WARMUP_TIMEOUT_SECONDS)
+    except asyncio.TimeoutError:
+        logger.warning(f"⚠️  Calentamiento sin terminar tras {WARMUP_TIMEOUT_SECONDS:.0f}s: se continúa el arranque")
+        return
+    except Exception as e:
+        logger.error(f"❌ Error en el calentamiento: {e}")
+        return
+    slowest = sorted(timings.items(), key=lambda item: item[1], reverse=True)[:3]
+    logger.info(
+        f"🔥 Calentamiento completo en {(time.perf_counter() - start) * 1000:.0f} ms "
+        f"(más lentos: {', '.join(f'{step} {seconds * 1000:.0f} ms' for step, seconds in slowest)})"
+    )
+
+
+# ==================== DRENAJE ====================
+
+class DrainState:
+    """Peticiones en curso y modo drenaje"""
+
+    def __init__(self):
+        self.in_flight = 0
+        self.draining = False
+        self._idle: asyncio.Event = None
+
+    def _idle_event(self) -> asyncio.Event:
+        if self._idle is None:
+            self._idle = asyncio.Event()
+            self._idle.set()
+        return self._idle
+
+    def started(self):
+        self.in_flight += 1
+        self._idle_event().clear()
+
+    def finished(self):
+        self.in_flight -= 1
+        if self.in_flight == 0:
+            self._idle_event().set()
+
+    def begin(self):
+        """Rechazar peticiones nuevas y reportar /readyz 503"""
+        self.draining = True
+        readiness.draining = True
+
+    async def drain(self, timeout: float = SHUTDOWN_DRAIN_SECONDS) -> bool:
+        """Rechazar peticiones nuevas y esperar las que están en curso; False si vence el plazo"""
+        self.begin()
+        if self.in_flight:
+            logger.info(f"⏳ Drenando {self.in_flight} peticiones en curso (hasta {timeout:.0f}s)")
+        try:
+            await asyncio.wait_for(self._idle_event().wait(), timeout)
+        except asyncio.TimeoutError:
+            logger.warning(f"⚠️  {self.in_flight} peticiones seguían en curso al vencer el drenaje")
+            return False
+        return True
+
+
+drain_state = DrainState()
+
+
+def drain_on_exit(server, prestop_seconds: float = SHUTDOWN_PRESTOP_SECONDS, state: DrainState = drain_state):
+    """
+    Envolver server.handle_exit (uvicorn.Server) para que el drenaje empiece
+    al recibir la señal y no en el lifespan, cuando uvicorn ya cerró el socket.
+    """
+    uvicorn_handle_exit = server.handle_exit
+    pending = None
+
+    def handle_exit(sig, frame):
+        nonlocal pending
+        state.begin()
+        if sig == signal.SIGTERM and pending is None and prestop_seconds > 0 and not server.should_exit:
+            try:
+                loop = asyncio.get_running_loop()
+            except RuntimeError:
+                loop = None
+            if loop is not None:
+                logger.info(f"🛑 SIGTERM: /readyz en 503, cierre del socket en {prestop_seconds:.0f}s")
+                pending = loop.call_later(prestop_seconds, uvicorn_handle_exit, sig, frame)
+                return
+        # SIGINT o segunda señal: uvicorn cierra ya
+        if pending is not None:
+            pending.cancel()
+            pending = None
+        uvicorn_handle_exit(sig, frame)
+
+    server.handle_exit = handle_exit
+    return server
+
+
+class DrainMiddleware:
+    """Cuenta las peticiones en curso y rechaza las nuevas mientras se drena"""
+
+    def __init__(self, app, state: DrainState = drain_state):
+        self.app = app
+        self.state = state
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"] in PROBE_PATHS:
+            await self.app(scope, receive, send)
+            return
+
+        if self.state.draining:
+            await send({
+                "type": "http.response.start",
+                "status": 503,
+                "headers": [
+                    (b"content-type", b"application/json"),
+                    (b"retry-after", str(DRAIN_RETRY_AFTER).encode("latin-1")),
+                    (b"connection", b"close"),
+                ],
+            })
+            await send({"type": "http.response.body",
+                        "body": b'{"error": "Servidor reiniciando, intente de nuevo", "status_code": 503}'})
+            return
+
+        self.state.started()
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            self.state.finished()
@@ -0,0 +1,126 @@
+"""
+Detector de bloqueos del event loop.
+
+Una tarea asyncio marca un latido cada LOOP_MONITOR_INTERVAL_MS y mide el
+retraso con el que el loop la vuelve a programar. Un hilo vigilante revisa
+ese latido: si el loop lleva más de LOOP_BLOCK_THRESHOLD_MS sin responder,
+captura la pila del hilo del loop mientras sigue bloqueado, la registra en
+el log y cuenta el bloqueo en /metrics con la función culpable como etiqueta.
+"""
+import os
+import sys
+import time
+import asyncio
+import logging
+import threading
+import traceback
+from typing import Optional
+
+from metrics import Counter, Histogram, registry
+
+logger = logging.getLogger(__name__)
+
+LOOP_MONITOR_ENABLED = os.environ.get('LOOP_MONITOR_ENABLED', 'true').lower() in ('1', 'true', 'yes')
+LOOP_MONITOR_INTERVAL_MS = float(os.environ.get('LOOP_MONITOR_INTERVAL_MS', 50))
+LOOP_BLOCK_THRESHOLD_MS = float(os.environ.get('LOOP_BLOCK_THRESHOLD_MS', 200))
+
+_APP_DIR = os.path.dirname(os.path.abspath(__file__))
+
+event_loop_lag = registry.register(Histogram(
+    "healthshield_event_loop_lag_seconds", "Retraso de programación del event loop",
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)))
+event_loop_stalls = registry.register(Counter(
+    "healthshield_event_loop_stalls_total", "Bloqueos del event loop por encima del umbral", ("culprit",)))
+event_loop_stall_seconds = registry.register(Counter(
+    "healthshield_event_loop_stall_seconds_total", "Tiempo total con el event loop bloqueado", ("culprit",)))
+
+
+def _culprit(frame) -> str:
+    """Frame más interno del código de la aplicación (o el más interno si no hay)"""
+    innermost = frame
+    while frame is not None:
+        filename = frame.f_code.co_filename
+        if filename.startswith(_APP_DIR) and "site-packages" not in filename:
+            break
+        frame = frame.f_back
+    frame = frame or innermost
+    code = frame.f_code
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+class LoopMonitor:
+    def __init__(self, interval_ms: float = LOOP_MONITOR_INTERVAL_MS,
+                 threshold_ms: float = LOOP_BLOCK_THRESHOLD_MS):
+        self.interval = interval_ms / 1000
+        self.threshold = threshold_ms / 1000
+        self._heartbeat = time.monotonic()
+        self._loop_thread_id: Optional[int] = None
+        self._task: Optional[asyncio.Task] = None
+        self._watchdog: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+        self.stalls = 0
+
+    async def _beat(self):
+        while True:
+            expected = time.monotonic() + self.interval
+            await asyncio.sleep(self.interval)
+            now = time.monotonic()
+            event_loop_lag.observe(max(now - expected, 0.0))
+            self._heartbeat = now
+
+    def _watch(self):
+        stalled_since = None
+        culprit = None
+        check_every = min(self.interval, self.threshold) / 2
+
+        while not self._stop.wait(check_every):
+            heartbeat = self._heartbeat
+            blocked = time.monotonic() - heartbeat
+
+            if blocked < self.threshold + self.interval:
+                if stalled_since is not None:
+                    # El loop volvió: contabilizar la duración total del bloqueo
+                    event_loop_stall_seconds.inc(culprit, amount=heartbeat - stalled_since)
+                    stalled_since = None
+                continue
+
+            if stalled_since is not None:
+                continue  # Mismo bloqueo, ya capturado
+
+            frame = sys._current_frames().get(self._loop_thread_id)
+            if frame is None:
+                continue
+            stalled_since = heartbeat
+            culprit = _culprit(frame)
+            self.stalls += 1
+            event_loop_stalls.inc(culprit)
+            stack = "".join(traceback.format_stack(frame))
+            logger.warning(
+                f"🧊 Event loop bloqueado más de {blocked * 1000:.0f} ms en {culprit}\n{stack}"
+            )
+
+    def start(self):
+        if self._task is not None:
+            return
+        self._loop_thread_id = threading.get_ident()
+        self._heartbeat = time.monotonic()
+        self._stop.clear()
+        self._task = asyncio.get_running_loop().create_task(self._beat())
+        self._watchdog = threading.Thread(target=self._watch, name="loop-monitor", daemon=True)
+        self._watchdog.start()
+        logger.info(f"🩺 Monitor del event loop activo (umbral {self.threshold * 1000:.0f} ms)")
+
+    async def stop(self):
+        if self._task is None:
+            return
+        self._stop.set()
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+        self._watchdog.join()
+
+
+loop_monitor = LoopMonitor()
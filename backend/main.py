@@ -1,6 +1,8 @@
-from fastapi import FastAPI, HTTPException, Depends, Query, status, Header, Body
+from fastapi import FastAPI, HTTPException, Depends, Query, Path, Request, status, Header, Body
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
+from fastapi.responses import JSONResponse, PlainTextResponse
+from fastapi.concurrency import run_in_threadpool
 from sqlalchemy.orm import Session
 from sqlalchemy import text
 import os
@@ -12,23 +14,40 @@ import logging
 import sys
 from contextlib import asynccontextmanager
 from profesional_validator import ProfesionalValidator
+from compression import CompressionMiddleware, compression_stats
+from profiling import (
+    ProfiledRoute, ProfilingMiddleware, profile_store, profile_worker, profiled, MAX_WORKER_PROFILE_SECONDS
+)
+from memory_profiling import GROUP_BY_OPTIONS, SyncMemoryMiddleware, tracemalloc_profiler
+from loop_monitor import LOOP_MONITOR_ENABLED, loop_monitor
+from health import readiness, table_row_estimates
+from structured_logging import RequestIdMiddleware, configure_logging, flush_logging
+from read_routing import ReadYourWritesMiddleware
+from query_guard import QueryGuardMiddleware
+from admission import AdmissionMiddleware, admission_controller
+from neon_connection import primary_connections, replica_connections
+from metrics import (
+    METRICS_MULTIPROC_DIR, MetricsMiddleware, PROMETHEUS_CONTENT_TYPE, WorkerMetricsExporter,
+    observe_sync_batch, render_metrics
+)
+from wire_format import (
+    MSGPACK_MEDIA_TYPE, SYNC_WIRE_SCHEMA, WireFormatResponse, WireFormatRoute, is_msgpack
+)
+from idempotency import (
+    IDEMPOTENCY_HEADER, idempotency_begin, idempotency_complete, idempotency_release
+)
 import re
 import hashlib 
 
 # ==================== CONFIGURACIÓN INICIAL ====================
 
-# Mostrar información de inicio
-print("\n" + "="*70)
-print("🚀 HEALTHSHIELD API - VERCEL + NEON POSTGRESQL")
-print("="*70)
-
-# Configurar logging
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
-)
+# Configurar logging (JSON asíncrono, ver structured_logging.py)
+configure_logging()
 logger = logging.getLogger(__name__)
 
+# Mostrar información de inicio
+logger.info("🚀 HEALTHSHIELD API - VERCEL + NEON POSTGRESQL")
+
 # Determinar entorno
 is_vercel = os.environ.get('VERCEL') is not None
 
@@ -74,15 +93,32 @@ def verify_token(token: str):
 
 # Importar módulos de la aplicación
 try:
-    from database import get_db, init_db, hash_password, verify_password
+    from database import (
+        get_db, get_read_db, get_engine, get_session_factory, dispose_engines, hash_password, verify_password,
+        slow_query_log, SLOW_QUERY_THRESHOLD_MS, SLOW_QUERY_EXPLAIN_RATE
+    )
     from models import (
         UsuarioCreate, UsuarioResponse, UserLogin, AuthResponse,
         PacienteCreate, PacienteResponse, PacienteUpdate,
         VacunaCreate, VacunaResponse, VacunaUpdate,
         MessageResponse, HealthCheck, BulkSyncData, BulkSyncResponse,
-        SyncResponse, Usuario, Paciente, Vacuna
+        SyncResponse, SyncUpdatesResponse, SyncSessionCreate, SyncSessionResponse, SyncChunkResponse,
+        Usuario, Paciente, Vacuna, SyncChunk
+    )
+    from repositories import (
+        UsuarioRepository, PacienteRepository, VacunaRepository, SyncSessionRepository, DeletedRecordError
+    )
+    from sync_service import SyncResult, apply_pacientes, apply_vacunas
+    from streaming_sync import (
+        SYNC_STREAM_BATCH_SIZE, AsyncByteStream, iter_raw_batches, validate_batch
     )
-    from repositories import UsuarioRepository, PacienteRepository, VacunaRepository
+    from bootstrap import run_bootstrap
+    from change_log import (
+        fetch_changes, paciente_update, vacuna_update, tombstone, change_log_maintenance
+    )
+    from fast_json import list_response, paciente_select, vacuna_select
+    from lifecycle import DrainMiddleware, drain_on_exit, drain_state, warmup
+    import ijson
     logger.info("✅ Módulos de la aplicación importados correctamente")
 except ImportError as e:
     logger.error(f"❌ Error importando módulos: {e}")
@@ -95,41 +131,6 @@ except ImportError as e:
 
 # ==================== FUNCIONES AUXILIARES ====================
 
-def create_default_admin(db: Session):
-    """Crear usuario administrador por defecto si no existe"""
-    try:
-        existing_admin = UsuarioRepository.get_by_username(db, "admin")
-        if existing_admin:
-            logger.info("✅ Usuario admin ya existe")
-            return existing_admin
-        
-        admin_password = os.environ.get('ADMIN_PASSWORD', 'Admin123!')
-        
-        admin_data = UsuarioCreate(
-            username="admin",
-            email="admin@healthshield.com",
-            password=admin_password,
-            telefono="0000000000",
-            is_professional=True,
-            professional_license="ADMIN-001"
-        )
-        
-        db_admin = UsuarioRepository.create(db, admin_data)
-        if db_admin:
-            db_admin.is_verified = True
-            db.commit()
-            db.refresh(db_admin)
-            logger.info(f"✅ Usuario admin creado: {db_admin.username}")
-            return db_admin
-        else:
-            logger.error("❌ No se pudo crear usuario admin")
-            return None
-            
-    except Exception as e:
-        logger.error(f"❌ Error creando usuario admin: {e}")
-        db.rollback()
-        return None
-
 def get_current_user(
     token: Optional[str] = Query(None),
     credentials: Optional[HTTPAuthorizationCredentials] = Depends(security),
@@ -181,6 +182,39 @@ def get_current_user(
     
     return user
 
+def get_admin_user(
+    token: Optional[str] = Query(None),
+    credentials: Optional[HTTPAuthorizationCredentials] = Depends(security),
+    db: Session = Depends(get_db)
+):
+    """
+    Usuario actual, solo si es administrador
+    """
+    user = get_current_user(token=token, credentials=credentials, db=db)
+    if user.username != "admin" and user.role != "admin":
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Solo administradores pueden acceder a este recurso"
+        )
+    return user
+
+def is_admin_token(jwt_token: str) -> bool:
+    """True si el token es válido y pertenece a un administrador (usado fuera de FastAPI)"""
+    payload = verify_token(jwt_token)
+    if not payload or not payload.get("sub"):
+        return False
+    
+    db_gen = get_db()
+    try:
+        db = next(db_gen)
+        user = UsuarioRepository.get_by_username(db, payload["sub"])
+        return bool(user and (user.username == "admin" or user.role == "admin"))
+    except Exception as e:
+        logger.warning(f"⚠️  No se pudo verificar el token de perfilado: {e}")
+        return False
+    finally:
+        db_gen.close()
+
 # ==================== LIFESPAN (STARTUP/SHUTDOWN) ====================
 
 @asynccontextmanager
@@ -192,27 +226,29 @@ async def lifespan(app: FastAPI):
     # ========== STARTUP ==========
     logger.info("🔄 Iniciando HealthShield API...")
     
-    # Inicializar base de datos
-    logger.info("🛠️  Inicializando base de datos...")
-    db_initialized = init_db()
+    # El esquema y el admin se crean con `python bootstrap.py` (tarea única).
+    # BOOTSTRAP_ON_STARTUP=true lo ejecuta aquí, útil solo en desarrollo local.
+    if os.environ.get('BOOTSTRAP_ON_STARTUP', 'false').lower() in ('1', 'true', 'yes'):
+        logger.info("🛠️  BOOTSTRAP_ON_STARTUP activo: inicializando base de datos...")
+        if not await run_in_threadpool(run_bootstrap):
+            logger.error("❌ Error inicializando base de datos")
+            logger.info("💡 La API funcionará en modo limitado")
     
-    if db_initialized:
-        logger.info("✅ Base de datos inicializada correctamente")
-        
-        # Crear usuario admin
-        try:
-            db = next(get_db())
-            admin = create_default_admin(db)
-            if admin:
-                logger.info(f"✅ Usuario admin: {admin.username} ({admin.email})")
-            else:
-                logger.warning("⚠️  No se pudo crear usuario admin")
-        except Exception as e:
-            logger.warning(f"⚠️  Error al crear admin: {e}")
-            logger.info("💡 El admin se creará en el primer inicio")
-    else:
-        logger.error("❌ Error inicializando base de datos")
-        logger.info("💡 La API funcionará en modo limitado")
+    # Conexiones abiertas y sentencias compiladas antes de la primera petición
+    await warmup()
+    
+    if LOOP_MONITOR_ENABLED:
+        loop_monitor.start()
+    readiness.start()
+    # NEON_KEEPALIVE_SECONDS > 0: evita que Neon suspenda el compute por inactividad
+    primary_connections.start(get_engine)
+    # Compactación del change_log y purga de lápidas, fuera de las peticiones
+    change_log_maintenance.start(get_session_factory)
+    
+    # Con serve.py (varios workers) cada worker publica sus métricas en disco
+    metrics_exporter = WorkerMetricsExporter(METRICS_MULTIPROC_DIR) if METRICS_MULTIPROC_DIR else None
+    if metrics_exporter:
+        metrics_exporter.start()
     
     logger.info("✅ HealthShield API lista para recibir peticiones")
     
@@ -220,7 +256,17 @@ async def lifespan(app: FastAPI):
     
     # ========== SHUTDOWN ==========
     logger.info("🛑 Deteniendo HealthShield API...")
-    # Limpieza si es necesaria
+    # /readyz en 503, peticiones nuevas rechazadas y espera de las que siguen en curso
+    await drain_state.drain()
+    await readiness.stop()
+    await primary_connections.stop()
+    await change_log_maintenance.stop()
+    await loop_monitor.stop()
+    if metrics_exporter:
+        metrics_exporter.stop()  # Último volcado de métricas
+    await run_in_threadpool(dispose_engines)
+    logger.info("👋 HealthShield API detenida")
+    flush_logging()
 
 # ==================== APLICACIÓN FASTAPI ====================
 
@@ -240,6 +286,15 @@ app = FastAPI(
     lifespan=lifespan
 )
 
+class AppRoute(ProfiledRoute, WireFormatRoute):
+    """
+    Negociación JSON / MessagePack en /api/sync/* (ver wire_format.py) y
+    endpoints `def` visibles en el perfil por petición (ver profiling.py)
+    """
+
+
+app.router.route_class = AppRoute
+
 # ==================== CONFIGURACIÓN CORS ====================
 
 # Orígenes permitidos
@@ -271,7 +326,39 @@ allowed_origins = list(dict.fromkeys([origin for origin in allowed_origins if or
 
 logger.info(f"🌐 CORS configurado para {len(allowed_origins)} orígenes")
 
-# Middleware CORS
+# Compresión gzip/zstd de respuestas y de subidas a /api/sync/*
+app.add_middleware(CompressionMiddleware)
+
+# Pico de memoria por petición de /api/sync/* (en /metrics)
+app.add_middleware(SyncMemoryMiddleware)
+
+# Perfilado por petición para administradores (X-Profile: 1 o ?profile=1)
+app.add_middleware(ProfilingMiddleware, is_admin_token=is_admin_token)
+
+# statement_timeout/lock_timeout por clase de endpoint y cancelación de
+# consultas si el cliente se desconecta (query_guard.py)
+app.add_middleware(QueryGuardMiddleware)
+
+# Prioridades, límites de concurrencia (503 + Retry-After) y rate limits de
+# login y profesionales (admission.py); por fuera de la descompresión y el
+# perfilado para que rechazar sea barato
+app.add_middleware(AdmissionMiddleware)
+
+# Peticiones en curso para el drenaje del apagado; durante el drenaje, 503
+app.add_middleware(DrainMiddleware)
+
+# Latencia, estados, peticiones en curso y tiempo de DB por ruta (GET /metrics)
+app.add_middleware(MetricsMiddleware)
+
+# Escrituras recientes por autor: sus lecturas van al primario (read_routing.py)
+app.add_middleware(ReadYourWritesMiddleware)
+
+# X-Request-ID en la respuesta y en cada log de la petición
+app.add_middleware(RequestIdMiddleware)
+
+# Middleware CORS, el más externo: los 503/429 que responden directamente
+# Admission/Drain también llevan Access-Control-Allow-Origin, y el navegador
+# puede leer el Retry-After en lugar de ver un error de CORS
 app.add_middleware(
     CORSMiddleware,
     allow_origins=allowed_origins,
@@ -301,18 +388,35 @@ async def root():
         }
     )
 
+@app.get("/livez", tags=["Diagnóstico"])
+async def liveness():
+    """
+    Liveness: el proceso responde. No consulta dependencias.
+    """
+    return {"status": "alive"}
+
+@app.get("/readyz", tags=["Diagnóstico"])
+async def readiness_probe():
+    """
+    Readiness: estado de las dependencias refrescado en segundo plano (503 si no está listo)
+    """
+    snapshot = await readiness.snapshot()
+    return JSONResponse(
+        status_code=200 if snapshot["ready"] else 503,
+        content={"status": "ready" if snapshot["ready"] else "not_ready", **snapshot},
+    )
+
 @app.get("/health", response_model=HealthCheck, tags=["Diagnóstico"])
-async def health_check(db: Session = Depends(get_db)):
+def health_check(db: Session = Depends(get_db)):
     """
-    Health check completo - Verifica conectividad a DB
+    Health check completo - Verifica conectividad a DB.
+    Los conteos son estimaciones (pg_class.reltuples), no COUNT(*).
     """
     try:
         db.execute(text("SELECT 1"))
         db_status = "connected"
         
-        pacientes_count = db.query(Paciente).count()
-        vacunas_count = db.query(Vacuna).count()
-        usuarios_count = db.query(Usuario).count()
+        row_estimates = table_row_estimates(db.connection())
         
         return HealthCheck(
             status="healthy",
@@ -320,9 +424,8 @@ async def health_check(db: Session = Depends(get_db)):
             environment=os.environ.get('ENVIRONMENT', 'development'),
             database=db_status,
             metrics={
-                "pacientes_count": pacientes_count,
-                "vacunas_count": vacunas_count,
-                "usuarios_count": usuarios_count,
+                **row_estimates,
+                "counts_are_estimates": True,
                 "vercel_environment": os.environ.get('VERCEL_ENV', 'unknown'),
                 "region": os.environ.get('VERCEL_REGION', 'unknown')
             }
@@ -340,13 +443,37 @@ async def health_check(db: Session = Depends(get_db)):
             }
         )
 
+@app.get("/api/metrics/compression", tags=["Diagnóstico"])
+async def compression_metrics():
+    """
+    Bytes originales, comprimidos y ahorrados por endpoint
+    """
+    return {
+        "timestamp": datetime.now().isoformat(),
+        **compression_stats.snapshot()
+    }
+
+@app.get("/metrics", response_class=PlainTextResponse, include_in_schema=False)
+async def prometheus_metrics(authorization: Optional[str] = Header(None)):
+    """
+    Métricas en formato Prometheus. Si METRICS_TOKEN está definida,
+    se exige Authorization: Bearer <METRICS_TOKEN>.
+    """
+    metrics_token = os.environ.get('METRICS_TOKEN')
+    if metrics_token and authorization != f"Bearer {metrics_token}":
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Token de métricas inválido"
+        )
+    return PlainTextResponse(render_metrics(), media_type=PROMETHEUS_CONTENT_TYPE)
+
 # ==================== ENDPOINTS DE AUTENTICACIÓN ====================
 
 @app.post("/api/auth/register", 
           response_model=AuthResponse, 
           status_code=status.HTTP_201_CREATED,
           tags=["Autenticación"])
-async def register_user(
+def register_user(
     usuario: UsuarioCreate,
     db: Session = Depends(get_db)
 ):
@@ -402,7 +529,7 @@ async def register_user(
 @app.post("/api/auth/login", 
           response_model=AuthResponse,
           tags=["Autenticación"])
-async def login_user(
+def login_user(
     login_data: UserLogin,
     db: Session = Depends(get_db)
 ):
@@ -444,7 +571,7 @@ async def login_user(
 @app.get("/api/auth/me", 
          response_model=UsuarioResponse,
          tags=["Autenticación"])
-async def get_current_user_info(
+def get_current_user_info(
     token: Optional[str] = Query(None),
     credentials: Optional[HTTPAuthorizationCredentials] = Depends(security),
     db: Session = Depends(get_db)
@@ -472,18 +599,26 @@ async def get_current_user_info(
           response_model=MessageResponse,
           status_code=status.HTTP_201_CREATED,
           tags=["Pacientes"])
-async def create_paciente(
+def create_paciente(
     paciente: PacienteCreate,
     db: Session = Depends(get_db),
     token: Optional[str] = Query(None),
-    credentials: Optional[HTTPAuthorizationCredentials] = Depends(security)
+    credentials: Optional[HTTPAuthorizationCredentials] = Depends(security),
+    idempotency_key: Optional[str] = Header(None, alias=IDEMPOTENCY_HEADER)
 ):
     """
     Crear un nuevo paciente
     """
-    get_current_user(token=token, credentials=credentials, db=db)
+    current_user = get_current_user(token=token, credentials=credentials, db=db)
+    
+    # Reintentos con la misma Idempotency-Key devuelven la respuesta guardada
+    idempotency_scope = f"{current_user.id}:POST /api/pacientes"
+    replay = idempotency_begin(db, idempotency_key, idempotency_scope, paciente.model_dump(mode="json"))
+    if replay:
+        return replay
     
     if PacienteRepository.get_by_cedula(db, paciente.cedula):
+        idempotency_release(db, idempotency_key, idempotency_scope)
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="La cédula ya está registrada"
@@ -492,12 +627,21 @@ async def create_paciente(
     try:
         db_paciente = PacienteRepository.create(db, paciente)
         
-        return MessageResponse(
+        response = MessageResponse(
             message="Paciente creado exitosamente",
             id=db_paciente.id,
             local_id=paciente.local_id
         )
+        idempotency_complete(db, idempotency_key, idempotency_scope, status.HTTP_201_CREATED, response.model_dump())
+        return response
+    except DeletedRecordError as e:
+        idempotency_release(db, idempotency_key, idempotency_scope)
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail=str(e)
+        )
     except Exception as e:
+        idempotency_release(db, idempotency_key, idempotency_scope)
         logger.error(f"❌ Error creando paciente: {e}")
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
@@ -507,13 +651,13 @@ async def create_paciente(
 @app.get("/api/pacientes", 
          response_model=List[PacienteResponse],
          tags=["Pacientes"])
-async def get_all_pacientes(
+def get_all_pacientes(
     skip: int = Query(0, ge=0, description="Número de registros a saltar"),
     limit: int = Query(100, ge=1, le=1000, description="Límite de registros"),
     search: Optional[str] = Query(None, description="Búsqueda por nombre o cédula"),
     token: Optional[str] = Query(None),
     credentials: Optional[HTTPAuthorizationCredentials] = Depends(security),
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_read_db)
 ):
     """
     Obtener todos los pacientes con paginación y búsqueda
@@ -525,10 +669,10 @@ async def get_all_pacientes(
         
         from sqlalchemy import or_
         
-        query = db.query(Paciente)
+        query = paciente_select()
         
         if search:
-            query = query.filter(
+            query = query.where(
                 or_(
                     Paciente.nombre.ilike(f"%{search}%"),
                     Paciente.cedula.ilike(f"%{search}%"),
@@ -536,20 +680,8 @@ async def get_all_pacientes(
                 )
             )
         
-        pacientes = query.offset(skip).limit(limit).all()
-        
-        return [
-            PacienteResponse(
-                id=paciente.id,
-                cedula=paciente.cedula,
-                nombre=paciente.nombre,
-                fecha_nacimiento=paciente.fecha_nacimiento,
-                telefono=paciente.telefono,
-                direccion=paciente.direccion,
-                created_at=paciente.created_at.isoformat() if paciente.created_at else None,
-                updated_at=paciente.updated_at.isoformat() if paciente.updated_at else None
-            ) for paciente in pacientes
-        ]
+        # Orden estable para paginar; usa ix_pacientes_id_activos
+        return list_response(db, query.order_by(Paciente.id).offset(skip).limit(limit))
     except Exception as e:
         logger.error(f"❌ Error obteniendo pacientes: {e}")
         raise HTTPException(
@@ -557,10 +689,39 @@ async def get_all_pacientes(
             detail="Error interno del servidor"
         )
 
+@app.get("/api/pacientes/buscar", 
+         response_model=List[PacienteResponse],
+         tags=["Pacientes"])
+def buscar_pacientes(
+    q: str = Query(..., description="Término de búsqueda (nombre o cédula)"),
+    db: Session = Depends(get_read_db)
+):
+    """
+    Buscar pacientes por nombre o cédula
+    """
+    try:
+        from sqlalchemy import or_
+        
+        query = paciente_select().where(
+            or_(
+                Paciente.nombre.ilike(f"%{q}%"),
+                Paciente.cedula.ilike(f"%{q}%")
+            )
+        )
+        
+        return list_response(db, query)
+        
+    except Exception as e:
+        logger.error(f"❌ Error buscando pacientes: {e}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Error interno del servidor"
+        )
+
 @app.get("/api/pacientes/{paciente_id}", 
          response_model=PacienteResponse,
          tags=["Pacientes"])
-async def get_paciente(
+def get_paciente(
     paciente_id: int,
     db: Session = Depends(get_db)
 ):
@@ -582,6 +743,7 @@ async def get_paciente(
         fecha_nacimiento=paciente.fecha_nacimiento,
         telefono=paciente.telefono,
         direccion=paciente.direccion,
+        is_synced=bool(paciente.is_synced),
         created_at=paciente.created_at.isoformat() if paciente.created_at else None,
         updated_at=paciente.updated_at.isoformat() if paciente.updated_at else None
     )
@@ -589,7 +751,7 @@ async def get_paciente(
 @app.get("/api/pacientes/cedula/{cedula}", 
          response_model=PacienteResponse,
          tags=["Pacientes"])
-async def get_paciente_by_cedula(
+def get_paciente_by_cedula(
     cedula: str,
     db: Session = Depends(get_db)
 ):
@@ -612,6 +774,7 @@ async def get_paciente_by_cedula(
             fecha_nacimiento=paciente.fecha_nacimiento,
             telefono=paciente.telefono,
             direccion=paciente.direccion,
+            is_synced=bool(paciente.is_synced),
             created_at=paciente.created_at.isoformat() if paciente.created_at else None,
             updated_at=paciente.updated_at.isoformat() if paciente.updated_at else None
         )
@@ -625,47 +788,66 @@ async def get_paciente_by_cedula(
             detail="Error interno del servidor"
         )
 
-@app.get("/api/pacientes/buscar", 
-         response_model=List[PacienteResponse],
-         tags=["Pacientes"])
-async def buscar_pacientes(
-    q: str = Query(..., description="Término de búsqueda (nombre o cédula)"),
-    db: Session = Depends(get_db)
+@app.delete("/api/pacientes/{paciente_id}",
+            response_model=MessageResponse,
+            tags=["Pacientes"])
+def delete_paciente(
+    paciente_id: int,
+    db: Session = Depends(get_db),
+    current_user=Depends(get_admin_user)
 ):
     """
-    Buscar pacientes por nombre o cédula
+    Eliminar un paciente y sus vacunas (borrado lógico: los dispositivos
+    reciben la lápida en /api/sync/updates). Solo administradores
     """
     try:
-        from sqlalchemy import or_
-        
-        query = db.query(Paciente).filter(
-            or_(
-                Paciente.nombre.ilike(f"%{q}%"),
-                Paciente.cedula.ilike(f"%{q}%")
-            )
+        paciente = PacienteRepository.delete(db, paciente_id)
+    except Exception as e:
+        logger.error(f"❌ Error eliminando paciente: {e}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Error interno del servidor"
         )
-        
-        pacientes = query.all()
-        
-        return [
-            PacienteResponse(
-                id=paciente.id,
-                cedula=paciente.cedula,
-                nombre=paciente.nombre,
-                fecha_nacimiento=paciente.fecha_nacimiento,
-                telefono=paciente.telefono,
-                direccion=paciente.direccion,
-                created_at=paciente.created_at.isoformat() if paciente.created_at else None,
-                updated_at=paciente.updated_at.isoformat() if paciente.updated_at else None
-            ) for paciente in pacientes
-        ]
-        
+    
+    if not paciente:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Paciente no encontrado"
+        )
+    
+    logger.info(f"🗑️  Paciente {paciente_id} eliminado por: {current_user.username}")
+    return MessageResponse(message="Paciente eliminado exitosamente", id=paciente_id)
+
+@app.post("/api/pacientes/{paciente_id}/restore",
+          response_model=MessageResponse,
+          tags=["Pacientes"])
+def restore_paciente(
+    paciente_id: int,
+    db: Session = Depends(get_db),
+    current_user=Depends(get_admin_user)
+):
+    """
+    Reactivar un paciente eliminado y las vacunas borradas con él (solo
+    administradores). Es la única forma de revivir una lápida: las altas y la
+    sincronización con esa cédula reciben un conflicto
+    """
+    try:
+        paciente = PacienteRepository.restore(db, paciente_id)
     except Exception as e:
-        logger.error(f"❌ Error buscando pacientes: {e}")
+        logger.error(f"❌ Error restaurando paciente: {e}")
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail="Error interno del servidor"
         )
+    
+    if not paciente:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Paciente eliminado no encontrado"
+        )
+    
+    logger.info(f"♻️  Paciente {paciente_id} restaurado por: {current_user.username}")
+    return MessageResponse(message="Paciente restaurado exitosamente", id=paciente_id)
 
 # ==================== ENDPOINTS DE VACUNAS ====================
 
@@ -673,17 +855,24 @@ async def buscar_pacientes(
           response_model=MessageResponse,
           status_code=status.HTTP_201_CREATED,
           tags=["Vacunas"])
-async def create_vacuna(
+def create_vacuna(
     vacuna: VacunaCreate,
     db: Session = Depends(get_db),
     token: Optional[str] = Query(None),
-    credentials: Optional[HTTPAuthorizationCredentials] = Depends(security)
+    credentials: Optional[HTTPAuthorizationCredentials] = Depends(security),
+    idempotency_key: Optional[str] = Header(None, alias=IDEMPOTENCY_HEADER)
 ):
     """
     Registrar una nueva vacuna
     """
     current_user = get_current_user(token=token, credentials=credentials, db=db)
     
+    # Sin server_id el repositorio no deduplica: la clave evita vacunas repetidas
+    idempotency_scope = f"{current_user.id}:POST /api/vacunas"
+    replay = idempotency_begin(db, idempotency_key, idempotency_scope, vacuna.model_dump(mode="json"))
+    if replay:
+        return replay
+    
     try:
         # Asignar usuario actual si no se especifica
         if not vacuna.usuario_id:
@@ -691,17 +880,27 @@ async def create_vacuna(
         
         db_vacuna = VacunaRepository.create(db, vacuna)
         
-        return MessageResponse(
+        response = MessageResponse(
             message="Vacuna registrada exitosamente",
             id=db_vacuna.id,
             local_id=vacuna.local_id
         )
+        idempotency_complete(db, idempotency_key, idempotency_scope, status.HTTP_201_CREATED, response.model_dump())
+        return response
+    except DeletedRecordError as e:
+        idempotency_release(db, idempotency_key, idempotency_scope)
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail=str(e)
+        )
     except ValueError as e:
+        idempotency_release(db, idempotency_key, idempotency_scope)
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail=str(e)
         )
     except Exception as e:
+        idempotency_release(db, idempotency_key, idempotency_scope)
         logger.error(f"❌ Error registrando vacuna: {e}")
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
@@ -711,9 +910,9 @@ async def create_vacuna(
 @app.get("/api/pacientes/{paciente_id}/vacunas", 
          response_model=List[VacunaResponse],
          tags=["Vacunas"])
-async def get_vacunas_paciente(
+def get_vacunas_paciente(
     paciente_id: int,
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_read_db)
 ):
     """
     Obtener todas las vacunas de un paciente
@@ -726,22 +925,7 @@ async def get_vacunas_paciente(
                 detail="Paciente no encontrado"
             )
         
-        vacunas = VacunaRepository.get_by_paciente(db, paciente_id)
-        
-        return [
-            VacunaResponse(
-                id=vacuna.id,
-                paciente_id=vacuna.paciente_id,
-                nombre_vacuna=vacuna.nombre_vacuna,
-                fecha_aplicacion=vacuna.fecha_aplicacion,
-                lote=vacuna.lote,
-                proxima_dosis=vacuna.proxima_dosis,
-                usuario_id=vacuna.usuario_id,
-                created_at=vacuna.created_at.isoformat() if vacuna.created_at else None,
-                paciente_nombre=vacuna.paciente.nombre if vacuna.paciente else None,
-                usuario_nombre=vacuna.usuario.username if vacuna.usuario else None
-            ) for vacuna in vacunas
-        ]
+        return list_response(db, vacuna_select().where(Vacuna.paciente_id == paciente_id))
     except HTTPException:
         raise
     except Exception as e:
@@ -754,37 +938,22 @@ async def get_vacunas_paciente(
 @app.get("/api/vacunas", 
          response_model=List[VacunaResponse],
          tags=["Vacunas"])
-async def get_all_vacunas(
+def get_all_vacunas(
     skip: int = Query(0, ge=0, description="Número de registros a saltar"),
     limit: int = Query(100, ge=1, le=1000, description="Límite de registros"),
     paciente_id: Optional[int] = Query(None, description="Filtrar por ID de paciente"),
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_read_db)
 ):
     """
     Obtener todas las vacunas con filtros
     """
     try:
-        query = db.query(Vacuna)
+        query = vacuna_select()
         
         if paciente_id:
-            query = query.filter(Vacuna.paciente_id == paciente_id)
-        
-        vacunas = query.offset(skip).limit(limit).all()
+            query = query.where(Vacuna.paciente_id == paciente_id)
         
-        return [
-            VacunaResponse(
-                id=vacuna.id,
-                paciente_id=vacuna.paciente_id,
-                nombre_vacuna=vacuna.nombre_vacuna,
-                fecha_aplicacion=vacuna.fecha_aplicacion,
-                lote=vacuna.lote,
-                proxima_dosis=vacuna.proxima_dosis,
-                usuario_id=vacuna.usuario_id,
-                created_at=vacuna.created_at.isoformat() if vacuna.created_at else None,
-                paciente_nombre=vacuna.paciente.nombre if vacuna.paciente else None,
-                usuario_nombre=vacuna.usuario.username if vacuna.usuario else None
-            ) for vacuna in vacunas
-        ]
+        return list_response(db, query.offset(skip).limit(limit))
     except Exception as e:
         logger.error(f"❌ Error obteniendo vacunas: {e}")
         raise HTTPException(
@@ -792,12 +961,42 @@ async def get_all_vacunas(
             detail="Error interno del servidor"
         )
 
+@app.delete("/api/vacunas/{vacuna_id}",
+            response_model=MessageResponse,
+            tags=["Vacunas"])
+def delete_vacuna(
+    vacuna_id: int,
+    db: Session = Depends(get_db),
+    current_user=Depends(get_admin_user)
+):
+    """
+    Eliminar una vacuna (borrado lógico: los dispositivos reciben la lápida
+    en /api/sync/updates). Solo administradores
+    """
+    try:
+        vacuna = VacunaRepository.delete(db, vacuna_id)
+    except Exception as e:
+        logger.error(f"❌ Error eliminando vacuna: {e}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Error interno del servidor"
+        )
+    
+    if not vacuna:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Vacuna no encontrada"
+        )
+    
+    logger.info(f"🗑️  Vacuna {vacuna_id} eliminada por: {current_user.username}")
+    return MessageResponse(message="Vacuna eliminada exitosamente", id=vacuna_id)
+
 # ==================== ENDPOINTS DE USUARIOS ====================
 
 @app.get("/api/users", 
          response_model=List[UsuarioResponse],
          tags=["Usuarios"])
-async def get_all_users(
+def get_all_users(
     db: Session = Depends(get_db),
     token: Optional[str] = Query(None),
     credentials: Optional[HTTPAuthorizationCredentials] = Depends(security)
@@ -837,7 +1036,7 @@ async def get_all_users(
 @app.post("/api/users/change-password", 
           response_model=MessageResponse,
           tags=["Usuarios"])
-async def change_password(
+def change_password(
     current_password: str = Query(..., description="Contraseña actual"),
     new_password: str = Query(..., description="Nueva contraseña"),
     user_id: int = Query(..., description="ID del usuario"),
@@ -890,125 +1089,47 @@ async def change_password(
 
 # ==================== ENDPOINTS DE SINCRONIZACIÓN ====================
 
-@app.post("/api/sync/bulk", response_model=BulkSyncResponse, tags=["Sincronización"])
-async def bulk_sync(
+@app.post("/api/sync/bulk", response_model=BulkSyncResponse,
+          response_class=WireFormatResponse, tags=["Sincronización"])
+def bulk_sync(
     sync_data: BulkSyncData,
     db: Session = Depends(get_db),
     token: Optional[str] = Query(None),
-    credentials: Optional[HTTPAuthorizationCredentials] = Depends(security)
+    credentials: Optional[HTTPAuthorizationCredentials] = Depends(security),
+    idempotency_key: Optional[str] = Header(None, alias=IDEMPOTENCY_HEADER)
 ):
     """Sincronización masiva desde cliente Flutter"""
     current_user = get_current_user(token=token, credentials=credentials, db=db)
     
+    idempotency_scope = f"{current_user.id}:POST /api/sync/bulk"
+    replay = idempotency_begin(db, idempotency_key, idempotency_scope, sync_data.model_dump(mode="json"))
+    if replay:
+        return replay
+    
     logger.info(f"📥 BULK SYNC iniciado por: {current_user.username}")
     logger.info(f"📊 Datos recibidos: {len(sync_data.pacientes)} pacientes, {len(sync_data.vacunas)} vacunas")
+    observe_sync_batch("bulk", "pacientes", len(sync_data.pacientes))
+    observe_sync_batch("bulk", "vacunas", len(sync_data.vacunas))
     
-    pacientes_ids = {}
-    vacunas_ids = {}
-    conflicts = []
+    result = SyncResult()
     
     try:
         # 1. Sincronizar pacientes
-        for paciente in sync_data.pacientes:
-            try:
-                logger.info(f"🔄 Procesando paciente: {paciente.cedula}")
-                
-                existing_paciente = PacienteRepository.get_by_cedula(db, paciente.cedula)
-                
-                if existing_paciente:
-                    # Actualizar
-                    update_data = {
-                        'nombre': paciente.nombre,
-                        'fecha_nacimiento': paciente.fecha_nacimiento,
-                        'telefono': paciente.telefono,
-                        'direccion': paciente.direccion,
-                        'is_synced': True
-                    }
-                    PacienteRepository.update(db, existing_paciente.id, update_data)
-                    pacientes_ids[str(paciente.local_id)] = {
-                        'server_id': existing_paciente.id,
-                        'action': 'updated'
-                    }
-                else:
-                    # Crear nuevo
-                    db_paciente = PacienteRepository.create(db, paciente)
-                    pacientes_ids[str(paciente.local_id)] = {
-                        'server_id': db_paciente.id,
-                        'action': 'created'
-                    }
-                    
-            except Exception as e:
-                logger.error(f"❌ Error paciente {paciente.cedula}: {e}")
-                conflicts.append({
-                    'type': 'paciente',
-                    'local_id': paciente.local_id,
-                    'error': str(e)
-                })
+        apply_pacientes(db, sync_data.pacientes, result)
         
         # 2. Sincronizar vacunas
-        for vacuna in sync_data.vacunas:
-            try:
-                # 🔥 ELIMINAR esta validación de paciente:
-                # paciente_server_id = None
-                # if vacuna.paciente_id and str(vacuna.paciente_id) in pacientes_ids:
-                #     paciente_server_id = pacientes_ids[str(vacuna.paciente_id)]['server_id']
-                # elif vacuna.cedula_paciente:
-                #     paciente = PacienteRepository.get_by_cedula(db, vacuna.cedula_paciente)
-                #     if paciente:
-                #         paciente_server_id = paciente.id
-                # 
-                # if not paciente_server_id:
-                #     raise ValueError(f"No se encontró paciente para vacuna: {vacuna.nombre_vacuna}")
-                
-                # 🔥 SIMPLIFICADO: Usar el paciente_id directamente (puede ser None)
-                vacuna_data = VacunaCreate(
-                    paciente_id=vacuna.paciente_id,  # Puede ser None
-                    paciente_server_id=vacuna.paciente_server_id,
-                    nombre_vacuna=vacuna.nombre_vacuna,
-                    fecha_aplicacion=vacuna.fecha_aplicacion,
-                    lote=vacuna.lote,
-                    proxima_dosis=vacuna.proxima_dosis,
-                    usuario_id=vacuna.usuario_id or current_user.id,
-                    es_menor=vacuna.es_menor,
-                    cedula_tutor=vacuna.cedula_tutor,
-                    cedula_propia=vacuna.cedula_propia,
-                    nombre_paciente=vacuna.nombre_paciente,
-                    cedula_paciente=vacuna.cedula_paciente,
-                    local_id=vacuna.local_id,
-                    server_id=vacuna.server_id
-                )
-                
-                # Crear vacuna
-                db_vacuna = VacunaRepository.create(db, vacuna_data)
-                
-                vacunas_ids[str(vacuna.local_id)] = {
-                    'server_id': db_vacuna.id,
-                    'action': 'created'
-                }
-                
-            except Exception as e:
-                logger.error(f"❌ Error vacuna {vacuna.nombre_vacuna}: {e}")
-                conflicts.append({
-                    'type': 'vacuna',
-                    'local_id': vacuna.local_id,
-                    'error': str(e)
-                })
+        apply_vacunas(db, sync_data.vacunas, current_user.id, result)
         
         db.commit()
         
-        logger.info(f"✅ BULK SYNC completado: {len(vacunas_ids)} vacunas sincronizadas")
+        logger.info(f"✅ BULK SYNC completado: {len(result.vacunas_ids)} vacunas sincronizadas")
         
-        return BulkSyncResponse(
-            message="Sincronización completada",
-            pacientes_sincronizados=len(sync_data.pacientes),
-            vacunas_sincronizadas=len(sync_data.vacunas),
-            pacientes_ids=pacientes_ids,
-            vacunas_ids=vacunas_ids,
-            conflicts=conflicts if conflicts else None,
-            server_timestamp=datetime.now().isoformat()
-        )
+        response = result.to_response()
+        idempotency_complete(db, idempotency_key, idempotency_scope, status.HTTP_200_OK, response.model_dump())
+        return response
         
     except Exception as e:
+        idempotency_release(db, idempotency_key, idempotency_scope)
         db.rollback()
         logger.error(f"❌ Error en bulk sync: {e}")
         raise HTTPException(
@@ -1016,59 +1137,378 @@ async def bulk_sync(
             detail=f"Error en sincronización: {str(e)}"
         )
 
+@app.post("/api/sync/bulk/stream", response_model=BulkSyncResponse,
+          response_class=WireFormatResponse, tags=["Sincronización"])
+async def bulk_sync_stream(
+    request: Request,
+    include_ids: bool = Query(True, description="Incluir el mapeo local_id → server_id en la respuesta"),
+    db: Session = Depends(get_db),
+    token: Optional[str] = Query(None),
+    credentials: Optional[HTTPAuthorizationCredentials] = Depends(security)
+):
+    """
+    Sincronización masiva en streaming. Mismo cuerpo que /api/sync/bulk,
+    pero se parsea de forma incremental y se aplica por lotes: cada lote
+    se confirma al terminar. Con include_ids=false la memoria no depende
+    del tamaño del payload.
+    """
+    current_user = await run_in_threadpool(get_current_user, token=token, credentials=credentials, db=db)
+    usuario_id = current_user.id
+    
+    if is_msgpack(request.headers.get("content-type", "")):
+        raise HTTPException(
+            status_code=status.HTTP_415_UNSUPPORTED_MEDIA_TYPE,
+            detail=f"La ingesta en streaming solo acepta JSON; use /api/sync/bulk para {MSGPACK_MEDIA_TYPE}"
+        )
+    
+    logger.info(f"📥 BULK SYNC (streaming) iniciado por: {current_user.username}")
+    
+    result = SyncResult(track_ids=include_ids)
+    body = AsyncByteStream(request.stream())
+    batches = 0
+    
+    def apply_batch(kind, records):
+        if kind == 'pacientes':
+            apply_pacientes(db, records, result)
+        else:
+            apply_vacunas(db, records, usuario_id, result)
+        db.commit()
+        # Soltar los objetos del lote para que la sesión no crezca
+        db.expunge_all()
+    
+    try:
+        async for kind, raw_records in iter_raw_batches(body, SYNC_STREAM_BATCH_SIZE):
+            records, invalid = validate_batch(kind, raw_records)
+            observe_sync_batch("stream", kind, len(raw_records))
+            
+            if kind == 'pacientes':
+                result.pacientes_recibidos += len(invalid)
+            else:
+                result.vacunas_recibidas += len(invalid)
+            
+            # Fuera del bucle de eventos: la vigilancia de desconexión de
+            # QueryGuardMiddleware sigue atendiendo mientras se escribe el lote
+            await run_in_threadpool(profiled(apply_batch), kind, records)
+            
+            for conflict in invalid:
+                result.record_conflict(conflict['type'], conflict['local_id'], conflict['error'])
+            batches += 1
+        
+        logger.info(f"✅ BULK SYNC (streaming) completado: {batches} lotes, {body.bytes_read} bytes")
+        return result.to_response()
+        
+    except HTTPException:
+        db.rollback()
+        raise
+    except ijson.JSONError as e:
+        db.rollback()
+        logger.error(f"❌ JSON inválido en bulk sync (streaming): {e}")
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"JSON inválido tras {batches} lotes aplicados: {str(e).splitlines()[0][:100]}"
+        )
+    except Exception as e:
+        db.rollback()
+        logger.error(f"❌ Error en bulk sync (streaming): {e}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Error en sincronización tras {batches} lotes aplicados: {str(e)}"
+        )
+
+@app.get("/api/sync/schema", tags=["Sincronización"])
+async def get_sync_wire_schema():
+    """
+    Esquema publicado del formato binario (MessagePack columnar) para el cliente Flutter
+    """
+    return SYNC_WIRE_SCHEMA
+
+# ==================== SINCRONIZACIÓN POR PARTES ====================
+# Protocolo: POST /api/sync/sessions → PUT .../chunks/{n} (0, 1, 2...) → POST .../commit
+# Cada parte se valida y se guarda al llegar; si la conexión se cae, el cliente
+# consulta GET /api/sync/sessions/{id} y reanuda desde next_chunk.
+
+SYNC_CHUNK_MAX_RECORDS = int(os.environ.get('SYNC_CHUNK_MAX_RECORDS', 1000))
+SYNC_SESSION_TTL_HOURS = int(os.environ.get('SYNC_SESSION_TTL_HOURS', 24))
+
+def _sync_session_response(db: Session, sync_session) -> SyncSessionResponse:
+    return SyncSessionResponse(
+        session_id=sync_session.id,
+        status=sync_session.status,
+        total_chunks=sync_session.total_chunks,
+        last_chunk=sync_session.last_chunk,
+        next_chunk=sync_session.last_chunk + 1,
+        chunks_received=SyncSessionRepository.get_chunk_indexes(db, sync_session.id),
+        created_at=sync_session.created_at.isoformat() if sync_session.created_at else None
+    )
+
+def _get_sync_session_or_404(db: Session, session_id: str, usuario_id: int):
+    sync_session = SyncSessionRepository.get(db, session_id, usuario_id)
+    if not sync_session:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Sesión de sincronización no encontrada"
+        )
+    return sync_session
+
+@app.post("/api/sync/sessions",
+          response_model=SyncSessionResponse,
+          response_class=WireFormatResponse,
+          status_code=status.HTTP_201_CREATED,
+          tags=["Sincronización"])
+def begin_sync_session(
+    session_data: SyncSessionCreate,
+    db: Session = Depends(get_db),
+    token: Optional[str] = Query(None),
+    credentials: Optional[HTTPAuthorizationCredentials] = Depends(security)
+):
+    """
+    Iniciar una sesión de sincronización por partes
+    """
+    current_user = get_current_user(token=token, credentials=credentials, db=db)
+    
+    try:
+        purged = SyncSessionRepository.purge_expired(db, SYNC_SESSION_TTL_HOURS)
+        if purged:
+            logger.info(f"🧹 {purged} sesiones de sincronización expiradas eliminadas")
+        
+        sync_session = SyncSessionRepository.create(
+            db, current_user.id, session_data.total_chunks, session_data.last_sync_client
+        )
+        logger.info(f"📦 Sesión de sync {sync_session.id} iniciada por: {current_user.username}")
+        return _sync_session_response(db, sync_session)
+    except Exception as e:
+        logger.error(f"❌ Error iniciando sesión de sync: {e}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Error interno del servidor"
+        )
+
+@app.get("/api/sync/sessions/{session_id}",
+         response_model=SyncSessionResponse,
+         response_class=WireFormatResponse,
+         tags=["Sincronización"])
+def get_sync_session(
+    session_id: str,
+    db: Session = Depends(get_db),
+    token: Optional[str] = Query(None),
+    credentials: Optional[HTTPAuthorizationCredentials] = Depends(security)
+):
+    """
+    Estado de la sesión: último chunk confirmado y desde dónde reanudar
+    """
+    current_user = get_current_user(token=token, credentials=credentials, db=db)
+    sync_session = _get_sync_session_or_404(db, session_id, current_user.id)
+    return _sync_session_response(db, sync_session)
+
+@app.put("/api/sync/sessions/{session_id}/chunks/{chunk_index}",
+         response_model=SyncChunkResponse,
+         response_class=WireFormatResponse,
+         tags=["Sincronización"])
+def upload_sync_chunk(
+    session_id: str,
+    chunk: BulkSyncData,
+    chunk_index: int = Path(..., ge=0, description="Número de parte (desde 0)"),
+    db: Session = Depends(get_db),
+    token: Optional[str] = Query(None),
+    credentials: Optional[HTTPAuthorizationCredentials] = Depends(security)
+):
+    """
+    Subir una parte numerada. Reenviar la misma parte la reemplaza.
+    """
+    current_user = get_current_user(token=token, credentials=credentials, db=db)
+    sync_session = _get_sync_session_or_404(db, session_id, current_user.id)
+    
+    if sync_session.status != 'open':
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail=f"La sesión no admite más partes (estado: {sync_session.status})"
+        )
+    
+    if sync_session.total_chunks is not None and chunk_index >= sync_session.total_chunks:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"chunk_index fuera de rango (total_chunks={sync_session.total_chunks})"
+        )
+    
+    records = len(chunk.pacientes) + len(chunk.vacunas)
+    if records > SYNC_CHUNK_MAX_RECORDS:
+        raise HTTPException(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail=f"Cada parte admite como máximo {SYNC_CHUNK_MAX_RECORDS} registros"
+        )
+    
+    try:
+        sync_session = SyncSessionRepository.stage_chunk(
+            db, sync_session, chunk_index, chunk.model_dump_json(),
+            len(chunk.pacientes), len(chunk.vacunas)
+        )
+        
+        return SyncChunkResponse(
+            message="Parte recibida",
+            session_id=sync_session.id,
+            chunk_index=chunk_index,
+            pacientes=len(chunk.pacientes),
+            vacunas=len(chunk.vacunas),
+            last_chunk=sync_session.last_chunk,
+            next_chunk=sync_session.last_chunk + 1
+        )
+    except Exception as e:
+        db.rollback()
+        logger.error(f"❌ Error guardando parte {chunk_index} de la sesión {session_id}: {e}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Error interno del servidor"
+        )
+
+@app.post("/api/sync/sessions/{session_id}/commit",
+          response_model=BulkSyncResponse,
+          response_class=WireFormatResponse,
+          tags=["Sincronización"])
+def commit_sync_session(
+    session_id: str,
+    db: Session = Depends(get_db),
+    token: Optional[str] = Query(None),
+    credentials: Optional[HTTPAuthorizationCredentials] = Depends(security)
+):
+    """
+    Aplicar todas las partes de la sesión en una sola transacción
+    """
+    current_user = get_current_user(token=token, credentials=credentials, db=db)
+    sync_session = _get_sync_session_or_404(db, session_id, current_user.id)
+    
+    # Un commit repetido devuelve el resultado ya aplicado
+    if sync_session.status == 'committed' and sync_session.result:
+        return BulkSyncResponse.model_validate_json(sync_session.result)
+    
+    if sync_session.status != 'open':
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail=f"La sesión no se puede confirmar (estado: {sync_session.status})"
+        )
+    
+    indexes = SyncSessionRepository.get_chunk_indexes(db, session_id)
+    expected = sync_session.total_chunks if sync_session.total_chunks is not None else len(indexes)
+    missing = sorted(set(range(expected)) - set(indexes))
+    if missing or not indexes:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail=f"Faltan partes por subir: {missing or [0]}"
+        )
+    
+    logger.info(f"📥 Commit de sesión {session_id} ({len(indexes)} partes) por: {current_user.username}")
+    
+    result = SyncResult()
+    
+    try:
+        for chunk in SyncSessionRepository.iter_chunks(db, session_id):
+            chunk_data = BulkSyncData.model_validate_json(chunk.payload)
+            observe_sync_batch("session", "pacientes", len(chunk_data.pacientes))
+            observe_sync_batch("session", "vacunas", len(chunk_data.vacunas))
+            apply_pacientes(db, chunk_data.pacientes, result)
+            apply_vacunas(db, chunk_data.vacunas, current_user.id, result)
+        
+        response = result.to_response()
+        
+        # Las partes ya no se necesitan: el resultado queda guardado en la sesión
+        db.query(SyncChunk).filter(SyncChunk.session_id == session_id).delete(synchronize_session=False)
+        sync_session.status = 'committed'
+        sync_session.result = response.model_dump_json()
+        sync_session.committed_at = datetime.now()
+        
+        db.commit()
+        
+        logger.info(f"✅ Sesión {session_id} aplicada: {result.pacientes_recibidos} pacientes, {result.vacunas_recibidas} vacunas")
+        return response
+        
+    except Exception as e:
+        db.rollback()
+        logger.error(f"❌ Error aplicando sesión {session_id}: {e}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Error en sincronización: {str(e)}"
+        )
+
+@app.delete("/api/sync/sessions/{session_id}",
+            response_model=MessageResponse,
+            response_class=WireFormatResponse,
+            tags=["Sincronización"])
+def abort_sync_session(
+    session_id: str,
+    db: Session = Depends(get_db),
+    token: Optional[str] = Query(None),
+    credentials: Optional[HTTPAuthorizationCredentials] = Depends(security)
+):
+    """
+    Cancelar una sesión abierta y descartar sus partes
+    """
+    current_user = get_current_user(token=token, credentials=credentials, db=db)
+    sync_session = _get_sync_session_or_404(db, session_id, current_user.id)
+    
+    if sync_session.status == 'committed':
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail="La sesión ya fue confirmada"
+        )
+    
+    SyncSessionRepository.discard(db, sync_session)
+    
+    return MessageResponse(message="Sesión de sincronización cancelada")
+
 @app.get("/api/sync/updates", 
-         response_model=SyncResponse,
+         response_model=SyncUpdatesResponse,
+         response_class=WireFormatResponse,
          tags=["Sincronización"])
-async def get_updates(
+def get_updates(
     last_sync: str = Query("1970-01-01T00:00:00Z", description="Fecha de última sincronización"),
+    cursor: Optional[int] = Query(None, ge=0, description="Último seq recibido (0 la primera vez): usa el change_log"),
     limit: int = Query(100, ge=1, le=500, description="Límite de registros"),
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_read_db)
 ):
     """
     Obtener actualizaciones desde la última sincronización
+
+    Con cursor se leen las entradas del change_log posteriores (altas,
+    modificaciones y lápidas) y se devuelve el cursor siguiente; sin cursor,
+    el modo anterior por fecha de creación, más las lápidas de borrados
+    posteriores a last_sync.
     """
     try:
-        from datetime import datetime
+        if cursor is not None:
+            page = fetch_changes(db, cursor, limit)
+            return SyncUpdatesResponse(
+                message="Resincronización completa requerida" if page.resync_required else "Actualizaciones obtenidas",
+                updates_count=len(page.updates),
+                last_sync=datetime.now().isoformat(),
+                updates=page.updates,
+                cursor=page.cursor,
+                has_more=page.has_more,
+                resync_required=page.resync_required
+            )
+        
         last_sync_dt = datetime.fromisoformat(last_sync.replace('Z', '+00:00'))
         
         updates = [] 
         
         pacientes = db.query(Paciente).filter(
-            Paciente.created_at > last_sync_dt
+            Paciente.created_at > last_sync_dt,
+            Paciente.deleted_at.is_(None)
         ).limit(limit).all()
-        
-        for paciente in pacientes:
-            updates.append({
-                'type': 'paciente',
-                'id': paciente.id,
-                'cedula': paciente.cedula,
-                'nombre': paciente.nombre,
-                'fecha_nacimiento': paciente.fecha_nacimiento,
-                'telefono': paciente.telefono,
-                'direccion': paciente.direccion,
-                'created_at': paciente.created_at.isoformat() if paciente.created_at else None,
-                'action': 'created'
-            })
+        updates.extend(paciente_update(paciente) for paciente in pacientes)
         
         vacunas = db.query(Vacuna).filter(
-            Vacuna.created_at > last_sync_dt
+            Vacuna.created_at > last_sync_dt,
+            Vacuna.deleted_at.is_(None)
         ).limit(limit).all()
+        updates.extend(vacuna_update(vacuna) for vacuna in vacunas)
         
-        for vacuna in vacunas:
-            updates.append({
-                'type': 'vacuna',
-                'id': vacuna.id,
-                'paciente_id': vacuna.paciente_id,
-                'nombre_vacuna': vacuna.nombre_vacuna,
-                'fecha_aplicacion': vacuna.fecha_aplicacion,
-                'lote': vacuna.lote,
-                'proxima_dosis': vacuna.proxima_dosis,
-                'usuario_id': vacuna.usuario_id,
-                'created_at': vacuna.created_at.isoformat() if vacuna.created_at else None,
-                'action': 'created'
-            })
+        # Lápidas de borrados posteriores (hasta que se purguen)
+        for entity, model in (('paciente', Paciente), ('vacuna', Vacuna)):
+            deleted = db.query(model.id, model.deleted_at).filter(
+                model.deleted_at > last_sync_dt
+            ).limit(limit).all()
+            updates.extend(tombstone(entity, row.id, row.deleted_at) for row in deleted)
         
-        return SyncResponse(
+        return SyncUpdatesResponse(
             message="Actualizaciones obtenidas",
             updates_count=len(updates),
             last_sync=datetime.now().isoformat(),
@@ -1121,6 +1561,185 @@ async def debug_token(
         "note": "Ambos métodos son soportados, pero header es más seguro"
     }
 
+@app.get("/api/debug/queries", tags=["Diagnóstico"])
+async def debug_slow_queries(
+    limit: int = Query(50, ge=1, le=1000),
+    admin=Depends(get_admin_user)
+):
+    """
+    Consultas lentas recientes con SQL normalizado, tipos de parámetros
+    y un EXPLAIN muestreado (solo administradores)
+    """
+    return {
+        "threshold_ms": SLOW_QUERY_THRESHOLD_MS,
+        "explain_rate": SLOW_QUERY_EXPLAIN_RATE,
+        "total_slow_queries": slow_query_log.total,
+        "queries": slow_query_log.entries(limit)
+    }
+
+@app.delete("/api/debug/queries", response_model=MessageResponse, tags=["Diagnóstico"])
+async def clear_slow_queries(admin=Depends(get_admin_user)):
+    """
+    Vaciar el registro de consultas lentas (solo administradores)
+    """
+    slow_query_log.clear()
+    return MessageResponse(message="Registro de consultas lentas vaciado")
+
+@app.get("/api/debug/admission", tags=["Diagnóstico"])
+async def debug_admission(admin=Depends(get_admin_user)):
+    """
+    Límites de concurrencia vigentes, peticiones en curso y latencia
+    interactive frente al objetivo (solo administradores)
+    """
+    return admission_controller.snapshot()
+
+@app.get("/api/debug/connections", tags=["Diagnóstico"])
+async def debug_connections(admin=Depends(get_admin_user)):
+    """
+    Despertares recientes de Neon (latencia e inactividad previa), fallos de
+    conexión seguidos y keepalive configurado (solo administradores)
+    """
+    return {
+        "primary": primary_connections.snapshot(),
+        "replica": replica_connections.snapshot(),
+    }
+
+@app.post("/api/debug/profile", tags=["Diagnóstico"])
+async def profile_worker_endpoint(
+    seconds: float = Query(10, gt=0, le=MAX_WORKER_PROFILE_SECONDS),
+    admin=Depends(get_admin_user)
+):
+    """
+    Perfilar todo el worker durante N segundos (solo administradores).
+    Devuelve el id del perfil; las pilas se leen en /api/debug/profiles/{id}.
+    """
+    logger.info(f"🔬 Perfilando worker {os.getpid()} durante {seconds}s")
+    profile_id = await run_in_threadpool(profile_worker, seconds)
+    profile = profile_store.get(profile_id)
+    return {key: value for key, value in profile.items() if key != "collapsed"}
+
+@app.get("/api/debug/profiles", tags=["Diagnóstico"])
+async def list_profiles(admin=Depends(get_admin_user)):
+    """
+    Perfiles guardados, más recientes primero (solo administradores)
+    """
+    return {"profiles": profile_store.list()}
+
+@app.get("/api/debug/profiles/{profile_id}", response_class=PlainTextResponse, tags=["Diagnóstico"])
+async def get_profile(profile_id: str, admin=Depends(get_admin_user)):
+    """
+    Pilas colapsadas del perfil, listas para flamegraph.pl o speedscope
+    """
+    profile = profile_store.get(profile_id)
+    if not profile:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Perfil no encontrado"
+        )
+    return PlainTextResponse(profile["collapsed"])
+
+# ==================== PERFILADO DE MEMORIA ====================
+
+@app.get("/api/debug/memory", tags=["Diagnóstico"])
+async def memory_status(admin=Depends(get_admin_user)):
+    """
+    Estado de tracemalloc y RSS del proceso (solo administradores)
+    """
+    return {**tracemalloc_profiler.status(), "snapshots": tracemalloc_profiler.list_snapshots()}
+
+@app.post("/api/debug/memory/start", tags=["Diagnóstico"])
+async def memory_start(
+    frames: int = Query(1, ge=1, le=50, description="Frames guardados por asignación"),
+    admin=Depends(get_admin_user)
+):
+    """
+    Iniciar el rastreo de asignaciones con tracemalloc (solo administradores)
+    """
+    logger.info(f"🧠 tracemalloc iniciado ({frames} frames)")
+    return tracemalloc_profiler.start(frames)
+
+@app.post("/api/debug/memory/stop", tags=["Diagnóstico"])
+async def memory_stop(admin=Depends(get_admin_user)):
+    """
+    Detener tracemalloc; los snapshots ya tomados se conservan
+    """
+    logger.info("🧠 tracemalloc detenido")
+    return tracemalloc_profiler.stop()
+
+@app.post("/api/debug/memory/snapshots", tags=["Diagnóstico"])
+async def memory_take_snapshot(
+    label: Optional[str] = Query(None, max_length=100),
+    admin=Depends(get_admin_user)
+):
+    """
+    Tomar un snapshot de las asignaciones actuales
+    """
+    try:
+        return await run_in_threadpool(tracemalloc_profiler.take_snapshot, label)
+    except RuntimeError as e:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail=str(e)
+        )
+
+def _memory_group_by(group_by: str) -> str:
+    if group_by not in GROUP_BY_OPTIONS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"group_by debe ser uno de: {', '.join(GROUP_BY_OPTIONS)}"
+        )
+    return group_by
+
+@app.get("/api/debug/memory/snapshots/{snapshot_id}", tags=["Diagnóstico"])
+async def memory_snapshot_top(
+    snapshot_id: int,
+    group_by: str = Query("lineno"),
+    limit: int = Query(30, ge=1, le=500),
+    admin=Depends(get_admin_user)
+):
+    """
+    Mayores consumidores de memoria del snapshot, por archivo o por línea
+    """
+    try:
+        return {
+            "snapshot_id": snapshot_id,
+            "group_by": group_by,
+            "top": await run_in_threadpool(
+                tracemalloc_profiler.top, snapshot_id, _memory_group_by(group_by), limit
+            )
+        }
+    except KeyError:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Snapshot no encontrado"
+        )
+
+@app.get("/api/debug/memory/diff", tags=["Diagnóstico"])
+async def memory_snapshot_diff(
+    from_id: int = Query(..., alias="from"),
+    to_id: int = Query(..., alias="to"),
+    group_by: str = Query("lineno"),
+    limit: int = Query(30, ge=1, le=500),
+    admin=Depends(get_admin_user)
+):
+    """
+    Diferencia entre dos snapshots (crecimiento de memoria por archivo o línea)
+    """
+    try:
+        return {
+            "from": from_id,
+            "to": to_id,
+            "group_by": group_by,
+            "diff": await run_in_threadpool(
+                tracemalloc_profiler.diff, from_id, to_id, _memory_group_by(group_by), limit
+            )
+        }
+    except KeyError:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Snapshot no encontrado"
+        )
+
 # ==================== MANEJO DE ERRORES ====================
 
 from fastapi.responses import JSONResponse
@@ -1357,13 +1976,20 @@ async def verificar_profesional(
 # ==================== EJECUCIÓN ====================
 
 if __name__ == "__main__":
+    # Desarrollo: un solo proceso. En producción usar serve.py (varios workers)
     import uvicorn
     
     port = int(os.environ.get("PORT", 8000))
-    uvicorn.run(
-        app,
-        host="0.0.0.0",
-        port=port,
-        log_level="info",
-        reload=os.environ.get('ENVIRONMENT') == 'development'
-    )
\ No newline at end of file
+    if os.environ.get('ENVIRONMENT') == 'development':
+        # La recarga automática necesita la ruta de importación de la app
+        uvicorn.run("main:app", host="0.0.0.0", port=port, log_level="info", reload=True)
+    else:
+        config = uvicorn.Config(
+            app,
+            host="0.0.0.0",
+            port=port,
+            log_level="info",
+            timeout_graceful_shutdown=int(os.environ.get('GRACEFUL_TIMEOUT', 30))
+        )
+        # El drenaje empieza al llegar SIGTERM, con el socket todavía abierto
+        drain_on_exit(uvicorn.Server(config)).run()
\ No newline at end of file
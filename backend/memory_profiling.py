@@ -0,0 +1,224 @@
+"""
+Perfilado de memoria.
+
+- tracemalloc bajo demanda (endpoints de administrador en /api/debug/memory):
+  iniciar/detener el rastreo, tomar snapshots y compararlos agrupando por
+  archivo o por línea.
+- Pico de RSS del proceso durante cada petición de /api/sync/*: un hilo
+  muestrea el RSS mientras haya peticiones de sincronización en curso y el
+  pico (sobre el RSS al empezar la petición) se publica en /metrics. Es
+  memoria del proceso, no de la petición: con peticiones concurrentes cada
+  una ve también lo que reservan las demás. Para atribuir memoria a código
+  concreto, usar los snapshots de tracemalloc.
+"""
+import os
+import time
+import itertools
+import threading
+import tracemalloc
+from collections import OrderedDict
+from datetime import datetime
+from typing import Dict, List, Optional
+
+from metrics import Histogram, registry
+
+MEMORY_SNAPSHOT_LIMIT = int(os.environ.get('MEMORY_SNAPSHOT_LIMIT', 10))
+MEMORY_SAMPLE_INTERVAL_MS = float(os.environ.get('MEMORY_SAMPLE_INTERVAL_MS', 10))
+GROUP_BY_OPTIONS = ("lineno", "filename", "traceback")
+
+sync_process_rss_peak = registry.register(Histogram(
+    "healthshield_sync_process_rss_peak_bytes",
+    "Pico de RSS del proceso (incluye peticiones concurrentes) por encima del inicial, "
+    "observado durante cada petición de sincronización", ("route",),
+    buckets=tuple(mb * 1024 * 1024 for mb in (1, 5, 10, 25, 50, 100, 250, 500, 1000))))
+
+_PAGE_SIZE = os.sysconf("SC_PAGE_SIZE") if hasattr(os, "sysconf") else 4096
+
+
+def current_rss() -> Optional[int]:
+    """RSS actual del proceso en bytes (Linux); None si no se puede leer"""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * _PAGE_SIZE
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+# ==================== TRACEMALLOC ====================
+
+class TracemallocProfiler:
+    """Snapshots de tracemalloc guardados en memoria (los más recientes)"""
+
+    _FILTERS = (
+        tracemalloc.Filter(False, tracemalloc.__file__),
+        tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+        tracemalloc.Filter(False, "<frozen importlib._bootstrap_external>"),
+        tracemalloc.Filter(False, "<unknown>"),
+    )
+
+    def __init__(self, max_snapshots: int = MEMORY_SNAPSHOT_LIMIT):
+        self.max_snapshots = max_snapshots
+        self._snapshots: "OrderedDict[int, dict]" = OrderedDict()
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def status() -> dict:
+        tracing = tracemalloc.is_tracing()
+        current, peak = tracemalloc.get_traced_memory() if tracing else (0, 0)
+        return {
+            "tracing": tracing,
+            "frames": tracemalloc.get_traceback_limit() if tracing else None,
+            "traced_current_bytes": current,
+            "traced_peak_bytes": peak,
+            "tracemalloc_overhead_bytes": tracemalloc.get_tracemalloc_memory() if tracing else 0,
+            "rss_bytes": current_rss(),
+        }
+
+    def start(self, frames: int = 1) -> dict:
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(frames)
+        return self.status()
+
+    def stop(self) -> dict:
+        if tracemalloc.is_tracing():
+            tracemalloc.stop()
+        # Los snapshots guardados siguen disponibles para comparar
+        return self.status()
+
+    def take_snapshot(self, label: Optional[str] = None) -> dict:
+        if not tracemalloc.is_tracing():
+            raise RuntimeError("tracemalloc no está activo")
+        snapshot = tracemalloc.take_snapshot().filter_traces(self._FILTERS)
+        snapshot_id = next(self._ids)
+        info = {
+            "id": snapshot_id,
+            "label": label,
+            "created_at": datetime.now().isoformat(),
+            "traced_bytes": sum(stat.size for stat in snapshot.statistics("filename")),
+            "rss_bytes": current_rss(),
+        }
+        with self._lock:
+            self._snapshots[snapshot_id] = {"info": info, "snapshot": snapshot}
+            while len(self._snapshots) > self.max_snapshots:
+                self._snapshots.popitem(last=False)
+        return info
+
+    def list_snapshots(self) -> List[dict]:
+        with self._lock:
+            return [entry["info"] for entry in self._snapshots.values()]
+
+    def _get(self, snapshot_id: int):
+        with self._lock:
+            entry = self._snapshots.get(snapshot_id)
+        if entry is None:
+            raise KeyError(snapshot_id)
+        return entry["snapshot"]
+
+    @staticmethod
+    def _location(stat) -> str:
+        frame = stat.traceback[0]
+        return f"{frame.filename}:{frame.lineno}"
+
+    def top(self, snapshot_id: int, group_by: str = "lineno", limit: int = 30) -> List[dict]:
+        stats = self._get(snapshot_id).statistics(group_by)
+        return [
+            {
+                "location": self._location(stat),
+                "traceback": stat.traceback.format() if group_by == "traceback" else None,
+                "size_bytes": stat.size,
+                "count": stat.count,
+            }
+            for stat in stats[:limit]
+        ]
+
+    def diff(self, from_id: int, to_id: int, group_by: str = "lineno", limit: int = 30) -> List[dict]:
+        stats = self._get(to_id).compare_to(self._get(from_id), group_by)
+        return [
+            {
+                "location": self._location(stat),
+                "traceback": stat.traceback.format() if group_by == "traceback" else None,
+                "size_diff_bytes": stat.size_diff,
+                "size_bytes": stat.size,
+                "count_diff": stat.count_diff,
+                "count": stat.count,
+            }
+            for stat in stats[:limit]
+        ]
+
+
+tracemalloc_profiler = TracemallocProfiler()
+
+
+# ==================== PICO DE MEMORIA POR PETICIÓN ====================
+
+class _RssSampler:
+    """Un único hilo que muestrea el RSS mientras haya peticiones activas"""
+
+    def __init__(self, interval: float):
+        self.interval = interval
+        self._active: Dict[int, List[int]] = {}  # id → [rss inicial, rss máximo]
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def _run(self):
+        while True:
+            self._wakeup.wait()
+            while True:
+                rss = current_rss()
+                with self._lock:
+                    if not self._active:
+                        self._wakeup.clear()
+                        break
+                    for window in self._active.values():
+                        if rss is not None and rss > window[1]:
+                            window[1] = rss
+                time.sleep(self.interval)
+
+    def begin(self, request_id: int) -> bool:
+        rss = current_rss()
+        if rss is None:
+            return False
+        with self._lock:
+            self._active[request_id] = [rss, rss]
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="rss-sampler", daemon=True)
+                self._thread.start()
+        self._wakeup.set()
+        return True
+
+    def end(self, request_id: int) -> int:
+        rss = current_rss() or 0
+        with self._lock:
+            start, peak = self._active.pop(request_id)
+        return max(peak, rss) - start
+
+
+_rss_sampler = _RssSampler(MEMORY_SAMPLE_INTERVAL_MS / 1000)
+_request_ids = itertools.count()
+
+
+class SyncMemoryMiddleware:
+    """Publica en /metrics el pico de RSS del proceso observado durante cada petición bajo `prefix`"""
+
+    def __init__(self, app, prefix: str = "/api/sync/"):
+        self.app = app
+        self.prefix = prefix
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not scope["path"].startswith(self.prefix):
+            await self.app(scope, receive, send)
+            return
+
+        request_id = next(_request_ids)
+        if not _rss_sampler.begin(request_id):
+            await self.app(scope, receive, send)
+            return
+
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            peak = _rss_sampler.end(request_id)
+            route = getattr(scope.get("route"), "path", None) or "unmatched"
+            sync_process_rss_peak.observe(peak, route)
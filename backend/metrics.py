@@ -0,0 +1,393 @@
+"""
+Métricas de la API en formato de exposición de Prometheus (GET /metrics).
+
+- Latencia por ruta (histograma), códigos de estado y peticiones en curso,
+  medidos por MetricsMiddleware.
+- Tiempo de base de datos y número de consultas por petición, medidos con
+  los eventos before/after_cursor_execute de SQLAlchemy.
+- Latencia de las consultas al SACS y tamaño de los lotes de sincronización.
+
+Sin dependencias externas: contadores en memoria protegidos por un lock y
+renderizados a texto solo cuando se consulta /metrics. Con varios workers
+(serve.py) cada uno vuelca su registro a METRICS_MULTIPROC_DIR y /metrics
+devuelve la suma.
+"""
+import os
+import json
+import time
+import bisect
+import contextvars
+import threading
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+PROMETHEUS_CONTENT_TYPE = "text/plain; version=0.0.4"
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+DB_QUERY_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 500)
+BATCH_BUCKETS = (1, 10, 50, 100, 500, 1000, 5000, 10000, 50000)
+
+
+# ==================== PRIMITIVAS ====================
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    parts = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+class _Metric:
+    kind = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def header(self) -> List[str]:
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, name, documentation, labelnames=()):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, *labels: str, amount: float = 1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def samples(self) -> Dict[Tuple[str, ...], float]:
+        with self._lock:
+            return dict(self._values)
+
+    def merge(self, merged: Dict, samples: Dict):
+        for labels, value in samples.items():
+            merged[labels] = merged.get(labels, 0) + value
+
+    def render(self, samples: Optional[Dict] = None) -> List[str]:
+        lines = self.header()
+        for labels, value in sorted((self.samples() if samples is None else samples).items()):
+            lines.append(f"{self.name}{_format_labels(self.labelnames, labels)} {_format_value(value)}")
+        return lines
+
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def dec(self, *labels: str, amount: float = 1):
+        self.inc(*labels, amount=-amount)
+
+    def set(self, *labels: str, value: float):
+        with self._lock:
+            self._values[labels] = value
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets: Iterable[float] = LATENCY_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # labels → [conteo por bucket..., +Inf, suma]
+        self._values: Dict[Tuple[str, ...], List[float]] = {}
+
+    def observe(self, value: float, *labels: str):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._values.get(labels)
+            if series is None:
+                series = self._values[labels] = [0] * (len(self.buckets) + 2)
+            series[index] += 1
+            series[-1] += value
+
+    def samples(self) -> Dict[Tuple[str, ...], List[float]]:
+        with self._lock:
+            return {labels: list(series) for labels, series in self._values.items()}
+
+    def merge(self, merged: Dict, samples: Dict):
+        for labels, series in samples.items():
+            current = merged.setdefault(labels, [0] * len(series))
+            for i, value in enumerate(series):
+                current[i] += value
+
+    def render(self, samples: Optional[Dict] = None) -> List[str]:
+        lines = self.header()
+        for labels, series in sorted((self.samples() if samples is None else samples).items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), series[:-1]):
+                cumulative += count
+                le = f'le="{_format_value(bound)}"'
+                lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, labels, le)} {cumulative}")
+            label_text = _format_labels(self.labelnames, labels)
+            lines.append(f"{self.name}_sum{label_text} {_format_value(series[-1])}")
+            lines.append(f"{self.name}_count{label_text} {cumulative}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: List[_Metric] = []
+
+    def register(self, metric: _Metric) -> _Metric:
+        self._metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        lines: List[str] = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+    def snapshot(self) -> Dict[str, list]:
+        """Valores actuales serializables en JSON: {métrica: [[labels, valor], ...]}"""
+        return {metric.name: [[list(labels), value] for labels, value in metric.samples().items()]
+                for metric in self._metrics}
+
+    def render_merged(self, snapshots: Iterable[Tuple[Dict[str, list], bool]]) -> str:
+        """
+        Renderizar la suma de varios snapshots (uno por worker). Los gauges
+        solo suman workers vivos; contadores e histogramas también los de
+        workers terminados, para que nunca retrocedan.
+        """
+        merged: Dict[str, Dict] = {metric.name: {} for metric in self._metrics}
+        by_name = {metric.name: metric for metric in self._metrics}
+        for snapshot, alive in snapshots:
+            for name, samples in snapshot.items():
+                metric = by_name.get(name)
+                if metric is None or (metric.kind == "gauge" and not alive):
+                    continue
+                metric.merge(merged[name], {tuple(labels): value for labels, value in samples})
+        lines: List[str] = []
+        for metric in self._metrics:
+            lines.extend(metric.render(merged[metric.name]))
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+http_requests_total = registry.register(Counter(
+    "healthshield_http_requests_total", "Peticiones HTTP atendidas", ("method", "route", "status")))
+http_request_duration = registry.register(Histogram(
+    "healthshield_http_request_duration_seconds", "Latencia de las peticiones HTTP", ("method", "route")))
+http_requests_in_flight = registry.register(Gauge(
+    "healthshield_http_requests_in_flight", "Peticiones HTTP en curso"))
+db_time_per_request = registry.register(Histogram(
+    "healthshield_db_time_per_request_seconds", "Tiempo en base de datos por petición", ("method", "route")))
+db_queries_per_request = registry.register(Histogram(
+    "healthshield_db_queries_per_request", "Consultas SQL por petición", ("method", "route"),
+    buckets=DB_QUERY_BUCKETS))
+db_queries_total = registry.register(Counter(
+    "healthshield_db_queries_total", "Consultas SQL ejecutadas"))
+db_query_duration = registry.register(Histogram(
+    "healthshield_db_query_duration_seconds", "Duración de cada consulta SQL"))
+sacs_request_duration = registry.register(Histogram(
+    "healthshield_sacs_request_duration_seconds", "Latencia de las consultas al SACS", ("outcome",)))
+sync_batch_records = registry.register(Histogram(
+    "healthshield_sync_batch_records", "Registros por lote de sincronización", ("endpoint", "kind"),
+    buckets=BATCH_BUCKETS))
+
+
+# ==================== TIEMPO DE BASE DE DATOS POR PETICIÓN ====================
+
+class RequestStats:
+    """Acumulador mutable por petición (se comparte con el threadpool vía contextvars)"""
+    __slots__ = ("db_time", "db_queries")
+
+    def __init__(self):
+        self.db_time = 0.0
+        self.db_queries = 0
+
+
+_request_stats: contextvars.ContextVar[Optional[RequestStats]] = contextvars.ContextVar(
+    "request_stats", default=None
+)
+
+
+# Otros módulos que necesitan la duración de cada consulta (registro de
+# consultas lentas en database.py) se suscriben aquí en lugar de medirla de nuevo
+_query_observers: List[Callable] = []
+
+
+def add_query_observer(observer: Callable):
+    """observer(conn, cursor, statement, parameters, executemany, elapsed) tras cada consulta"""
+    _query_observers.append(observer)
+
+
+@event.listens_for(Engine, "before_cursor_execute")
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("query_start_time", []).append(time.perf_counter())
+
+
+@event.listens_for(Engine, "after_cursor_execute")
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    start_times = conn.info.get("query_start_time")
+    if not start_times:
+        return
+    elapsed = time.perf_counter() - start_times.pop()
+
+    db_queries_total.inc()
+    db_query_duration.observe(elapsed)
+
+    stats = _request_stats.get()
+    if stats is not None:
+        stats.db_time += elapsed
+        stats.db_queries += 1
+
+    for observer in _query_observers:
+        observer(conn, cursor, statement, parameters, executemany, elapsed)
+
+
+def current_request_stats() -> Optional[RequestStats]:
+    return _request_stats.get()
+
+
+# ==================== HELPERS ====================
+
+def observe_sacs(seconds: float, outcome: str):
+    """Registrar una consulta al SACS (outcome: ok, http_error, timeout, connection_error)"""
+    sacs_request_duration.observe(seconds, outcome)
+
+
+def observe_sync_batch(endpoint: str, kind: str, records: int):
+    """Registrar el tamaño de un lote de sincronización"""
+    sync_batch_records.observe(records, endpoint, kind)
+
+
+def _route_name(scope) -> str:
+    """Ruta plantilla; las rutas no encontradas se agrupan para acotar la cardinalidad"""
+    route = scope.get("route")
+    return getattr(route, "path", None) or "unmatched"
+
+
+# ==================== VARIOS WORKERS ====================
+
+# Con serve.py cada worker escribe su snapshot en METRICS_MULTIPROC_DIR y
+# /metrics (en cualquier worker) devuelve la suma de todos.
+METRICS_MULTIPROC_DIR = os.environ.get('METRICS_MULTIPROC_DIR')
+METRICS_FLUSH_SECONDS = float(os.environ.get('METRICS_FLUSH_SECONDS', 1))
+
+
+def worker_snapshot_path(directory: str, pid: int, alive: bool = True) -> str:
+    return os.path.join(directory, f"{'worker' if alive else 'dead'}-{pid}.json")
+
+
+def write_worker_snapshot(directory: str = None):
+    directory = directory or METRICS_MULTIPROC_DIR
+    path = worker_snapshot_path(directory, os.getpid())
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(registry.snapshot(), f)
+    os.replace(tmp_path, path)
+
+
+def read_worker_snapshots(directory: str, exclude_pid: int = None):
+    """(snapshot, vivo) de cada worker; ignora archivos a medio escribir"""
+    for filename in os.listdir(directory):
+        if not filename.endswith(".json"):
+            continue
+        kind, _, pid = filename[:-5].partition("-")
+        if kind not in ("worker", "dead") or (exclude_pid is not None and pid == str(exclude_pid)):
+            continue
+        try:
+            with open(os.path.join(directory, filename)) as f:
+                yield json.load(f), kind == "worker"
+        except (OSError, ValueError):
+            continue
+
+
+class WorkerMetricsExporter:
+    """Hilo que vuelca el registro de este worker a disco cada METRICS_FLUSH_SECONDS"""
+
+    def __init__(self, directory: str, interval: float = METRICS_FLUSH_SECONDS):
+        self.directory = directory
+        self.interval = interval
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                write_worker_snapshot(self.directory)
+            except OSError:
+                pass
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="metrics-exporter", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        if self._thread is None:
+            return
+        self._stop.set()
+        self._thread.join()
+        self._thread = None
+        write_worker_snapshot(self.directory)
+
+
+def render_metrics() -> str:
+    if not METRICS_MULTIPROC_DIR or not os.path.isdir(METRICS_MULTIPROC_DIR):
+        return registry.render()
+    # El propio worker aporta sus valores en vivo, no los del último volcado
+    snapshots = list(read_worker_snapshots(METRICS_MULTIPROC_DIR, exclude_pid=os.getpid()))
+    snapshots.append((registry.snapshot(), True))
+    return registry.render_merged(snapshots)
+
+
+# ==================== MIDDLEWARE ====================
+
+class MetricsMiddleware:
+    """Middleware ASGI que mide latencia, estado, peticiones en curso y tiempo de DB"""
+
+    def __init__(self, app, exclude_paths: Sequence[str] = ("/metrics",)):
+        self.app = app
+        self.exclude_paths = frozenset(exclude_paths)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"] in self.exclude_paths:
+            await self.app(scope, receive, send)
+            return
+
+        stats = RequestStats()
+        token = _request_stats.set(stats)
+        status_holder = {"status": 500}
+
+        async def send_with_status(message):
+            if message["type"] == "http.response.start":
+                status_holder["status"] = message["status"]
+            await send(message)
+
+        http_requests_in_flight.inc()
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            elapsed = time.perf_counter() - start
+            http_requests_in_flight.dec()
+            _request_stats.reset(token)
+
+            method = scope.get("method", "GET")
+            route = _route_name(scope)
+            http_requests_total.inc(method, route, str(status_holder["status"]))
+            http_request_duration.observe(elapsed, method, route)
+            db_time_per_request.observe(stats.db_time, method, route)
+            db_queries_per_request.observe(stats.db_queries, method, route)
@@ -1,6 +1,8 @@
-from sqlalchemy import Column, Integer, String, Boolean, DateTime, ForeignKey, Text
+from sqlalchemy import (
+    BigInteger, Column, Integer, String, Boolean, DateTime, ForeignKey, Index, Sequence, Text, UniqueConstraint
+)
 from sqlalchemy.orm import relationship
-from sqlalchemy.sql import func
+from sqlalchemy.sql import func, text
 from database import Base
 from pydantic import BaseModel, EmailStr, field_validator, ConfigDict
 from typing import Optional, List, Dict, Any
@@ -41,6 +43,16 @@ class Paciente(Base):
     is_synced = Column(Boolean, default=False)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     updated_at = Column(DateTime(timezone=True), onupdate=func.now())
+    deleted_at = Column(DateTime(timezone=True), nullable=True)  # Borrado lógico: lápida para sync
+    
+    __table_args__ = (
+        # Listado paginado de pacientes vigentes (la cédula ya tiene su índice único)
+        Index('ix_pacientes_id_activos', 'id',
+              postgresql_where=text('deleted_at IS NULL'), sqlite_where=text('deleted_at IS NULL')),
+        # Solo las lápidas: purge_tombstones (change_log.py) borra por deleted_at
+        Index('ix_pacientes_eliminados', 'deleted_at',
+              postgresql_where=text('deleted_at IS NOT NULL'), sqlite_where=text('deleted_at IS NOT NULL')),
+    )
     
     # 🔥 IMPORTANTE: ELIMINAR esta relación completamente
     # vacunas = relationship("Vacuna", back_populates="paciente")  # ← COMENTAR O ELIMINAR
@@ -70,11 +82,98 @@ class Vacuna(Base):
     
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     updated_at = Column(DateTime(timezone=True), onupdate=func.now())
+    deleted_at = Column(DateTime(timezone=True), nullable=True)  # Borrado lógico: lápida para sync
+    
+    __table_args__ = (
+        # Vacunas de un paciente: solo las vigentes
+        Index('ix_vacunas_paciente_activas', 'paciente_id',
+              postgresql_where=text('deleted_at IS NULL'), sqlite_where=text('deleted_at IS NULL')),
+        # Solo las lápidas: purge_tombstones (change_log.py) borra por deleted_at
+        Index('ix_vacunas_eliminadas', 'deleted_at',
+              postgresql_where=text('deleted_at IS NOT NULL'), sqlite_where=text('deleted_at IS NOT NULL')),
+    )
     
     # 🔥 IMPORTANTE: ELIMINAR esta relación
     # paciente = relationship("Paciente", back_populates="vacunas")  # ← COMENTAR O ELIMINAR
     usuario = relationship("Usuario", back_populates="vacunas")
 
+class SyncSession(Base):
+    """Sesión de sincronización por partes (begin → chunks → commit)"""
+    __tablename__ = 'sync_sessions'
+    
+    id = Column(String(36), primary_key=True)
+    usuario_id = Column(Integer, ForeignKey('usuarios.id'), nullable=False, index=True)
+    status = Column(String(20), default='open', nullable=False)  # open | committed | aborted
+    total_chunks = Column(Integer, nullable=True)
+    last_chunk = Column(Integer, default=-1, nullable=False)  # Último chunk contiguo confirmado
+    last_sync_client = Column(String(50))
+    result = Column(Text)  # Respuesta del commit (JSON) para reintentos
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    updated_at = Column(DateTime(timezone=True), onupdate=func.now())
+    committed_at = Column(DateTime(timezone=True))
+    
+    chunks = relationship("SyncChunk", back_populates="session", cascade="all, delete-orphan",
+                          order_by="SyncChunk.chunk_index")
+
+class SyncChunk(Base):
+    """Parte validada y preparada (staging) de una sesión de sincronización"""
+    __tablename__ = 'sync_chunks'
+    __table_args__ = (UniqueConstraint('session_id', 'chunk_index', name='uq_sync_chunk'),)
+    
+    id = Column(Integer, primary_key=True, index=True)
+    session_id = Column(String(36), ForeignKey('sync_sessions.id', ondelete='CASCADE'), nullable=False, index=True)
+    chunk_index = Column(Integer, nullable=False)
+    payload = Column(Text, nullable=False)  # BulkSyncData validado, en JSON
+    pacientes_count = Column(Integer, default=0)
+    vacunas_count = Column(Integer, default=0)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    
+    session = relationship("SyncSession", back_populates="chunks")
+
+class IdempotencyKey(Base):
+    """Clave de idempotencia por ámbito (usuario + endpoint) y su respuesta guardada"""
+    __tablename__ = 'idempotency_keys'
+    __table_args__ = (UniqueConstraint('scope', 'key', name='uq_idempotency_scope_key'),)
+    
+    id = Column(Integer, primary_key=True)
+    scope = Column(String(120), nullable=False)
+    key = Column(String(255), nullable=False)
+    fingerprint = Column(String(64), nullable=False)  # SHA-256 del cuerpo
+    status_code = Column(Integer, nullable=True)  # NULL = en proceso
+    response = Column(Text, nullable=True)  # JSON de la respuesta exitosa
+    created_at = Column(DateTime(timezone=True), nullable=False)
+    expires_at = Column(DateTime(timezone=True), nullable=False, index=True)
+
+# Secuencia de change_log.seq en PostgreSQL (en SQLite seq = id)
+CHANGE_LOG_SEQUENCE = Sequence('change_log_seq', metadata=Base.metadata)
+
+class ChangeLog(Base):
+    """Registro append-only de cambios en pacientes y vacunas (ver change_log.py)"""
+    __tablename__ = 'change_log'
+    __table_args__ = (
+        Index('ix_change_log_entity', 'entity', 'entity_id', 'seq'),
+        # Filas aún sin numerar: transacciones en curso o recién confirmadas
+        Index('ix_change_log_unsequenced', 'id',
+              postgresql_where=text('seq IS NULL'), sqlite_where=text('seq IS NULL')),
+        {'sqlite_autoincrement': True},  # seq = id en SQLite: los id no se reutilizan tras compactar
+    )
+    
+    id = Column(BigInteger().with_variant(Integer, 'sqlite'), primary_key=True, autoincrement=True)
+    seq = Column(BigInteger, unique=True, nullable=True)  # Orden de commit: cursor de /api/sync/updates
+    entity = Column(String(20), nullable=False)  # paciente | vacuna
+    entity_id = Column(Integer, nullable=False)
+    action = Column(String(10), nullable=False)  # created | updated | deleted
+    changed_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
+
+class ChangeLogCompaction(Base):
+    """Compactaciones del change_log: cursores menores a compacted_through deben resincronizar"""
+    __tablename__ = 'change_log_compactions'
+    
+    id = Column(Integer, primary_key=True)
+    compacted_through = Column(BigInteger, nullable=False)
+    removed = Column(Integer, default=0, nullable=False)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+
 # ==================== PYDANTIC SCHEMAS ====================
 
 class UsuarioBase(BaseModel):
@@ -305,8 +404,55 @@ class BulkSyncResponse(BaseModel):
     pacientes_ids: Dict[str, Any]
     vacunas_ids: Dict[str, Any]
     conflicts: Optional[List[Dict[str, Any]]] = None
+    conflicts_count: Optional[int] = None  # Total; conflicts lista como mucho SYNC_MAX_REPORTED_CONFLICTS
     server_timestamp: str
 
+class SyncSessionCreate(BaseModel):
+    model_config = ConfigDict(from_attributes=True)
+    
+    total_chunks: Optional[int] = None
+    last_sync_client: Optional[str] = None
+    
+    @field_validator('total_chunks')
+    @classmethod
+    def validate_total_chunks(cls, v):
+        if v is not None and v < 1:
+            raise ValueError('total_chunks debe ser al menos 1')
+        return v
+
+class SyncSessionResponse(BaseModel):
+    model_config = ConfigDict(from_attributes=True)
+    
+    session_id: str
+    status: str
+    total_chunks: Optional[int] = None
+    last_chunk: int = -1
+    next_chunk: int = 0
+    chunks_received: List[int] = []
+    created_at: Optional[str] = None
+
+class SyncChunkResponse(BaseModel):
+    model_config = ConfigDict(from_attributes=True)
+    
+    message: str
+    session_id: str
+    chunk_index: int
+    pacientes: int = 0
+    vacunas: int = 0
+    last_chunk: int = -1
+    next_chunk: int = 0
+
+class SyncUpdatesResponse(BaseModel):
+    model_config = ConfigDict(from_attributes=True)
+    
+    message: str
+    updates_count: int = 0
+    last_sync: str
+    updates: List[Dict[str, Any]] = []
+    cursor: Optional[int] = None  # Solo con ?cursor=: pasar en la próxima petición
+    has_more: bool = False
+    resync_required: bool = False
+
 class ClientSyncData(BaseModel):
     model_config = ConfigDict(from_attributes=True)
     
@@ -0,0 +1,212 @@
+"""
+Conexiones a Neon con compute que se suspende por inactividad.
+
+- Reintentos: cada conexión nueva (NullPool: una por sesión) que falla con
+  OperationalError se reintenta hasta NEON_CONNECT_RETRIES veces con backoff
+  exponencial y jitter completo (NEON_RETRY_BASE_SECONDS, tope
+  NEON_RETRY_MAX_SECONDS), así el primer acceso tras una suspensión espera
+  a que el compute despierte en lugar de fallar.
+- Despertares: una conexión que necesitó reintentos o tardó más de
+  NEON_WAKEUP_THRESHOLD_MS se registra como despertar, con su latencia y los
+  segundos de inactividad previos (/metrics y /api/debug/connections). Con
+  eso se elige NEON_KEEPALIVE_SECONDS frente al autosuspend de Neon.
+- Keepalive opcional: con NEON_KEEPALIVE_SECONDS > 0, una tarea en segundo
+  plano hace SELECT 1 si no hubo actividad en ese intervalo.
+- Recreación: tras NEON_RECREATE_AFTER_FAILURES conexiones fallidas seguidas
+  (con los reintentos agotados) el engine se marca como vencido y
+  database.get_engine() crea uno nuevo. Si crear el engine falló, se vuelve
+  a intentar cada NEON_ENGINE_RETRY_SECONDS, sin reiniciar el proceso.
+"""
+import os
+import time
+import random
+import asyncio
+import logging
+import threading
+from collections import deque
+from typing import Callable, Optional
+
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import event, text
+
+from metrics import Counter, Histogram, registry
+
+logger = logging.getLogger(__name__)
+
+NEON_CONNECT_TIMEOUT = int(os.environ.get('NEON_CONNECT_TIMEOUT', 15))
+NEON_CONNECT_RETRIES = int(os.environ.get('NEON_CONNECT_RETRIES', 4))
+NEON_RETRY_BASE_SECONDS = float(os.environ.get('NEON_RETRY_BASE_SECONDS', 0.5))
+NEON_RETRY_MAX_SECONDS = float(os.environ.get('NEON_RETRY_MAX_SECONDS', 8))
+NEON_WAKEUP_THRESHOLD_MS = float(os.environ.get('NEON_WAKEUP_THRESHOLD_MS', 1000))
+NEON_KEEPALIVE_SECONDS = float(os.environ.get('NEON_KEEPALIVE_SECONDS', 0))
+NEON_RECREATE_AFTER_FAILURES = int(os.environ.get('NEON_RECREATE_AFTER_FAILURES', 3))
+NEON_ENGINE_RETRY_SECONDS = float(os.environ.get('NEON_ENGINE_RETRY_SECONDS', 30))
+
+IDLE_BUCKETS = (10, 30, 60, 120, 300, 600, 900, 1800, 3600, 7200, 14400, 86400)
+
+db_connect_duration = registry.register(Histogram(
+    "healthshield_db_connect_seconds", "Tiempo hasta obtener una conexión nueva (con reintentos)",
+    ("role", "outcome")))
+db_connect_retries = registry.register(Counter(
+    "healthshield_db_connect_retries_total", "Reintentos de conexión por error operacional", ("role",)))
+db_wakeup_duration = registry.register(Histogram(
+    "healthshield_db_wakeup_seconds", "Latencia de las conexiones que despertaron el compute", ("role",)))
+db_idle_before_wakeup = registry.register(Histogram(
+    "healthshield_db_idle_before_wakeup_seconds", "Inactividad previa a cada despertar", ("role",),
+    buckets=IDLE_BUCKETS))
+db_engine_recreations = registry.register(Counter(
+    "healthshield_db_engine_recreations_total", "Engines recreados sin reiniciar el proceso", ("role", "reason")))
+db_keepalive_total = registry.register(Counter(
+    "healthshield_db_keepalive_total", "Pings de keepalive por resultado", ("role", "outcome")))
+
+
+def backoff_delay(attempt: int, base: float = NEON_RETRY_BASE_SECONDS, cap: float = NEON_RETRY_MAX_SECONDS) -> float:
+    """Jitter completo: uniforme entre 0 y min(tope, base·2^intento)"""
+    return random.uniform(0, min(cap, base * (2 ** attempt)))
+
+
+class ConnectionManager:
+    """Reintentos, despertares, keepalive y vencimiento del engine de un rol (primary/replica)"""
+
+    def __init__(self, role: str, retries: int = NEON_CONNECT_RETRIES,
+                 recreate_after: int = NEON_RECREATE_AFTER_FAILURES,
+                 keepalive_seconds: float = NEON_KEEPALIVE_SECONDS):
+        self.role = role
+        self.retries = retries
+        self.recreate_after = recreate_after
+        self.keepalive_seconds = keepalive_seconds
+        self.last_activity: Optional[float] = None
+        self.consecutive_failures = 0
+        self.stale = False
+        self.engine_failed_at: Optional[float] = None
+        self.wakeups = deque(maxlen=50)
+        self._lock = threading.Lock()
+        self._task: Optional[asyncio.Task] = None
+
+    # ---------- engine ----------
+
+    def instrument(self, engine):
+        event.listen(engine, "do_connect", self._do_connect)
+        event.listen(engine, "checkin", self._touch)
+        return engine
+
+    def should_rebuild(self, engine) -> bool:
+        if engine is None:
+            return (self.engine_failed_at is not None
+                    and time.monotonic() - self.engine_failed_at >= NEON_ENGINE_RETRY_SECONDS)
+        return self.stale
+
+    def engine_created(self, engine, retryable: bool):
+        """Resultado de crear el engine; retryable=False si falta la configuración"""
+        with self._lock:
+            self.engine_failed_at = time.monotonic() if engine is None and retryable else None
+            self.stale = False
+            self.consecutive_failures = 0
+
+    def engine_rebuilt(self, reason: str):
+        db_engine_recreations.inc(self.role, reason)
+        logger.warning(f"♻️  Engine {self.role} recreado ({reason})")
+
+    # ---------- conexiones ----------
+
+    def _touch(self, *args):
+        self.last_activity = time.monotonic()
+
+    def _do_connect(self, dialect, conn_rec, cargs, cparams):
+        operational_error = getattr(dialect.loaded_dbapi, "OperationalError", Exception)
+        idle = time.monotonic() - self.last_activity if self.last_activity is not None else None
+        start = time.perf_counter()
+        attempt = 0
+        while True:
+            try:
+                connection = dialect.connect(*cargs, **cparams)
+                break
+            except operational_error as e:
+                if attempt >= self.retries:
+                    self._connect_failed(time.perf_counter() - start, e)
+                    raise
+                delay = backoff_delay(attempt)
+                attempt += 1
+                db_connect_retries.inc(self.role)
+                logger.warning(f"🔁 Conexión {self.role} falló (intento {attempt}/{self.retries}), "
+                               f"reintento en {delay:.2f}s: {str(e).strip()[:120]}")
+                time.sleep(delay)
+
+        elapsed = time.perf_counter() - start
+        db_connect_duration.observe(elapsed, self.role, "retried" if attempt else "ok")
+        with self._lock:
+            self.consecutive_failures = 0
+        if attempt or elapsed * 1000 >= NEON_WAKEUP_THRESHOLD_MS:
+            self._record_wakeup(elapsed, idle, attempt)
+        self._touch()
+        return connection
+
+    def _connect_failed(self, elapsed: float, error: Exception):
+        db_connect_duration.observe(elapsed, self.role, "failed")
+        with self._lock:
+            self.consecutive_failures += 1
+            if self.consecutive_failures >= self.recreate_after and not self.stale:
+                self.stale = True
+                logger.error(f"❌ {self.consecutive_failures} conexiones {self.role} fallidas seguidas: "
+                             f"se recreará el engine ({str(error).strip()[:120]})")
+
+    def _record_wakeup(self, elapsed: float, idle: Optional[float], retries: int):
+        db_wakeup_duration.observe(elapsed, self.role)
+        if idle is not None:
+            db_idle_before_wakeup.observe(idle, self.role)
+        self.wakeups.append({
+            "at": time.time(),
+            "latency_ms": round(elapsed * 1000, 1),
+            "idle_seconds": round(idle, 1) if idle is not None else None,
+            "retries": retries,
+        })
+        idle_text = f" tras {idle:.0f}s inactivo" if idle is not None else ""
+        logger.info(f"⏰ Base de datos {self.role} despertó en {elapsed * 1000:.0f} ms{idle_text} ({retries} reintentos)")
+
+    def snapshot(self) -> dict:
+        return {
+            "role": self.role,
+            "idle_seconds": round(time.monotonic() - self.last_activity, 1) if self.last_activity else None,
+            "consecutive_failures": self.consecutive_failures,
+            "stale": self.stale,
+            "keepalive_seconds": self.keepalive_seconds,
+            "wakeups": list(self.wakeups),
+        }
+
+    # ---------- keepalive ----------
+
+    def _ping(self, engine):
+        try:
+            with engine.connect() as conn:
+                conn.execute(text("SELECT 1"))
+            db_keepalive_total.inc(self.role, "ok")
+        except Exception as e:
+            db_keepalive_total.inc(self.role, "error")
+            logger.warning(f"⚠️  Keepalive {self.role} falló: {e}")
+
+    async def _keepalive_loop(self, get_engine: Callable):
+        while True:
+            await asyncio.sleep(min(self.keepalive_seconds / 2, 30))
+            if self.last_activity is not None and time.monotonic() - self.last_activity < self.keepalive_seconds:
+                continue
+            engine = await run_in_threadpool(get_engine)
+            if engine is not None:
+                await run_in_threadpool(self._ping, engine)
+
+    def start(self, get_engine: Callable):
+        if self._task is None and self.keepalive_seconds > 0:
+            self._task = asyncio.get_running_loop().create_task(self._keepalive_loop(get_engine))
+
+    async def stop(self):
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+
+primary_connections = ConnectionManager("primary")
+replica_connections = ConnectionManager("replica")
@@ -1,4 +1,6 @@
 # validar_profesional.py
+import os
+import logging
 import requests
 import re
 import json
@@ -8,6 +10,10 @@ import time
 from typing import Dict, Any, Optional, List
 from datetime import datetime
 
+from metrics import observe_sacs
+
+logger = logging.getLogger(__name__)
+
 # Desactivar warnings de SSL
 urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
 
@@ -17,7 +23,8 @@ class ProfesionalValidator:
     Consulta el sistema: https://sistemas.sacs.gob.ve/consultas/prfsnal_salud
     """
     
-    BASE_URL = "https://sistemas.sacs.gob.ve/consultas/prfsnal_salud"
+    # SACS_BASE_URL permite apuntar a un SACS simulado (benchmarks/fake_sacs.py)
+    BASE_URL = os.environ.get("SACS_BASE_URL", "https://sistemas.sacs.gob.ve/consultas/prfsnal_salud")
     
     @staticmethod
     def _clean_text(text: str) -> str:
@@ -125,9 +132,10 @@ class ProfesionalValidator:
         }
         
         try:
-            print(f"🔍 Validando cédula: {cedula}")
+            logger.info(f"🔍 Validando cédula: {cedula}")
             
             # Realizar solicitud POST
+            sacs_start = time.perf_counter()
             response = requests.post(
                 ProfesionalValidator.BASE_URL,
                 data=payload,
@@ -136,6 +144,9 @@ class ProfesionalValidator:
                 timeout=30
             )
             
+            observe_sacs(time.perf_counter() - sacs_start,
+                         "ok" if response.status_code == 200 else "http_error")
+
             if response.status_code != 200:
                 return {
                     "success": False,
@@ -190,13 +201,14 @@ class ProfesionalValidator:
             }
             
             if is_valid:
-                print(f"✅ Profesional encontrado: {user_data.get('nombre', 'N/A')}")
+                logger.info(f"✅ Profesional encontrado: {user_data.get('nombre', 'N/A')}")
             else:
-                print(f"❌ Profesional no encontrado o datos incompletos")
+                logger.info("❌ Profesional no encontrado o datos incompletos")
             
             return result
             
         except requests.exceptions.Timeout:
+            observe_sacs(time.perf_counter() - sacs_start, "timeout")
             return {
                 "success": False,
                 "is_valid": False,
@@ -205,6 +217,7 @@ class ProfesionalValidator:
                 "timestamp": datetime.now().isoformat()
             }
         except requests.exceptions.ConnectionError:
+            observe_sacs(time.perf_counter() - sacs_start, "connection_error")
             return {
                 "success": False,
                 "is_valid": False,
@@ -0,0 +1,268 @@
+"""
+Perfilado bajo demanda para administradores.
+
+- Por petición: cabecera `X-Profile: 1` o parámetro `?profile=1`. Solo se
+  activa si el token pertenece a un administrador; el perfil se guarda y su
+  id se devuelve en la cabecera `X-Profile-Id`. Se muestrean el hilo del
+  event loop y los hilos del threadpool mientras ejecutan un endpoint `def`
+  de la petición (ProfiledRoute) o una función envuelta con `profiled()`.
+- Por worker: muestrea todos los hilos del proceso durante N segundos.
+
+Los perfiles se generan en formato de pilas colapsadas ("a;b;c 12"), que
+aceptan directamente flamegraph.pl, speedscope e inferno. Sin la cabecera ni
+el parámetro, el middleware solo hace una búsqueda en las cabeceras.
+"""
+import os
+import sys
+import time
+import uuid
+import asyncio
+import functools
+import threading
+import contextvars
+from collections import Counter, OrderedDict
+from datetime import datetime
+from typing import Callable, Dict, Iterable, Optional, Set
+from urllib.parse import parse_qs
+
+from fastapi.concurrency import run_in_threadpool
+from fastapi.routing import APIRoute
+from starlette.datastructures import MutableHeaders
+
+PROFILE_HEADER = "X-Profile"
+PROFILE_ID_HEADER = "X-Profile-Id"
+PROFILE_SAMPLE_INTERVAL_MS = float(os.environ.get('PROFILE_SAMPLE_INTERVAL_MS', 5))
+PROFILE_STORE_SIZE = int(os.environ.get('PROFILE_STORE_SIZE', 20))
+MAX_WORKER_PROFILE_SECONDS = 60
+
+_TRUE_VALUES = ("1", "true", "yes")
+
+# Hilos que trabajan ahora mismo para la petición perfilada en curso
+_profiled_threads: contextvars.ContextVar[Optional[Set[int]]] = contextvars.ContextVar(
+    "profiled_threads", default=None
+)
+
+
+# ==================== MUESTREO DE PILAS ====================
+
+def _frame_label(frame) -> str:
+    code = frame.f_code
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+def _collapse(frame) -> str:
+    labels = []
+    while frame is not None:
+        labels.append(_frame_label(frame))
+        frame = frame.f_back
+    labels.reverse()  # raíz → hoja
+    return ";".join(labels)
+
+
+class StackSampler:
+    """
+    Perfilador por muestreo: cada `interval` segundos toma la pila de los
+    hilos indicados (o de todos) con sys._current_frames(). Si se pasa un
+    set, se consulta en cada muestra: otros hilos pueden agregarse y quitarse
+    mientras corre.
+    """
+
+    def __init__(self, thread_ids: Optional[Iterable[int]] = None,
+                 interval: float = PROFILE_SAMPLE_INTERVAL_MS / 1000):
+        if thread_ids is not None and not isinstance(thread_ids, set):
+            thread_ids = set(thread_ids)
+        self.thread_ids = thread_ids
+        self.interval = interval
+        self.stacks: Counter = Counter()
+        self.samples = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="stack-sampler", daemon=True)
+
+    def _run(self):
+        own_id = threading.get_ident()
+        names = {}
+        while not self._stop.wait(self.interval):
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own_id:
+                    continue
+                if self.thread_ids is not None and thread_id not in self.thread_ids:
+                    continue
+                if self.thread_ids is None:
+                    # En modo worker, la raíz de cada pila es el hilo
+                    if thread_id not in names:
+                        names = {t.ident: t.name for t in threading.enumerate()}
+                    stack = f"{names.get(thread_id, thread_id)};{_collapse(frame)}"
+                else:
+                    stack = _collapse(frame)
+                self.stacks[stack] += 1
+            self.samples += 1
+
+    def start(self) -> "StackSampler":
+        self._thread.start()
+        return self
+
+    def stop(self) -> "StackSampler":
+        self._stop.set()
+        self._thread.join()
+        return self
+
+    def collapsed(self) -> str:
+        return "\n".join(f"{stack} {count}" for stack, count in self.stacks.most_common()) + "\n"
+
+
+# ==================== PERFILES GUARDADOS ====================
+
+class ProfileStore:
+    """Últimos perfiles generados (LRU)"""
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self._profiles: "OrderedDict[str, dict]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def add(self, kind: str, target: str, sampler: StackSampler, duration: float) -> str:
+        profile_id = uuid.uuid4().hex[:12]
+        with self._lock:
+            self._profiles[profile_id] = {
+                "id": profile_id,
+                "kind": kind,
+                "target": target,
+                "created_at": datetime.now().isoformat(),
+                "duration_ms": round(duration * 1000, 2),
+                "samples": sampler.samples,
+                "collapsed": sampler.collapsed(),
+            }
+            while len(self._profiles) > self.max_entries:
+                self._profiles.popitem(last=False)
+        return profile_id
+
+    def get(self, profile_id: str) -> Optional[dict]:
+        with self._lock:
+            return self._profiles.get(profile_id)
+
+    def list(self) -> list:
+        with self._lock:
+            return [
+                {key: value for key, value in profile.items() if key != "collapsed"}
+                for profile in reversed(self._profiles.values())
+            ]
+
+
+profile_store = ProfileStore(PROFILE_STORE_SIZE)
+
+
+def profile_worker(seconds: float) -> str:
+    """Muestrear todos los hilos del proceso durante `seconds` (bloqueante: usar en un hilo)"""
+    seconds = min(max(seconds, 0.1), MAX_WORKER_PROFILE_SECONDS)
+    sampler = StackSampler().start()
+    time.sleep(seconds)
+    sampler.stop()
+    return profile_store.add("worker", f"pid {os.getpid()}", sampler, seconds)
+
+
+# ==================== HILOS DEL THREADPOOL ====================
+
+def profiled(func: Callable) -> Callable:
+    """
+    Envolver una función que corre en el threadpool: mientras se ejecuta, su
+    hilo se muestrea junto con la petición perfilada (si la hay)
+    """
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        threads = _profiled_threads.get()
+        if threads is None:
+            return func(*args, **kwargs)
+        thread_id = threading.get_ident()
+        threads.add(thread_id)
+        try:
+            return func(*args, **kwargs)
+        finally:
+            threads.discard(thread_id)
+
+    return wrapper
+
+
+class ProfiledRoute(APIRoute):
+    """Ruta cuyos endpoints `def` (corren en el threadpool) aparecen en el perfil por petición"""
+
+    def __init__(self, path: str, endpoint: Callable, **kwargs):
+        if not asyncio.iscoroutinefunction(endpoint):
+            endpoint = profiled(endpoint)
+        super().__init__(path, endpoint, **kwargs)
+
+
+# ==================== MIDDLEWARE ====================
+
+def _profiling_token(scope) -> Optional[str]:
+    """Token JWT si la petición pidió perfilado; None en caso contrario"""
+    flag = None
+    token = None
+    for name, value in scope["headers"]:
+        if name == b"x-profile":
+            flag = value.decode("latin-1")
+        elif name == b"authorization":
+            token = value.decode("latin-1")
+
+    query_string = scope.get("query_string", b"")
+    if flag is None and b"profile=" not in query_string:
+        return None
+
+    query = parse_qs(query_string.decode("latin-1"))
+    if flag is None:
+        flag = query.get("profile", [""])[0]
+    if flag.lower() not in _TRUE_VALUES:
+        return None
+
+    if token and token.lower().startswith("bearer "):
+        return token[7:]
+    return query.get("token", [None])[0]
+
+
+class ProfilingMiddleware:
+    """
+    Perfila la petición si lo pide un administrador. `is_admin_token`
+    recibe el JWT y decide si está autorizado (consulta la base: corre en
+    el threadpool).
+
+    Se muestrean el hilo del event loop, donde corren los endpoints async,
+    y los hilos del threadpool mientras ejecutan código de esta petición;
+    las peticiones concurrentes en el hilo del event loop también aparecen
+    en el perfil.
+    """
+
+    def __init__(self, app, is_admin_token: Callable[[str], bool]):
+        self.app = app
+        self.is_admin_token = is_admin_token
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        token = _profiling_token(scope)
+        if token is None or not await run_in_threadpool(self.is_admin_token, token):
+            await self.app(scope, receive, send)
+            return
+
+        target = f"{scope.get('method', 'GET')} {scope['path']}"
+        profile_id: Dict[str, str] = {}
+        threads = {threading.get_ident()}
+        context_token = _profiled_threads.set(threads)
+        sampler = StackSampler(thread_ids=threads).start()
+        start = time.perf_counter()
+
+        async def send_with_profile_id(message):
+            if message["type"] == "http.response.start":
+                # El perfil se cierra al empezar la respuesta
+                sampler.stop()
+                profile_id["id"] = profile_store.add("request", target, sampler, time.perf_counter() - start)
+                headers = MutableHeaders(scope=message)
+                headers[PROFILE_ID_HEADER] = profile_id["id"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_profile_id)
+        finally:
+            _profiled_threads.reset(context_token)
+            if "id" not in profile_id:
+                sampler.stop()
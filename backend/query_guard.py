@@ -0,0 +1,228 @@
+"""
+Límites de tiempo por clase de endpoint y cancelación al desconectarse el cliente.
+
+- Cada petición se clasifica por ruta (interactive, sync, admin) y cada
+  transacción de sesión que abre empieza con SET LOCAL statement_timeout /
+  lock_timeout de su clase (solo PostgreSQL). Los límites se configuran con
+  STATEMENT_TIMEOUT_<CLASE>_MS y LOCK_TIMEOUT_<CLASE>_MS.
+- QueryGuardMiddleware vigila el canal ASGI una vez leído el cuerpo: si llega
+  http.disconnect, cancela las consultas en curso de esa petición
+  (cancel() de psycopg2, interrupt() de SQLite) y las siguientes fallan de
+  inmediato, así que el hilo del worker queda libre en lugar de seguir
+  trabajando para un cliente que ya no espera la respuesta.
+
+El vigilante corre en el bucle de eventos, así que solo puede actuar si el
+endpoint no lo bloquea: los endpoints con base de datos son `def` (FastAPI
+los corre en el threadpool) o, si tienen que ser async, mandan el trabajo de
+base de datos a run_in_threadpool (como /api/sync/bulk/stream).
+"""
+import os
+import asyncio
+import logging
+import threading
+import contextvars
+from typing import Dict, Optional, Set
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session
+
+from metrics import Counter, registry
+
+logger = logging.getLogger(__name__)
+
+
+def _timeouts(name: str, statement_ms: int, lock_ms: int) -> Dict[str, int]:
+    return {
+        "statement_timeout": int(os.environ.get(f"STATEMENT_TIMEOUT_{name.upper()}_MS", statement_ms)),
+        "lock_timeout": int(os.environ.get(f"LOCK_TIMEOUT_{name.upper()}_MS", lock_ms)),
+    }
+
+
+# Milisegundos; 0 desactiva el límite
+TIMEOUT_CLASSES: Dict[str, Dict[str, int]] = {
+    "interactive": _timeouts("interactive", 5000, 1000),
+    "sync": _timeouts("sync", 60000, 5000),
+    "admin": _timeouts("admin", 120000, 10000),
+}
+
+# Primer prefijo que coincide; el resto de /api es interactive
+ENDPOINT_CLASSES = (
+    ("/api/sync/", "sync"),
+    ("/api/debug/", "admin"),
+)
+ADMIN_PATHS = frozenset({"/api/users"})
+
+# SQLSTATE de PostgreSQL
+_QUERY_CANCELED = "57014"
+_LOCK_NOT_AVAILABLE = "55P03"
+
+queries_cancelled = registry.register(Counter(
+    "healthshield_queries_cancelled_total",
+    "Consultas canceladas por desconexión del cliente o por statement/lock timeout", ("reason", "endpoint_class")))
+
+
+def endpoint_class(path: str) -> str:
+    if path in ADMIN_PATHS:
+        return "admin"
+    for prefix, name in ENDPOINT_CLASSES:
+        if path.startswith(prefix):
+            return name
+    return "interactive"
+
+
+class ClientDisconnected(Exception):
+    """El cliente cerró la conexión: no tiene sentido seguir consultando"""
+
+
+class RequestQueries:
+    """Conexiones DBAPI con una consulta en curso para la petición actual"""
+
+    def __init__(self, endpoint_class: str):
+        self.endpoint_class = endpoint_class
+        self.cancelled = False
+        self._active: Set = set()
+        self._lock = threading.Lock()
+
+    def started(self, dbapi_connection):
+        with self._lock:
+            self._active.add(dbapi_connection)
+
+    def finished(self, dbapi_connection):
+        with self._lock:
+            self._active.discard(dbapi_connection)
+
+    def cancel(self) -> int:
+        with self._lock:
+            self.cancelled = True
+            active = list(self._active)
+        for dbapi_connection in active:
+            cancel = getattr(dbapi_connection, "cancel", None) or getattr(dbapi_connection, "interrupt", None)
+            if cancel is None:
+                continue
+            try:
+                cancel()
+                queries_cancelled.inc("client_disconnect", self.endpoint_class)
+            except Exception as e:
+                logger.warning(f"⚠️  No se pudo cancelar la consulta: {e}")
+        return len(active)
+
+
+_request_queries: contextvars.ContextVar[Optional[RequestQueries]] = contextvars.ContextVar(
+    "request_queries", default=None
+)
+
+
+# ==================== EVENTOS DE SQLALCHEMY ====================
+
+@event.listens_for(Session, "after_begin")
+def _apply_timeouts(session, transaction, connection):
+    queries = _request_queries.get()
+    if queries is None or connection.dialect.name != "postgresql":
+        return
+    timeouts = TIMEOUT_CLASSES[queries.endpoint_class]
+    # SET LOCAL: vale hasta el fin de la transacción, no contamina la conexión
+    connection.exec_driver_sql(
+        f"SET LOCAL statement_timeout = {int(timeouts['statement_timeout'])}; "
+        f"SET LOCAL lock_timeout = {int(timeouts['lock_timeout'])}"
+    )
+
+
+@event.listens_for(Engine, "before_cursor_execute")
+def _track_query_start(conn, cursor, statement, parameters, context, executemany):
+    queries = _request_queries.get()
+    if queries is None:
+        return
+    if queries.cancelled:
+        raise ClientDisconnected("El cliente se desconectó; consulta no ejecutada")
+    queries.started(conn.connection.dbapi_connection)
+
+
+@event.listens_for(Engine, "after_cursor_execute")
+def _track_query_end(conn, cursor, statement, parameters, context, executemany):
+    queries = _request_queries.get()
+    if queries is not None:
+        queries.finished(conn.connection.dbapi_connection)
+
+
+@event.listens_for(Engine, "handle_error")
+def _track_query_error(exception_context):
+    queries = _request_queries.get()
+    connection = exception_context.connection
+    if queries is None or connection is None or connection.invalidated:
+        return
+    queries.finished(connection.connection.dbapi_connection)
+    pgcode = getattr(exception_context.original_exception, "pgcode", None)
+    if pgcode == _QUERY_CANCELED and not queries.cancelled:
+        queries_cancelled.inc("statement_timeout", queries.endpoint_class)
+    elif pgcode == _LOCK_NOT_AVAILABLE:
+        queries_cancelled.inc("lock_timeout", queries.endpoint_class)
+
+
+# ==================== MIDDLEWARE ====================
+
+class QueryGuardMiddleware:
+    """Clase de timeouts por ruta y cancelación de consultas si el cliente se va"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        queries = RequestQueries(endpoint_class(scope["path"]))
+        token = _request_queries.set(queries)
+        body_done = asyncio.Event()
+        # Leído el cuerpo, el vigilante es el único que llama a receive() y
+        # reenvía a la aplicación lo que llegue por esta cola
+        inbox: asyncio.Queue = asyncio.Queue()
+        response_done = False
+
+        async def guarded_receive():
+            if body_done.is_set():
+                message = await inbox.get()
+                if message["type"] == "http.disconnect":
+                    inbox.put_nowait(message)  # Toda lectura posterior ve la desconexión
+                return message
+            message = await receive()
+            if message["type"] == "http.disconnect" or not message.get("more_body", False):
+                body_done.set()
+            return message
+
+        async def watch_disconnect():
+            await body_done.wait()
+            while True:
+                message = await receive()
+                inbox.put_nowait(message)
+                if message["type"] == "http.disconnect":
+                    break
+            # Tras la respuesta, uvicorn también informa http.disconnect: no es un abandono
+            if response_done:
+                return
+            cancelled = queries.cancel()
+            if cancelled:
+                logger.warning(f"🔌 Cliente desconectado en {scope['path']}: {cancelled} consultas canceladas")
+
+        async def tracking_send(message):
+            nonlocal response_done
+            if message["type"] == "http.response.body" and not message.get("more_body", False):
+                response_done = True
+            await send(message)
+
+        # Métodos sin cuerpo: el canal ya está libre para vigilar
+        if scope.get("method") in ("GET", "HEAD", "DELETE", "OPTIONS"):
+            body_done.set()
+
+        watcher = asyncio.create_task(watch_disconnect())
+        try:
+            await self.app(scope, guarded_receive, tracking_send)
+        except Exception:
+            # La consulta cancelada falla en el endpoint, pero ya no hay a quién responder
+            if not queries.cancelled:
+                raise
+            logger.info(f"🔌 Petición abandonada por el cliente: {scope['path']}")
+        finally:
+            watcher.cancel()
+            _request_queries.reset(token)
@@ -0,0 +1,156 @@
+"""
+Enrutamiento de lecturas a la réplica con read-your-writes.
+
+- Una petición que escribió (método distinto de GET/HEAD/OPTIONS con
+  respuesta 2xx) marca a su autor (hash del token) como escritor reciente.
+  Durante READ_YOUR_WRITES_SECONDS sus lecturas van al primario.
+- La respuesta de la escritura lleva X-Last-Write-At (ms desde epoch): un
+  cliente que lo reenvía en sus lecturas también lee del primario dentro de
+  la ventana, aunque la petición caiga en otro worker.
+- El retraso de la réplica se mide en segundo plano (health.py) y se publica
+  en /metrics. Si supera la ventana, o la réplica no responde, todas las
+  lecturas van al primario: así la ventana de read-your-writes sigue siendo
+  suficiente.
+"""
+import os
+import time
+import hashlib
+import threading
+from typing import Dict, Optional, Tuple
+from urllib.parse import parse_qs
+
+from sqlalchemy import text
+
+from metrics import Counter, Gauge, registry
+
+READ_YOUR_WRITES_SECONDS = float(os.environ.get('READ_YOUR_WRITES_SECONDS', 5))
+LAST_WRITE_HEADER = "X-Last-Write-At"
+_READ_METHODS = frozenset({"GET", "HEAD", "OPTIONS"})
+
+replica_lag_seconds = registry.register(Gauge(
+    "healthshield_replica_lag_seconds", "Retraso de replicación medido en la réplica de lectura"))
+replica_available = registry.register(Gauge(
+    "healthshield_replica_available", "1 si las lecturas se pueden enviar a la réplica"))
+read_routing_total = registry.register(Counter(
+    "healthshield_read_routing_total", "Sesiones de solo lectura por destino y motivo", ("target", "reason")))
+
+
+def request_key(headers: Dict[str, str], query_token: Optional[str] = None) -> Optional[str]:
+    """Identidad del autor de la petición: hash del token (header o ?token=)"""
+    authorization = headers.get("authorization", "")
+    token = authorization[7:] if authorization.lower().startswith("bearer ") else query_token
+    if not token:
+        return None
+    return hashlib.sha256(token.encode("utf-8")).hexdigest()[:32]
+
+
+class RecentWrites:
+    """Último instante de escritura por autor, olvidado pasada la ventana"""
+
+    def __init__(self, window: float = READ_YOUR_WRITES_SECONDS):
+        self.window = window
+        self._writes: Dict[str, float] = {}
+        self._lock = threading.Lock()
+
+    def record(self, key: str):
+        now = time.monotonic()
+        with self._lock:
+            self._writes[key] = now
+            if len(self._writes) > 10000:
+                self._writes = {k: t for k, t in self._writes.items() if now - t < self.window}
+
+    def wrote_recently(self, key: Optional[str]) -> bool:
+        if key is None:
+            return False
+        with self._lock:
+            written_at = self._writes.get(key)
+        return written_at is not None and time.monotonic() - written_at < self.window
+
+
+recent_writes = RecentWrites()
+
+
+# ==================== ESTADO DE LA RÉPLICA ====================
+
+class ReplicaState:
+    def __init__(self, max_lag: float = READ_YOUR_WRITES_SECONDS):
+        self.max_lag = max_lag
+        self.lag: Optional[float] = None
+        self.healthy = True  # Optimista hasta la primera medición
+
+    def usable(self) -> bool:
+        return self.healthy and (self.lag is None or self.lag < self.max_lag)
+
+    def check(self, engine) -> dict:
+        """Medir el retraso (segundos desde la última transacción reproducida)"""
+        start = time.perf_counter()
+        try:
+            with engine.connect() as conn:
+                lag = conn.execute(text("""
+                    SELECT CASE
+                        WHEN NOT pg_is_in_recovery() THEN 0
+                        WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+                        ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0)
+                    END
+                """)).scalar()
+            self.lag, self.healthy = float(lag), True
+            replica_lag_seconds.set(value=self.lag)
+            result = {"ok": True, "lag_seconds": round(self.lag, 3)}
+        except Exception as e:
+            self.healthy = False
+            result = {"ok": False, "error": str(e)[:200]}
+        replica_available.set(value=1 if self.usable() else 0)
+        result["latency_ms"] = round((time.perf_counter() - start) * 1000, 2)
+        result["routing_reads"] = self.usable()
+        return result
+
+
+replica_state = ReplicaState()
+
+
+def read_target(key: Optional[str], last_write_at_ms: Optional[str]) -> Tuple[str, str]:
+    """("replica" | "primary", motivo) para una sesión de solo lectura"""
+    if not replica_state.usable():
+        return "primary", "replica_unavailable"
+    if recent_writes.wrote_recently(key):
+        return "primary", "recent_write"
+    if last_write_at_ms:
+        try:
+            if time.time() - int(last_write_at_ms) / 1000 < READ_YOUR_WRITES_SECONDS:
+                return "primary", "recent_write"
+        except ValueError:
+            pass
+    return "replica", "read_only"
+
+
+# ==================== MIDDLEWARE ====================
+
+class ReadYourWritesMiddleware:
+    """Registra las escrituras exitosas de cada autor y devuelve X-Last-Write-At"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] in _READ_METHODS:
+            await self.app(scope, receive, send)
+            return
+
+        async def send_marking_write(message):
+            if message["type"] == "http.response.start" and 200 <= message["status"] < 300:
+                headers = {name.decode("latin-1").lower(): value.decode("latin-1")
+                           for name, value in scope.get("headers", ())}
+                key = request_key(headers, query_token(scope))
+                if key is not None:
+                    recent_writes.record(key)
+                message["headers"] = list(message.get("headers", [])) + [
+                    (LAST_WRITE_HEADER.lower().encode("latin-1"), str(int(time.time() * 1000)).encode("latin-1"))
+                ]
+            await send(message)
+
+        await self.app(scope, receive, send_marking_write)
+
+
+def query_token(scope) -> Optional[str]:
+    values = parse_qs(scope.get("query_string", b"").decode("latin-1")).get("token")
+    return values[0] if values else None
@@ -1,25 +1,47 @@
 from sqlalchemy.orm import Session
-from sqlalchemy import or_
-from models import Usuario, Paciente, Vacuna
+from sqlalchemy import delete, func, or_, select, lambda_stmt
+from models import Usuario, Paciente, Vacuna, SyncSession, SyncChunk
 from database import hash_password, verify_password
+import change_log  # noqa: F401 - registra cada escritura de pacientes y vacunas en change_log
 from typing import List, Optional, Dict, Any
+from datetime import datetime, timedelta, timezone
+import uuid
+
+# Búsquedas de una fila: lambda_stmt guarda la sentencia compilada por sitio de
+# llamada (el valor buscado va como parámetro), así no se reconstruye ni se
+# recompila un Query en cada llamada (ver benchmarks/bench_lookups.py).
+
+class DeletedRecordError(Exception):
+    """El registro recibido corresponde a una lápida: no se revive implícitamente"""
+
+
+def _first(db: Session, statement):
+    return db.execute(statement).scalars().first()
+
+def _save(db: Session, instance, commit: bool = True):
+    """Confirmar la transacción, o solo enviar los cambios (flush) si el llamador la controla"""
+    if commit:
+        db.commit()
+        db.refresh(instance)
+    else:
+        db.flush()
 
 class UsuarioRepository:
     @staticmethod
     def get_by_username(db: Session, username: str) -> Optional[Usuario]:
-        return db.query(Usuario).filter(Usuario.username == username).first()
+        return _first(db, lambda_stmt(lambda: select(Usuario).where(Usuario.username == username).limit(1)))
     
     @staticmethod
     def get_by_email(db: Session, email: str) -> Optional[Usuario]:
-        return db.query(Usuario).filter(Usuario.email == email).first()
+        return _first(db, lambda_stmt(lambda: select(Usuario).where(Usuario.email == email).limit(1)))
     
     @staticmethod
     def get_by_id(db: Session, user_id: int) -> Optional[Usuario]:
-        return db.query(Usuario).filter(Usuario.id == user_id).first()
+        return _first(db, lambda_stmt(lambda: select(Usuario).where(Usuario.id == user_id).limit(1)))
     
     @staticmethod
     def get_by_server_id(db: Session, server_id: int) -> Optional[Usuario]:
-        return db.query(Usuario).filter(Usuario.server_id == server_id).first()
+        return _first(db, lambda_stmt(lambda: select(Usuario).where(Usuario.server_id == server_id).limit(1)))
     
     @staticmethod
     def get_all(db: Session, skip: int = 0, limit: int = 100) -> List[Usuario]:
@@ -91,26 +113,41 @@ class UsuarioRepository:
 class PacienteRepository:
     @staticmethod
     def get_by_id(db: Session, paciente_id: int) -> Optional[Paciente]:
-        return db.query(Paciente).filter(Paciente.id == paciente_id).first()
+        return _first(db, lambda_stmt(lambda: select(Paciente).where(Paciente.id == paciente_id, Paciente.deleted_at.is_(None)).limit(1)))
     
     @staticmethod
     def get_by_server_id(db: Session, server_id: int) -> Optional[Paciente]:
-        return db.query(Paciente).filter(Paciente.server_id == server_id).first()
+        return _first(db, lambda_stmt(lambda: select(Paciente).where(Paciente.server_id == server_id, Paciente.deleted_at.is_(None)).limit(1)))
     
     @staticmethod
     def get_by_cedula(db: Session, cedula: str) -> Optional[Paciente]:
-        return db.query(Paciente).filter(Paciente.cedula == cedula).first()
+        return _first(db, lambda_stmt(lambda: select(Paciente).where(Paciente.cedula == cedula, Paciente.deleted_at.is_(None)).limit(1)))
+    
+    @staticmethod
+    def get_deleted_by_cedula(db: Session, cedula: str) -> Optional[Paciente]:
+        return _first(db, lambda_stmt(
+            lambda: select(Paciente).where(Paciente.cedula == cedula, Paciente.deleted_at.isnot(None)).limit(1)))
+    
+    @staticmethod
+    def get_deleted_by_server_id(db: Session, server_id: int) -> Optional[Paciente]:
+        return _first(db, lambda_stmt(
+            lambda: select(Paciente).where(Paciente.server_id == server_id, Paciente.deleted_at.isnot(None)).limit(1)))
     
     @staticmethod
     def get_all(db: Session, skip: int = 0, limit: int = 100) -> List[Paciente]:
-        return db.query(Paciente).offset(skip).limit(limit).all()
+        return db.query(Paciente).filter(Paciente.deleted_at.is_(None)).offset(skip).limit(limit).all()
     
     @staticmethod
-    def create(db: Session, paciente_data) -> Paciente:
+    def create(db: Session, paciente_data, commit: bool = True) -> Paciente:
         # Buscar por server_id si existe
         existing_paciente = None
         if hasattr(paciente_data, 'server_id') and paciente_data.server_id:
             existing_paciente = PacienteRepository.get_by_server_id(db, paciente_data.server_id)
+            if not existing_paciente and PacienteRepository.get_deleted_by_server_id(db, paciente_data.server_id):
+                raise DeletedRecordError(f"Paciente {paciente_data.server_id} eliminado en el servidor")
+        if not existing_paciente and PacienteRepository.get_deleted_by_cedula(db, paciente_data.cedula):
+            # Un dispositivo que aún no recibió la lápida no lo revive: solo restore()
+            raise DeletedRecordError(f"Paciente con cédula {paciente_data.cedula} eliminado en el servidor")
         
         if existing_paciente:
             # Actualizar paciente existente
@@ -120,8 +157,7 @@ class PacienteRepository:
             existing_paciente.telefono = paciente_data.telefono
             existing_paciente.direccion = paciente_data.direccion
             existing_paciente.is_synced = True
-            db.commit()
-            db.refresh(existing_paciente)
+            _save(db, existing_paciente, commit)
             return existing_paciente
         else:
             # Crear nuevo paciente
@@ -135,12 +171,11 @@ class PacienteRepository:
                 is_synced=True  # Cuando se crea desde el servidor, está sincronizado
             )
             db.add(db_paciente)
-            db.commit()
-            db.refresh(db_paciente)
+            _save(db, db_paciente, commit)
             return db_paciente
     
     @staticmethod
-    def update(db: Session, paciente_id: int, paciente_update: Dict[str, Any]) -> Optional[Paciente]:
+    def update(db: Session, paciente_id: int, paciente_update: Dict[str, Any], commit: bool = True) -> Optional[Paciente]:
         paciente = PacienteRepository.get_by_id(db, paciente_id)
         if not paciente:
             return None
@@ -149,29 +184,64 @@ class PacienteRepository:
             if value is not None and hasattr(paciente, key):
                 setattr(paciente, key, value)
         
-        db.commit()
-        db.refresh(paciente)
+        _save(db, paciente, commit)
+        return paciente
+    
+    @staticmethod
+    def delete(db: Session, paciente_id: int, commit: bool = True) -> Optional[Paciente]:
+        """Borrado lógico del paciente y de sus vacunas: quedan como lápidas para la sincronización"""
+        paciente = PacienteRepository.get_by_id(db, paciente_id)
+        if not paciente:
+            return None
+        
+        deleted_at = datetime.now(timezone.utc)
+        paciente.deleted_at = deleted_at
+        for vacuna in VacunaRepository.get_by_paciente(db, paciente_id):
+            vacuna.deleted_at = deleted_at
+        
+        _save(db, paciente, commit)
+        return paciente
+    
+    @staticmethod
+    def restore(db: Session, paciente_id: int, commit: bool = True) -> Optional[Paciente]:
+        """Reactivar un paciente borrado junto con las vacunas que se borraron con él"""
+        paciente = _first(db, lambda_stmt(
+            lambda: select(Paciente).where(Paciente.id == paciente_id, Paciente.deleted_at.isnot(None)).limit(1)))
+        if not paciente:
+            return None
+        
+        # Por el ORM, no con UPDATE masivo: cada fila reactivada entra en change_log
+        for vacuna in db.query(Vacuna).filter(Vacuna.paciente_id == paciente_id,
+                                              Vacuna.deleted_at == paciente.deleted_at):
+            vacuna.deleted_at = None
+        paciente.deleted_at = None
+        _save(db, paciente, commit)
         return paciente
 
 class VacunaRepository:
     @staticmethod
     def get_by_id(db: Session, vacuna_id: int) -> Optional[Vacuna]:
-        return db.query(Vacuna).filter(Vacuna.id == vacuna_id).first()
+        return _first(db, lambda_stmt(lambda: select(Vacuna).where(Vacuna.id == vacuna_id, Vacuna.deleted_at.is_(None)).limit(1)))
     
     @staticmethod
     def get_by_server_id(db: Session, server_id: int) -> Optional[Vacuna]:
-        return db.query(Vacuna).filter(Vacuna.server_id == server_id).first()
+        return _first(db, lambda_stmt(lambda: select(Vacuna).where(Vacuna.server_id == server_id, Vacuna.deleted_at.is_(None)).limit(1)))
+    
+    @staticmethod
+    def get_deleted_by_server_id(db: Session, server_id: int) -> Optional[Vacuna]:
+        return _first(db, lambda_stmt(
+            lambda: select(Vacuna).where(Vacuna.server_id == server_id, Vacuna.deleted_at.isnot(None)).limit(1)))
     
     @staticmethod
     def get_by_paciente(db: Session, paciente_id: int) -> List[Vacuna]:
-        return db.query(Vacuna).filter(Vacuna.paciente_id == paciente_id).all()
+        return db.query(Vacuna).filter(Vacuna.paciente_id == paciente_id, Vacuna.deleted_at.is_(None)).all()
     
     @staticmethod
     def get_all(db: Session, skip: int = 0, limit: int = 100) -> List[Vacuna]:
-        return db.query(Vacuna).offset(skip).limit(limit).all()
+        return db.query(Vacuna).filter(Vacuna.deleted_at.is_(None)).offset(skip).limit(limit).all()
     
     @staticmethod
-    def create(db: Session, vacuna_data) -> Vacuna:
+    def create(db: Session, vacuna_data, commit: bool = True) -> Vacuna:
         # 🔥 CAMBIO: NO validar existencia de paciente
         # Simplemente usar el paciente_id que viene (o None)
         paciente_id = getattr(vacuna_data, 'paciente_id', None)
@@ -180,6 +250,9 @@ class VacunaRepository:
         existing_vacuna = None
         if hasattr(vacuna_data, 'server_id') and vacuna_data.server_id:
             existing_vacuna = VacunaRepository.get_by_server_id(db, vacuna_data.server_id)
+            if not existing_vacuna and VacunaRepository.get_deleted_by_server_id(db, vacuna_data.server_id):
+                # Sin esto se insertaría una copia viva de una vacuna borrada
+                raise DeletedRecordError(f"Vacuna {vacuna_data.server_id} eliminada en el servidor")
         
         if existing_vacuna:
             # Actualizar vacuna existente
@@ -196,8 +269,7 @@ class VacunaRepository:
             existing_vacuna.nombre_paciente = getattr(vacuna_data, 'nombre_paciente', None)
             existing_vacuna.cedula_paciente = getattr(vacuna_data, 'cedula_paciente', None)
             existing_vacuna.is_synced = True
-            db.commit()
-            db.refresh(existing_vacuna)
+            _save(db, existing_vacuna, commit)
             return existing_vacuna
         else:
             # Crear nueva vacuna
@@ -218,12 +290,11 @@ class VacunaRepository:
                 is_synced=True
             )
             db.add(db_vacuna)
-            db.commit()
-            db.refresh(db_vacuna)
+            _save(db, db_vacuna, commit)
             return db_vacuna
     
     @staticmethod
-    def update(db: Session, vacuna_id: int, vacuna_update: Dict[str, Any]) -> Optional[Vacuna]:
+    def update(db: Session, vacuna_id: int, vacuna_update: Dict[str, Any], commit: bool = True) -> Optional[Vacuna]:
         vacuna = VacunaRepository.get_by_id(db, vacuna_id)
         if not vacuna:
             return None
@@ -232,6 +303,120 @@ class VacunaRepository:
             if value is not None and hasattr(vacuna, key):
                 setattr(vacuna, key, value)
         
+        _save(db, vacuna, commit)
+        return vacuna
+    
+    @staticmethod
+    def delete(db: Session, vacuna_id: int, commit: bool = True) -> Optional[Vacuna]:
+        """Borrado lógico: queda como lápida para la sincronización"""
+        vacuna = VacunaRepository.get_by_id(db, vacuna_id)
+        if not vacuna:
+            return None
+        
+        vacuna.deleted_at = datetime.now(timezone.utc)
+        _save(db, vacuna, commit)
+        return vacuna
+
+class SyncSessionRepository:
+    @staticmethod
+    def create(db: Session, usuario_id: int, total_chunks: Optional[int] = None,
+               last_sync_client: Optional[str] = None) -> SyncSession:
+        sync_session = SyncSession(
+            id=str(uuid.uuid4()),
+            usuario_id=usuario_id,
+            status='open',
+            total_chunks=total_chunks,
+            last_chunk=-1,
+            last_sync_client=last_sync_client
+        )
+        db.add(sync_session)
+        db.commit()
+        db.refresh(sync_session)
+        return sync_session
+    
+    @staticmethod
+    def get(db: Session, session_id: str, usuario_id: int) -> Optional[SyncSession]:
+        return db.query(SyncSession).filter(
+            SyncSession.id == session_id,
+            SyncSession.usuario_id == usuario_id
+        ).first()
+    
+    @staticmethod
+    def get_chunk_indexes(db: Session, session_id: str) -> List[int]:
+        rows = db.query(SyncChunk.chunk_index).filter(
+            SyncChunk.session_id == session_id
+        ).order_by(SyncChunk.chunk_index).all()
+        return [row[0] for row in rows]
+    
+    @staticmethod
+    def stage_chunk(db: Session, sync_session: SyncSession, chunk_index: int, payload: str,
+                    pacientes_count: int, vacunas_count: int) -> SyncSession:
+        """Guardar (o reemplazar) una parte y recalcular el último chunk contiguo"""
+        chunk = db.query(SyncChunk).filter(
+            SyncChunk.session_id == sync_session.id,
+            SyncChunk.chunk_index == chunk_index
+        ).first()
+        
+        if chunk:
+            chunk.payload = payload
+            chunk.pacientes_count = pacientes_count
+            chunk.vacunas_count = vacunas_count
+        else:
+            db.add(SyncChunk(
+                session_id=sync_session.id,
+                chunk_index=chunk_index,
+                payload=payload,
+                pacientes_count=pacientes_count,
+                vacunas_count=vacunas_count
+            ))
+        db.flush()
+        
+        last_chunk = -1
+        for index in SyncSessionRepository.get_chunk_indexes(db, sync_session.id):
+            if index != last_chunk + 1:
+                break
+            last_chunk = index
+        sync_session.last_chunk = last_chunk
+        sync_session.updated_at = datetime.now(timezone.utc)  # Última actividad: cuenta para purge_expired
+        
         db.commit()
-        db.refresh(vacuna)
-        return vacuna
\ No newline at end of file
+        db.refresh(sync_session)
+        return sync_session
+    
+    @staticmethod
+    def iter_chunks(db: Session, session_id: str):
+        """Recorrer las partes en orden, cargando una a la vez"""
+        for index in SyncSessionRepository.get_chunk_indexes(db, session_id):
+            chunk = db.query(SyncChunk).filter(
+                SyncChunk.session_id == session_id,
+                SyncChunk.chunk_index == index
+            ).first()
+            yield chunk
+            db.expunge(chunk)
+    
+    @staticmethod
+    def discard(db: Session, sync_session: SyncSession):
+        """Eliminar la sesión con sus partes"""
+        SyncSessionRepository._delete_sessions(db, [sync_session.id])
+        db.expunge(sync_session)
+        db.commit()
+    
+    @staticmethod
+    def purge_expired(db: Session, max_age_hours: int = 24) -> int:
+        """Eliminar sesiones abiertas sin partes nuevas en max_age_hours, con sus partes"""
+        cutoff = datetime.now(timezone.utc) - timedelta(hours=max_age_hours)
+        # Las confirmadas se conservan: guardan el resultado para reintentos del commit
+        expired = [row[0] for row in db.query(SyncSession.id).filter(
+            SyncSession.status == 'open',
+            func.coalesce(SyncSession.updated_at, SyncSession.created_at) < cutoff
+        )]
+        if expired:
+            SyncSessionRepository._delete_sessions(db, expired)
+        db.commit()
+        return len(expired)
+    
+    @staticmethod
+    def _delete_sessions(db: Session, session_ids: List[str]):
+        # Core, no la cascada del ORM: esa carga cada parte (con su payload) para borrarla
+        db.execute(delete(SyncChunk).where(SyncChunk.session_id.in_(session_ids)))
+        db.execute(delete(SyncSession).where(SyncSession.id.in_(session_ids)))
@@ -0,0 +1,254 @@
+"""
+Servidor de producción: varios workers uvicorn sobre un socket compartido.
+
+El proceso maestro abre el socket, (opcionalmente) importa la aplicación una
+sola vez (--preload, por defecto) y hace fork de los workers, que comparten
+el código en memoria copy-on-write. El engine de base de datos es perezoso,
+así que ningún worker hereda conexiones del maestro. Se usan uvloop y
+httptools si están instalados.
+
+Señales al proceso maestro:
+    TERM / INT   drenar: los workers reciben SIGTERM, responden 503 (y
+                 /readyz 503) durante SHUTDOWN_PRESTOP_SECONDS, dejan de
+                 aceptar conexiones, terminan las peticiones en curso (hasta
+                 --graceful-timeout) y salen
+    HUP          recarga gradual: arranca una nueva generación de workers y
+                 drena la anterior con SIGINT (sin la espera previa: los
+                 nuevos ya atienden el socket). Con --no-preload cada worker
+                 importa main, así que HUP también carga código nuevo
+    TTIN / TTOU  un worker más / menos
+
+Métricas: cada worker vuelca su registro en METRICS_MULTIPROC_DIR y /metrics
+(en cualquier worker) devuelve la suma de todos (ver metrics.py).
+
+Uso:
+    python serve.py
+    python serve.py --workers 4 --port 8000
+    WEB_CONCURRENCY=4 PORT=8080 python serve.py --no-preload
+"""
+import os
+import sys
+import time
+import signal
+import shutil
+import logging
+import argparse
+import tempfile
+import importlib.util
+from collections import deque
+from typing import Dict
+
+
+def default_workers() -> int:
+    return int(os.environ.get("WEB_CONCURRENCY", 0)) or os.cpu_count() or 1
+
+
+def _available(module: str) -> bool:
+    return importlib.util.find_spec(module) is not None
+
+
+class Arbiter:
+    """Proceso maestro: mantiene N workers vivos y atiende las señales"""
+
+    HANDLED_SIGNALS = (signal.SIGTERM, signal.SIGINT, signal.SIGHUP, signal.SIGTTIN, signal.SIGTTOU)
+    # Un worker que muere antes de esto se considera un fallo de arranque
+    MIN_WORKER_LIFETIME = 1.0
+
+    def __init__(self, args, metrics_dir: str):
+        self.args = args
+        self.metrics_dir = metrics_dir
+        self.target = args.workers
+        self.generation = 0
+        self.workers: Dict[int, dict] = {}  # pid → {"generation", "started", "draining"}
+        self.signals = deque()
+        self.stopping = False
+        self.logger = logging.getLogger("serve")
+
+        import uvicorn
+        self.uvicorn = uvicorn
+        app = "main:app"
+        if args.preload:
+            import main
+            app = main.app
+        self.config = uvicorn.Config(
+            app,
+            host=args.host,
+            port=args.port,
+            loop="uvloop" if _available("uvloop") else "asyncio",
+            http="httptools" if _available("httptools") else "h11",
+            lifespan="on",
+            log_config=None,  # structured_logging ya configuró el logger raíz
+            access_log=False,
+            proxy_headers=True,
+            forwarded_allow_ips=os.environ.get("FORWARDED_ALLOW_IPS", "127.0.0.1"),
+            backlog=args.backlog,
+            timeout_keep_alive=args.keep_alive,
+            timeout_graceful_shutdown=args.graceful_timeout,
+        )
+        if args.preload:
+            self.config.load()
+        self.sock = self.config.bind_socket()
+
+    # ---------- workers ----------
+
+    def spawn_worker(self):
+        pid = os.fork()
+        if pid:
+            self.workers[pid] = {"generation": self.generation, "started": time.monotonic(), "draining": False}
+            return
+
+        # Worker: señales por defecto (uvicorn instala las suyas al arrancar)
+        for sig in self.HANDLED_SIGNALS:
+            signal.signal(sig, signal.SIG_DFL)
+        exit_code = 0
+        try:
+            from lifecycle import drain_on_exit
+            drain_on_exit(self.uvicorn.Server(self.config)).run(sockets=[self.sock])
+        except BaseException:
+            logging.getLogger("serve").exception(f"❌ Worker {os.getpid()} terminó con error")
+            exit_code = 1
+        finally:
+            logging.shutdown()
+            os._exit(exit_code)
+
+    def kill_worker(self, pid: int, sig: int = signal.SIGTERM):
+        """SIGTERM: drenar con espera previa (apagado); SIGINT: drenar ya (recarga)"""
+        info = self.workers.get(pid)
+        if info is None or (info["draining"] and sig != signal.SIGKILL):
+            return  # Una segunda señal haría que uvicorn corte sin drenar
+        info["draining"] = True
+        try:
+            os.kill(pid, sig)
+        except ProcessLookupError:
+            self.workers.pop(pid, None)
+
+    def reap_workers(self):
+        while True:
+            try:
+                pid, status = os.waitpid(-1, os.WNOHANG)
+            except ChildProcessError:
+                return
+            if not pid:
+                return
+            info = self.workers.pop(pid, None)
+            # Sus contadores siguen sumando en /metrics; sus gauges no
+            live_path = os.path.join(self.metrics_dir, f"worker-{pid}.json")
+            if os.path.exists(live_path):
+                os.replace(live_path, os.path.join(self.metrics_dir, f"dead-{pid}.json"))
+            if info is None or self.stopping:
+                continue
+            code = os.waitstatus_to_exitcode(status)
+            if code != 0:
+                self.logger.warning(f"⚠️  Worker {pid} terminó con código {code}")
+                if time.monotonic() - info["started"] < self.MIN_WORKER_LIFETIME:
+                    time.sleep(self.MIN_WORKER_LIFETIME)  # evitar un bucle de reinicios
+
+    def current_workers(self):
+        return [pid for pid, info in self.workers.items()
+                if info["generation"] == self.generation and not info["draining"]]
+
+    def maintain_workers(self):
+        current = self.current_workers()
+        for _ in range(self.target - len(current)):
+            self.spawn_worker()
+        # TTOU: sobran workers de la generación actual → drenar los más viejos
+        for pid in sorted(current, key=lambda p: self.workers[p]["started"])[:max(len(current) - self.target, 0)]:
+            self.kill_worker(pid, signal.SIGINT)
+
+    # ---------- señales ----------
+
+    def _on_signal(self, signum, frame):
+        self.signals.append(signum)
+
+    def handle_signal(self, signum: int):
+        if signum in (signal.SIGTERM, signal.SIGINT):
+            self.stopping = True
+        elif signum == signal.SIGHUP:
+            old = list(self.workers)
+            self.generation += 1
+            self.logger.info(f"🔄 Recarga gradual: generación {self.generation}, drenando {len(old)} workers")
+            for _ in range(self.target):
+                self.spawn_worker()
+            for pid in old:
+                self.kill_worker(pid, signal.SIGINT)
+        elif signum == signal.SIGTTIN:
+            self.target += 1
+            self.logger.info(f"➕ Workers: {self.target}")
+        elif signum == signal.SIGTTOU and self.target > 1:
+            self.target -= 1
+            self.logger.info(f"➖ Workers: {self.target}")
+
+    # ---------- ciclo principal ----------
+
+    def run(self):
+        for sig in self.HANDLED_SIGNALS:
+            signal.signal(sig, self._on_signal)
+
+        self.logger.info(
+            f"🚀 Maestro {os.getpid()}: {self.target} workers en http://{self.args.host}:{self.args.port} "
+            f"(loop={self.config.loop}, http={self.config.http}, preload={self.args.preload})"
+        )
+        while not self.stopping:
+            while self.signals:
+                self.handle_signal(self.signals.popleft())
+            if self.stopping:
+                break
+            self.reap_workers()
+            self.maintain_workers()
+            time.sleep(0.2)
+
+        self.drain()
+
+    def drain(self):
+        self.logger.info(f"🛑 Drenando {len(self.workers)} workers (hasta {self.args.graceful_timeout}s)")
+        for pid in list(self.workers):
+            self.kill_worker(pid)
+        # Los workers siguen escuchando SHUTDOWN_PRESTOP_SECONDS antes de drenar (lifecycle.py)
+        prestop = float(os.environ.get("SHUTDOWN_PRESTOP_SECONDS", 5))
+        deadline = time.monotonic() + prestop + self.args.graceful_timeout + 5
+        while self.workers and time.monotonic() < deadline:
+            self.reap_workers()
+            time.sleep(0.1)
+        for pid in list(self.workers):
+            self.logger.warning(f"⚠️  Worker {pid} no terminó a tiempo: SIGKILL")
+            self.kill_worker(pid, signal.SIGKILL)
+        self.reap_workers()
+        self.sock.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default=os.environ.get("HOST", "0.0.0.0"))
+    parser.add_argument("--port", type=int, default=int(os.environ.get("PORT", 8000)))
+    parser.add_argument("--workers", type=int, default=default_workers(),
+                        help="Por defecto WEB_CONCURRENCY o el número de CPUs")
+    parser.add_argument("--no-preload", dest="preload", action="store_false",
+                        help="Cada worker importa la aplicación (HUP carga código nuevo)")
+    parser.add_argument("--graceful-timeout", type=int, default=int(os.environ.get("GRACEFUL_TIMEOUT", 30)))
+    parser.add_argument("--keep-alive", type=int, default=5)
+    parser.add_argument("--backlog", type=int, default=2048)
+    parser.add_argument("--metrics-dir", default=os.environ.get("METRICS_MULTIPROC_DIR"))
+    args = parser.parse_args()
+
+    # Antes de importar la aplicación: metrics.py lee METRICS_MULTIPROC_DIR al importarse
+    owns_metrics_dir = not args.metrics_dir
+    metrics_dir = args.metrics_dir or tempfile.mkdtemp(prefix="healthshield-metrics-")
+    os.makedirs(metrics_dir, exist_ok=True)
+    for filename in os.listdir(metrics_dir):
+        if filename.endswith(".json"):
+            os.remove(os.path.join(metrics_dir, filename))
+    os.environ["METRICS_MULTIPROC_DIR"] = metrics_dir
+
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    from structured_logging import configure_logging
+    configure_logging()
+
+    try:
+        Arbiter(args, metrics_dir).run()
+    finally:
+        if owns_metrics_dir:
+            shutil.rmtree(metrics_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
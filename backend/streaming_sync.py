@@ -0,0 +1,125 @@
+"""
+Ingesta en streaming para la sincronización masiva.
+
+El cuerpo JSON ({"pacientes": [...], "vacunas": [...]}) se parsea de forma
+incremental con ijson a medida que llegan los bytes. Los registros se validan
+y aplican en lotes de tamaño fijo, así que la memoria máxima depende del
+tamaño del lote y no del tamaño del payload.
+"""
+import os
+import logging
+from typing import Any, AsyncIterator, Dict, List, Tuple
+
+import ijson
+from pydantic import ValidationError
+
+from models import PacienteCreate, VacunaCreate
+
+logger = logging.getLogger(__name__)
+
+SYNC_STREAM_BATCH_SIZE = int(os.environ.get('SYNC_STREAM_BATCH_SIZE', 500))
+
+# Prefijos ijson de cada registro dentro del cuerpo
+ITEM_PREFIXES = {
+    'pacientes.item': 'pacientes',
+    'vacunas.item': 'vacunas',
+}
+
+RECORD_SCHEMAS = {
+    'pacientes': PacienteCreate,
+    'vacunas': VacunaCreate,
+}
+
+
+class AsyncByteStream:
+    """Adaptador de un iterador asíncrono de bytes (request.stream()) a read(n)"""
+
+    def __init__(self, chunks: AsyncIterator[bytes]):
+        self._chunks = chunks.__aiter__()
+        self._buffer = b""
+        self._eof = False
+        self.bytes_read = 0
+
+    async def read(self, size: int = -1) -> bytes:
+        while not self._eof and (size < 0 or len(self._buffer) < size):
+            try:
+                chunk = await self._chunks.__anext__()
+            except StopAsyncIteration:
+                self._eof = True
+                break
+            self.bytes_read += len(chunk)
+            self._buffer += chunk
+
+        if size < 0 or size >= len(self._buffer):
+            data, self._buffer = self._buffer, b""
+        else:
+            data, self._buffer = self._buffer[:size], self._buffer[size:]
+        return data
+
+
+async def iter_raw_batches(
+    source, batch_size: int = SYNC_STREAM_BATCH_SIZE
+) -> AsyncIterator[Tuple[str, List[Any]]]:
+    """
+    Recorrer el cuerpo y producir lotes ('pacientes' | 'vacunas', [dict, ...]).
+    Solo se mantiene en memoria el lote actual.
+    """
+    kind = None
+    batch: List[Any] = []
+    builder = None
+    item_prefix = None
+
+    async for prefix, event, value in ijson.parse_async(source, use_float=True):
+        if builder is not None:
+            # Dentro de un registro: construir el dict hasta su cierre
+            builder.event(event, value)
+            if prefix != item_prefix or event != 'end_map':
+                continue
+            batch.append(builder.value)
+            builder = None
+
+        elif prefix in ITEM_PREFIXES:
+            record_kind = ITEM_PREFIXES[prefix]
+            if record_kind != kind:
+                if batch:
+                    yield kind, batch
+                    batch = []
+                kind = record_kind
+
+            if event == 'start_map':
+                item_prefix = prefix
+                builder = ijson.ObjectBuilder()
+                builder.event(event, value)
+                continue
+            # Valor que no es un objeto: se deja que la validación lo rechace
+            batch.append(value)
+
+        else:
+            continue
+
+        if len(batch) >= batch_size:
+            yield kind, batch
+            batch = []
+
+    if batch:
+        yield kind, batch
+
+
+def validate_batch(kind: str, raw_records: List[Any]) -> Tuple[List[Any], List[Dict[str, Any]]]:
+    """Validar un lote registro a registro; los inválidos se devuelven como conflictos"""
+    schema = RECORD_SCHEMAS[kind]
+    valid = []
+    conflicts = []
+
+    for raw in raw_records:
+        try:
+            valid.append(schema.model_validate(raw))
+        except ValidationError as e:
+            local_id = raw.get('local_id') if isinstance(raw, dict) else None
+            conflicts.append({
+                'type': 'paciente' if kind == 'pacientes' else 'vacuna',
+                'local_id': local_id,
+                'error': "; ".join(error['msg'] for error in e.errors())
+            })
+
+    return valid, conflicts
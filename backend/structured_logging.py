@@ -0,0 +1,256 @@
+"""
+Logging estructurado, asíncrono y muestreado.
+
+- Un único configure_logging() reemplaza los logging.basicConfig de main.py
+  y database.py.
+- Las llamadas a logger.* solo encolan el registro (QueueHandler); un hilo
+  (QueueListener) lo formatea y lo escribe en stderr. Si la cola se llena se
+  descarta el registro y se cuenta en /metrics en lugar de bloquear la
+  petición.
+- Formato JSON por línea (LOG_FORMAT=json, por defecto) o texto legible
+  (LOG_FORMAT=text, para desarrollo local).
+- Muestreo por logger para mensajes de bucles calientes (LOG_SAMPLING,
+  p. ej. "sync_service.records=0.01"). Solo se muestrean DEBUG/INFO; las
+  advertencias y errores se emiten siempre. Cada registro muestreado lleva
+  sample_rate para poder extrapolar.
+- Correlación por petición: RequestIdMiddleware toma X-Request-ID (o genera
+  uno), lo devuelve en la respuesta y lo añade a cada registro emitido
+  durante la petición.
+"""
+import os
+import sys
+import json
+import uuid
+import queue
+import random
+import atexit
+import logging
+import contextvars
+import logging.handlers
+from datetime import datetime, timezone
+from typing import Dict, Optional
+
+from metrics import Counter, registry
+
+LOG_LEVEL = os.environ.get('LOG_LEVEL', 'INFO').upper()
+LOG_FORMAT = os.environ.get('LOG_FORMAT', 'json').lower()
+LOG_QUEUE_SIZE = int(os.environ.get('LOG_QUEUE_SIZE', 10000))
+LOG_SAMPLING = os.environ.get('LOG_SAMPLING', 'sync_service.records=0.01')
+REQUEST_ID_HEADER = "X-Request-ID"
+
+request_id_var: contextvars.ContextVar[Optional[str]] = contextvars.ContextVar("request_id", default=None)
+
+log_records_dropped = registry.register(Counter(
+    "healthshield_log_records_dropped_total", "Registros de log descartados por cola llena"))
+
+# Atributos estándar de LogRecord: todo lo demás viene de extra={...}
+# (color_message: copia con códigos ANSI que añade uvicorn)
+_RECORD_ATTRS = frozenset(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {
+    "message", "asctime", "color_message"}
+
+
+def parse_sampling(spec: str) -> Dict[str, float]:
+    """"logger=tasa,otro=tasa" → {"logger": tasa}"""
+    rates = {}
+    for part in (spec or "").split(","):
+        name, _, rate = part.partition("=")
+        if name.strip() and rate.strip():
+            rates[name.strip()] = min(max(float(rate), 0.0), 1.0)
+    return rates
+
+
+# ==================== FILTROS Y FORMATO ====================
+
+class SamplingFilter(logging.Filter):
+    """Deja pasar una fracción de los registros DEBUG/INFO de ciertos loggers"""
+
+    def __init__(self, rates: Dict[str, float]):
+        super().__init__()
+        self.rates = rates
+
+    def _rate(self, name: str) -> Optional[float]:
+        # El logger más específico configurado (sync_service.records antes que sync_service)
+        while name:
+            if name in self.rates:
+                return self.rates[name]
+            name = name.rpartition(".")[0]
+        return None
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno > logging.INFO or not self.rates:
+            return True
+        rate = self._rate(record.name)
+        if rate is None or rate >= 1.0:
+            return True
+        if random.random() >= rate:
+            return False
+        record.sample_rate = rate
+        return True
+
+
+class RequestIdFilter(logging.Filter):
+    """Añade request_id al registro en el hilo que lo emite (antes de encolarlo)"""
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        record.request_id = request_id_var.get()
+        return True
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+        }
+        if getattr(record, "request_id", None):
+            entry["request_id"] = record.request_id
+        for key, value in record.__dict__.items():
+            if key not in _RECORD_ATTRS and key != "request_id" and not key.startswith("_"):
+                entry[key] = value
+        if record.exc_info:
+            record.exc_text = record.exc_text or self.formatException(record.exc_info)
+        if record.exc_text:
+            entry["exc"] = record.exc_text
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class TextFormatter(logging.Formatter):
+    def __init__(self):
+        super().__init__('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+
+    def format(self, record: logging.LogRecord) -> str:
+        line = super().format(record)
+        request_id = getattr(record, "request_id", None)
+        return f"{line} [{request_id}]" if request_id else line
+
+
+# ==================== COLA NO BLOQUEANTE ====================
+
+class NonBlockingQueueHandler(logging.handlers.QueueHandler):
+    """
+    Encola sin formatear: el mensaje se resuelve aquí (los args pueden
+    cambiar después) pero el JSON se arma en el hilo del listener.
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record: logging.LogRecord):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            log_records_dropped.inc()
+
+
+_listener: Optional[logging.handlers.QueueListener] = None
+_config: Optional[dict] = None
+
+
+def configure_logging(level: str = LOG_LEVEL, fmt: str = LOG_FORMAT, sampling: str = LOG_SAMPLING,
+                      stream=None):
+    """Configurar el logger raíz (idempotente: reemplaza la configuración anterior)"""
+    global _listener, _config
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+    _config = {"level": level, "fmt": fmt, "sampling": sampling, "stream": stream}
+
+    output = logging.StreamHandler(stream or sys.stderr)
+    output.setFormatter(JsonFormatter() if fmt == "json" else TextFormatter())
+
+    handler = NonBlockingQueueHandler(queue.Queue(maxsize=LOG_QUEUE_SIZE))
+    handler.addFilter(SamplingFilter(parse_sampling(sampling)))
+    handler.addFilter(RequestIdFilter())
+
+    root = logging.getLogger()
+    for existing in list(root.handlers):
+        root.removeHandler(existing)
+    root.addHandler(handler)
+    root.setLevel(level)
+
+    _listener = logging.handlers.QueueListener(handler.queue, output, respect_handler_level=True)
+    _listener.start()
+    return _listener
+
+
+def shutdown_logging():
+    """Vaciar la cola y detener el listener"""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+
+def flush_logging():
+    """
+    Vaciar la cola y seguir escribiendo de forma síncrona: para el final del
+    apagado, cuando ya no vale la pena un hilo pero aún quedan mensajes
+    """
+    global _listener
+    if _listener is None:
+        return
+    listener, _listener = _listener, None
+    listener.stop()
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        if isinstance(handler, NonBlockingQueueHandler):
+            root.removeHandler(handler)
+            for output in listener.handlers:
+                for log_filter in handler.filters:
+                    output.addFilter(log_filter)
+                root.addHandler(output)
+
+
+def _restart_after_fork():
+    # Los hilos no sobreviven a fork(): cada worker de serve.py necesita su listener
+    global _listener
+    if _listener is not None:
+        _listener = None
+        configure_logging(**_config)
+
+
+atexit.register(shutdown_logging)
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_restart_after_fork)
+
+
+# ==================== ID DE PETICIÓN ====================
+
+class RequestIdMiddleware:
+    """Propaga X-Request-ID (o genera uno) a los logs y a la respuesta"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        request_id = None
+        for name, value in scope.get("headers", ()):
+            if name == b"x-request-id":
+                request_id = value.decode("latin-1")[:128]
+                break
+        request_id = request_id or uuid.uuid4().hex
+        token = request_id_var.set(request_id)
+
+        async def send_with_request_id(message):
+            if message["type"] == "http.response.start":
+                message.setdefault("headers", [])
+                message["headers"] = list(message["headers"]) + [
+                    (REQUEST_ID_HEADER.lower().encode("latin-1"), request_id.encode("latin-1"))
+                ]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_request_id)
+        finally:
+            request_id_var.reset(token)
@@ -0,0 +1,141 @@
+"""
+Lógica de aplicación de datos de sincronización (pacientes y vacunas).
+Compartida por /api/sync/bulk y por el protocolo de sincronización por partes.
+"""
+import os
+import logging
+from datetime import datetime
+from typing import Any, Dict, Iterable, List
+
+from sqlalchemy.orm import Session
+
+from models import PacienteCreate, VacunaCreate, BulkSyncResponse
+from repositories import DeletedRecordError, PacienteRepository, VacunaRepository
+
+logger = logging.getLogger(__name__)
+# Mensajes por registro: muestreados (LOG_SAMPLING, ver structured_logging.py)
+record_logger = logging.getLogger(f"{__name__}.records")
+
+# Conflictos que se devuelven con detalle; del resto solo se informa el total
+SYNC_MAX_REPORTED_CONFLICTS = int(os.environ.get('SYNC_MAX_REPORTED_CONFLICTS', 1000))
+
+
+class SyncResult:
+    """Acumula ids asignados y conflictos a lo largo de uno o varios lotes"""
+
+    def __init__(self, track_ids: bool = True):
+        # Sin track_ids solo se cuentan registros: la memoria no crece con el payload
+        self.track_ids = track_ids
+        self.pacientes_ids: Dict[str, Any] = {}
+        self.vacunas_ids: Dict[str, Any] = {}
+        self.conflicts: List[Dict[str, Any]] = []
+        self.conflicts_count = 0
+        self.pacientes_recibidos = 0
+        self.vacunas_recibidas = 0
+        self.pacientes_aplicados = 0
+        self.vacunas_aplicadas = 0
+
+    def record_paciente(self, local_id, server_id: int, action: str):
+        self.pacientes_aplicados += 1
+        if self.track_ids:
+            self.pacientes_ids[str(local_id)] = {'server_id': server_id, 'action': action}
+
+    def record_vacuna(self, local_id, server_id: int, action: str):
+        self.vacunas_aplicadas += 1
+        if self.track_ids:
+            self.vacunas_ids[str(local_id)] = {'server_id': server_id, 'action': action}
+
+    def record_conflict(self, tipo: str, local_id, error: str):
+        self.conflicts_count += 1
+        # Acotado: un stream con muchos registros inválidos no acumula una lista sin fin
+        if len(self.conflicts) < SYNC_MAX_REPORTED_CONFLICTS:
+            self.conflicts.append({'type': tipo, 'local_id': local_id, 'error': error})
+
+    def to_response(self, message: str = "Sincronización completada") -> BulkSyncResponse:
+        return BulkSyncResponse(
+            message=message,
+            pacientes_sincronizados=self.pacientes_recibidos,
+            vacunas_sincronizadas=self.vacunas_recibidas,
+            pacientes_ids=self.pacientes_ids,
+            vacunas_ids=self.vacunas_ids,
+            conflicts=self.conflicts if self.conflicts else None,
+            conflicts_count=self.conflicts_count if self.conflicts_count else None,
+            server_timestamp=datetime.now().isoformat()
+        )
+
+
+def apply_pacientes(db: Session, pacientes: Iterable[PacienteCreate], result: SyncResult):
+    """
+    Crear o actualizar pacientes (por cédula) sin confirmar la transacción.
+    Cada registro va en un SAVEPOINT: un error se reporta como conflicto
+    sin deshacer los registros anteriores. Una cédula eliminada en el
+    servidor también es conflicto: solo se reactiva con restore.
+    """
+    for paciente in pacientes:
+        result.pacientes_recibidos += 1
+        try:
+            record_logger.info("🔄 Procesando paciente: %s", paciente.cedula)
+
+            with db.begin_nested():
+                existing_paciente = PacienteRepository.get_by_cedula(db, paciente.cedula)
+
+                if existing_paciente:
+                    # Actualizar
+                    update_data = {
+                        'nombre': paciente.nombre,
+                        'fecha_nacimiento': paciente.fecha_nacimiento,
+                        'telefono': paciente.telefono,
+                        'direccion': paciente.direccion,
+                        'is_synced': True
+                    }
+                    PacienteRepository.update(db, existing_paciente.id, update_data, commit=False)
+                    result.record_paciente(paciente.local_id, existing_paciente.id, 'updated')
+                else:
+                    # Crear nuevo
+                    db_paciente = PacienteRepository.create(db, paciente, commit=False)
+                    result.record_paciente(paciente.local_id, db_paciente.id, 'created')
+
+        except DeletedRecordError as e:
+            # El dispositivo aún no recibió la lápida: la verá en /api/sync/updates
+            record_logger.info("🪦 %s", e)
+            result.record_conflict('paciente', paciente.local_id, str(e))
+        except Exception as e:
+            logger.error(f"❌ Error paciente {paciente.cedula}: {e}")
+            result.record_conflict('paciente', paciente.local_id, str(e))
+
+
+def apply_vacunas(db: Session, vacunas: Iterable[VacunaCreate], usuario_id: int, result: SyncResult):
+    """Crear o actualizar vacunas sin confirmar la transacción"""
+    for vacuna in vacunas:
+        result.vacunas_recibidas += 1
+        try:
+            # Usar el paciente_id directamente (puede ser None)
+            vacuna_data = VacunaCreate(
+                paciente_id=vacuna.paciente_id,
+                paciente_server_id=vacuna.paciente_server_id,
+                nombre_vacuna=vacuna.nombre_vacuna,
+                fecha_aplicacion=vacuna.fecha_aplicacion,
+                lote=vacuna.lote,
+                proxima_dosis=vacuna.proxima_dosis,
+                usuario_id=vacuna.usuario_id or usuario_id,
+                es_menor=vacuna.es_menor,
+                cedula_tutor=vacuna.cedula_tutor,
+                cedula_propia=vacuna.cedula_propia,
+                nombre_paciente=vacuna.nombre_paciente,
+                cedula_paciente=vacuna.cedula_paciente,
+                local_id=vacuna.local_id,
+                server_id=vacuna.server_id
+            )
+
+            with db.begin_nested():
+                db_vacuna = VacunaRepository.create(db, vacuna_data, commit=False)
+
+            result.record_vacuna(vacuna.local_id, db_vacuna.id, 'created')
+
+        except DeletedRecordError as e:
+            # El dispositivo aún no recibió la lápida: la verá en /api/sync/updates
+            record_logger.info("🪦 %s", e)
+            result.record_conflict('vacuna', vacuna.local_id, str(e))
+        except Exception as e:
+            logger.error(f"❌ Error vacuna {vacuna.nombre_vacuna}: {e}")
+            result.record_conflict('vacuna', vacuna.local_id, str(e))
@@ -0,0 +1,61 @@
+"""
+Fixtures comunes: la API completa sobre un SQLite temporal (sin Neon).
+
+Cada hilo (threadpool, tareas de fondo) usa su propia conexión del pool,
+como con PostgreSQL: una sola conexión compartida mezclaría los SAVEPOINT
+de peticiones concurrentes.
+
+    cd backend && python -m pytest -q
+"""
+import os
+import sys
+import atexit
+import shutil
+import tempfile
+
+os.environ.setdefault("LOOP_MONITOR_ENABLED", "false")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pytest  # noqa: E402
+from sqlalchemy import create_engine  # noqa: E402
+from sqlalchemy.orm import sessionmaker  # noqa: E402
+
+import database  # noqa: E402
+
+_db_dir = tempfile.mkdtemp(prefix="healthshield-tests-")
+atexit.register(shutil.rmtree, _db_dir, ignore_errors=True)
+_engine = create_engine(
+    f"sqlite:///{os.path.join(_db_dir, 'healthshield.db')}",
+    connect_args={"check_same_thread": False, "timeout": 30},
+)
+database._engine = _engine
+database._SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=_engine)
+database._engine_initialized = True
+
+import bootstrap  # noqa: E402
+
+assert bootstrap.run_bootstrap()
+
+import main  # noqa: E402
+from fastapi.testclient import TestClient  # noqa: E402
+
+
+@pytest.fixture(scope="session")
+def client():
+    with TestClient(main.app) as test_client:
+        yield test_client
+
+
+@pytest.fixture(scope="session")
+def auth_headers(client):
+    response = client.post("/api/auth/login", json={"username": "admin", "password": "Admin123!"})
+    return {"Authorization": f"Bearer {response.json()['token']}"}
+
+
+@pytest.fixture
+def db():
+    session = database.get_session_factory()()
+    try:
+        yield session
+    finally:
+        session.close()
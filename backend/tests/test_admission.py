@@ -0,0 +1,137 @@
+"""Control de admisión: AIMD del límite bulk, token buckets y respuestas 429/503"""
+import pytest
+from starlette.testclient import TestClient
+
+import admission
+from admission import AdmissionController, AdmissionMiddleware, TokenBucketLimiter, parse_rate, priority_class
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(admission.time, "monotonic", clock)
+    return clock
+
+
+def _tick(controller, clock, seconds=1.0):
+    clock.now += seconds
+    assert controller.try_acquire("bulk") or controller.limits["bulk"] == 0
+    if controller.in_flight["bulk"]:
+        controller.release("bulk", 0.0)
+
+
+def test_priority_classes_by_path():
+    assert priority_class("/livez") == "critical"
+    assert priority_class("/api/sync/bulk") == "bulk"
+    assert priority_class("/api/profesionales/validar") == "bulk"
+    assert priority_class("/api/pacientes") == "interactive"
+
+
+def test_bulk_limit_halves_under_slow_interactive_traffic_and_recovers_by_one(clock):
+    controller = AdmissionController(max_interactive=4, max_bulk=8, latency_target=0.5, adjust_every=1)
+
+    for expected in (4, 2, 1, 0):
+        assert controller.try_acquire("interactive")
+        controller.release("interactive", 2.0)
+        _tick(controller, clock)
+        assert controller.limits["bulk"] == expected
+    assert not controller.try_acquire("bulk")  # Todo el bulk se descarta
+
+    while controller.overloaded():
+        controller.try_acquire("interactive")
+        controller.release("interactive", 0.01)
+    for expected in (1, 2, 3):
+        controller.try_acquire("interactive")
+        controller.release("interactive", 0.01)
+        _tick(controller, clock)
+        assert controller.limits["bulk"] == expected
+    assert not controller.overloaded()
+
+
+def test_bulk_limit_recovers_without_interactive_traffic(clock):
+    controller = AdmissionController(max_bulk=2, latency_target=0.5, adjust_every=1)
+    controller.try_acquire("interactive")
+    controller.release("interactive", 2.0)
+    _tick(controller, clock)
+    assert controller.limits["bulk"] == 1
+
+    for _ in range(3):
+        _tick(controller, clock)
+
+    # Sin muestras nuevas la media vieja se olvida y el límite vuelve al máximo
+    assert controller.limits["bulk"] == 2
+    assert controller.latency_ewma is None
+
+
+def test_concurrency_limit_per_class_and_critical_always_admitted(clock):
+    controller = AdmissionController(max_interactive=1, max_bulk=1, adjust_every=60)
+
+    assert controller.try_acquire("interactive")
+    assert not controller.try_acquire("interactive")
+    assert controller.try_acquire("bulk")
+    assert controller.try_acquire("critical")
+    controller.release("interactive", 0.01)
+    assert controller.try_acquire("interactive")
+
+
+def test_token_bucket_refills_at_the_configured_rate(clock):
+    assert parse_rate("10/60") == (10.0, 10 / 60)
+    limiter = TokenBucketLimiter("2/10")
+
+    assert limiter.acquire("a") == 0
+    assert limiter.acquire("a") == 0
+    assert limiter.acquire("a") == pytest.approx(5)
+    assert limiter.acquire("b") == 0  # Cada identidad tiene su bucket
+
+    clock.now += 5
+    assert limiter.acquire("a") == 0
+    assert limiter.acquire("a") > 0
+
+
+def test_token_bucket_forgets_the_least_recently_used_keys(clock):
+    limiter = TokenBucketLimiter("1/60", max_keys=2)
+    limiter.acquire("a")
+    limiter.acquire("b")
+    limiter.acquire("c")
+
+    assert limiter.acquire("a") == 0  # Olvidada: bucket lleno otra vez
+    assert limiter.acquire("c") > 0
+
+
+async def _ok_app(scope, receive, send):
+    await send({"type": "http.response.start", "status": 200, "headers": [(b"content-type", b"text/plain")]})
+    await send({"type": "http.response.body", "body": b"ok"})
+
+
+def test_middleware_returns_429_with_retry_after_per_identity(clock, monkeypatch):
+    monkeypatch.setitem(admission.RATE_LIMITS, "login", ("/api/auth/login", TokenBucketLimiter("1/30")))
+    client = TestClient(AdmissionMiddleware(_ok_app, AdmissionController(adjust_every=60)))
+
+    assert client.post("/api/auth/login", headers={"X-Device-ID": "tablet-1"}).status_code == 200
+    limited = client.post("/api/auth/login", headers={"X-Device-ID": "tablet-1"})
+    assert client.post("/api/auth/login", headers={"X-Device-ID": "tablet-2"}).status_code == 200
+
+    assert limited.status_code == 429
+    assert limited.headers["retry-after"] == "30"
+    assert limited.json()["status_code"] == 429
+
+
+def test_middleware_sheds_bulk_with_503_when_the_limit_is_zero(clock):
+    controller = AdmissionController(max_bulk=0, adjust_every=60)
+    client = TestClient(AdmissionMiddleware(_ok_app, controller))
+
+    shed = client.post("/api/sync/bulk")
+
+    assert shed.status_code == 503
+    assert shed.headers["retry-after"] == str(admission.ADMISSION_RETRY_AFTER)
+    assert client.get("/api/pacientes").status_code == 200
+    assert client.get("/livez").status_code == 200
+    assert controller.in_flight == {"interactive": 0, "bulk": 0}
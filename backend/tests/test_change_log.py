@@ -0,0 +1,226 @@
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from sqlalchemy import create_engine, func, select, text, update
+from sqlalchemy.orm import sessionmaker
+
+from change_log import (
+    CHANGE_LOG_RETENTION_DAYS, SOFT_DELETE_RETENTION_DAYS, ChangeLogMaintenance,
+    backfill, compact, fetch_changes, latest_seq, purge_tombstones,
+)
+from database import Base, upgrade_schema
+from models import ChangeLog, Paciente, Vacuna
+
+
+# session.dirty no tiene orden fijo: varias rondas con otra fila borrada
+@pytest.mark.parametrize("deleted_index", range(0, 10, 2))
+def test_soft_delete_does_not_relabel_other_updates_in_the_same_flush(db, deleted_index):
+    pacientes = [Paciente(cedula=f"CL50-{deleted_index}-{i}", nombre=f"Paciente Registro {i}",
+                          fecha_nacimiento="1990-01-01")
+                 for i in range(10)]
+    db.add_all(pacientes)
+    db.commit()
+
+    deleted = pacientes[deleted_index]
+    for paciente in pacientes:
+        if paciente is deleted:
+            paciente.deleted_at = datetime.now(timezone.utc)
+        else:
+            paciente.telefono = "0414-5555555"
+    db.commit()
+
+    ids = [p.id for p in pacientes]
+    actions = dict(db.execute(
+        select(ChangeLog.entity_id, ChangeLog.action)
+        .where(ChangeLog.entity == "paciente", ChangeLog.entity_id.in_(ids), ChangeLog.action != "created")
+    ).all())
+    assert actions == {p.id: "deleted" if p is deleted else "updated" for p in pacientes}
+
+
+def test_upgrade_schema_adds_active_paciente_index_and_drops_the_duplicate():
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(engine)
+    with engine.begin() as conn:
+        conn.execute(text("DROP INDEX ix_pacientes_id_activos"))
+        # Creado por la versión anterior: duplicaba el índice único de cédula
+        conn.execute(text("CREATE INDEX ix_pacientes_cedula_activos ON pacientes (cedula) WHERE deleted_at IS NULL"))
+
+    upgrade_schema(engine)
+
+    with engine.connect() as conn:
+        definitions = dict(conn.execute(text(
+            "SELECT name, sql FROM sqlite_master WHERE type = 'index' AND tbl_name = 'pacientes'"
+        )).all())
+    assert "WHERE deleted_at IS NULL" in definitions["ix_pacientes_id_activos"]
+    assert "ix_pacientes_cedula_activos" not in definitions
+
+
+def _deleted_paciente(client, auth_headers, cedula: str) -> int:
+    created = client.post("/api/pacientes", headers=auth_headers, json={
+        "cedula": cedula, "nombre": "Paciente Eliminado", "fecha_nacimiento": "1985-02-03"})
+    assert created.status_code == 201
+    paciente_id = created.json()["id"]
+    assert client.delete(f"/api/pacientes/{paciente_id}", headers=auth_headers).status_code == 200
+    return paciente_id
+
+
+def test_sync_does_not_resurrect_a_deleted_paciente(client, auth_headers, db):
+    paciente_id = _deleted_paciente(client, auth_headers, "T50-SYNC")
+
+    # Un dispositivo sin la lápida vuelve a subir el paciente
+    response = client.post("/api/sync/bulk", headers=auth_headers, json={"pacientes": [
+        {"local_id": 7, "cedula": "T50-SYNC", "nombre": "Paciente Eliminado", "fecha_nacimiento": "1985-02-03"}]})
+
+    assert response.status_code == 200
+    assert [c["local_id"] for c in response.json()["conflicts"]] == [7]
+    assert db.get(Paciente, paciente_id).deleted_at is not None
+    assert client.post("/api/pacientes", headers=auth_headers, json={
+        "cedula": "T50-SYNC", "nombre": "Paciente Eliminado", "fecha_nacimiento": "1985-02-03"}).status_code == 409
+
+
+def test_restore_reactivates_the_paciente_and_its_vacunas(client, auth_headers, db):
+    created = client.post("/api/pacientes", headers=auth_headers, json={
+        "cedula": "T50-RESTORE", "nombre": "Paciente Restaurado", "fecha_nacimiento": "1985-02-03"})
+    paciente_id = created.json()["id"]
+    vacuna = client.post("/api/vacunas", headers=auth_headers, json={
+        "paciente_id": paciente_id, "nombre_vacuna": "Hepatitis B", "fecha_aplicacion": "2024-01-10"})
+    assert client.delete(f"/api/pacientes/{paciente_id}", headers=auth_headers).status_code == 200
+
+    response = client.post(f"/api/pacientes/{paciente_id}/restore", headers=auth_headers)
+
+    assert response.status_code == 200
+    assert db.get(Paciente, paciente_id).deleted_at is None
+    assert db.get(Vacuna, vacuna.json()["id"]).deleted_at is None
+    assert client.post(f"/api/pacientes/{paciente_id}/restore", headers=auth_headers).status_code == 404
+
+
+def test_deleted_vacuna_is_not_reinserted_by_server_id(client, auth_headers, db):
+    vacuna = Vacuna(server_id=950001, nombre_vacuna="Tétanos", fecha_aplicacion="2024-02-01",
+                    deleted_at=datetime.now(timezone.utc))
+    db.add(vacuna)
+    db.commit()
+
+    response = client.post("/api/sync/bulk", headers=auth_headers, json={"vacunas": [
+        {"local_id": 3, "server_id": 950001, "nombre_vacuna": "Tétanos", "fecha_aplicacion": "2024-02-01"}]})
+
+    assert response.status_code == 200
+    assert [c["local_id"] for c in response.json()["conflicts"]] == [3]
+    assert db.scalar(select(func.count()).select_from(Vacuna).where(Vacuna.server_id == 950001)) == 1
+
+
+def test_delete_endpoints_require_an_admin(client, auth_headers):
+    registered = client.post("/api/auth/register", json={
+        "username": "enfermera50", "email": "enfermera50@example.com", "password": "Clave123!"})
+    assert registered.status_code == 201
+    user_headers = {"Authorization": f"Bearer {registered.json()['token']}"}
+    created = client.post("/api/pacientes", headers=auth_headers, json={
+        "cedula": "T50-ADMIN", "nombre": "Paciente Protegido", "fecha_nacimiento": "1985-02-03"})
+    paciente_id = created.json()["id"]
+
+    assert client.delete(f"/api/pacientes/{paciente_id}", headers=user_headers).status_code == 403
+    assert client.delete("/api/vacunas/1", headers=user_headers).status_code == 403
+    assert client.post(f"/api/pacientes/{paciente_id}/restore", headers=user_headers).status_code == 403
+    assert client.get(f"/api/pacientes/{paciente_id}", headers=auth_headers).status_code == 200
+
+
+@pytest.fixture
+def change_db():
+    """Base aparte: compactar sube la marca de agua y no debe afectar a las otras pruebas"""
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(engine)
+    SessionLocal = sessionmaker(bind=engine)
+    session = SessionLocal()
+    session.info["factory"] = SessionLocal
+    try:
+        yield session
+    finally:
+        session.close()
+        engine.dispose()
+
+
+def _add_pacientes(db, count: int, prefix: str = "CP49"):
+    pacientes = [Paciente(cedula=f"{prefix}-{i}", nombre=f"Paciente Cursor {i}", fecha_nacimiento="1990-01-01")
+                 for i in range(count)]
+    db.add_all(pacientes)
+    db.commit()
+    return pacientes
+
+
+def _age_change_log(db, days: int):
+    db.execute(update(ChangeLog).values(changed_at=datetime.now(timezone.utc) - timedelta(days=days)))
+    db.commit()
+
+
+def test_cursor_pages_through_every_change_once(change_db):
+    pacientes = _add_pacientes(change_db, 5)
+    pacientes[0].telefono = "0414-1111111"  # Segundo cambio de la misma entidad
+    change_db.commit()
+
+    seen, cursor, pages = [], 0, []
+    while True:
+        page = fetch_changes(change_db, cursor, 2)
+        pages.append(page)
+        seen.extend(update["id"] for update in page.updates)
+        cursor = page.cursor
+        if not page.has_more:
+            break
+
+    assert [p.has_more for p in pages] == [True, True, True, False]
+    assert set(seen) == {p.id for p in pacientes}
+    assert seen.count(pacientes[0].id) == 2  # Alta en la primera página, modificación en la última
+    assert fetch_changes(change_db, cursor, 2) == ([], cursor, False, False)
+
+
+def test_compaction_requires_resync_from_older_cursors(change_db):
+    _add_pacientes(change_db, 3)
+    _age_change_log(change_db, CHANGE_LOG_RETENTION_DAYS + 1)
+    recent = _add_pacientes(change_db, 1, prefix="CP49R")[0]
+
+    result = compact(change_db)
+
+    assert result["expired"] == 3
+    stale = fetch_changes(change_db, 0, 10)
+    assert stale.resync_required and stale.updates == []
+    assert stale.cursor == latest_seq(change_db)
+    current = fetch_changes(change_db, result["compacted_through"], 10)
+    assert not current.resync_required
+    assert [update["id"] for update in current.updates] == [recent.id]
+
+
+def test_purged_tombstone_is_still_delivered_from_the_change_log(change_db):
+    paciente = _add_pacientes(change_db, 1)[0]
+    paciente_id, cursor = paciente.id, latest_seq(change_db)
+    paciente.deleted_at = datetime.now(timezone.utc) - timedelta(days=SOFT_DELETE_RETENTION_DAYS + 1)
+    change_db.commit()
+
+    assert purge_tombstones(change_db) == 1
+
+    change_db.expunge_all()
+    assert change_db.get(Paciente, paciente_id) is None
+    page = fetch_changes(change_db, cursor, 10)
+    assert [(u["id"], u["action"]) for u in page.updates] == [(paciente_id, "deleted")]
+
+
+def test_backfill_registers_rows_written_without_the_orm(change_db):
+    _add_pacientes(change_db, 1)
+    change_db.execute(text("INSERT INTO pacientes (cedula, nombre, fecha_nacimiento) "
+                           "VALUES ('CP49-RAW', 'Paciente Crudo', '1990-01-01')"))
+    change_db.commit()
+
+    assert backfill(change_db.connection()) == 1
+    change_db.commit()
+
+    raw_id = change_db.scalar(select(Paciente.id).where(Paciente.cedula == "CP49-RAW"))
+    assert raw_id in [u["id"] for u in fetch_changes(change_db, 0, 10).updates]
+
+
+def test_maintenance_compacts_and_purges_in_one_pass(change_db):
+    paciente = _add_pacientes(change_db, 2)[0]
+    paciente.deleted_at = datetime.now(timezone.utc) - timedelta(days=SOFT_DELETE_RETENTION_DAYS + 1)
+    change_db.commit()
+    _age_change_log(change_db, CHANGE_LOG_RETENTION_DAYS + 1)
+
+    result = ChangeLogMaintenance(interval_seconds=0).run_once(change_db.info["factory"])
+
+    assert result["expired"] == 2 and result["superseded"] == 1
+    assert result["tombstones_purged"] == 1
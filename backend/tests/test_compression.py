@@ -0,0 +1,82 @@
+import gzip
+import json
+
+import pytest
+import zstandard
+
+import compression
+from compression import _BoundedDecompressor
+from metrics import http_requests_total
+
+
+def _sync_body(prefix: str) -> bytes:
+    pacientes = [{"local_id": 1, "cedula": f"{prefix}-1", "nombre": "Paciente Comprimido", "fecha_nacimiento": "1990-05-01"}]
+    return json.dumps({"last_sync_client": None, "pacientes": pacientes, "vacunas": []}).encode("utf-8")
+
+
+@pytest.mark.parametrize("encoding, compress", [("gzip", gzip.compress), ("zstd", zstandard.compress)])
+def test_decompressed_output_is_bounded_per_call(encoding, compress):
+    bomb = compress(b"\0" * (20 * 1024 * 1024))
+    decompressor = _BoundedDecompressor(encoding)
+
+    first = decompressor.decompress(bomb, 64 * 1024)
+    # zstd puede pasarse como mucho lo que expande una porción de entrada
+    assert len(first) <= 64 * 1024 + compression.ZSTD_INPUT_SLICE * 32 * 1024
+    assert decompressor.has_pending
+
+    total = len(first)
+    while decompressor.has_pending:
+        total += len(decompressor.decompress(b"", 64 * 1024))
+    assert total + len(decompressor.flush()) == 20 * 1024 * 1024
+
+
+@pytest.mark.parametrize("encoding, compress", [("gzip", gzip.compress), ("zstd", zstandard.compress)])
+def test_compressed_bomb_is_rejected_with_413(client, auth_headers, monkeypatch, encoding, compress):
+    monkeypatch.setattr(compression, "MAX_DECOMPRESSED_SIZE", 1024 * 1024)
+    bomb = compress(b" " * (50 * 1024 * 1024))
+
+    for path in ("/api/sync/bulk", "/api/sync/bulk/stream"):
+        response = client.post(path, content=bomb, headers={
+            **auth_headers, "Content-Type": "application/json", "Content-Encoding": encoding,
+        })
+        assert response.status_code == 413, (path, response.text)
+        assert response.json()["status_code"] == 413
+
+
+def test_invalid_compressed_body_is_rejected_with_400(client, auth_headers):
+    response = client.post("/api/sync/bulk/stream", content=b"no es gzip", headers={
+        **auth_headers, "Content-Type": "application/json", "Content-Encoding": "gzip",
+    })
+    assert response.status_code == 400
+
+
+@pytest.mark.parametrize("encoding, compress", [("gzip", gzip.compress), ("zstd", zstandard.compress)])
+def test_compressed_upload_is_applied(client, auth_headers, encoding, compress):
+    response = client.post("/api/sync/bulk/stream", content=compress(_sync_body(f"C29{encoding}")), headers={
+        **auth_headers, "Content-Type": "application/json", "Content-Encoding": encoding,
+    })
+    assert response.status_code == 200, response.text
+    assert response.json()["pacientes_sincronizados"] == 1
+
+
+def test_compressed_upload_keeps_its_route_label(client, auth_headers):
+    before = http_requests_total.samples()
+    response = client.post("/api/sync/bulk", content=gzip.compress(_sync_body("R29")), headers={
+        **auth_headers, "Content-Type": "application/json", "Content-Encoding": "gzip",
+    })
+    assert response.status_code == 200
+
+    after = http_requests_total.samples()
+    labels = ("POST", "/api/sync/bulk", "200")
+    assert after.get(labels, 0) == before.get(labels, 0) + 1
+    assert after.get(("POST", "unmatched", "200"), 0) == before.get(("POST", "unmatched", "200"), 0)
+
+
+@pytest.mark.parametrize("encoding, compress", [("gzip", gzip.compress), ("zstd", zstandard.compress)])
+def test_truncated_compressed_body_is_rejected_with_400(client, auth_headers, encoding, compress):
+    body = compress(_sync_body(f"T29{encoding}") * 50)
+    response = client.post("/api/sync/bulk/stream", content=body[:len(body) // 2], headers={
+        **auth_headers, "Content-Type": "application/json", "Content-Encoding": encoding,
+    })
+    assert response.status_code == 400, response.text
+    assert "truncado" in response.json()["error"]
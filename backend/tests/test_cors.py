@@ -0,0 +1,24 @@
+from lifecycle import drain_state
+
+ORIGIN = "http://localhost:5173"
+
+
+def test_drain_rejection_carries_cors_headers(client, monkeypatch):
+    monkeypatch.setattr(drain_state, "draining", True)
+
+    response = client.get("/api/pacientes", headers={"Origin": ORIGIN})
+
+    assert response.status_code == 503
+    assert response.headers["access-control-allow-origin"] == ORIGIN
+    assert "retry-after" in response.headers
+
+
+def test_preflight_is_answered_while_draining(client, monkeypatch):
+    monkeypatch.setattr(drain_state, "draining", True)
+
+    response = client.options("/api/pacientes", headers={
+        "Origin": ORIGIN, "Access-Control-Request-Method": "GET",
+    })
+
+    assert response.status_code == 200
+    assert response.headers["access-control-allow-origin"] == ORIGIN
@@ -0,0 +1,64 @@
+import signal
+import socket
+import threading
+import time
+from types import SimpleNamespace
+
+import httpx
+import uvicorn
+from fastapi import FastAPI
+
+from health import readiness
+from lifecycle import DrainMiddleware, DrainState, drain_on_exit
+
+
+def test_sigterm_rejects_new_requests_before_the_socket_closes(monkeypatch):
+    monkeypatch.setattr(readiness, "draining", False)
+    state = DrainState()
+    app = FastAPI()
+
+    @app.get("/api/ping")
+    async def ping():
+        return {"ok": True}
+
+    @app.post("/api/senal")
+    async def deliver_sigterm():
+        # Como loop.add_signal_handler: el manejador corre dentro del bucle
+        server.handle_exit(signal.SIGTERM, None)
+        return {"ok": True}
+
+    sock = socket.socket()
+    sock.bind(("127.0.0.1", 0))
+    url = f"http://127.0.0.1:{sock.getsockname()[1]}"
+    server = drain_on_exit(
+        uvicorn.Server(uvicorn.Config(DrainMiddleware(app, state=state), lifespan="off", log_config=None)),
+        prestop_seconds=1, state=state,
+    )
+    thread = threading.Thread(target=server.run, kwargs={"sockets": [sock]}, daemon=True)
+    thread.start()
+    while not server.started:
+        time.sleep(0.01)
+
+    assert httpx.get(f"{url}/api/ping").status_code == 200
+    httpx.post(f"{url}/api/senal")
+
+    # El socket sigue abierto: las peticiones nuevas reciben 503 y /readyz lo reporta
+    response = httpx.get(f"{url}/api/ping")
+    assert response.status_code == 503
+    assert response.headers["retry-after"]
+    assert readiness.draining and not server.should_exit
+
+    thread.join(timeout=10)
+    assert not thread.is_alive()
+
+
+def test_sigint_exits_without_prestop(monkeypatch):
+    monkeypatch.setattr(readiness, "draining", False)
+    state = DrainState()
+    calls = []
+    server = SimpleNamespace(should_exit=False, handle_exit=lambda sig, frame: calls.append(sig))
+
+    drain_on_exit(server, prestop_seconds=5, state=state).handle_exit(signal.SIGINT, None)
+
+    assert calls == [signal.SIGINT]
+    assert state.draining
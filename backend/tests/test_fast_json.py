@@ -0,0 +1,69 @@
+"""Las listas por el camino rápido (Core + orjson) dicen lo mismo que los schemas de respuesta"""
+from datetime import datetime
+
+import orjson
+
+from fast_json import encode_rows, fetch_dtos, paciente_select, vacuna_select
+from models import Paciente, PacienteResponse, Vacuna, VacunaResponse
+
+
+def _schema_dump(schema, row) -> dict:
+    """Como lo construían los handlers: un schema por fila ORM, fechas con isoformat()"""
+    values = {}
+    for name in schema.model_fields:
+        value = getattr(row, name, None)
+        if isinstance(value, datetime):
+            value = value.isoformat()
+        values[name] = bool(value) if name == "is_synced" else value
+    return schema(**values).model_dump(mode="json")
+
+
+def _seed(db, cedula: str):
+    paciente = Paciente(cedula=cedula, nombre="Paciente Rápido", fecha_nacimiento="2001-09-09",
+                        telefono=None, is_synced=None)
+    db.add(paciente)
+    db.flush()
+    vacuna = Vacuna(paciente_id=paciente.id, nombre_vacuna="Sarampión", fecha_aplicacion="2002-09-09",
+                    es_menor=True, cedula_tutor="V-1234567", usuario_id=1)
+    db.add(vacuna)
+    db.commit()
+    db.refresh(paciente)
+    db.refresh(vacuna)
+    return paciente, vacuna
+
+
+def test_dtos_have_exactly_the_schema_fields(db):
+    paciente, vacuna = _seed(db, "FJ40-1")
+
+    [paciente_dto] = fetch_dtos(db, paciente_select().where(Paciente.id == paciente.id))
+    [vacuna_dto] = fetch_dtos(db, vacuna_select().where(Vacuna.id == vacuna.id))
+
+    assert list(paciente_dto) == [name for name in PacienteResponse.model_fields if name in paciente_dto]
+    assert set(PacienteResponse.model_fields) - set(paciente_dto) <= {
+        name for name, field in PacienteResponse.model_fields.items() if not field.is_required()}
+    assert set(VacunaResponse.model_fields) - set(vacuna_dto) <= {
+        name for name, field in VacunaResponse.model_fields.items() if not field.is_required()}
+
+
+def test_encoded_rows_match_the_schema_dump(db):
+    paciente, vacuna = _seed(db, "FJ40-2")
+
+    [paciente_json] = orjson.loads(encode_rows(fetch_dtos(db, paciente_select().where(Paciente.id == paciente.id))))
+    [vacuna_json] = orjson.loads(encode_rows(fetch_dtos(db, vacuna_select().where(Vacuna.id == vacuna.id))))
+
+    expected_paciente = _schema_dump(PacienteResponse, paciente)
+    expected_vacuna = _schema_dump(VacunaResponse, vacuna)
+    assert paciente_json["is_synced"] is False  # NULL en la columna
+    assert {k: paciente_json.get(k) for k in expected_paciente} == expected_paciente
+    assert {k: vacuna_json.get(k) for k in expected_vacuna} == expected_vacuna
+    PacienteResponse.model_validate(paciente_json)
+    VacunaResponse.model_validate(vacuna_json)
+
+
+def test_list_endpoints_answer_with_the_fast_path(client, auth_headers):
+    response = client.get("/api/pacientes?limit=5", headers=auth_headers)
+
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "application/json"
+    for item in response.json():
+        PacienteResponse.model_validate(item)
@@ -0,0 +1,60 @@
+import asyncio
+
+import health
+from health import ReadinessState, table_row_estimates
+
+
+def test_livez_and_readyz(client):
+    assert client.get("/livez").json() == {"status": "alive"}
+
+    ready = client.get("/readyz")
+    assert ready.status_code == 200
+    assert ready.json()["status"] == "ready"
+    assert ready.json()["checks"]["database"]["ok"] is True
+
+
+def test_concurrent_probes_refresh_a_stale_state_once(monkeypatch):
+    state = ReadinessState(max_age_seconds=60)
+    calls = []
+    run_checks = state._run_checks
+
+    def counted():
+        calls.append(1)
+        run_checks()
+
+    monkeypatch.setattr(state, "_run_checks", counted)
+
+    async def probes():
+        return await asyncio.gather(*(state.snapshot() for _ in range(10)))
+
+    snapshots = asyncio.run(probes())
+
+    assert len(calls) == 1
+    assert all(snapshot["ready"] for snapshot in snapshots)
+
+
+def test_database_down_makes_the_probe_fail(monkeypatch):
+    monkeypatch.setattr(health, "get_engine", lambda: None)
+    state = ReadinessState()
+
+    snapshot = asyncio.run(state.snapshot())
+
+    assert snapshot["ready"] is False
+    assert snapshot["checks"]["database"] == {"ok": False, "error": "engine no disponible"}
+
+
+def test_draining_state_is_not_ready():
+    state = ReadinessState()
+    asyncio.run(state.refresh())
+    state.draining = True
+
+    snapshot = asyncio.run(state.snapshot())
+
+    assert snapshot["ready"] is False and snapshot["draining"] is True
+
+
+def test_row_estimates_without_counting(db):
+    estimates = table_row_estimates(db.connection())
+
+    assert set(estimates) == {"pacientes_count", "vacunas_count", "usuarios_count"}
+    assert estimates["pacientes_count"] >= 1 and estimates["usuarios_count"] >= 1
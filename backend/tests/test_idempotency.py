@@ -0,0 +1,45 @@
+import uuid
+
+import idempotency
+from idempotency import IdempotencyStore
+from models import Vacuna
+
+
+def _vacuna():
+    return {"nombre_vacuna": f"BCG-{uuid.uuid4().hex[:8]}", "fecha_aplicacion": "2020-01-01"}
+
+
+def test_retry_replays_saved_response(client, auth_headers):
+    headers = {**auth_headers, "Idempotency-Key": uuid.uuid4().hex}
+    body = _vacuna()
+    first = client.post("/api/vacunas", json=body, headers=headers)
+    retry = client.post("/api/vacunas", json=body, headers=headers)
+    assert first.status_code == retry.status_code == 201
+    assert retry.headers["idempotent-replayed"] == "true"
+    assert retry.json() == first.json()
+
+
+def test_retry_on_another_worker_does_not_duplicate(client, auth_headers, db, monkeypatch):
+    headers = {**auth_headers, "Idempotency-Key": uuid.uuid4().hex}
+    body = _vacuna()
+    assert client.post("/api/vacunas", json=body, headers=headers).status_code == 201
+
+    # Otro worker: almacén nuevo, misma base de datos
+    monkeypatch.setattr(idempotency, "idempotency_store", IdempotencyStore())
+    retry = client.post("/api/vacunas", json=body, headers=headers)
+    assert retry.headers["idempotent-replayed"] == "true"
+    assert db.query(Vacuna).filter(Vacuna.nombre_vacuna == body["nombre_vacuna"]).count() == 1
+
+
+def test_same_key_different_body_is_rejected(client, auth_headers):
+    headers = {**auth_headers, "Idempotency-Key": uuid.uuid4().hex}
+    assert client.post("/api/vacunas", json=_vacuna(), headers=headers).status_code == 201
+    assert client.post("/api/vacunas", json=_vacuna(), headers=headers).status_code == 422
+
+
+def test_failed_request_releases_key(client, auth_headers):
+    headers = {**auth_headers, "Idempotency-Key": uuid.uuid4().hex}
+    paciente = {"cedula": "00000000", "nombre": "Duplicado", "fecha_nacimiento": "2000-01-01"}
+    assert client.post("/api/pacientes", json=paciente, headers=headers).status_code == 400
+    paciente["cedula"] = f"V{uuid.uuid4().int % 10**8}"
+    assert client.post("/api/pacientes", json=paciente, headers=headers).status_code == 201
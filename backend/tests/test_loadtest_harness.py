@@ -0,0 +1,77 @@
+"""Datos sintéticos, SACS simulado y cálculo de regresiones de benchmarks/loadtest.py"""
+import os
+import re
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "benchmarks"))
+
+from datagen import bulk_sync_payload, generate_pacientes, generate_vacunas  # noqa: E402
+from fake_sacs import start_fake_sacs  # noqa: E402
+from loadtest import compare_with_baseline, percentile  # noqa: E402
+
+from models import BulkSyncData  # noqa: E402
+from profesional_validator import ProfesionalValidator  # noqa: E402
+
+
+def test_datagen_is_reproducible_and_venezuelan():
+    first = list(generate_pacientes(200, seed=7))
+    assert first == list(generate_pacientes(200, seed=7))
+    assert first[50:] == list(generate_pacientes(150, seed=7, start=50))
+
+    cedulas = [p["cedula"] for p in first]
+    assert len(set(cedulas)) == len(cedulas)
+    for paciente in first:
+        if paciente["_es_menor"]:
+            # Cédula escolar: la del representante más un correlativo
+            assert paciente["cedula"].startswith(paciente["_cedula_tutor"] + "-")
+        else:
+            assert re.fullmatch(r"[VE]-\d{7,8}", paciente["cedula"])
+    assert any(c.startswith("E-") for c in cedulas) and any(p["_es_menor"] for p in first)
+
+    menor = next(p for p in first if p["_es_menor"])
+    for vacuna in generate_vacunas(menor, 1, 1, per_paciente=3, seed=7):
+        assert vacuna["es_menor"] and vacuna["cedula_tutor"] == menor["_cedula_tutor"]
+        assert vacuna["fecha_aplicacion"] >= menor["fecha_nacimiento"]
+
+
+def test_bulk_payload_validates_against_the_api_model():
+    payload = bulk_sync_payload(20, seed=3, start=0)
+
+    data = BulkSyncData.model_validate(payload)
+
+    assert len(data.pacientes) == 20
+    assert {v.paciente_id for v in data.vacunas} <= {p.local_id for p in data.pacientes}
+
+
+def test_fake_sacs_answers_like_the_real_one(monkeypatch):
+    server = start_fake_sacs(latency_ms=0, jitter_ms=0)
+    monkeypatch.setattr(ProfesionalValidator, "BASE_URL",
+                        f"http://127.0.0.1:{server.server_port}/consultas/prfsnal_salud")
+    try:
+        found = ProfesionalValidator.validate_cedula("V-12345678")
+        missing = ProfesionalValidator.validate_cedula("V-12345677")
+    finally:
+        server.shutdown()
+
+    assert found["success"] and found["is_valid"]
+    assert not missing["success"] and missing["error"] == "Profesional no encontrado en el registro"
+
+
+def test_regressions_compare_p95_throughput_and_errors():
+    assert percentile([], 95) == 0.0
+    assert percentile([float(i) for i in range(1, 101)], 95) == 95.0
+
+    baseline = {"scenarios": {"search": {"p95_ms": 100, "throughput_rps": 200, "error_rate": 0.0}}}
+    steady = {"scenarios": {"search": {"p95_ms": 110, "throughput_rps": 190, "error_rate": 0.005}}}
+    slower = {"scenarios": {"search": {"p95_ms": 130, "throughput_rps": 140, "error_rate": 0.02},
+                            "login": {"p95_ms": 1, "throughput_rps": 1, "error_rate": 0.0}}}
+
+    assert compare_with_baseline(steady, baseline, 0.25) == []
+    assert len(compare_with_baseline(slower, baseline, 0.25)) == 3
+
+
+def test_search_route_is_not_shadowed_by_the_id_route(client, auth_headers):
+    response = client.get("/api/pacientes/buscar?q=Por Defecto", headers=auth_headers)
+
+    assert response.status_code == 200
+    assert "00000000" in [p["cedula"] for p in response.json()]
@@ -0,0 +1,74 @@
+"""Búsquedas de una fila con lambda_stmt: mismas filas que el Query ORM y sin recompilar por valor"""
+import os
+import sys
+from datetime import datetime, timezone
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "benchmarks"))
+
+from bench_lookups import build_cases  # noqa: E402
+from database import Base  # noqa: E402
+from models import Paciente, Usuario, Vacuna  # noqa: E402
+from repositories import PacienteRepository, UsuarioRepository, VacunaRepository  # noqa: E402
+
+
+@pytest.fixture
+def lookup_db():
+    """Base aparte: se cuenta lo que entra en la caché de compilación del engine"""
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(engine)
+    session = sessionmaker(bind=engine)()
+    deleted_at = datetime.now(timezone.utc)
+    session.add_all([Usuario(username=f"usuario{i}", email=f"usuario{i}@example.com", password="x",
+                             server_id=100 + i) for i in range(5)])
+    session.add_all([Paciente(cedula=f"LK48-{i}", nombre=f"Paciente Búsqueda {i}", fecha_nacimiento="1990-01-01",
+                              server_id=200 + i, deleted_at=deleted_at if i == 4 else None) for i in range(5)])
+    session.add_all([Vacuna(nombre_vacuna="Hepatitis B", fecha_aplicacion="2024-01-10", server_id=300 + i,
+                            deleted_at=deleted_at if i == 4 else None) for i in range(5)])
+    session.commit()
+    try:
+        yield session
+    finally:
+        session.close()
+        engine.dispose()
+
+
+def test_each_value_returns_its_own_row(lookup_db):
+    for i in range(4):
+        assert UsuarioRepository.get_by_username(lookup_db, f"usuario{i}").email == f"usuario{i}@example.com"
+        assert UsuarioRepository.get_by_server_id(lookup_db, 100 + i).username == f"usuario{i}"
+        assert PacienteRepository.get_by_cedula(lookup_db, f"LK48-{i}").server_id == 200 + i
+        assert PacienteRepository.get_by_server_id(lookup_db, 200 + i).cedula == f"LK48-{i}"
+        assert VacunaRepository.get_by_server_id(lookup_db, 300 + i).server_id == 300 + i
+    assert UsuarioRepository.get_by_username(lookup_db, "nadie") is None
+
+
+def test_deleted_rows_are_only_found_by_the_deleted_lookups(lookup_db):
+    assert PacienteRepository.get_by_cedula(lookup_db, "LK48-4") is None
+    assert PacienteRepository.get_by_server_id(lookup_db, 204) is None
+    assert VacunaRepository.get_by_server_id(lookup_db, 304) is None
+
+    assert PacienteRepository.get_deleted_by_cedula(lookup_db, "LK48-4").server_id == 204
+    assert PacienteRepository.get_deleted_by_server_id(lookup_db, 204).cedula == "LK48-4"
+    assert VacunaRepository.get_deleted_by_server_id(lookup_db, 304).server_id == 304
+    assert PacienteRepository.get_deleted_by_cedula(lookup_db, "LK48-0") is None
+
+
+def test_lookups_compile_once_per_call_site(lookup_db):
+    cache = lookup_db.get_bind()._compiled_cache
+    PacienteRepository.get_by_cedula(lookup_db, "LK48-0")
+    compiled = len(cache)
+
+    for i in range(1, 5):
+        PacienteRepository.get_by_cedula(lookup_db, f"LK48-{i}")
+
+    assert len(cache) == compiled
+
+
+def test_cached_lookups_match_the_legacy_queries(lookup_db):
+    for name, case in build_cases(lookup_db, lookups=5).items():
+        for key in case["keys"] + ["no-existe"]:
+            assert case["cached"](key) is case["legacy"](key), f"{name}({key!r})"
@@ -0,0 +1,41 @@
+import asyncio
+import time
+
+from loop_monitor import LoopMonitor, event_loop_stall_seconds, event_loop_stalls
+
+
+def _blocking_handler():
+    time.sleep(0.3)  # Trabajo síncrono dentro del loop
+
+
+async def _run_with_stall(monitor: LoopMonitor):
+    monitor.start()
+    await asyncio.sleep(0.05)
+    _blocking_handler()
+    await asyncio.sleep(0.1)  # El vigilante ve volver al loop y suma la duración
+    await monitor.stop()
+
+
+def test_stall_is_counted_with_the_blocking_function_as_culprit():
+    monitor = LoopMonitor(interval_ms=10, threshold_ms=50)
+
+    asyncio.run(_run_with_stall(monitor))
+
+    assert monitor.stalls == 1
+    culprits = [labels[0] for labels in event_loop_stalls.samples() if "_blocking_handler" in labels[0]]
+    assert len(culprits) == 1 and "test_loop_monitor.py" in culprits[0]
+    assert event_loop_stall_seconds.samples()[(culprits[0],)] >= 0.2
+
+
+async def _run_idle(monitor: LoopMonitor):
+    monitor.start()
+    await asyncio.sleep(0.2)
+    await monitor.stop()
+
+
+def test_idle_loop_records_no_stalls():
+    monitor = LoopMonitor(interval_ms=10, threshold_ms=100)
+
+    asyncio.run(_run_idle(monitor))
+
+    assert monitor.stalls == 0
@@ -0,0 +1,23 @@
+from memory_profiling import sync_process_rss_peak
+
+
+def _count(route: str) -> int:
+    series = sync_process_rss_peak.samples().get((route,))
+    return sum(series[:-1]) if series else 0
+
+
+def test_sync_requests_publish_the_process_rss_peak_by_route(client, auth_headers):
+    route = "/api/sync/updates"
+    before = _count(route)
+
+    response = client.get("/api/sync/updates?cursor=0&limit=5", headers=auth_headers)
+
+    assert response.status_code == 200
+    assert _count(route) == before + 1
+
+
+def test_metric_is_documented_as_process_memory(client):
+    body = client.get("/metrics").text
+
+    assert "# HELP healthshield_sync_process_rss_peak_bytes Pico de RSS del proceso" in body
+    assert "healthshield_sync_request_peak_memory_bytes" not in body
@@ -0,0 +1,81 @@
+import json
+import os
+
+import metrics
+from metrics import Counter, Gauge, Histogram, Registry
+
+
+def _registry():
+    registry = Registry()
+    requests = registry.register(Counter("t_requests_total", "Peticiones", ("route",)))
+    in_flight = registry.register(Gauge("t_in_flight", "En curso"))
+    latency = registry.register(Histogram("t_latency_seconds", "Latencia", buckets=(0.1, 1.0)))
+    return registry, requests, in_flight, latency
+
+
+def test_exposition_format():
+    registry, requests, in_flight, latency = _registry()
+    requests.inc('/api/"x"\n')
+    in_flight.set(value=3)
+    latency.observe(0.05)
+    latency.observe(0.5)
+    latency.observe(2.5)
+
+    assert registry.render().splitlines() == [
+        "# HELP t_requests_total Peticiones",
+        "# TYPE t_requests_total counter",
+        't_requests_total{route="/api/\\"x\\"\\n"} 1',
+        "# HELP t_in_flight En curso",
+        "# TYPE t_in_flight gauge",
+        "t_in_flight 3",
+        "# HELP t_latency_seconds Latencia",
+        "# TYPE t_latency_seconds histogram",
+        't_latency_seconds_bucket{le="0.1"} 1',
+        't_latency_seconds_bucket{le="1"} 2',
+        't_latency_seconds_bucket{le="+Inf"} 3',
+        "t_latency_seconds_sum 3.05",
+        "t_latency_seconds_count 3",
+    ]
+
+
+def test_merge_sums_workers_and_drops_gauges_of_dead_ones():
+    registry, requests, in_flight, latency = _registry()
+    requests.inc("/a", amount=2)
+    in_flight.set(value=1)
+    latency.observe(0.5)
+    alive = json.loads(json.dumps(registry.snapshot()))  # Como se lee del disco
+    dead = json.loads(json.dumps(registry.snapshot()))
+
+    lines = registry.render_merged([(alive, True), (dead, False)]).splitlines()
+
+    assert 't_requests_total{route="/a"} 4' in lines
+    assert "t_in_flight 1" in lines
+    assert "t_latency_seconds_count 2" in lines
+
+
+def test_render_metrics_adds_other_workers_snapshots(tmp_path, monkeypatch):
+    monkeypatch.setattr(metrics, "METRICS_MULTIPROC_DIR", str(tmp_path))
+    before = metrics.db_queries_total.samples().get((), 0)
+    other = {metrics.db_queries_total.name: [[[], 5]]}
+    (tmp_path / "worker-999999.json").write_text(json.dumps(other))
+    (tmp_path / "worker-888888.json.tmp").write_text("{incompleto")
+
+    body = metrics.render_metrics()
+
+    assert f"healthshield_db_queries_total {metrics._format_value(before + 5)}" in body.splitlines()
+
+    # El volcado propio se excluye: sus valores ya van en vivo
+    metrics.write_worker_snapshot(str(tmp_path))
+    assert os.path.exists(metrics.worker_snapshot_path(str(tmp_path), os.getpid()))
+    assert f"healthshield_db_queries_total {metrics._format_value(before + 5)}" in metrics.render_metrics().splitlines()
+
+
+def test_middleware_records_route_status_and_db_time(client, auth_headers):
+    key = ("GET", "/api/pacientes", "200")
+    before = metrics.http_requests_total.samples().get(key, 0)
+    queries_before = metrics.db_queries_per_request.samples().get(("GET", "/api/pacientes"), [0])[-1]
+
+    assert client.get("/api/pacientes", headers=auth_headers).status_code == 200
+
+    assert metrics.http_requests_total.samples()[key] == before + 1
+    assert metrics.db_queries_per_request.samples()[("GET", "/api/pacientes")][-1] > queries_before
@@ -0,0 +1,34 @@
+"""benchmarks/microbench.py: casos ejecutables, cubiertos por la línea base y regresiones"""
+import json
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "benchmarks"))
+
+from microbench import DEFAULT_BASELINE, build_cases, compare_with_baseline, measure  # noqa: E402
+
+
+def test_every_case_runs_and_has_a_baseline():
+    cases = build_cases()
+    with open(DEFAULT_BASELINE) as f:
+        baseline = json.load(f)
+
+    for name, func in cases.items():
+        assert func() is not None, name
+    assert set(cases) == set(baseline["cases"])
+
+
+def test_measure_calibrates_iterations():
+    result = measure(lambda: sum(range(100)), repeat=3, target_seconds=0.01)
+
+    assert result["iterations"] >= 10 and result["repeat"] == 3
+    assert 0 < result["min_us"] <= result["median_us"]
+
+
+def test_only_slower_medians_beyond_the_tolerance_are_regressions():
+    baseline = {"cases": {"a": {"median_us": 100.0}, "b": {"median_us": 100.0}}}
+    results = {"cases": {"a": {"median_us": 120.0}, "b": {"median_us": 130.0}, "nuevo": {"median_us": 1.0}}}
+
+    regressions = compare_with_baseline(results, baseline, 0.25)
+
+    assert len(regressions) == 1 and regressions[0].startswith("b:")
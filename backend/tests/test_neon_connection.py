@@ -0,0 +1,120 @@
+"""Reintentos de conexión, despertares y recreación del engine sin reiniciar"""
+import pytest
+from sqlalchemy import create_engine, text
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.pool import NullPool
+
+import database
+import neon_connection
+from neon_connection import ConnectionManager, backoff_delay
+
+
+class FlakyDBAPI:
+    class OperationalError(Exception):
+        pass
+
+
+class FlakyDialect:
+    """Falla las primeras `failures` conexiones con OperationalError"""
+    loaded_dbapi = FlakyDBAPI
+
+    def __init__(self, failures: int):
+        self.failures = failures
+        self.attempts = 0
+
+    def connect(self, *args, **kwargs):
+        self.attempts += 1
+        if self.attempts <= self.failures:
+            raise FlakyDBAPI.OperationalError("the endpoint is waking up")
+        return "conexión"
+
+
+@pytest.fixture
+def sleeps(monkeypatch):
+    sleeps = []
+    monkeypatch.setattr(neon_connection.time, "sleep", sleeps.append)
+    monkeypatch.setattr(neon_connection.random, "uniform", lambda low, high: high)
+    return sleeps
+
+
+def test_backoff_is_exponential_with_a_cap(monkeypatch):
+    monkeypatch.setattr(neon_connection.random, "uniform", lambda low, high: (low, high))
+
+    assert [backoff_delay(n, base=0.5, cap=3) for n in range(4)] == [(0, 0.5), (0, 1.0), (0, 2.0), (0, 3)]
+
+
+def test_transient_failures_are_retried_and_recorded_as_a_wakeup(sleeps):
+    manager = ConnectionManager("primary", retries=4)
+    dialect = FlakyDialect(failures=2)
+
+    assert manager._do_connect(dialect, None, (), {}) == "conexión"
+
+    assert dialect.attempts == 3
+    assert sleeps == [neon_connection.NEON_RETRY_BASE_SECONDS, neon_connection.NEON_RETRY_BASE_SECONDS * 2]
+    assert manager.wakeups[-1]["retries"] == 2
+    assert manager.consecutive_failures == 0 and manager.last_activity is not None
+
+
+def test_exhausted_retries_raise_and_mark_the_engine_stale_after_repeated_failures(sleeps):
+    manager = ConnectionManager("primary", retries=1, recreate_after=2)
+
+    for failures in (1, 2):
+        with pytest.raises(FlakyDBAPI.OperationalError):
+            manager._do_connect(FlakyDialect(failures=10), None, (), {})
+        assert manager.consecutive_failures == failures
+
+    assert len(sleeps) == 2  # Un reintento por conexión
+    assert manager.should_rebuild(object())
+    manager.engine_created(object(), retryable=True)
+    assert not manager.should_rebuild(object()) and manager.consecutive_failures == 0
+
+
+def test_instrumented_engine_retries_real_connection_errors(sleeps, tmp_path):
+    manager = ConnectionManager("replica", retries=2, recreate_after=1)
+    engine = manager.instrument(create_engine(f"sqlite:///{tmp_path}/no/existe.db", poolclass=NullPool))
+
+    with pytest.raises(OperationalError):
+        engine.connect()
+
+    assert len(sleeps) == 2
+    assert manager.stale
+
+
+def test_failed_engine_creation_is_retried_after_the_interval(monkeypatch):
+    manager = ConnectionManager("primary")
+    now = [1000.0]
+    monkeypatch.setattr(neon_connection.time, "monotonic", lambda: now[0])
+
+    manager.engine_created(None, retryable=False)
+    assert not manager.should_rebuild(None)  # Sin configuración no hay nada que reintentar
+
+    manager.engine_created(None, retryable=True)
+    assert not manager.should_rebuild(None)
+    now[0] += neon_connection.NEON_ENGINE_RETRY_SECONDS
+    assert manager.should_rebuild(None)
+
+
+def test_get_engine_rebuilds_a_stale_engine_and_disposes_the_old_one(monkeypatch):
+    manager = ConnectionManager("primary")
+    old_engine = create_engine("sqlite://")
+    new_engine = create_engine("sqlite://")
+    disposed = []
+    monkeypatch.setattr(old_engine, "dispose", lambda: disposed.append(old_engine))
+
+    def build_engine():
+        database._engine = new_engine
+        manager.engine_created(new_engine, retryable=True)
+
+    monkeypatch.setattr(database, "primary_connections", manager)
+    monkeypatch.setattr(database, "_build_engine", build_engine)
+    monkeypatch.setattr(database, "_engine", old_engine)
+    monkeypatch.setattr(database, "_engine_initialized", True)
+
+    assert database.get_engine() is old_engine
+    manager.stale = True
+
+    assert database.get_engine() is new_engine
+    assert disposed == [old_engine]
+    assert not manager.stale
+    with new_engine.connect() as conn:
+        assert conn.execute(text("SELECT 1")).scalar() == 1
@@ -0,0 +1,35 @@
+import time
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from profiling import PROFILE_ID_HEADER, ProfiledRoute, ProfilingMiddleware, profile_store
+
+
+def _profiled_app(is_admin_token):
+    app = FastAPI()
+    app.router.route_class = ProfiledRoute
+
+    @app.get("/lento")
+    def endpoint_en_threadpool():
+        time.sleep(0.1)
+        return {"ok": True}
+
+    app.add_middleware(ProfilingMiddleware, is_admin_token=is_admin_token)
+    return app
+
+
+def test_request_profile_includes_threadpool_endpoint():
+    with TestClient(_profiled_app(lambda token: token == "admin")) as client:
+        response = client.get("/lento", headers={"X-Profile": "1", "Authorization": "Bearer admin"})
+
+    profile = profile_store.get(response.headers[PROFILE_ID_HEADER])
+    assert "endpoint_en_threadpool" in profile["collapsed"]
+
+
+def test_profile_requires_admin_token():
+    with TestClient(_profiled_app(lambda token: False)) as client:
+        response = client.get("/lento", headers={"X-Profile": "1", "Authorization": "Bearer usuario"})
+
+    assert response.status_code == 200
+    assert PROFILE_ID_HEADER not in response.headers
@@ -0,0 +1,58 @@
+import asyncio
+import inspect
+
+from fastapi import FastAPI
+from fastapi.routing import APIRoute
+from sqlalchemy import create_engine, text
+
+import main
+from database import get_db
+from query_guard import QueryGuardMiddleware
+
+# Rutas async que ya sacan el trabajo de base de datos del bucle con run_in_threadpool
+OFFLOADED_ASYNC_ROUTES = {"/api/sync/bulk/stream"}
+
+
+def _uses_db(dependant) -> bool:
+    # Las dependencias sync (get_admin_user…) ya corren en el threadpool
+    return any(dep.call is get_db for dep in dependant.dependencies)
+
+
+def test_db_routes_do_not_block_the_event_loop():
+    blocking = [
+        route.path for route in main.app.routes
+        if isinstance(route, APIRoute) and _uses_db(route.dependant)
+        and inspect.iscoroutinefunction(route.endpoint) and route.path not in OFFLOADED_ASYNC_ROUTES
+    ]
+    assert blocking == []
+
+
+def test_disconnect_interrupts_running_query():
+    engine = create_engine("sqlite://")
+    app = FastAPI()
+
+    @app.get("/lenta")
+    def slow_query():
+        with engine.connect() as connection:
+            # Recursión sin fin: solo termina si se interrumpe
+            return connection.execute(text(
+                "WITH RECURSIVE c(x) AS (SELECT 1 UNION ALL SELECT x + 1 FROM c) SELECT count(*) FROM c"
+            )).scalar()
+
+    guarded = QueryGuardMiddleware(app)
+    sent = []
+
+    async def call():
+        async def receive():
+            await asyncio.sleep(0.3)
+            return {"type": "http.disconnect"}
+
+        async def send(message):
+            sent.append(message)
+
+        scope = {"type": "http", "method": "GET", "path": "/lenta", "raw_path": b"/lenta", "query_string": b"",
+                 "headers": [], "scheme": "http", "server": ("testserver", 80), "root_path": "", "http_version": "1.1"}
+        await asyncio.wait_for(guarded(scope, receive, send), timeout=10)
+
+    asyncio.run(call())
+    assert not any(m["type"] == "http.response.start" and m["status"] == 200 for m in sent)
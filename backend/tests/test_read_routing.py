@@ -0,0 +1,104 @@
+"""Read-your-writes: cuándo una lectura va al primario y cuándo a la réplica"""
+import time
+
+import pytest
+from starlette.requests import Request
+
+import database
+import read_routing
+from read_routing import LAST_WRITE_HEADER, RecentWrites, ReplicaState, read_target, request_key
+
+
+@pytest.fixture
+def routing(monkeypatch):
+    monkeypatch.setattr(read_routing, "recent_writes", RecentWrites(window=5))
+    monkeypatch.setattr(read_routing, "replica_state", ReplicaState(max_lag=5))
+    return read_routing
+
+
+def test_reads_go_to_the_replica_without_recent_writes(routing):
+    assert read_target("autor", None) == ("replica", "read_only")
+    assert read_target(None, "no-es-un-numero") == ("replica", "read_only")
+
+
+def test_author_of_a_recent_write_reads_from_the_primary(routing):
+    routing.recent_writes.record("autor")
+
+    assert read_target("autor", None) == ("primary", "recent_write")
+    assert read_target("otro", None) == ("replica", "read_only")
+
+
+def test_last_write_header_routes_to_the_primary_within_the_window(routing):
+    now_ms = int(time.time() * 1000)
+
+    assert read_target(None, str(now_ms - 1000)) == ("primary", "recent_write")
+    assert read_target(None, str(now_ms - 60000)) == ("replica", "read_only")
+
+
+def test_recent_writes_are_forgotten_after_the_window(monkeypatch):
+    writes = RecentWrites(window=5)
+    clock = iter([100.0, 104.0, 106.0])
+    monkeypatch.setattr(read_routing.time, "monotonic", lambda: next(clock))
+
+    writes.record("autor")
+
+    assert writes.wrote_recently("autor")
+    assert not writes.wrote_recently("autor")
+    assert not writes.wrote_recently(None)
+
+
+def test_lagging_or_failing_replica_sends_every_read_to_the_primary(routing):
+    routing.replica_state.lag = 10
+    assert read_target("autor", None) == ("primary", "replica_unavailable")
+
+    class BrokenEngine:
+        def connect(self):
+            raise ConnectionError("réplica caída")
+
+    result = routing.replica_state.check(BrokenEngine())
+
+    assert result["ok"] is False and result["routing_reads"] is False
+    assert not routing.replica_state.healthy
+
+
+def test_request_key_uses_the_bearer_token_or_the_query_token():
+    assert request_key({"authorization": "Bearer abc"}) == request_key({}, "abc")
+    assert request_key({"authorization": "Bearer abc"}) != request_key({"authorization": "Bearer xyz"})
+    assert request_key({}) is None
+
+
+def test_successful_write_marks_the_author_and_returns_the_header(client, auth_headers, routing):
+    key = request_key({"authorization": auth_headers["Authorization"]})
+
+    read = client.get("/api/pacientes", headers=auth_headers)
+    assert LAST_WRITE_HEADER not in read.headers
+    assert not routing.recent_writes.wrote_recently(key)
+
+    rejected = client.post("/api/pacientes", headers=auth_headers, json={"cedula": "RR43"})
+    assert rejected.status_code == 422
+    assert LAST_WRITE_HEADER not in rejected.headers
+    assert not routing.recent_writes.wrote_recently(key)
+
+    created = client.post("/api/pacientes", headers=auth_headers, json={
+        "cedula": "RR43", "nombre": "Paciente Réplica", "fecha_nacimiento": "1990-01-01"})
+    assert created.status_code == 201
+    assert abs(int(created.headers[LAST_WRITE_HEADER]) - time.time() * 1000) < 60000
+    assert routing.recent_writes.wrote_recently(key)
+
+
+def test_get_read_db_picks_the_session_factory_from_the_routing(routing, monkeypatch):
+    replica_factory, primary_factory = object(), object()
+    monkeypatch.setattr(database, "get_replica_engine", lambda: object())
+    monkeypatch.setattr(database, "_ReplicaSessionLocal", replica_factory)
+    monkeypatch.setattr(database, "get_session_factory", lambda: primary_factory)
+    monkeypatch.setattr(database, "_read_only_session", lambda factory: iter([factory]))
+
+    def session_for(token):
+        scope = {"type": "http", "method": "GET", "path": "/api/pacientes", "query_string": b"",
+                 "headers": [(b"authorization", f"Bearer {token}".encode())]}
+        return next(database.get_read_db(Request(scope)))
+
+    routing.recent_writes.record(request_key({"authorization": "Bearer escritor"}))
+
+    assert session_for("lector") is replica_factory
+    assert session_for("escritor") is primary_factory
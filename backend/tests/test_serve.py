@@ -0,0 +1,84 @@
+"""Lógica del proceso maestro de serve.py sin hacer fork"""
+import logging
+import os
+import signal
+
+import pytest
+
+import serve
+
+
+@pytest.fixture
+def arbiter(tmp_path, monkeypatch):
+    arbiter = serve.Arbiter.__new__(serve.Arbiter)
+    arbiter.metrics_dir = str(tmp_path)
+    arbiter.target = 2
+    arbiter.generation = 0
+    arbiter.workers = {}
+    arbiter.stopping = False
+    arbiter.logger = logging.getLogger("serve")
+    arbiter.spawned = []
+    arbiter.killed = []
+    pids = iter(range(1000, 2000))
+
+    def spawn_worker():
+        pid = next(pids)
+        arbiter.workers[pid] = {"generation": arbiter.generation, "started": float(pid), "draining": False}
+        arbiter.spawned.append(pid)
+
+    def kill(pid, sig):
+        arbiter.killed.append((pid, sig))
+
+    monkeypatch.setattr(arbiter, "spawn_worker", spawn_worker)
+    monkeypatch.setattr(serve.os, "kill", kill)
+    return arbiter
+
+
+def test_maintain_workers_fills_up_to_the_target(arbiter):
+    arbiter.maintain_workers()
+    arbiter.maintain_workers()
+
+    assert arbiter.spawned == [1000, 1001]
+
+
+def test_hup_starts_a_new_generation_and_drains_the_old_one_immediately(arbiter):
+    arbiter.maintain_workers()
+
+    arbiter.handle_signal(signal.SIGHUP)
+
+    assert arbiter.spawned == [1000, 1001, 1002, 1003]
+    assert arbiter.killed == [(1000, signal.SIGINT), (1001, signal.SIGINT)]
+    assert arbiter.current_workers() == [1002, 1003]
+
+
+def test_ttou_drains_the_oldest_worker_once(arbiter):
+    arbiter.maintain_workers()
+
+    arbiter.handle_signal(signal.SIGTTOU)
+    arbiter.maintain_workers()
+    arbiter.kill_worker(1000, signal.SIGTERM)  # Una segunda señal cortaría sin drenar
+
+    assert arbiter.target == 1
+    assert arbiter.killed == [(1000, signal.SIGINT)]
+    arbiter.handle_signal(signal.SIGTTIN)
+    assert arbiter.target == 2
+
+
+def test_reaped_worker_keeps_its_counters_as_a_dead_snapshot(arbiter, monkeypatch):
+    arbiter.maintain_workers()
+    live = os.path.join(arbiter.metrics_dir, "worker-1000.json")
+    with open(live, "w") as f:
+        f.write("{}")
+    statuses = iter([(1000, 0), (0, 0)])
+    monkeypatch.setattr(serve.os, "waitpid", lambda pid, options: next(statuses))
+
+    arbiter.reap_workers()
+
+    assert 1000 not in arbiter.workers
+    assert not os.path.exists(live)
+    assert os.path.exists(os.path.join(arbiter.metrics_dir, "dead-1000.json"))
+
+
+def test_default_workers_reads_web_concurrency(monkeypatch):
+    monkeypatch.setenv("WEB_CONCURRENCY", "3")
+    assert serve.default_workers() == 3
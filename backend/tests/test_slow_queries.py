@@ -0,0 +1,51 @@
+from sqlalchemy import text
+
+import database
+import metrics
+
+
+class _RecordingCursor:
+    def __init__(self, executed):
+        self.executed = executed
+
+    def execute(self, statement, parameters=None):
+        self.executed.append(statement)
+
+    def fetchall(self):
+        return [("Seq Scan on pacientes",)]
+
+    def close(self):
+        pass
+
+
+class _FakeCursor:
+    def __init__(self):
+        self.executed = []
+        self.connection = self
+
+    def cursor(self):
+        return _RecordingCursor(self.executed)
+
+
+def test_explain_plans_without_running_the_query_again():
+    cursor = _FakeCursor()
+
+    plan = database._explain(cursor, "SELECT * FROM pacientes WHERE cedula = %(cedula)s", {"cedula": "1"})
+
+    assert plan == "Seq Scan on pacientes"
+    explain = [sql for sql in cursor.executed if sql.startswith("EXPLAIN")]
+    assert explain == ["EXPLAIN SELECT * FROM pacientes WHERE cedula = %(cedula)s"]
+
+
+def test_slow_query_log_uses_the_shared_timing_hook(db, monkeypatch):
+    monkeypatch.setattr(database, "SLOW_QUERY_THRESHOLD_MS", 0)
+    database.slow_query_log.clear()
+    queries_before = metrics.db_queries_total.samples().get((), 0)
+
+    db.execute(text("SELECT 32 AS slow_query_marker")).all()
+
+    entries = database.slow_query_log.entries()
+    assert [entry["sql"] for entry in entries] == ["SELECT ? AS slow_query_marker"]
+    assert metrics.db_queries_total.samples().get((), 0) == queries_before + 1
+    # Una sola medición por consulta: no queda una pila de tiempos propia
+    assert "slow_query_start" not in db.connection().info
@@ -0,0 +1,23 @@
+"""
+Presupuesto de arranque en frío (benchmarks/startup_budget.py) como parte de la suite.
+"""
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "benchmarks"))
+
+from startup_budget import measure  # noqa: E402
+
+STARTUP_BUDGET_MS = float(os.environ.get("STARTUP_BUDGET_MS", 1500))
+
+
+def test_import_main_fits_startup_budget():
+    result = measure(runs=3)
+
+    assert not result["engine_created"], "importar main creó el engine de base de datos"
+    slowest = sorted((m for m in result["modules"] if m["depth"] == 1),
+                     key=lambda m: m["cumulative_ms"], reverse=True)[:5]
+    assert result["import_ms"] <= STARTUP_BUDGET_MS, (
+        f"arranque {result['import_ms']:.1f} ms > {STARTUP_BUDGET_MS:.0f} ms; más costosos: "
+        + ", ".join(f"{m['module'].strip()} {m['cumulative_ms']:.0f} ms" for m in slowest)
+    )
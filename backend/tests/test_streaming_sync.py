@@ -0,0 +1,98 @@
+"""
+/api/sync/bulk/stream: mismo resultado que /api/sync/bulk y memoria acotada.
+
+La prueba de memoria envía el cuerpo por trozos a través de la app ASGI (el
+TestClient lo leería entero). Para 1M de filas usar el benchmark:
+
+    python benchmarks/bench_streaming_sync.py --rows 1000000
+"""
+import os
+import sys
+import tracemalloc
+
+import httpx
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "benchmarks"))
+
+import main  # noqa: E402
+import sync_service  # noqa: E402
+from bench_streaming_sync import synthetic_body  # noqa: E402
+
+LARGE_ROWS = int(os.environ.get("STREAM_TEST_ROWS", 2000))
+SMALL_ROWS = max(LARGE_ROWS // 10, 1)
+
+
+def _payload(prefix: str) -> dict:
+    pacientes = [
+        {"local_id": i, "cedula": f"{prefix}-{i}", "nombre": f"Paciente {prefix} {i}", "fecha_nacimiento": "1990-05-01"}
+        for i in range(1, 41)
+    ]
+    vacunas = [
+        {"local_id": i, "paciente_id": i, "nombre_vacuna": "Antiamarílica", "fecha_aplicacion": "2024-03-15",
+         "es_menor": i % 4 == 0, "cedula_tutor": f"{prefix}-T{i}" if i % 4 == 0 else None}
+        for i in range(1, 41)
+    ]
+    return {"last_sync_client": None, "pacientes": pacientes, "vacunas": vacunas}
+
+
+def _comparable(body: dict) -> dict:
+    body = dict(body)
+    body.pop("server_timestamp", None)
+    # Los ids del servidor difieren; se comparan las claves locales
+    body["pacientes_ids"] = sorted(body.get("pacientes_ids") or {})
+    body["vacunas_ids"] = sorted(body.get("vacunas_ids") or {})
+    return body
+
+
+def test_stream_matches_bulk(client, auth_headers):
+    bulk = client.post("/api/sync/bulk", json=_payload("B28"), headers=auth_headers)
+    stream = client.post("/api/sync/bulk/stream", json=_payload("S28"), headers=auth_headers)
+
+    assert bulk.status_code == stream.status_code == 200
+    assert _comparable(stream.json()) == _comparable(bulk.json())
+    assert stream.json()["pacientes_sincronizados"] == 40
+
+
+async def _stream_rows(token: str, rows: int) -> int:
+    transport = httpx.ASGITransport(app=main.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://testserver") as async_client:
+        tracemalloc.start()
+        try:
+            response = await async_client.post(
+                "/api/sync/bulk/stream?include_ids=false",
+                content=synthetic_body(rows),
+                headers={"Authorization": token, "Content-Type": "application/json"},
+            )
+            _, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+
+    assert response.status_code == 200, response.text
+    assert response.json()["vacunas_sincronizadas"] == rows
+    return peak
+
+
+def test_stream_memory_does_not_grow_with_payload(client, auth_headers, monkeypatch):
+    token = auth_headers["Authorization"]
+    # Lotes pequeños: la corrida de referencia ya alcanza el régimen estable
+    monkeypatch.setattr(main, "SYNC_STREAM_BATCH_SIZE", 50)
+    # Correr dentro del bucle de la app (lifespan activo). La primera corrida
+    # llena cachés (sentencias compiladas, validadores) y no se compara
+    client.portal.call(_stream_rows, token, SMALL_ROWS)
+    small = client.portal.call(_stream_rows, token, SMALL_ROWS)
+    large = client.portal.call(_stream_rows, token, LARGE_ROWS)
+
+    assert large < small * 1.5, f"{LARGE_ROWS} filas: {large} B; {SMALL_ROWS} filas: {small} B"
+
+
+def test_stream_reports_a_bounded_list_of_conflicts(client, auth_headers, monkeypatch):
+    monkeypatch.setattr(sync_service, "SYNC_MAX_REPORTED_CONFLICTS", 5)
+    # Sin fecha_nacimiento: todos inválidos
+    pacientes = [{"local_id": i, "cedula": f"X28-{i}", "nombre": f"Paciente Inválido {i}"} for i in range(40)]
+
+    response = client.post("/api/sync/bulk/stream?include_ids=false",
+                           json={"pacientes": pacientes, "vacunas": []}, headers=auth_headers)
+
+    assert response.status_code == 200
+    assert len(response.json()["conflicts"]) == 5
+    assert response.json()["conflicts_count"] == 40
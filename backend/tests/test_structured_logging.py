@@ -0,0 +1,68 @@
+import json
+import logging
+import queue
+
+import structured_logging
+from structured_logging import (
+    JsonFormatter, NonBlockingQueueHandler, RequestIdFilter, SamplingFilter, log_records_dropped,
+    parse_sampling, request_id_var,
+)
+
+
+def _record(name="sync_service.records", level=logging.INFO, msg="Procesando %s", args=("V-1",), **extra):
+    record = logging.LogRecord(name, level, __file__, 1, msg, args, None)
+    record.__dict__.update(extra)
+    return record
+
+
+def test_parse_sampling_clamps_rates():
+    assert parse_sampling("a=0.5, b.c=2,bad,=1") == {"a": 0.5, "b.c": 1.0}
+
+
+def test_sampling_uses_the_most_specific_logger_and_spares_warnings(monkeypatch):
+    sampler = SamplingFilter({"sync_service": 1.0, "sync_service.records": 0.1})
+    monkeypatch.setattr(structured_logging.random, "random", lambda: 0.5)
+
+    assert not sampler.filter(_record())
+    assert sampler.filter(_record(name="sync_service"))
+    assert sampler.filter(_record(level=logging.WARNING))
+
+    monkeypatch.setattr(structured_logging.random, "random", lambda: 0.05)
+    kept = _record()
+    assert sampler.filter(kept) and kept.sample_rate == 0.1
+
+
+def test_json_lines_carry_request_id_and_extra_fields():
+    token = request_id_var.set("req-41")
+    try:
+        record = _record(paciente_id=7)
+        RequestIdFilter().filter(record)
+    finally:
+        request_id_var.reset(token)
+
+    entry = json.loads(JsonFormatter().format(record))
+
+    assert entry["msg"] == "Procesando V-1"
+    assert entry["request_id"] == "req-41"
+    assert entry["paciente_id"] == 7
+    assert {"ts", "level", "logger"} <= set(entry)
+
+
+def test_full_queue_drops_records_instead_of_blocking():
+    handler = NonBlockingQueueHandler(queue.Queue(maxsize=1))
+    before = log_records_dropped.samples().get((), 0)
+
+    handler.handle(_record())
+    handler.handle(_record())
+
+    assert handler.queue.qsize() == 1
+    assert handler.queue.get().msg == "Procesando V-1"  # Mensaje ya resuelto al encolar
+    assert log_records_dropped.samples()[()] == before + 1
+
+
+def test_request_id_is_echoed_or_generated(client):
+    echoed = client.get("/livez", headers={"X-Request-ID": "abc-123"})
+    generated = client.get("/livez")
+
+    assert echoed.headers["x-request-id"] == "abc-123"
+    assert len(generated.headers["x-request-id"]) == 32
@@ -0,0 +1,107 @@
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import event, func, select, update
+
+import database
+from models import Paciente, SyncChunk, SyncSession
+from repositories import SyncSessionRepository
+
+
+def _chunk(cedula):
+    return {"pacientes": [{"cedula": cedula, "nombre": "Ana Sesión", "fecha_nacimiento": "2000-01-01"}]}
+
+
+def _begin(client, auth_headers, total_chunks=2):
+    return client.post("/api/sync/sessions", json={"total_chunks": total_chunks}, headers=auth_headers).json()["session_id"]
+
+
+def _age(db, session_id, **columns):
+    db.execute(update(SyncSession).where(SyncSession.id == session_id).values(**columns))
+    db.commit()
+
+
+def test_purge_keeps_active_and_committed_sessions(client, auth_headers, db):
+    old = datetime.now(timezone.utc) - timedelta(days=3)
+
+    # Empezó hace días pero sigue recibiendo partes: se puede reanudar
+    active = _begin(client, auth_headers)
+    _age(db, active, created_at=old)
+    client.put(f"/api/sync/sessions/{active}/chunks/0", json=_chunk("S27-1"), headers=auth_headers)
+
+    committed = _begin(client, auth_headers, total_chunks=1)
+    client.put(f"/api/sync/sessions/{committed}/chunks/0", json=_chunk("S27-2"), headers=auth_headers)
+    assert client.post(f"/api/sync/sessions/{committed}/commit", headers=auth_headers).status_code == 200
+    _age(db, committed, created_at=old, updated_at=old)
+
+    abandoned = _begin(client, auth_headers)
+    client.put(f"/api/sync/sessions/{abandoned}/chunks/0", json=_chunk("S27-3"), headers=auth_headers)
+    _age(db, abandoned, created_at=old, updated_at=old)
+
+    SyncSessionRepository.purge_expired(db, max_age_hours=24)
+    db.expire_all()
+
+    remaining = {row.id for row in db.query(SyncSession.id)}
+    assert active in remaining
+    assert committed in remaining
+    assert abandoned not in remaining
+    assert client.post(f"/api/sync/sessions/{committed}/commit", headers=auth_headers).status_code == 200
+
+
+def test_resume_after_a_chunk_gap(client, auth_headers):
+    session_id = _begin(client, auth_headers, total_chunks=3)
+    client.put(f"/api/sync/sessions/{session_id}/chunks/0", json=_chunk("S27-R0"), headers=auth_headers)
+    client.put(f"/api/sync/sessions/{session_id}/chunks/2", json=_chunk("S27-R2"), headers=auth_headers)
+
+    # Al reanudar, el dispositivo sube desde next_chunk: la parte 2 ya está
+    state = client.get(f"/api/sync/sessions/{session_id}", headers=auth_headers).json()
+    assert (state["last_chunk"], state["next_chunk"], state["chunks_received"]) == (0, 1, [0, 2])
+    missing = client.post(f"/api/sync/sessions/{session_id}/commit", headers=auth_headers)
+    assert missing.status_code == 409 and "[1]" in missing.json()["error"]
+
+    chunk = client.put(f"/api/sync/sessions/{session_id}/chunks/1", json=_chunk("S27-R1"), headers=auth_headers)
+    assert chunk.json()["last_chunk"] == 2
+
+    committed = client.post(f"/api/sync/sessions/{session_id}/commit", headers=auth_headers)
+    assert committed.status_code == 200
+    assert committed.json()["pacientes_sincronizados"] == 3
+
+
+def test_second_commit_returns_the_stored_result(client, auth_headers, db):
+    session_id = _begin(client, auth_headers, total_chunks=1)
+    client.put(f"/api/sync/sessions/{session_id}/chunks/0", json=_chunk("S27-C"), headers=auth_headers)
+
+    first = client.post(f"/api/sync/sessions/{session_id}/commit", headers=auth_headers)
+    second = client.post(f"/api/sync/sessions/{session_id}/commit", headers=auth_headers)
+
+    assert first.status_code == second.status_code == 200
+    assert second.json() == first.json()
+    assert first.json()["pacientes_ids"]["None"]["action"] == "created"
+    assert db.scalar(select(func.count()).select_from(Paciente).where(Paciente.cedula == "S27-C")) == 1
+    assert db.scalar(select(func.count()).select_from(SyncChunk).where(SyncChunk.session_id == session_id)) == 0
+
+
+def test_abort_and_purge_do_not_load_chunk_payloads(client, auth_headers, db):
+    aborted = _begin(client, auth_headers)
+    expired = _begin(client, auth_headers)
+    for session_id in (aborted, expired):
+        client.put(f"/api/sync/sessions/{session_id}/chunks/0", json=_chunk(f"S27-{session_id[:8]}"),
+                   headers=auth_headers)
+    old = datetime.now(timezone.utc) - timedelta(days=3)
+    _age(db, expired, created_at=old, updated_at=old)
+
+    statements = []
+
+    def capture(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    engine = database.get_engine()
+    event.listen(engine, "before_cursor_execute", capture)
+    try:
+        assert client.delete(f"/api/sync/sessions/{aborted}", headers=auth_headers).status_code == 200
+        SyncSessionRepository.purge_expired(db, max_age_hours=24)
+    finally:
+        event.remove(engine, "before_cursor_execute", capture)
+
+    assert not [sql for sql in statements if sql.lstrip().startswith("SELECT") and "sync_chunks.payload" in sql]
+    remaining = db.scalar(select(func.count()).select_from(SyncChunk).where(SyncChunk.session_id.in_([aborted, expired])))
+    assert remaining == 0
@@ -0,0 +1,36 @@
+import json
+
+from wire_format import MSGPACK_MEDIA_TYPE, packb, unpackb
+
+
+def _payload(prefix: str) -> dict:
+    return {
+        "last_sync_client": None,
+        "pacientes": [
+            {"local_id": 1, "cedula": f"{prefix}-1", "nombre": "Ana Columnar", "fecha_nacimiento": "1990-05-01"},
+            {"local_id": 2, "cedula": f"{prefix}-2", "nombre": "Luis Columnar", "fecha_nacimiento": "1985-02-11",
+             "telefono": "0414-0000000"},
+        ],
+        "vacunas": [
+            # Sin es_menor: en JSON aplica el valor por defecto
+            {"local_id": 1, "paciente_id": 1, "nombre_vacuna": "Antiamarílica", "fecha_aplicacion": "2024-03-15"},
+            {"local_id": 2, "paciente_id": 2, "nombre_vacuna": "Antiamarílica", "fecha_aplicacion": "2024-03-15",
+             "es_menor": True, "cedula_tutor": f"{prefix}-T", "lote": None},
+        ],
+    }
+
+
+def test_columnar_round_trip_keeps_absent_fields_absent():
+    payload = _payload("W30")
+    assert unpackb(packb(payload)) == payload
+
+
+def test_msgpack_accepts_the_same_records_as_json(client, auth_headers):
+    as_json = client.post("/api/sync/bulk", json=_payload("J30"), headers=auth_headers)
+    as_msgpack = client.post("/api/sync/bulk", content=packb(_payload("M30")), headers={
+        **auth_headers, "Content-Type": MSGPACK_MEDIA_TYPE, "Accept": "application/json",
+    })
+
+    assert as_json.status_code == 200, as_json.text
+    assert as_msgpack.status_code == 200, as_msgpack.text
+    assert as_msgpack.json()["vacunas_sincronizadas"] == as_json.json()["vacunas_sincronizadas"] == 2
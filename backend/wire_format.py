@@ -0,0 +1,303 @@
+"""
+Formato binario compacto para /api/sync/* (MessagePack columnar).
+
+Negociación de contenido:
+- Accept: application/x-msgpack → la respuesta se codifica en MessagePack.
+- Content-Type: application/x-msgpack → el cuerpo de la petición se decodifica
+  desde MessagePack.
+
+En MessagePack, las listas de registros (pacientes, vacunas, updates) viajan
+en formato columnar: {"_n": filas, "_cols": {"campo": [valores...]}}, para no
+repetir las claves en cada fila; "_absent" marca las filas que no traían un
+campo, para que se decodifiquen igual que el JSON equivalente. Las marcas de tiempo viajan como enteros
+(milisegundos desde epoch, UTC). El esquema publicado está en SYNC_WIRE_SCHEMA
+y se sirve en GET /api/sync/schema.
+"""
+import contextvars
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, List
+
+import msgpack
+from fastapi import Request, Response
+from fastapi.responses import JSONResponse
+from fastapi.routing import APIRoute
+
+MSGPACK_MEDIA_TYPE = "application/x-msgpack"
+JSON_MEDIA_TYPE = "application/json"
+WIRE_FORMAT_VERSION = 1
+
+# Campos que se codifican como milisegundos desde epoch
+TIMESTAMP_FIELDS = frozenset({
+    "created_at", "updated_at", "deleted_at", "committed_at",
+    "server_timestamp", "last_sync", "last_sync_server", "last_sync_client",
+})
+
+# Formato pedido por el cliente para la petición en curso
+_response_format: contextvars.ContextVar[str] = contextvars.ContextVar(
+    "wire_response_format", default=JSON_MEDIA_TYPE
+)
+
+
+# ==================== NEGOCIACIÓN ====================
+
+def _media_type(value: str) -> str:
+    return value.split(";", 1)[0].strip().lower()
+
+
+def is_msgpack(content_type: str) -> bool:
+    return _media_type(content_type or "") == MSGPACK_MEDIA_TYPE
+
+
+def wants_msgpack(accept: str) -> bool:
+    """True si el cliente prefiere MessagePack sobre JSON en Accept"""
+    if not accept:
+        return False
+    quality = {}
+    for part in accept.split(","):
+        media, _, params = part.partition(";")
+        q = 1.0
+        for param in params.split(";"):
+            param = param.strip()
+            if param.startswith("q="):
+                try:
+                    q = float(param[2:])
+                except ValueError:
+                    q = 0.0
+        quality[media.strip().lower()] = q
+    msgpack_q = quality.get(MSGPACK_MEDIA_TYPE, 0.0)
+    json_q = max(quality.get(JSON_MEDIA_TYPE, 0.0), quality.get("*/*", 0.0))
+    return msgpack_q > 0 and msgpack_q >= json_q
+
+
+# ==================== CODIFICACIÓN ====================
+
+def _timestamp_to_ms(value):
+    if isinstance(value, datetime):
+        dt = value
+    elif isinstance(value, str) and value:
+        try:
+            dt = datetime.fromisoformat(value.replace("Z", "+00:00"))
+        except ValueError:
+            return value
+    else:
+        return value
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=timezone.utc)
+    return int(dt.timestamp() * 1000)
+
+
+def _ms_to_timestamp(value):
+    if isinstance(value, int) and not isinstance(value, bool):
+        return datetime.fromtimestamp(value / 1000, tz=timezone.utc).isoformat()
+    return value
+
+
+def _is_record_list(value) -> bool:
+    return isinstance(value, list) and bool(value) and all(isinstance(item, dict) for item in value)
+
+
+def to_columnar(records: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    [{a: 1, b: 2}, {a: 3}] → {"_n": 2, "_cols": {"a": [1, 3], "b": [2, None]}, "_absent": {"b": [1]}}
+
+    El relleno None de las columnas no distingue un campo ausente de un null
+    explícito; "_absent" lista las filas que no traían el campo.
+    """
+    fields: Dict[str, None] = {}
+    for record in records:
+        for key in record:
+            fields.setdefault(key, None)
+
+    columns = {}
+    absent = {}
+    for field in fields:
+        values = [record.get(field) for record in records]
+        if field in TIMESTAMP_FIELDS:
+            values = [_timestamp_to_ms(v) for v in values]
+        columns[field] = values
+        missing_rows = [row for row, record in enumerate(records) if field not in record]
+        if missing_rows:
+            absent[field] = missing_rows
+
+    encoded = {"_n": len(records), "_cols": columns}
+    if absent:
+        encoded["_absent"] = absent
+    return encoded
+
+
+def from_columnar(value: Dict[str, Any]) -> List[Dict[str, Any]]:
+    count = value["_n"]
+    columns = value["_cols"]
+    absent = value.get("_absent") or {}
+    records = [{} for _ in range(count)]
+    for field, values in columns.items():
+        convert = _ms_to_timestamp if field in TIMESTAMP_FIELDS else None
+        skip = set(absent.get(field, ()))
+        for row, (record, item) in enumerate(zip(records, values)):
+            if row in skip:
+                continue  # El registro no traía el campo: que aplique el valor por defecto
+            record[field] = convert(item) if convert else item
+    return records
+
+
+def _is_columnar(value) -> bool:
+    return isinstance(value, dict) and "_cols" in value and "_n" in value
+
+
+def encode_payload(payload: Any) -> Any:
+    """Preparar un payload JSON-compatible para MessagePack"""
+    if isinstance(payload, dict):
+        encoded = {}
+        for key, value in payload.items():
+            if _is_record_list(value):
+                encoded[key] = to_columnar(value)
+            elif key in TIMESTAMP_FIELDS:
+                encoded[key] = _timestamp_to_ms(value)
+            else:
+                encoded[key] = encode_payload(value)
+        return encoded
+    if _is_record_list(payload):
+        return to_columnar(payload)
+    return payload
+
+
+def decode_payload(payload: Any) -> Any:
+    """Inverso de encode_payload: columnas → filas y timestamps → ISO 8601"""
+    if _is_columnar(payload):
+        return [decode_payload(record) for record in from_columnar(payload)]
+    if isinstance(payload, dict):
+        return {
+            key: _ms_to_timestamp(value) if key in TIMESTAMP_FIELDS else decode_payload(value)
+            for key, value in payload.items()
+        }
+    if isinstance(payload, list):
+        return [decode_payload(item) for item in payload]
+    return payload
+
+
+def packb(payload: Any) -> bytes:
+    return msgpack.packb(encode_payload(payload), use_bin_type=True)
+
+
+def unpackb(data: bytes) -> Any:
+    return decode_payload(msgpack.unpackb(data, raw=False))
+
+
+# ==================== INTEGRACIÓN CON FASTAPI ====================
+
+class WireFormatResponse(JSONResponse):
+    """JSONResponse que se codifica en MessagePack si el cliente lo negoció"""
+
+    def render(self, content: Any) -> bytes:
+        if _response_format.get() == MSGPACK_MEDIA_TYPE:
+            self.media_type = MSGPACK_MEDIA_TYPE
+            return packb(content)
+        return super().render(content)
+
+
+class _MsgPackRequest(Request):
+    """Request cuyo cuerpo MessagePack se expone a FastAPI como JSON ya decodificado"""
+
+    async def json(self) -> Any:
+        if not hasattr(self, "_json"):
+            body = await self.body()
+            self._json = unpackb(body)
+        return self._json
+
+
+class WireFormatRoute(APIRoute):
+    """
+    Ruta que negocia el formato de /api/sync/*. Para el resto de rutas
+    no hace nada.
+    """
+
+    def get_route_handler(self) -> Callable:
+        original_handler = super().get_route_handler()
+
+        if not self.path.startswith("/api/sync/"):
+            return original_handler
+
+        async def wire_format_handler(request: Request) -> Response:
+            response_format = (
+                MSGPACK_MEDIA_TYPE if wants_msgpack(request.headers.get("accept", ""))
+                else JSON_MEDIA_TYPE
+            )
+            token = _response_format.set(response_format)
+
+            # Solo si FastAPI parsea el cuerpo (la ingesta en streaming lo lee ella misma)
+            if self.body_field is not None and is_msgpack(request.headers.get("content-type", "")):
+                # FastAPI solo llama a request.json() con content-type JSON
+                headers = [
+                    (name, JSON_MEDIA_TYPE.encode("latin-1") if name == b"content-type" else value)
+                    for name, value in request.scope["headers"]
+                ]
+                scope = dict(request.scope, headers=headers)
+                request = _MsgPackRequest(scope, request.receive)
+
+            try:
+                return await original_handler(request)
+            finally:
+                _response_format.reset(token)
+
+        return wire_format_handler
+
+
+# ==================== ESQUEMA PUBLICADO ====================
+
+_PACIENTE_FIELDS = {
+    "id": "int?", "server_id": "int?", "local_id": "int?",
+    "cedula": "str", "nombre": "str", "fecha_nacimiento": "date (YYYY-MM-DD)",
+    "telefono": "str?", "direccion": "str?", "is_synced": "bool?",
+    "created_at": "timestamp_ms?", "updated_at": "timestamp_ms?",
+}
+
+_VACUNA_FIELDS = {
+    "id": "int?", "server_id": "int?", "local_id": "int?",
+    "paciente_id": "int?", "paciente_server_id": "int?",
+    "nombre_vacuna": "str", "fecha_aplicacion": "date (YYYY-MM-DD)",
+    "lote": "str?", "proxima_dosis": "date (YYYY-MM-DD)?", "usuario_id": "int?",
+    "es_menor": "bool", "cedula_tutor": "str?", "cedula_propia": "str?",
+    "nombre_paciente": "str?", "cedula_paciente": "str?", "is_synced": "bool?",
+    "created_at": "timestamp_ms?", "updated_at": "timestamp_ms?",
+}
+
+SYNC_WIRE_SCHEMA = {
+    "version": WIRE_FORMAT_VERSION,
+    "media_type": MSGPACK_MEDIA_TYPE,
+    "negotiation": {
+        "request": f"Content-Type: {MSGPACK_MEDIA_TYPE}",
+        "response": f"Accept: {MSGPACK_MEDIA_TYPE}",
+        "endpoints": "/api/sync/* (excepto /api/sync/bulk/stream, que solo acepta JSON)",
+    },
+    "record_list": {
+        "description": "Toda lista de objetos se codifica por columnas",
+        "layout": {"_n": "int (número de filas)", "_cols": {"<campo>": "[valor fila 0, valor fila 1, ...]"}},
+        "missing_values": "null en la columna; si el registro no traía el campo, la fila se lista en "
+                          "_absent: {\"<campo>\": [fila, ...]} (opcional) y se aplica el valor por defecto",
+    },
+    "types": {
+        "timestamp_ms": "int, milisegundos desde 1970-01-01T00:00:00Z",
+        "timestamp_fields": sorted(TIMESTAMP_FIELDS),
+        "?": "el campo admite null",
+    },
+    "records": {
+        "paciente": _PACIENTE_FIELDS,
+        "vacuna": _VACUNA_FIELDS,
+    },
+    "messages": {
+        "BulkSyncData": {"pacientes": "record_list<paciente>", "vacunas": "record_list<vacuna>",
+                         "last_sync_client": "timestamp_ms?"},
+        "BulkSyncResponse": {"message": "str", "pacientes_sincronizados": "int",
+                             "vacunas_sincronizadas": "int",
+                             "pacientes_ids": "map<local_id, {server_id: int, action: str}>",
+                             "vacunas_ids": "map<local_id, {server_id: int, action: str}>",
+                             "conflicts": "record_list<{type, local_id, error}>?",
+                             "conflicts_count": "int? (total; conflicts trae como mucho SYNC_MAX_REPORTED_CONFLICTS)",
+                             "server_timestamp": "timestamp_ms"},
+        "SyncUpdatesResponse": {"message": "str", "updates_count": "int", "last_sync": "timestamp_ms",
+                                "updates": "record_list<paciente | vacuna> (columna 'type' indica cuál; "
+                                           "lápidas {type, id, deleted_at, action: 'deleted'}; "
+                                           "con ?cursor= también 'seq')",
+                                "cursor": "int?", "has_more": "bool", "resync_required": "bool"},
+    },
+}